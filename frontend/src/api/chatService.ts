@@ -1,7 +1,27 @@
 import axios from "axios";
+import { v4 as uuidv4 } from "uuid";
 
 const API_URL = "http://localhost:8002";
 
+// A retrieved chunk an answer is based on; its full text is fetched with getChunk.
+// Summaries of whole documents or sections have no chunk id.
+export interface SourceReference {
+  id: number | null;
+  source?: string;
+  page?: number;
+  section?: string;
+  level?: string;
+  tier?: string;
+  snippet: string;
+}
+
+export interface Chunk {
+  id: number;
+  text: string;
+  metadata: Record<string, any>;
+  tier: string;
+}
+
 // TypeScript interfaces for streaming responses
 export interface StreamingStep {
   step:
@@ -15,7 +35,9 @@ export interface StreamingStep {
   count?: number;
   result?: string;
   meta?: {
-    documents: any[];
+    sources: SourceReference[];
+    session_id?: string | null;
+    standalone_query?: string;
   };
 }
 
@@ -25,16 +47,37 @@ export interface StreamingCallbacks {
   onError: (error: string) => void;
 }
 
+// Identifies this browser tab to the backend, which debounces prefetches per
+// client and treats the tab's queries as one conversation, so follow-ups such as
+// "and for part-timers?" are understood.
+const CLIENT_ID = uuidv4();
+
 export const query = async (message: string) => {
   try {
-    const response = await axios.post(`${API_URL}/query`, { query: message });
-    return response.data.answer?.[0];
+    const response = await axios.post(`${API_URL}/query`, { query: message, session_id: CLIENT_ID });
+    return response.data.answer;
   } catch (error) {
     console.error("Error querying API:", error);
     throw new Error("Failed to get response from API");
   }
 };
 
+export const getChunk = async (id: number): Promise<Chunk> => {
+  const response = await axios.get(`${API_URL}/chunks/${id}`);
+  return response.data;
+};
+
+// Lets the backend start retrieval while the user is still typing. Failures are
+// ignored: the real query works the same without a prefetch.
+export const prefetch = (message: string) => {
+  fetch(`${API_URL}/prefetch`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ query: message, client_id: CLIENT_ID }),
+    keepalive: true,
+  }).catch(() => undefined);
+};
+
 export const queryStreaming = (
   message: string,
   callbacks: StreamingCallbacks
@@ -56,7 +99,7 @@ export const queryStreaming = (
           "Content-Type": "application/json",
           Accept: "text/event-stream",
         },
-        body: JSON.stringify({ query: message }),
+        body: JSON.stringify({ query: message, session_id: CLIENT_ID }),
         signal: controller.signal,
       });
 
@@ -4,7 +4,7 @@ import { Message, ThinkingStep } from "@/utils/types";
 import { Send, Brain, FileSearch, Zap, CheckCircle, XCircle } from "lucide-react";
 import { useEffect, useState, useRef } from "react";
 import { v4 as uuidv4 } from "uuid";
-import { query, queryStreaming, StreamingCallbacks } from "@/api/chatService";
+import { prefetch, query, queryStreaming, StreamingCallbacks } from "@/api/chatService";
 import { loadChatHistory, saveChatHistory } from "@/utils/sessionStorage";
 import { Link } from "react-router-dom";
 import { useTheme } from "@/components/theme-provider";
@@ -90,6 +90,7 @@ export default function ChatPage() {
     const { setTheme } = useTheme();
     const messagesEndRef = useRef<null | HTMLDivElement>(null);
     const streamingRef = useRef<EventSource | null>(null);
+    const prefetchTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
 
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -103,6 +104,15 @@ export default function ChatPage() {
         saveChatHistory(messages);
     }, [messages]);
 
+    const handleInputChange = (value: string) => {
+        setInput(value);
+        // Send at most one prefetch per pause in typing; the backend debounces as well.
+        if (prefetchTimerRef.current) clearTimeout(prefetchTimerRef.current);
+        prefetchTimerRef.current = setTimeout(() => {
+            if (value.trim()) prefetch(value);
+        }, 150);
+    };
+
     const handleSend = async () => {
         if (input.trim() === "" || isLoading) return;
 
@@ -110,6 +120,7 @@ export default function ChatPage() {
         setMessages((prev) => [...prev, userMessage]);
 
         const currentInput = input;
+        if (prefetchTimerRef.current) clearTimeout(prefetchTimerRef.current);
         setInput("");
         setIsLoading(true);
 
@@ -209,7 +220,7 @@ export default function ChatPage() {
                     <Input
                         placeholder="Type your message..."
                         value={input}
-                        onChange={(e) => setInput(e.target.value)}
+                        onChange={(e) => handleInputChange(e.target.value)}
                         onKeyDown={(e) => { if (e.key === "Enter") handleSend() }}
                         disabled={isLoading}
                         className="flex-1"
@@ -0,0 +1,153 @@
+"""
+Measures rerank calls saved by the adaptive retrieval policy and its effect on recall.
+
+Every question is answered twice through `Retriever.retrieve`: once with the
+"fixed" policy (search 50, always rerank) and once with the "adaptive" policy
+configured by the `RETRIEVAL_*` environment variables. For each policy the
+benchmark reports rerank calls, documents sent to the reranker, Milvus
+searches and recall@5, where a question counts as answered when its
+expected text appears in one of the returned documents.
+
+Without arguments the simulated backend is used with a synthetic handbook of
+topic x region policy chunks plus shared boilerplate, and three kinds of
+questions: verbatim sentences (easy), topic-and-region questions and vague
+topic questions. The simulated embeddings and reranker are hashed bag-of-words
+models, so the distance knobs need to be re-tuned for Titan v2; to measure on
+the real stack, pass `--questions` with a JSON file of
+`[{"question": ..., "expected": ...}]` and `--collection` with an ingested
+collection.
+
+Usage:
+    uv run python benchmarks/adaptive_retrieval_benchmark.py
+    RETRIEVAL_CANDIDATE_WINDOW=0.3 uv run python benchmarks/adaptive_retrieval_benchmark.py
+    uv run python benchmarks/adaptive_retrieval_benchmark.py --questions qa.json --collection rag_collection
+"""
+import argparse
+import json
+import os
+import random
+
+TOPICS = {
+    "annual leave": "Annual leave must be booked in the leave portal at least two weeks in advance.",
+    "sick leave": "A medical certificate is required for sick leave longer than two consecutive days.",
+    "parental leave": "Parental leave can be taken in up to three separate blocks within the first year.",
+    "remote work": "Remote work arrangements are agreed with the line manager and reviewed every quarter.",
+    "travel expenses": "Travel expenses are reimbursed within thirty days of submitting itemised receipts.",
+    "overtime": "Overtime must be approved in advance and is compensated as time off in lieu.",
+    "health insurance": "Health insurance covers the employee, their spouse and dependent children.",
+    "training budget": "The training budget may be used for courses, certifications and conference tickets.",
+    "equipment": "Laptops and phones are replaced every three years or when they fail.",
+    "probation": "The probation period ends with a written review by the line manager.",
+}
+REGIONS = ["Singapore", "Germany", "Australia", "Japan", "Brazil"]
+BOILERPLATE = [
+    "This handbook is provided for information only and does not form part of any contract of employment.",
+    "Questions about this policy should be directed to the HR business partner for your region.",
+]
+
+
+def synthetic_corpus(seed: int):
+    """
+    Returns handbook chunks and questions with the text that answers them.
+    """
+    rng = random.Random(seed)
+    chunks, questions = [], []
+    for region in REGIONS:
+        for topic, rule in TOPICS.items():
+            amount = rng.randint(2, 40)
+            entitlement = f"In {region}, the {topic} entitlement is {amount} units per calendar year."
+            chunks.append({"text": f"{topic.title()} ({region}). {entitlement} {rule}", "metadata": {"source": f"handbook_{region.lower()}.pdf"}})
+            questions.append({"question": entitlement, "expected": entitlement, "kind": "verbatim"})
+            questions.append({"question": f"What is the {topic} entitlement for employees in {region}?", "expected": entitlement, "kind": "topic+region"})
+        for text in BOILERPLATE:
+            chunks.append({"text": f"{text} ({region})", "metadata": {"source": f"handbook_{region.lower()}.pdf"}})
+    for topic, rule in TOPICS.items():
+        questions.append({"question": f"How does {topic} work here?", "expected": rule, "kind": "vague"})
+    return chunks, questions
+
+
+class CountingRetriever:
+    """
+    Wraps a Retriever to count Milvus searches and reranker calls.
+    """
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self.searches = self.rerank_calls = self.reranked_documents = 0
+        search, rerank = retriever._search_milvus, retriever._rerank_documents
+
+        def counted_search(*args, **kwargs):
+            self.searches += 1
+            return search(*args, **kwargs)
+
+        def counted_rerank(query, results, *args, **kwargs):
+            self.rerank_calls += 1
+            self.reranked_documents += len(results)
+            return rerank(query, results, *args, **kwargs)
+
+        retriever._search_milvus = counted_search
+        retriever._rerank_documents = counted_rerank
+
+
+def evaluate(milvus_manager, policy, questions: list) -> dict:
+    from rag.utils.retriever import Retriever
+
+    counting = CountingRetriever(Retriever(milvus_manager, policy=policy))
+    answered, by_kind = 0, {}
+    for item in questions:
+        documents = counting.retriever.retrieve(item["question"])
+        hit = any(item["expected"] in (document if isinstance(document, str) else document.get("text", "")) for document in documents)
+        answered += hit
+        kind = by_kind.setdefault(item.get("kind", "all"), [0, 0])
+        kind[0] += hit
+        kind[1] += 1
+    return {
+        "rerank_calls": counting.rerank_calls,
+        "reranked_documents": counting.reranked_documents,
+        "searches": counting.searches,
+        "recall@5": round(answered / len(questions), 3),
+        "recall_by_kind": {kind: round(hits / total, 3) for kind, (hits, total) in by_kind.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark adaptive retrieval depth and conditional reranking.")
+    parser.add_argument("--questions", type=str, help="JSON file of {question, expected} pairs for a real collection.")
+    parser.add_argument("--collection", type=str, default="rag_collection")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from rag.utils.logging_config import setup_logging
+
+    if args.questions:
+        with open(args.questions) as f:
+            questions = json.load(f)
+    else:
+        os.environ["RAG_BACKEND"] = "simulated"
+        os.environ.setdefault("SIM_LATENCY_SCALE", "0")
+    setup_logging("prod")
+
+    from rag.utils.retrieval_policy import RetrievalPolicy
+    from rag.utils.simulation import create_milvus_manager, pseudo_embedding
+
+    milvus_manager = create_milvus_manager(collection_name=args.collection)
+    if not args.questions:
+        chunks, questions = synthetic_corpus(args.seed)
+        for chunk in chunks:
+            chunk["embedding"] = pseudo_embedding(chunk["text"], milvus_manager.embedding_dim)
+        milvus_manager.insert_data(chunks)
+        print(f"corpus: {len(chunks)} chunks, {len(questions)} questions")
+
+    fixed = evaluate(milvus_manager, RetrievalPolicy(mode="fixed"), questions)
+    adaptive_policy = RetrievalPolicy.from_env()
+    adaptive_policy.mode = "adaptive"
+    adaptive = evaluate(milvus_manager, adaptive_policy, questions)
+    print(f"   fixed: {fixed}")
+    print(f"adaptive: {adaptive}")
+    saved = 1 - adaptive["rerank_calls"] / fixed["rerank_calls"] if fixed["rerank_calls"] else 0.0
+    print(f"rerank calls saved: {saved:.0%}, documents reranked: {fixed['reranked_documents']} -> {adaptive['reranked_documents']}, "
+          f"recall@5: {fixed['recall@5']} -> {adaptive['recall@5']}")
+
+
+if __name__ == "__main__":
+    main()
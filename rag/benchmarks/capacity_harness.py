@@ -0,0 +1,169 @@
+"""
+Capacity-planning load harness for the API on the simulated backend.
+
+Runs the real FastAPI app in-process with `RAG_BACKEND=simulated`, so every
+Bedrock, Cohere, S3 and Milvus call goes through the simulation with its
+configured latency distribution, error rate and throttling (see
+`rag.utils.simulation`; e.g. `SIM_LLM_LATENCY_MS=4000,12000`,
+`SIM_BEDROCK_EMBEDDING_CAPACITY=8`, `SIM_COHERE_RERANK_ERROR_RATE=0.02`).
+
+A synthetic handbook corpus is first uploaded through `/upload`. Then, for
+each concurrency level, closed-loop clients send `/query` requests, optionally
+mixed with uploads, for `--duration` seconds. For each level the harness
+reports throughput, status codes, end-to-end latency percentiles and the p50/p99
+of each pipeline stage (admission wait, embed, search, rerank, generation and
+ingestion).
+
+`--latency-scale` shrinks every simulated latency so a sweep finishes
+quickly; throughput figures then scale up by the same factor.
+
+Usage:
+    uv run python benchmarks/capacity_harness.py --concurrency 1 2 4 8 16 32 --duration 20
+    uv run python benchmarks/capacity_harness.py --latency-scale 0.1 --upload-ratio 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import fitz  # PyMuPDF
+import httpx
+
+TOPICS = ["annual leave", "sick leave", "parental leave", "remote work", "travel expenses", "overtime",
+          "health insurance", "training budget", "equipment", "probation", "resignation", "public holidays"]
+REGIONS = ["Singapore", "Germany", "Australia", "Japan"]
+STAGES = [
+    "admission.query.wait", "retrieve.embed", "retrieve.search", "retrieve.rerank", "query.retrieve",
+    "query.generate", "admission.upload.wait", "ingest.extract", "ingest.embed", "ingest.store", "upload.ingest",
+]
+
+
+def build_handbook(path: Path, region: str, seed: int):
+    """Writes a small policy handbook PDF for one region."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for topic in TOPICS:
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{topic.title()} in {region}", fontsize=16)
+        body = (
+            f"In {region}, the {topic} entitlement is {rng.randint(2, 40)} units per calendar year. "
+            f"Requests for {topic} are approved by the line manager. "
+            "Exceptions must be approved in writing by the HR business partner."
+        )
+        page.insert_textbox(fitz.Rect(72, 100, 520, 400), body, fontsize=10)
+    doc.save(str(path))
+
+
+def questions():
+    return [f"What is the {topic} entitlement in {region}?" for topic in TOPICS for region in REGIONS]
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def upload(client: httpx.AsyncClient, path: Path, region: str) -> int:
+    with open(path, "rb") as f:
+        response = await client.post("/upload", files={"file": (path.name, f.read(), "application/pdf")}, data={"region": region})
+    return response.status_code
+
+
+async def seed_corpus(client: httpx.AsyncClient, corpus_dir: Path) -> list:
+    files = []
+    for index, region in enumerate(REGIONS):
+        path = corpus_dir / f"handbook_{region.lower()}.pdf"
+        build_handbook(path, region, seed=index)
+        files.append((path, region))
+    statuses = await asyncio.gather(*(upload(client, path, region) for path, region in files))
+    print(f"seeded corpus: {len(files)} documents, statuses {sorted(statuses)}")
+    return files
+
+
+async def run_level(api, client: httpx.AsyncClient, concurrency: int, duration: float, upload_ratio: float, files: list) -> dict:
+    api.metrics.reset()
+    latencies, statuses = {"query": [], "upload": []}, {}
+    bank = questions()
+    deadline = time.monotonic() + duration
+
+    async def worker(worker_id: int):
+        rng = random.Random(worker_id)
+        while time.monotonic() < deadline:
+            kind = "upload" if rng.random() < upload_ratio else "query"
+            started = time.monotonic()
+            if kind == "upload":
+                path, region = rng.choice(files)
+                # A fresh version of the document each time, so it is not short-circuited as a duplicate.
+                build_handbook(path, region, seed=rng.randint(0, 10 ** 9))
+                status = await upload(client, path, region)
+            else:
+                response = await client.post("/query", json={"query": rng.choice(bank)})
+                status = response.status_code
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies[kind].append(time.monotonic() - started)
+            elif status in (429, 503):
+                await asyncio.sleep(0.05)
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    wall = time.monotonic() - started
+
+    summary = api.metrics.latency_summary()
+    query_latencies = latencies["query"]
+    return {
+        "queries_per_sec": round(len(query_latencies) / wall, 2),
+        "uploads_per_sec": round(len(latencies["upload"]) / wall, 3),
+        "statuses": dict(sorted(statuses.items())),
+        "p50": round(percentile(query_latencies, 50), 3),
+        "p95": round(percentile(query_latencies, 95), 3),
+        "p99": round(percentile(query_latencies, 99), 3),
+        "mean": round(statistics.fmean(query_latencies), 3) if query_latencies else float("nan"),
+        "stages": {stage: (summary[stage]["p50"], summary[stage]["p99"]) for stage in STAGES if stage in summary},
+        "retries": {k: v for k, v in api.metrics.snapshot().items() if k.endswith((".retries", ".throttled", ".short_circuits"))},
+    }
+
+
+async def main_async(args):
+    from rag import api
+    from rag.utils.admission import AdmissionController
+    from rag.utils.logging_config import setup_logging
+
+    setup_logging("prod")
+    api.admission = AdmissionController.from_env()
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://harness", timeout=None) as client:
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            files = await seed_corpus(client, Path(corpus_dir))
+            for concurrency in args.concurrency:
+                result = await run_level(api, client, concurrency, args.duration, args.upload_ratio, files)
+                stages = result.pop("stages")
+                print(f"concurrency={concurrency:>3}: {result}")
+                for stage, (p50, p99) in stages.items():
+                    print(f"    {stage:<22} p50={p50:.3f}s p99={p99:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capacity sweep of the API on the simulated backend.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level.")
+    parser.add_argument("--upload-ratio", type=float, default=0.0, help="Fraction of requests that are uploads.")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for all simulated latencies.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ["RAG_BACKEND"] = "simulated"
+    os.environ["SIM_LATENCY_SCALE"] = str(args.latency_scale)
+    os.environ.setdefault("AWS_REGION", "ap-northeast-1")
+    random.seed(args.seed)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Compares the legacy fixed-size splitter with the structure-aware chunker.
+
+For each strategy the benchmark reports the number of chunks, the tokens sent
+to the embedding model (and the estimated Titan v2 cost), and retrieval
+recall@k on a question set. Retrieval uses a local hashed bag-of-words
+embedding so the comparison isolates chunking and costs no model calls; a
+question counts as answered when its answer sentence appears intact in one of
+the top-k chunks.
+
+Without arguments a synthetic handbook PDF with nested headings is generated.
+Real documents can be benchmarked with `--files` and a `--questions` JSON file
+containing `[{"question": ..., "answer": ...}]`.
+
+Usage:
+    uv run python benchmarks/chunking_benchmark.py
+    uv run python benchmarks/chunking_benchmark.py --files handbook.pdf --questions qa.json
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import tempfile
+from pathlib import Path
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from rag.utils.document_processor import DocumentProcessor
+from rag.utils.text_utils import count_tokens
+
+# Titan Text Embeddings v2 on-demand price per 1,000 input tokens (USD).
+EMBEDDING_PRICE_PER_1K_TOKENS = 0.00002
+DIM = 2048
+
+TOPICS = ["annual leave", "sick leave", "parental leave", "remote work", "travel expenses", "overtime",
+          "health insurance", "dental cover", "training budget", "equipment", "probation", "resignation"]
+REGIONS = ["Singapore", "Germany", "Australia", "Japan"]
+FILLER = [
+    "This section should be read together with the general terms of employment.",
+    "Managers are responsible for communicating these rules to their teams.",
+    "Exceptions must be approved in writing by the HR business partner.",
+    "Local legislation takes precedence where it is more favourable to the employee.",
+    "Records are retained in the HR system for the duration of employment.",
+]
+
+
+def build_synthetic_corpus(path: Path, seed: int = 7) -> list:
+    """Writes a multi-level handbook PDF and returns its question set."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    questions = []
+    page, y = doc.new_page(), 72
+
+    def write(text, size):
+        nonlocal page, y
+        for line in _wrap(text, 95 if size < 12 else 60):
+            if y > 760:
+                page, y = doc.new_page(), 72
+            page.insert_text((72, y), line, fontsize=size)
+            y += size + 6
+        y += 4
+
+    for region in REGIONS:
+        write(f"{region} Employee Handbook", 20)
+        for topic in TOPICS:
+            write(f"{topic.title()} in {region}", 15)
+            for _ in range(rng.randint(1, 3)):
+                write(" ".join(rng.sample(FILLER, 3)), 10)
+            amount = rng.randint(2, 40)
+            answer = f"In {region}, the {topic} entitlement is {amount} units per calendar year."
+            write(" ".join(rng.sample(FILLER, 2)) + " " + answer + " " + rng.choice(FILLER), 10)
+            questions.append({"question": f"What is the {topic} entitlement in {region}?", "answer": answer})
+    doc.save(str(path))
+    return questions
+
+
+def _wrap(text, width):
+    words, line, lines = text.split(), "", []
+    for word in words:
+        if len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    return lines + [line] if line else lines
+
+
+def embed(text: str) -> np.ndarray:
+    """A deterministic hashed unigram+bigram embedding."""
+    tokens = re.findall(r"\w+", text.lower())
+    vector = np.zeros(DIM, dtype=np.float32)
+    for gram in tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]:
+        vector[int(hashlib.md5(gram.encode()).hexdigest(), 16) % DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def evaluate(strategy: str, files: list, questions: list, k: int) -> dict:
+    processor = DocumentProcessor(mock=True, chunking_strategy=strategy)
+    chunks = []
+    for file_path in files:
+        blocks, _ = processor._extract_text_and_images(str(file_path))
+        chunks.extend(chunk["text"] for chunk in processor._chunk_blocks(blocks))
+
+    normalize = lambda text: " ".join(text.split())
+    matrix = np.stack([embed(chunk) for chunk in chunks])
+    hits = 0
+    for item in questions:
+        top = np.argsort(-(matrix @ embed(item["question"])))[:k]
+        hits += any(normalize(item["answer"]) in normalize(chunks[i]) for i in top)
+
+    tokens = sum(count_tokens(chunk) for chunk in chunks)
+    return {
+        "chunks": len(chunks),
+        "embedded_tokens": tokens,
+        "embedding_cost_usd": round(tokens / 1000 * EMBEDDING_PRICE_PER_1K_TOKENS, 6),
+        f"recall@{k}": round(hits / len(questions), 3) if questions else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking strategies.")
+    parser.add_argument("--files", nargs="*", help="PDF/DOCX files to chunk; defaults to a synthetic handbook.")
+    parser.add_argument("--questions", help="JSON file with question/answer pairs for the given files.")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.files:
+            files = [Path(f) for f in args.files]
+            questions = json.loads(Path(args.questions).read_text()) if args.questions else []
+        else:
+            files = [Path(temp_dir) / "synthetic_handbook.pdf"]
+            questions = build_synthetic_corpus(files[0])
+
+        for strategy in ("recursive", "structured"):
+            print(f"{strategy:>10}: {evaluate(strategy, files, questions, args.k)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Compares DOCX extraction with python-docx against the single-pass XML reader.
+
+- python-docx: the previous `_extract_from_docx`. It loads the whole document
+  tree, walks `doc.paragraphs` and runs two XPath `findall` calls per run, and
+  never looks at tables.
+- single-pass: `DocumentProcessor._extract_from_docx`, which streams the body
+  XML once with `iter_docx` and emits paragraphs, tables and images in order.
+
+A synthetic handbook is generated with python-docx: headed sections of
+paragraphs with several runs each, a benefits table every few sections and an
+image every few sections. Each variant runs in a fresh process and reports its
+time, the growth of its peak resident set size and how many of the table cell
+texts appear in its output.
+
+Usage:
+    uv run python benchmarks/docx_extraction_benchmark.py --sections 400
+    uv run python benchmarks/docx_extraction_benchmark.py --files handbook.docx
+"""
+import argparse
+import io
+import multiprocessing
+import random
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import docx
+from PIL import Image
+
+NAMESPACES = {
+    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+}
+TOPICS = ["annual leave", "sick leave", "parental leave", "remote work", "travel expenses", "overtime", "health insurance"]
+VARIANTS = ("python-docx", "single-pass")
+
+
+def build_synthetic_docx(path: Path, sections: int, seed: int = 7):
+    """Writes a long handbook with headings, multi-run paragraphs, tables and images."""
+    rng = random.Random(seed)
+    document = docx.Document()
+    image = io.BytesIO()
+    Image.effect_noise((160, 120), 60).convert("RGB").save(image, format="PNG")
+    for section in range(sections):
+        topic = rng.choice(TOPICS)
+        document.add_heading(f"{section + 1}. {topic.title()}", level=1 + section % 2)
+        for _ in range(8):
+            paragraph = document.add_paragraph()
+            for sentence in range(4):
+                run = paragraph.add_run(f"Employees in grade {rng.randint(1, 9)} receive {rng.randint(1, 30)} days of {topic}. ")
+                run.bold = sentence == 0
+        if section % 4 == 0:
+            table = document.add_table(rows=6, cols=4)
+            for row_index, row in enumerate(table.rows):
+                for column, cell in enumerate(row.cells):
+                    cell.text = f"{topic} {column}" if row_index == 0 else f"grade {row_index}: {rng.randint(1, 30)} days"
+        if section % 10 == 0:
+            image.seek(0)
+            document.add_paragraph("The chart below summarises the entitlement.").add_run().add_picture(image)
+    document.save(path)
+
+
+def extract_with_python_docx(file_path: str):
+    """The previous extractor, kept here as the baseline."""
+    doc = docx.Document(file_path)
+    blocks = []
+    extracted_images = []
+    image_part_map = {rId: rel.target_part for rId, rel in doc.part.rels.items() if "image" in rel.target_ref}
+    img_counter = 0
+    for para in doc.paragraphs:
+        para_content = ""
+        for run in para.runs:
+            drawing_elems = run.element.findall('.//w:drawing', namespaces=NAMESPACES)
+            if drawing_elems:
+                for drawing in drawing_elems:
+                    for blip in drawing.findall('.//a:blip', namespaces=NAMESPACES):
+                        rId = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
+                        if rId and rId in image_part_map:
+                            img_counter += 1
+                            image_filename = f"docx_{Path(file_path).stem}_img{img_counter}.png"
+                            para_content += f"\n[image_placeholder:{image_filename}]\n"
+                            extracted_images.append({"bytes": image_part_map[rId].blob, "filename": image_filename})
+            else:
+                para_content += run.text
+        blocks.append({"text": para_content, "page": None, "heading_level": 0})
+    return blocks, extracted_images
+
+
+def table_cells(file_path: str) -> list:
+    document = docx.Document(file_path)
+    return [cell.text for table in document.tables for row in table.rows for cell in row.cells if cell.text]
+
+
+def _run_variant(name: str, file_path: str, results):
+    from rag.utils.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(mock=True)
+    cells = table_cells(file_path)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if name == "python-docx":
+        blocks, images = extract_with_python_docx(file_path)
+    else:
+        blocks, images = processor._extract_from_docx(file_path)
+    elapsed = time.perf_counter() - started
+    growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+    text = "\n".join(block["text"] for block in blocks)
+    found = sum(1 for cell in cells if cell in text)
+    results.put((elapsed, growth, len(blocks), len(images), found, len(cells)))
+
+
+def measure(name: str, file_path: str):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_variant, args=(name, file_path, results))
+    process.start()
+    elapsed, growth, blocks, images, found, cells = results.get()
+    process.join()
+    print(f"{name:>12}: {{'seconds': {elapsed:.2f}, 'peak_rss_growth_mb': {growth:.1f}, 'blocks': {blocks}, "
+          f"'images': {images}, 'table_cells_found': '{found}/{cells}'}}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DOCX extraction.")
+    parser.add_argument("--sections", type=int, default=400, help="Sections of the synthetic handbook.")
+    parser.add_argument("--files", nargs="*", help="DOCX files to benchmark instead of the synthetic handbook.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = args.files
+        if not files:
+            path = Path(temp_dir) / "handbook.docx"
+            build_synthetic_docx(path, args.sections)
+            print(f"Synthetic handbook: {args.sections} sections, {path.stat().st_size / 2 ** 20:.1f} MB")
+            files = [str(path)]
+        for file_path in files:
+            print(file_path)
+            for name in VARIANTS:
+                measure(name, file_path)
+
+
+if __name__ == "__main__":
+    main()
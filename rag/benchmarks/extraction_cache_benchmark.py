@@ -0,0 +1,92 @@
+"""
+Measures how long re-running the extraction of a document takes with and without the extraction cache.
+
+A synthetic handbook of `--pages` text-dense pages, with a distinct chart every
+`--image-every` pages, is extracted as `process_document` does: parsed with
+PyMuPDF and its images captioned, with the simulated backend standing in for
+S3 and the caption model at its modelled latency (`SIM_LATENCY_SCALE`).
+
+- cold: the first extraction, which parses, captions and fills the cache.
+- cached: a later run with the same file and settings, e.g. to re-chunk it.
+- rechunk: the cached run followed by chunking with other settings, the
+  experiment the cache is for.
+
+Usage:
+    RAG_BACKEND=simulated uv run python benchmarks/extraction_cache_benchmark.py --pages 300
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from rag.utils.chunker import StructuredChunker
+from rag.utils.document_processor import DocumentProcessor
+from rag.utils.extraction_cache import ExtractionCache
+from rag.utils.upload import file_sha256
+
+TOPICS = ["annual leave", "sick leave", "parental leave", "remote work", "travel expenses", "overtime", "health insurance"]
+
+
+def build_pdf(path: str, pages: int, image_every: int, seed: int = 7):
+    """Writes a handbook of text-dense pages with a heading on each and a distinct chart every `image_every` pages."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page()
+        topic = rng.choice(TOPICS)
+        page.insert_text((72, 72), f"{number}. {topic.title()}", fontsize=16)
+        body = " ".join(
+            f"Employees in grade {rng.randint(1, 9)} are entitled to {rng.randint(1, 30)} days of {topic} per calendar year."
+            for _ in range(30)
+        )
+        page.insert_textbox(fitz.Rect(72, 100, 520, 600), body, fontsize=9)
+        if image_every and number % image_every == 0:
+            chart = io.BytesIO()
+            Image.effect_noise((300, 200), 40 + number % 50).convert("RGB").save(chart, format="PNG")
+            page.insert_image(fitz.Rect(72, 610, 372, 810), stream=chart.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--image-every", type=int, default=10, help="Pages between images; 0 for none.")
+    args = parser.parse_args()
+    os.environ.setdefault("RAG_BACKEND", "simulated")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "handbook.pdf")
+        build_pdf(path, args.pages, args.image_every)
+        content_hash = file_sha256(path)
+        processor = DocumentProcessor()
+        processor.extraction_cache = ExtractionCache(os.path.join(temp_dir, "cache"))
+
+        cold, cold_seconds = timed(lambda: processor._extract_blocks(path, content_hash))
+        captioned = processor.image_stats["captioned"]
+        cached, cached_seconds = timed(lambda: processor._extract_blocks(path, content_hash))
+        if cached != cold:
+            raise SystemExit("The cached extraction differs from the cold one")
+        rechunker = StructuredChunker(max_size=150, min_size=30, overlap=0, length_unit="tokens")
+        _, rechunk_seconds = timed(lambda: rechunker.chunk(processor._extract_blocks(path, content_hash)))
+
+        cache_bytes = sum(entry.stat().st_size for entry in os.scandir(processor.extraction_cache.directory))
+        print(f"{args.pages} pages, {len(cold)} blocks, {captioned} images captioned, cache entry {cache_bytes / 1e3:.0f} kB")
+        print(f"{'run':<10}{'seconds':>10}{'speed-up':>10}")
+        for name, seconds in (("cold", cold_seconds), ("cached", cached_seconds), ("rechunk", rechunk_seconds)):
+            print(f"{name:<10}{seconds:>10.3f}{cold_seconds / seconds:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Overload test for the admission controller.
+
+Drives the FastAPI app in-process against a local fake model backend that
+behaves like a throttled Bedrock endpoint: calls slow down proportionally once
+more than `--backend-capacity` run at once, and are throttled outright past
+twice that. Requests arrive at a fixed rate above what the backend can serve,
+and the same arrival pattern is replayed with admission control effectively
+disabled and with the configured limits, and the latency distribution of
+successful requests is reported for both.
+
+Usage:
+    uv run python benchmarks/load_test.py --rate 40 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import threading
+import time
+
+import httpx
+
+
+class ThrottlingException(Exception):
+    """Raised by the fake backend when it is overloaded."""
+
+
+class FakeModelBackend:
+    """
+    A processor-sharing model of an LLM backend with a fixed capacity.
+
+    Throttled calls are retried with jittered exponential backoff the way the
+    AWS SDK does by default, so overload shows up as latency before it shows
+    up as errors.
+    """
+
+    def __init__(self, capacity: int, base_latency: float, throttle_factor: float = 2.0, max_retries: int = 4):
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.throttle_factor = throttle_factor
+        self.max_retries = max_retries
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def call(self, scale: float = 1.0):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._attempt(scale)
+            except ThrottlingException:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+    def _attempt(self, scale: float):
+        with self._lock:
+            self._active += 1
+            active = self._active
+        try:
+            if active > self.capacity * self.throttle_factor:
+                time.sleep(self.base_latency * 0.1)
+                raise ThrottlingException("Rate exceeded")
+            slowdown = max(1.0, active / self.capacity)
+            time.sleep(random.lognormvariate(0, 0.2) * self.base_latency * scale * slowdown)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+class _FakeReport:
+    def __init__(self, raw: str):
+        self.raw = raw
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+def install_fake_backend(api, backend: FakeModelBackend):
+    """Replaces the model-bound pipeline steps of the API with fake backend calls."""
+    def retrieve(query: str, *args) -> dict:
+        backend.call(scale=0.2)
+        return {"documents": [{"id": None, "text": f"Policy text relevant to: {query}"}], "degraded": False}
+
+    def generate(query: str, documents: list, fast: bool = False):
+        backend.call(scale=1.0)
+        return _FakeReport(f"Answer to: {query}")
+
+    api._retrieve_documents = retrieve
+    api._generate_report = generate
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+async def run_open_loop(api, rate: float, duration: float) -> dict:
+    """Fires requests at a fixed arrival rate regardless of how fast they complete."""
+    latencies, statuses = [], {}
+    transport = httpx.ASGITransport(app=api.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        async def one(i: int):
+            started = time.monotonic()
+            response = await client.post("/query", json={"query": f"How many leave days for case {i}?"})
+            elapsed = time.monotonic() - started
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(elapsed)
+
+        tasks = []
+        started = time.monotonic()
+        for i in range(int(rate * duration)):
+            tasks.append(asyncio.ensure_future(one(i)))
+            await asyncio.sleep(max(0.0, started + (i + 1) / rate - time.monotonic()))
+        await asyncio.gather(*tasks)
+        wall = time.monotonic() - started
+
+    return {
+        "statuses": dict(sorted(statuses.items())),
+        "ok_per_sec": round(len(latencies) / wall, 2),
+        "p50": round(percentile(latencies, 50), 3),
+        "p99": round(percentile(latencies, 99), 3),
+        "mean": round(statistics.fmean(latencies), 3) if latencies else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overload test for /query admission control.")
+    parser.add_argument("--rate", type=float, default=40.0, help="Arrivals per second.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of arrivals.")
+    parser.add_argument("--backend-capacity", type=int, default=4)
+    parser.add_argument("--base-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    from rag import api
+    from rag.utils.admission import AdmissionController, EndpointLimits
+
+    backend = FakeModelBackend(capacity=args.backend_capacity, base_latency=args.base_latency)
+    install_fake_backend(api, backend)
+
+    scenarios = {
+        "unbounded": AdmissionController(
+            {"query": EndpointLimits(10_000, 10_000, 3600, 0), "upload": EndpointLimits(10_000, 10_000, 3600, 10)},
+            total_concurrency=10_000,
+        ),
+        "admission": AdmissionController.from_env() if os.environ.get("QUERY_MAX_CONCURRENCY") else AdmissionController(
+            {
+                "query": EndpointLimits(args.backend_capacity, args.backend_capacity * 4, args.base_latency * 10, 0),
+                "upload": EndpointLimits(1, 4, 60, 10),
+            },
+            total_concurrency=args.backend_capacity,
+        ),
+    }
+
+    for name, controller in scenarios.items():
+        api.admission = controller
+        result = asyncio.run(run_open_loop(api, args.rate, args.duration))
+        print(f"{name:>10}: {result}")
+
+
+if __name__ == "__main__":
+    main()
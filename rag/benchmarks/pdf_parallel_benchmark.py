@@ -0,0 +1,79 @@
+"""
+Measures PDF extraction wall time against the number of worker processes.
+
+A synthetic handbook of `--pages` text-dense pages, with an image every
+`--image-every` pages, is parsed with `read_pdf` once per worker count. One
+worker is the single-process path; more workers split the file into page
+ranges parsed in parallel processes. The first parallel run also pays for
+starting the pool, so each count is measured after one warm-up run.
+
+Every run is checked against the single-process output, so the speed-up is
+only reported for identical results. The speed-up is bounded by the CPUs of
+the machine, which are printed with the results.
+
+Usage:
+    uv run python benchmarks/pdf_parallel_benchmark.py --pages 2000 --workers 1 2 4 8
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from rag.utils.pdf_reader import read_pdf
+
+TOPICS = ["annual leave", "sick leave", "parental leave", "remote work", "travel expenses", "overtime", "health insurance"]
+
+
+def build_pdf(path: str, pages: int, image_every: int, seed: int = 7):
+    """Writes a handbook of text-dense pages with a heading on each and an image every `image_every` pages."""
+    rng = random.Random(seed)
+    image = io.BytesIO()
+    Image.new("RGB", (200, 150), (30, 90, 160)).save(image, format="PNG")
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page()
+        topic = rng.choice(TOPICS)
+        page.insert_text((72, 72), f"{number}. {topic.title()}", fontsize=16)
+        body = " ".join(
+            f"Employees in grade {rng.randint(1, 9)} are entitled to {rng.randint(1, 30)} days of {topic} per calendar year."
+            for _ in range(30)
+        )
+        page.insert_textbox(fitz.Rect(72, 100, 520, 700), body, fontsize=9)
+        if image_every and number % image_every == 0:
+            page.insert_image(fitz.Rect(72, 710, 272, 780), stream=image.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--image-every", type=int, default=10, help="Pages between images; 0 for none.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "handbook.pdf")
+        build_pdf(path, args.pages, args.image_every)
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+        print(f"{'workers':>8}{'seconds':>10}{'pages/s':>10}{'speed-up':>10}")
+        expected, baseline = None, None
+        for workers in args.workers:
+            read_pdf(path, "pdf_handbook", workers=workers, min_pages=1)
+            started = time.perf_counter()
+            result = read_pdf(path, "pdf_handbook", workers=workers, min_pages=1)
+            elapsed = time.perf_counter() - started
+            expected = expected or result
+            if result != expected:
+                raise SystemExit(f"{workers} workers returned a different extraction")
+            baseline = baseline or elapsed
+            print(f"{workers:>8}{elapsed:>10.2f}{args.pages / elapsed:>10.0f}{baseline / elapsed:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Measures how much of the crew prompts the provider's prompt cache can serve.
+
+A stream of queries is answered with the simulated backend, whose fake
+provider renders the real task templates and counts the prompt tokens read
+from its prompt cache. Each query retrieves a few chunks from a corpus in
+which some chunks are asked about far more often than others (Zipf), as in
+an HR knowledge base where leave and expenses dominate.
+
+- no-cache: no cache points (`PROMPT_CACHE=off`).
+- static-prefix: cache points after the system prompt and the task
+  instructions; no chunks pinned.
+- static+pinned: as above, with the most used chunks pinned into the cached
+  part of the prompt (`ChunkPopularity`).
+
+Bedrock only caches a prefix of at least about 1,000 tokens, which the
+instructions alone do not reach; `--min-tokens` changes that threshold.
+
+Usage:
+    uv run python benchmarks/prompt_cache_benchmark.py --queries 500
+    uv run python benchmarks/prompt_cache_benchmark.py --queries 500 --min-tokens 0
+"""
+import argparse
+import os
+import random
+
+from rag.utils.cost import price_of
+from rag.utils.prompt_cache import ChunkPopularity
+from rag.utils.simulation import SimulatedBackend
+
+MODEL = "apac.amazon.nova-pro-v1:0"
+TOPICS = ["annual leave", "sick leave", "parental leave", "remote work", "travel expenses", "overtime", "health insurance"]
+VARIANTS = {
+    "no-cache": {"PROMPT_CACHE": "off", "pin_uses": 0},
+    "static-prefix": {"PROMPT_CACHE": "on", "pin_uses": 0},
+    "static+pinned": {"PROMPT_CACHE": "on", "pin_uses": 3},
+}
+
+
+def build_corpus(chunks: int, chars: int, seed: int = 7) -> list:
+    """Returns chunk documents of about `chars` characters each."""
+    rng = random.Random(seed)
+    corpus = []
+    for chunk_id in range(chunks):
+        topic = rng.choice(TOPICS)
+        text = ""
+        while len(text) < chars:
+            text += f"Employees in grade {rng.randint(1, 9)} are entitled to {rng.randint(1, 30)} days of {topic} per calendar year. "
+        corpus.append({"id": chunk_id, "text": text})
+    return corpus
+
+
+def build_queries(corpus: list, queries: int, per_query: int, seed: int = 11) -> list:
+    """Returns (question, documents) pairs; chunk popularity follows a Zipf distribution."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** 1.2 for rank in range(len(corpus))]
+    workload = []
+    for index in range(queries):
+        chosen = {}
+        while len(chosen) < per_query:
+            document = rng.choices(corpus, weights=weights)[0]
+            chosen[document["id"]] = document
+        documents = sorted(chosen.values(), key=lambda document: rng.random())
+        workload.append((f"Question {index} about {rng.choice(TOPICS)}?", documents))
+    return workload
+
+
+def run_variant(name: str, workload: list, min_tokens: int, max_pinned: int) -> dict:
+    settings = VARIANTS[name]
+    os.environ.update({"PROMPT_CACHE": settings["PROMPT_CACHE"], "MODEL": MODEL, "SIM_LATENCY_SCALE": "0",
+                       "SIM_PROMPT_CACHE_MIN_TOKENS": str(min_tokens)})
+    backend = SimulatedBackend()
+    popularity = ChunkPopularity(min_uses=settings["pin_uses"], max_pinned=max_pinned)
+    prompt_tokens = cached_tokens = output_tokens = 0
+    for question, documents in workload:
+        pinned, rest = popularity.split(documents)
+        usage = backend.generate_report(question, [document["text"] for document in rest],
+                                        pinned_documents=[document["text"] for document in pinned]).token_usage
+        prompt_tokens += usage.prompt_tokens
+        cached_tokens += usage.cached_prompt_tokens
+        output_tokens += usage.completion_tokens
+    return {
+        "variant": name,
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "cached_share": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+        "cost_usd": price_of(MODEL, prompt_tokens, output_tokens, cached_input_tokens=cached_tokens),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=200, help="Chunks in the corpus.")
+    parser.add_argument("--chars", type=int, default=1000, help="Characters per chunk.")
+    parser.add_argument("--per-query", type=int, default=5, help="Chunks sent to the crew per query.")
+    parser.add_argument("--pinned", type=int, default=3, help="Most chunks pinned in one prompt.")
+    parser.add_argument("--min-tokens", type=int, default=1024, help="Smallest prefix the provider caches.")
+    args = parser.parse_args()
+
+    workload = build_queries(build_corpus(args.chunks, args.chars), args.queries, args.per_query)
+    results = [run_variant(name, workload, args.min_tokens, args.pinned) for name in VARIANTS]
+    baseline = results[0]["cost_usd"]
+    print(f"{args.queries} queries, {args.per_query} chunks of {args.chars} characters each, up to {args.pinned} pinned, "
+          f"minimum cached prefix {args.min_tokens} tokens")
+    print(f"{'variant':<16}{'prompt tokens':>15}{'cached tokens':>15}{'cached':>9}{'cost usd':>11}{'saving':>9}")
+    for result in results:
+        print(f"{result['variant']:<16}{result['prompt_tokens']:>15}{result['cached_tokens']:>15}{result['cached_share']:>9.1%}"
+              f"{result['cost_usd']:>11.4f}{1 - result['cost_usd'] / baseline:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
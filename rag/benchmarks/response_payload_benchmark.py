@@ -0,0 +1,98 @@
+"""
+Compares the size and serialization time of /query responses.
+
+- full-json: the previous response. Every retrieved document's full text is in
+  `meta.documents`, and FastAPI's JSONResponse runs `jsonable_encoder` and
+  `json.dumps` over it.
+- references-orjson: the current response. `meta.sources` holds the chunk id,
+  source metadata and a snippet of each document, serialized with orjson.
+  Building the references is timed separately.
+
+Each payload is also gzipped at the level used by `CompressionMiddleware` to
+show the bytes actually sent to clients that accept gzip. The answer and the
+documents are synthetic, sized like a typical crew report and chunk.
+
+Usage:
+    uv run python benchmarks/response_payload_benchmark.py --documents 5 --chars 1500
+    uv run python benchmarks/response_payload_benchmark.py --documents 50 --chars 1000
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+
+from fastapi.encoders import jsonable_encoder
+
+from rag.utils.responses import dumps, references
+
+TOPICS = ["annual leave", "sick leave", "parental leave", "remote work", "travel expenses", "overtime", "health insurance"]
+
+
+def build_documents(count: int, chars: int, seed: int = 7) -> list:
+    """Returns retrieved documents with handbook-like text of about `chars` characters."""
+    rng = random.Random(seed)
+    documents = []
+    for index in range(count):
+        topic = rng.choice(TOPICS)
+        text = ""
+        while len(text) < chars:
+            text += f"Employees in grade {rng.randint(1, 9)} are entitled to {rng.randint(1, 30)} days of {topic} per calendar year. "
+        documents.append({"id": 1000 + index, "text": text, "source": f"handbook_{index % 4}.pdf", "page": rng.randint(1, 80),
+                          "section": f"Handbook > {topic.title()}"})
+    return documents
+
+
+def full_payload(answer: str, documents: list, usage: dict) -> dict:
+    return {"answer": [answer], "meta": {"documents": [document["text"] for document in documents], "usage": usage}}
+
+
+def slim_payload(answer: str, documents: list, usage: dict) -> dict:
+    return {"answer": answer, "meta": {"sources": references(documents), "usage": usage}}
+
+
+def measure(name: str, build, serialize, repeat: int) -> dict:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = build()
+    built = time.perf_counter()
+    for _ in range(repeat):
+        body = serialize(payload)
+    serialized = time.perf_counter()
+    return {
+        "variant": name,
+        "bytes": len(body),
+        "gzip_bytes": len(zlib.compress(body, 6)),
+        "build_us": round((built - started) / repeat * 1e6, 1),
+        "serialize_us": round((serialized - built) / repeat * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=5, help="Documents returned by retrieval.")
+    parser.add_argument("--chars", type=int, default=1500, help="Characters per document.")
+    parser.add_argument("--repeat", type=int, default=2000, help="Serializations per variant.")
+    args = parser.parse_args()
+
+    documents = build_documents(args.documents, args.chars)
+    answer = " ".join(f"Point {i}: {document['text'][:300]}" for i, document in enumerate(documents[:5]))
+    usage = {"cost_usd": 0.0123, "input_tokens": 5400, "output_tokens": 800, "calls": 4, "degraded": False}
+
+    results = [
+        measure("full-json", lambda: full_payload(answer, documents, usage),
+                lambda payload: json.dumps(jsonable_encoder(payload), ensure_ascii=False).encode(), args.repeat),
+        measure("references-orjson", lambda: slim_payload(answer, documents, usage), dumps, args.repeat),
+    ]
+    print(f"{args.documents} documents of {args.chars} characters, answer of {len(answer)} characters")
+    print(f"{'variant':<20}{'bytes':>10}{'gzip bytes':>12}{'build us':>10}{'serialize us':>14}")
+    for result in results:
+        print(f"{result['variant']:<20}{result['bytes']:>10}{result['gzip_bytes']:>12}{result['build_us']:>10}{result['serialize_us']:>14}")
+    baseline, current = results
+    print(f"payload {current['bytes'] / baseline['bytes']:.1%} of before, {current['gzip_bytes'] / baseline['bytes']:.1%} gzipped; "
+          f"serialization {baseline['serialize_us'] / current['serialize_us']:.1f}x faster, "
+          f"{baseline['serialize_us'] / (current['build_us'] + current['serialize_us']):.1f}x including the references")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Measures time and memory to receive a large upload.
+
+Three ways of receiving the same multipart body are compared:
+
+- spooled: the previous handler. Starlette spools the body into an
+  `UploadFile`, it is copied to a temp directory with `shutil.copyfileobj`,
+  and detecting a duplicate would need another full read to hash it.
+- streaming: `StreamingUploadParser` writes the file part straight to the
+  temp directory and hashes it as it arrives.
+- endpoint: the real `/upload` endpoint driven in-process, with the duplicate
+  check stubbed to report a match, so the file is received, hashed and
+  short-circuited without parsing or model calls.
+
+Each variant runs in a fresh process and reports the growth of its peak
+resident set size over the baseline after imports.
+
+Usage:
+    uv run python benchmarks/upload_benchmark.py --size-mb 200
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from starlette.requests import Request
+
+from rag.utils.upload import StreamingUploadParser, file_sha256
+
+BOUNDARY = "benchmarkboundary"
+CHUNK_SIZE = 64 * 1024
+
+
+def body_parts(size: int):
+    """Yields a multipart body with one file part of `size` bytes, in network-sized chunks."""
+    yield (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="tenant"\r\n\r\nacme\r\n'
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="large.pdf"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    block = os.urandom(CHUNK_SIZE)
+    sent = 0
+    while sent < size:
+        piece = block[:min(CHUNK_SIZE, size - sent)]
+        sent += len(piece)
+        yield piece
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(size: int) -> Request:
+    parts = body_parts(size)
+
+    async def receive():
+        chunk = next(parts, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/upload",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }
+    return Request(scope, receive)
+
+
+async def receive_spooled(size: int, target: Path):
+    form = await make_request(size).form()
+    upload = form["file"]
+    with open(target / upload.filename, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+    await form.close()
+    return file_sha256(str(target / upload.filename))
+
+
+async def receive_streaming(size: int, target: Path):
+    request = make_request(size)
+    parser = StreamingUploadParser(request.headers["content-type"], target, max_bytes=size)
+    upload = await parser.parse(request.stream())
+    return upload.sha256
+
+
+async def receive_endpoint(size: int, target: Path):
+    from rag import api
+
+    api._is_duplicate = lambda content_hash, tenant=None: True
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def content():
+            for part in body_parts(size):
+                yield part
+
+        response = await client.post(
+            "/upload",
+            content=content(),
+            headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"},
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+VARIANTS = {"spooled": receive_spooled, "streaming": receive_streaming, "endpoint": receive_endpoint}
+
+
+def _run_variant(name: str, size: int, results):
+    if name == "endpoint":
+        from rag import api  # noqa: F401  (imported before the baseline is taken)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as temp_dir:
+        started = time.perf_counter()
+        asyncio.run(VARIANTS[name](size, Path(temp_dir)))
+        elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((elapsed, (peak - baseline) / 1024))
+
+
+def measure(name: str, size: int):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_variant, args=(name, size, results))
+    process.start()
+    elapsed, rss_growth_mb = results.get()
+    process.join()
+    print(f"{name:>10}: {{'seconds': {elapsed:.2f}, 'mb_per_sec': {size / 2 ** 20 / elapsed:.0f}, 'peak_rss_growth_mb': {rss_growth_mb:.1f}}}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark large upload handling.")
+    parser.add_argument("--size-mb", type=float, default=200)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    os.environ.setdefault("MAX_UPLOAD_MB", str(args.size_mb + 1))
+    for name in VARIANTS:
+        measure(name, size)
+
+
+if __name__ == "__main__":
+    main()
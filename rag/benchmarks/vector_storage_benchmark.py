@@ -0,0 +1,137 @@
+"""
+Compares vector storage settings for the knowledge base.
+
+For every combination of embedding dimension (256/512/1024) and quantization
+(none/sq8) the benchmark reports the vector memory per million chunks,
+both of the indexes alone and of everything loaded for a search, the
+brute-force search latency per query and recall@k against exact 1024-d
+float32 search, with the same candidate oversampling and full-precision
+re-scoring that MilvusManager.search applies to quantized collections.
+Re-scoring reads the float vectors, so quantized settings keep them loaded
+beside their indexes.
+
+Without arguments a clustered synthetic corpus is generated, and reduced
+dimensions are approximated by truncating and re-normalizing the vectors
+(Titan v2 is trained so its shorter outputs behave similarly). Real Titan v2
+embeddings exported as .npy files give exact numbers: pass the 1024-d matrix
+with `--embeddings`, and optionally `--reduced 256=emb256.npy 512=emb512.npy`
+with embeddings of the same texts requested at the lower dimensions.
+
+Usage:
+    uv run python benchmarks/vector_storage_benchmark.py
+    uv run python benchmarks/vector_storage_benchmark.py --embeddings emb1024.npy --reduced 256=emb256.npy 512=emb512.npy
+"""
+import argparse
+import time
+
+import numpy as np
+
+from rag.utils.milvus_manager import SUPPORTED_DIMENSIONS, SUPPORTED_QUANTIZATIONS
+
+BYTES_PER_MILLION = 1_000_000
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int, seed: int = 7) -> np.ndarray:
+    """
+    Returns unit vectors drawn around random topic centroids.
+
+    Variance decays along the dimensions so that, as with Titan v2's shorter
+    outputs, the leading dimensions carry most of the signal.
+    """
+    rng = np.random.default_rng(seed)
+    decay = 1 / np.sqrt(1 + np.arange(dim) / 32)
+    centroids = rng.normal(size=(clusters, dim))
+    vectors = centroids[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim))
+    return normalize((vectors * decay).astype(np.float32))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def index_bytes_per_vector(dim: int, quantization: str) -> int:
+    """
+    Bytes per vector of the index MilvusManager builds: IVF_FLAT or IVF_SQ8.
+    """
+    return dim if quantization == "sq8" else dim * 4
+
+
+def loaded_bytes_per_vector(dim: int, quantization: str) -> int:
+    """
+    Bytes per vector resident once the collection is loaded.
+
+    IVF_SQ8 does not hold the float vectors that re-scoring reads, so Milvus
+    keeps them loaded beside the index (unless the field is memory-mapped).
+    """
+    if quantization == "none":
+        return dim * 4
+    return index_bytes_per_vector(dim, quantization) + dim * 4
+
+
+def top_k_l2(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    distances = (corpus ** 2).sum(axis=1)[None, :] - 2 * queries @ corpus.T
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def search(corpus: np.ndarray, queries: np.ndarray, quantization: str, k: int, oversample: int) -> np.ndarray:
+    """Searches the compact representation and re-scores candidates at full precision, like MilvusManager."""
+    if quantization == "none":
+        return top_k_l2(corpus, queries, k)
+
+    low, high = corpus.min(axis=0), corpus.max(axis=0)
+    scale = np.where(high > low, (high - low) / 255, 1)
+    decoded = np.round((corpus - low) / scale) * scale + low
+    distances = (decoded ** 2).sum(axis=1)[None, :] - 2 * queries @ decoded.T
+    candidates = np.argsort(distances, axis=1)[:, :k * oversample]
+
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for row, (query, ids) in enumerate(zip(queries, candidates)):
+        exact = ((corpus[ids] - query) ** 2).sum(axis=1)
+        results[row] = ids[np.argsort(exact)[:k]]
+    return results
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding dimension and quantization settings.")
+    parser.add_argument("--embeddings", help="A .npy matrix of 1024-d Titan v2 document embeddings.")
+    parser.add_argument("--reduced", nargs="*", default=[], help="DIM=path.npy embeddings of the same texts at a lower dimension.")
+    parser.add_argument("--chunks", type=int, default=20000, help="Synthetic corpus size.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, default=4, help="Candidate multiplier for re-scoring (RESCORE_OVERSAMPLE).")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    if args.embeddings:
+        full = normalize(np.load(args.embeddings).astype(np.float32))
+    else:
+        full = synthetic_corpus(args.chunks + args.queries, 1024, clusters=64)
+    query_ids = rng.choice(len(full), size=args.queries, replace=False)
+    corpus_mask = np.ones(len(full), dtype=bool)
+    corpus_mask[query_ids] = False
+    truth = top_k_l2(full[corpus_mask], full[query_ids], args.k)
+
+    reduced = {int(dim): normalize(np.load(path).astype(np.float32)) for dim, path in (item.split("=") for item in args.reduced)}
+
+    for dim in SUPPORTED_DIMENSIONS:
+        vectors = reduced.get(dim, full if dim == 1024 else normalize(full[:, :dim]))
+        corpus, queries = vectors[corpus_mask], vectors[query_ids]
+        for quantization in SUPPORTED_QUANTIZATIONS:
+            started = time.perf_counter()
+            found = search(corpus, queries, quantization, args.k, args.oversample)
+            latency_ms = (time.perf_counter() - started) / len(queries) * 1000
+            result = {
+                "index_mb_per_1m": round(index_bytes_per_vector(dim, quantization) * BYTES_PER_MILLION / 2 ** 20, 1),
+                "loaded_mb_per_1m": round(loaded_bytes_per_vector(dim, quantization) * BYTES_PER_MILLION / 2 ** 20, 1),
+                "ms_per_query": round(latency_ms, 2),
+                f"recall@{args.k}": round(recall(found, truth), 3),
+            }
+            print(f"dim={dim:>4} {quantization:>6}: {result}")
+
+
+if __name__ == "__main__":
+    main()
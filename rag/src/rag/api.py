@@ -1,28 +1,72 @@
-import shutil
 import tempfile
 import json
 import asyncio
+import os
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 
-from rag.crew import RagCrew
+from rag.crew import CONFIG_FILES, RagCrew, load_config
+from rag.utils.admission import AdmissionController, AdmissionRejected
+from rag.utils.cost import NORMAL, get_budget, record_usage, spend_window, track
 from rag.utils.document_processor import DocumentProcessor
 from rag.utils.logging_config import setup_logging
-from rag.utils.milvus_manager import MilvusManager
+from rag.utils.metrics import metrics
+from rag.utils.milvus_manager import TAG_FIELDS, normalize_tags
+from rag.utils.prefetch import TOO_SHORT, Prefetcher
+from rag.utils.prewarm import Prewarmer, QueryLog
+from rag.utils.prompt_cache import ChunkPopularity, crew_inputs
+from rag.utils.resilience import DependencyUnavailable, breaker_states
+from rag.utils.responses import CompressionMiddleware, as_documents, from_cached, references, sse_event, texts
 from rag.utils.retriever import Retriever
+from rag.utils.sessions import Session, SessionStore, is_follow_up
+from rag.utils.shared_cache import ANSWERS, RETRIEVALS, cache_key, get_shared_cache, invalidate_knowledge_base
+from rag.utils.simulation import create_milvus_manager, get_backend, simulation_enabled
+from rag.utils.single_flight import SingleFlight
+from rag.utils.text_utils import normalize_query
+from rag.utils.upload import StreamingUploadParser, UploadRejected, check_content_length, max_upload_bytes
 from loguru import logger
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warms the worker on startup and lets in-flight work finish on shutdown.
+
+    Uvicorn stops accepting connections and waits for open requests first; crews
+    whose clients disconnected keep running and are drained here, for up to
+    `SHUTDOWN_DRAIN_TIMEOUT` seconds.
+    """
+    for config_path in CONFIG_FILES:
+        load_config(config_path)
+    prewarmer.start()
+    logger.info(f"Worker {os.getpid()} ready.")
+    yield
+    prefetcher.cancel_all()
+    prewarmer.cancel_all()
+    drain_timeout = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 120))
+    logger.info(f"Worker {os.getpid()} shutting down; draining in-flight work for up to {drain_timeout:.0f}s: {admission.stats()}")
+    if await admission.drain(drain_timeout):
+        logger.info(f"Worker {os.getpid()} drained.")
+    else:
+        logger.warning(f"Worker {os.getpid()} exiting with work still in flight: {admission.stats()}")
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG Crew API",
     description="An API for processing documents and answering questions using a RAG-based CrewAI.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -34,97 +78,668 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Gzip responses, flushing streamed events as they are written
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get("COMPRESSION_MIN_BYTES", 1000)))
+
 # Setup logging
 setup_logging()
 
+# Concurrent identical queries share one retrieval and one crew run.
+retrieval_flight = SingleFlight("query.retrieve")
+generation_flight = SingleFlight("query.generate")
+
+# Bounds the LLM-bound work running at once; queries are served before uploads.
+admission = AdmissionController.from_env()
+
+
+def _backends_idle() -> bool:
+    """
+    Returns True when speculative work would not compete with real requests:
+    no query or upload is queued for admission, no circuit is open and spending is within budget.
+    """
+    stats = admission.stats()
+    return (
+        not any(endpoint["queued"] for name, endpoint in stats.items() if name != "prewarm")
+        and "open" not in breaker_states().values()
+        and get_budget().level() == NORMAL
+    )
+
+
+# Retrieval for queries still being typed, run on spare capacity.
+prefetcher = Prefetcher.from_env(should_run=_backends_idle)
+
+# Conversations, so follow-ups can be condensed and start from the previous retrieval.
+sessions = SessionStore.from_env()
+# Retrievals that start a conversation carry its candidates, so they are shared under their own key.
+TURN_KEY_SUFFIX = "|turn"
+
+# How often chunks reach the crew, so the most used ones go in the cached part of its prompts.
+chunk_popularity = ChunkPopularity.from_env()
+
+# How often each query is asked, so the answers to the common ones can be precomputed after an ingestion.
+query_log = QueryLog.from_env()
+
+class QueryFilters(BaseModel):
+    """Restricts a query to documents with matching tags; a list matches any of its values."""
+    tenant: Optional[Union[str, List[str]]] = None
+    department: Optional[Union[str, List[str]]] = None
+    region: Optional[Union[str, List[str]]] = None
+    doc_type: Optional[Union[str, List[str]]] = None
+
+
 class QueryRequest(BaseModel):
-    """Request model for the /query endpoint."""
+    """Request model for the /query endpoint; queries with a `session_id` are turns of one conversation."""
     query: str
+    filters: Optional[QueryFilters] = None
+    include_archived: bool = False
+    session_id: Optional[str] = None
+
+
+class PrefetchRequest(QueryRequest):
+    """Request model for the /prefetch endpoint: a query that is still being typed."""
+    client_id: Optional[str] = None
+
+
+class CachedReport:
+    """
+    A report served from the shared answer cache; reads like a crew output.
+    """
+
+    def __init__(self, raw: str):
+        self.raw = raw
+
+    @classmethod
+    def from_cached(cls, value, count_prewarmed: bool = True) -> "CachedReport":
+        """
+        Reads a cached answer. Answers precomputed by the prewarmer are stored with a marker, and hits on them are counted.
+        """
+        if isinstance(value, dict):
+            if count_prewarmed:
+                metrics.incr("prewarm.answer_hits")
+            return cls(value["answer"])
+        return cls(value)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __str__(self):
+        return self.raw
+
+
+def _filters_dict(request: QueryRequest) -> Dict[str, Union[str, List[str]]]:
+    """
+    Returns the request filters that are set.
+
+    Raises:
+        HTTPException: 400 if a filter value is not a valid tag value.
+    """
+    filters = request.filters.model_dump(exclude_none=True) if request.filters else {}
+    try:
+        for key, value in filters.items():
+            for item in value if isinstance(value, list) else [value]:
+                normalize_tags({key: item})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+    return filters
+
+
+def _query_key(query: str, filters: Dict[str, Union[str, List[str]]], include_archived: bool = False) -> str:
+    """
+    Returns the coalescing key; queries with a different scope never share results.
+    """
+    key = normalize_query(query)
+    if filters:
+        key += f"|{json.dumps(filters, sort_keys=True)}"
+    if include_archived:
+        key += "|archived"
+    return key
+
+
+def _answer_key(query: str, documents: list, filters: Dict[str, Union[str, List[str]]], include_archived: bool, fast: bool) -> str:
+    """
+    Returns the key answers are shared and cached under: the query's key and the documents the answer is based on.
+
+    Documents are identified by chunk id, and by their text where they have
+    none (summaries and old cache entries), so that queries answered from
+    different documents, e.g. a follow-up's merged candidates, never share an answer.
+    """
+    used = [document["id"] if document.get("id") is not None else document["text"] for document in documents]
+    return _query_key(query, filters, include_archived) + f"|docs={cache_key(used)[:16]}" + ("|fast" if fast else "")
+
+
+def _plan_generation(documents: list, tracker) -> Tuple[list, bool]:
+    """
+    Trims the documents, and picks the fast crew, as far as the cost budget requires.
+    """
+    kept, fast = get_budget().plan_generation(texts(documents), os.environ.get("MODEL", ""), tracker)
+    return documents[:len(kept)], fast
+
+
+def _retrieve_documents(
+    query: str,
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+    include_archived: bool = False,
+    include_embeddings: bool = False,
+) -> Dict[str, Any]:
+    """
+    Embeds the query, searches the matching part of the knowledge base and reranks the candidates.
+
+    Returns:
+        Dict[str, Any]: The `documents`, each with its text, chunk id and source metadata, and whether
+        the retrieval is `degraded` because a search or the rerank failed and was fallen back from.
+        With `include_embeddings`, also the first `candidates` with their embeddings and the
+        `query_embedding`, from which a conversation continues.
+    """
+    with metrics.timer("query.retrieve"):
+        milvus_manager = create_milvus_manager()
+        retriever = Retriever(milvus_manager)
+        retriever.retrieve(query, filters=filters, include_archived=include_archived, prior=[] if include_embeddings else None)
+        documents = as_documents(retriever.hits)
+    if retriever.degraded:
+        metrics.incr("query.retrieve.degraded")
+        logger.warning(f"The retrieval for '{query}' is degraded; it will not be cached.")
+    if not include_embeddings:
+        return {"documents": documents, "degraded": retriever.degraded}
+    return {
+        "documents": documents,
+        "degraded": retriever.degraded,
+        # Plain lists, so the retrieval can be kept in the shared cache.
+        "candidates": [
+            {**hit, "embedding": np.asarray(hit["embedding"], dtype=np.float32).tolist()}
+            for hit in retriever.candidates[:sessions.max_candidates] if hit.get("embedding") is not None
+        ],
+        "query_embedding": np.asarray(retriever.query_embedding, dtype=np.float32).tolist() if retriever.query_embedding else None,
+    }
+
+
+def _session_turn(session: Session, query: str, filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+                  include_archived: bool = False) -> Tuple[list, str]:
+    """
+    Retrieves documents for a follow-up in a conversation.
+
+    The follow-up is rewritten as a standalone question from the earlier ones and
+    starts from the candidates of the previous turn, if it had the same filters
+    and the condenser did not return it unchanged as a question of its own.
+    The turn's candidates are kept in the session for the next one.
+
+    Returns:
+        Tuple[list, str]: The documents, and the standalone question they were retrieved for.
+    """
+    scope = _query_key("", filters, include_archived)
+    with metrics.timer("query.retrieve"):
+        retriever = Retriever(create_milvus_manager())
+        metrics.incr("session.follow_ups")
+        with metrics.timer("query.condense"):
+            standalone = retriever.condense_query(list(session.history), query)
+        logger.info(f"Condensed the follow-up '{query}' into '{standalone}'.")
+        prior, prior_embedding = [], None
+        if normalize_query(standalone) != normalize_query(query):
+            prior = session.prior(scope)
+            prior_embedding = session.query_embedding if prior else None
+        retriever.retrieve(standalone, filters=filters, include_archived=include_archived, prior=prior, prior_embedding=prior_embedding)
+    sessions.update(session, standalone, retriever.candidates, retriever.query_embedding, scope)
+    return as_documents(retriever.hits), standalone
+
+
+def _generate_report(query: str, documents: list, fast: bool = False):
+    """
+    Runs the RAG crew over the retrieved documents, or the single-task fast crew, and records its token usage.
+
+    Frequently used chunks are moved into the cached part of the crew prompts; see `ChunkPopularity`.
+    """
+    pinned, documents = chunk_popularity.split(documents)
+    inputs = crew_inputs(query, texts(documents), texts(pinned))
+    with metrics.timer("query.generate"):
+        if simulation_enabled():
+            report = get_backend().generate_report(query, texts(documents), fast=fast, pinned_documents=texts(pinned))
+        else:
+            rag_crew = RagCrew()
+            report = (rag_crew.fast_crew() if fast else rag_crew.crew()).kickoff(inputs=inputs)
+    usage = report.token_usage
+    record_usage("crew", os.environ.get("MODEL", ""), input_tokens=usage.prompt_tokens,
+                 output_tokens=usage.completion_tokens, calls=usage.successful_requests,
+                 cached_input_tokens=getattr(usage, "cached_prompt_tokens", 0))
+    return report
+
+
+def _is_duplicate(content_hash: str, tenant: Optional[str] = None) -> bool:
+    """
+    Returns True if a file with the same content is already in the tenant's knowledge base.
+    """
+    try:
+        return create_milvus_manager().has_content(content_hash, tenant)
+    except Exception as e:
+        logger.warning(f"Could not check for a duplicate upload; processing it anyway. Details: {e}")
+        return False
+
+
+def _ingest_document(file_path: str, tags: Optional[Dict[str, str]] = None, content_hash: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Processes a document and stores its chunks in the knowledge base under the given tags.
+
+    Returns:
+        Tuple[int, int]: The number of chunks stored and the number merged into near-duplicates.
+    """
+    with metrics.timer("upload.ingest"):
+        milvus_manager = create_milvus_manager()
+        doc_processor = DocumentProcessor(embedding_dim=milvus_manager.embedding_dim)
+        processed_chunks = doc_processor.process_document(file_path, tags=tags, content_hash=content_hash, milvus_manager=milvus_manager)
+        if processed_chunks:
+            with metrics.timer("ingest.store"):
+                milvus_manager.insert_data(processed_chunks, supersede=True)
+            if doc_processor.summaries:
+                _store_summaries(milvus_manager, doc_processor.summaries)
+        if processed_chunks or doc_processor.merged_chunks:
+            invalidate_knowledge_base()
+        metrics.incr("ingest.near_duplicates_merged", doc_processor.merged_chunks)
+        return len(processed_chunks), doc_processor.merged_chunks
+
+
+def _store_summaries(milvus_manager, summaries: list):
+    """
+    Stores a document's summaries; the document is searchable without them, so failures are only logged.
+    """
+    try:
+        with metrics.timer("ingest.store_summaries"):
+            milvus_manager.insert_summaries(summaries)
+    except Exception as e:
+        logger.warning(f"Could not store the document summaries: {e}")
+
+
+async def _cached(namespace: str, key: str, compute, encode=lambda value: value, decode=lambda value: value,
+                  cacheable=lambda value: True):
+    """
+    Returns a result from the shared cache, or computes and stores it.
+
+    Entries are keyed by the knowledge-base generation, so a change to the
+    knowledge base made through any worker or the CLI invalidates them.
+    Results `cacheable` rejects are returned without being stored.
+    """
+    cache = get_shared_cache()
+    if cache is None:
+        return await compute()
+
+    def lookup():
+        entry_key = cache_key(key, cache.generation())
+        return entry_key, cache.get(namespace, entry_key)
+
+    entry_key, cached = await run_in_threadpool(lookup)
+    if cached is not None:
+        logger.info(f"Serving '{key}' from the shared {namespace} cache.")
+        return decode(cached)
+    result = await compute()
+    if not cacheable(result):
+        logger.info(f"Not caching '{key}' in the shared {namespace} cache.")
+        return result
+    await run_in_threadpool(cache.set, namespace, entry_key, encode(result))
+    return result
+
+
+def _cacheable_retrieval(retrieval: Dict[str, Any]) -> bool:
+    """
+    Returns True unless the retrieval found nothing or is degraded, which would
+    otherwise be served from the cache long after the failure has passed.
+    """
+    return bool(retrieval["documents"]) and not retrieval["degraded"]
+
+
+def _encode_retrieval(retrieval: Dict[str, Any]) -> Union[list, Dict[str, Any]]:
+    """
+    Writes a retrieval to the shared cache; one without embeddings is kept as its plain list of documents.
+    """
+    if "candidates" not in retrieval:
+        return retrieval["documents"]
+    return {name: value for name, value in retrieval.items() if name != "degraded"}
+
+
+def _decode_retrieval(value: Union[list, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reads a retrieval written by `_encode_retrieval`; only complete retrievals are cached.
+    """
+    if isinstance(value, list):
+        return {"documents": from_cached(value), "degraded": False}
+    return {**value, "documents": from_cached(value["documents"]), "degraded": False}
+
+
+async def _cached_retrieval(key: str, compute) -> Dict[str, Any]:
+    """
+    Returns a retrieval from the shared cache, or computes it and stores it if it is complete.
+    """
+    return await _cached(RETRIEVALS, key, compute, encode=_encode_retrieval, decode=_decode_retrieval,
+                         cacheable=_cacheable_retrieval)
+
+
+async def _run_admitted(endpoint: str, fn, *args):
+    """
+    Runs a blocking function in the threadpool once the endpoint is admitted.
+    """
+    async with admission.slot(endpoint):
+        return await run_in_threadpool(fn, *args)
+
+
+def _unavailable_retry_after() -> int:
+    """
+    Returns the seconds a client should wait after a dependency failed: until its circuit may close again.
+    """
+    return int(float(os.environ.get("CIRCUIT_RESET_TIMEOUT", 30)))
+
+
+def _unavailable_to_http(error: DependencyUnavailable) -> HTTPException:
+    """
+    Converts a failing dependency into a 503 with a Retry-After header, rather than an empty answer.
+    """
+    return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(_unavailable_retry_after())})
+
+
+def _rejection_to_http(rejection: AdmissionRejected) -> HTTPException:
+    """
+    Converts an admission rejection into an HTTP error with a Retry-After header.
+    """
+    return HTTPException(
+        status_code=rejection.status_code,
+        detail=rejection.reason,
+        headers={"Retry-After": str(rejection.retry_after)},
+    )
+
+
+async def _coalesced_retrieve(
+    query: str,
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+    include_archived: bool = False,
+    include_embeddings: bool = False,
+) -> Union[list, Dict[str, Any]]:
+    """
+    Retrieves documents for the query, sharing the work with identical in-flight queries
+    and reusing results cached by any worker.
+
+    With `include_embeddings`, the candidates a conversation continues from are
+    returned as well; see `_retrieve_documents`. Those retrievals are shared
+    and cached under their own key, and do not use prefetched results, which
+    hold only the documents.
+    """
+    key = _query_key(query, filters, include_archived)
+    if include_embeddings:
+        key += TURN_KEY_SUFFIX
+    else:
+        prefetched = prefetcher.get(key)
+        if prefetched is not None:
+            return prefetched
+    retrieval = await retrieval_flight.do(
+        key, lambda: _cached_retrieval(key, lambda: _run_admitted("query", _retrieve_documents, query, filters, include_archived,
+                                                                  include_embeddings))
+    )
+    return retrieval if include_embeddings else retrieval["documents"]
+
+
+async def _retrieve_turn(request: QueryRequest, filters: Dict[str, Union[str, List[str]]]) -> Tuple[list, str, Optional[Session]]:
+    """
+    Retrieves documents for a query, as a turn of its conversation when it has a session.
+
+    Only follow-ups depend on the conversation's history. Any other turn,
+    including the first, is retrieved like a query without a session, shared
+    with identical queries and cached, and its candidates start the session.
+
+    Returns:
+        Tuple[list, str, Optional[Session]]: The documents, the standalone question and the session.
+    """
+    if request.session_id is None or not sessions.enabled:
+        return await _coalesced_retrieve(request.query, filters, request.include_archived), request.query, None
+    session = sessions.get(request.session_id)
+    if is_follow_up(request.query, list(session.history)):
+        documents, standalone = await _run_admitted("query", _session_turn, session, request.query, filters, request.include_archived)
+        return documents, standalone, session
+    retrieval = await _coalesced_retrieve(request.query, filters, request.include_archived, include_embeddings=True)
+    sessions.update(session, request.query, retrieval["candidates"], retrieval["query_embedding"],
+                    _query_key("", filters, request.include_archived))
+    return retrieval["documents"], request.query, session
+
+
+async def _speculative_retrieve(
+    query: str,
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+    include_archived: bool = False,
+) -> Optional[list]:
+    """
+    Retrieves documents for a query that is still being typed. It runs without an
+    admission slot, under the prefetcher's own limit, and a real query for the same
+    key that arrives meanwhile joins it.
+
+    Returns:
+        Optional[list]: The documents, or None if the retrieval is degraded and should not be kept.
+    """
+    key = _query_key(query, filters, include_archived)
+    with track("prefetch"):
+        retrieval = await retrieval_flight.do(
+            key, lambda: _cached_retrieval(key, lambda: run_in_threadpool(_retrieve_documents, query, filters, include_archived))
+        )
+    return None if retrieval["degraded"] else retrieval["documents"]
+
+
+async def _coalesced_generate(
+    query: str,
+    documents: list,
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+    include_archived: bool = False,
+    fast: bool = False,
+):
+    """
+    Generates the report for the query, sharing the crew run with identical in-flight queries
+    and reusing answers cached by any worker. Reports degraded by the cost budget
+    are only shared with queries degraded the same way.
+    """
+    key = _answer_key(query, documents, filters, include_archived, fast)
+    metrics.incr("query.answers")
+    return await generation_flight.do(
+        key,
+        lambda: _cached(ANSWERS, key, lambda: _run_admitted("query", _generate_report, query, documents, fast),
+                        encode=lambda report: str(report.raw), decode=CachedReport.from_cached),
+    )
+
+
+async def _log_query(query: str, filters: Dict[str, Union[str, List[str]]], include_archived: bool):
+    """
+    Counts the query in the query log, if there is one.
+    """
+    if query_log is not None:
+        await run_in_threadpool(query_log.record, query, filters, include_archived)
+
+
+async def _prewarm_query(entry: Dict[str, object]) -> bool:
+    """
+    Retrieves documents for a logged query and caches its answer, as a /query for it would.
+
+    The work runs at the prewarmer's admission priority, and the answer is cached
+    with a marker so that hits on it can be told apart.
+
+    Returns:
+        bool: False if the answer was already cached or being generated, or nothing relevant was found.
+    """
+    query, filters, include_archived = entry["query"], entry["filters"], entry["include_archived"]
+    key = _query_key(query, filters, include_archived)
+    with track("prewarm", get_budget().query_usd) as tracker:
+        retrieval = await retrieval_flight.do(
+            key, lambda: _cached_retrieval(key, lambda: _run_admitted("prewarm", _retrieve_documents, query, filters, include_archived))
+        )
+        documents = retrieval["documents"]
+        if not documents or retrieval["degraded"]:
+            return False
+        documents, fast = _plan_generation(documents, tracker)
+        key = _answer_key(query, documents, filters, include_archived, fast)
+        generated = []
+
+        async def generate():
+            generated.append(key)
+            return await _run_admitted("prewarm", _generate_report, query, documents, fast)
+
+        await generation_flight.do(
+            key,
+            lambda: _cached(ANSWERS, key, generate, encode=lambda report: {"answer": str(report.raw), "prewarmed": True},
+                            decode=lambda value: CachedReport.from_cached(value, count_prewarmed=False)),
+        )
+        return bool(generated)
+
+
+def _knowledge_base_generation() -> Optional[int]:
+    """
+    Returns the generation of the knowledge base, or None when answers are not cached.
+    """
+    cache = get_shared_cache()
+    return cache.generation() if cache is not None else None
+
+
+# Precomputes the answers to the most asked queries after the knowledge base changes, on spare capacity.
+prewarmer = Prewarmer.from_env(
+    warm=_prewarm_query,
+    top_queries=lambda limit, min_count: query_log.top(limit, min_count) if query_log is not None else [],
+    generation=_knowledge_base_generation,
+    should_run=_backends_idle,
+)
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request):
     """
     Uploads a document (.pdf or .docx), processes it, and adds it to the knowledge base.
-    """
-    if not file.filename.endswith((".pdf", ".docx")):
-        raise HTTPException(status_code=400, detail="Unsupported file type. Please upload a .pdf or .docx file.")
 
+    Expects a multipart form with a `file` part and optional `tenant`, `department`,
+    `region` and `doc_type` fields. The file is streamed to disk and hashed as it
+    arrives; files over `MAX_UPLOAD_MB` are rejected with 413 and a file that is
+    already in the tenant's knowledge base is acknowledged without reprocessing.
+    """
+    max_bytes = max_upload_bytes()
     try:
+        check_content_length(request.headers.get("content-length"), max_bytes)
         # Use a temporary directory to securely handle the file
         with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir) / file.filename
-            with open(temp_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            logger.info(f"File '{file.filename}' uploaded to temporary path: {temp_path}")
+            parser = StreamingUploadParser(request.headers.get("content-type"), Path(temp_dir), max_bytes)
+            upload = await parser.parse(request.stream())
+            logger.info(f"File '{upload.filename}' ({upload.size} bytes, sha256 {upload.sha256[:12]}) streamed to: {upload.path}")
 
-            # Process the document
-            doc_processor = DocumentProcessor()
-            milvus_manager = MilvusManager()
-            processed_chunks = doc_processor.process_document(str(temp_path))
-            
-            if processed_chunks:
-                milvus_manager.insert_data(processed_chunks)
-                logger.info(f"Successfully processed and stored '{file.filename}' in the knowledge base.")
-                return {"message": f"File '{file.filename}' uploaded and processed successfully."}
+            try:
+                tags = normalize_tags({key: upload.fields.get(key) for key in TAG_FIELDS})
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            if await run_in_threadpool(_is_duplicate, upload.sha256, tags.get("tenant")):
+                metrics.incr("upload.duplicates_skipped")
+                logger.info(f"'{upload.filename}' is identical to an ingested document; skipping processing.")
+                return {"message": f"File '{upload.filename}' is already in the knowledge base.", "duplicate": True}
+
+            # Process the document once the upload is admitted
+            with track("upload", get_budget().upload_usd) as tracker:
+                stored, merged = await _run_admitted("upload", _ingest_document, str(upload.path), tags, upload.sha256)
+            logger.info(f"Ingestion of '{upload.filename}' cost ${tracker.cost:.4f} over {tracker.calls} model calls.")
+
+            if stored or merged:
+                logger.info(f"Successfully processed and stored '{upload.filename}' in the knowledge base.")
+                prewarmer.trigger()
+                return {
+                    "message": f"File '{upload.filename}' uploaded and processed successfully.",
+                    "chunks": stored,
+                    "merged_chunks": merged,
+                    "usage": tracker.summary(),
+                }
             else:
-                logger.warning(f"No content could be processed from '{file.filename}'.")
+                logger.warning(f"No content could be processed from '{upload.filename}'.")
                 raise HTTPException(status_code=400, detail="No content could be processed from the file.")
 
+    except UploadRejected as rejection:
+        logger.warning(f"Upload rejected: {rejection.reason}")
+        raise HTTPException(status_code=rejection.status_code, detail=rejection.reason)
+    except AdmissionRejected as rejection:
+        raise _rejection_to_http(rejection)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"An error occurred during file upload and processing: {e}")
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
-    finally:
-        # Ensure the file stream is closed
-        file.file.close()
+
+@app.post("/prefetch", status_code=202)
+async def prefetch(request: PrefetchRequest, http_request: Request):
+    """
+    Speculatively retrieves documents for a query the user is still typing.
+
+    The chat UI calls this as the user types; retrieval starts once the client
+    has paused for `PREFETCH_DEBOUNCE_MS`, and a following /query or
+    /query/stream with the same text and filters skips straight to generation.
+    Prefetches run only on spare capacity and are dropped, never queued, when
+    the backends are busy.
+    """
+    if len(normalize_query(request.query)) < prefetcher.min_chars:
+        return {"status": TOO_SHORT}
+    filters = _filters_dict(request)
+    key = _query_key(request.query, filters, request.include_archived)
+    client = request.client_id or (http_request.client.host if http_request.client else "anonymous")
+    status = prefetcher.schedule(client, key, lambda: _speculative_retrieve(request.query, filters, request.include_archived))
+    return {"status": status}
 
 @app.post("/query/stream")
 async def query_rag_stream(request: QueryRequest):
     """
     Receives a query and returns a streaming response with step-by-step progress updates.
     """
+    # Reject before the stream starts so the client sees a proper status code.
+    # Requests that would join an in-flight identical query need no slot of their own.
+    filters = _filters_dict(request)
+    key = _query_key(request.query, filters, request.include_archived)
+    if not (retrieval_flight.is_inflight(key) or retrieval_flight.is_inflight(key + TURN_KEY_SUFFIX)):
+        try:
+            admission.check("query")
+        except AdmissionRejected as rejection:
+            raise _rejection_to_http(rejection)
+
     async def generate_steps():
+        with track("query", get_budget().query_usd) as tracker:
+            async for event in query_steps(tracker):
+                yield event
+
+    async def query_steps(tracker):
         try:
             logger.info(f"Starting streaming query: '{request.query}'")
             
             # Step 1: Document Retrieval
-            yield f"data: {json.dumps({'step': 'retrieving', 'message': 'Searching for relevant documents...'})}\n\n"
+            yield sse_event({'step': 'retrieving', 'message': 'Searching for relevant documents...'})
             await asyncio.sleep(0.1)  # Small delay for better UX
             
-            milvus_manager = MilvusManager()
-            retriever = Retriever(milvus_manager)
-            documents = retriever.retrieve(request.query)
+            documents, standalone, session = await _retrieve_turn(request, filters)
             
-            yield f"data: {json.dumps({'step': 'retrieved', 'message': f'Found {len(documents)} relevant documents', 'count': len(documents)})}\n\n"
+            await _log_query(standalone, filters, request.include_archived)
+            yield sse_event({'step': 'retrieved', 'message': f'Found {len(documents)} relevant documents', 'count': len(documents)})
             await asyncio.sleep(0.1)
             
             if len(documents) == 0:
-                yield f"data: {json.dumps({'step': 'complete', 'message': 'No relevant documents found. Please try uploading more documents or rephrasing your query.', 'result': 'No relevant documents found.'})}\n\n"
+                yield sse_event({'step': 'complete', 'message': 'No relevant documents found. Please try uploading more documents or rephrasing your query.', 'result': 'No relevant documents found.'})
                 return
             
             logger.info(f"Retrieved {len(documents)} documents for streaming query.")
             
             # Step 2: AI Analysis
-            yield f"data: {json.dumps({'step': 'analyzing', 'message': 'Analyzing document content with AI agents...'})}\n\n"
+            yield sse_event({'step': 'analyzing', 'message': 'Analyzing document content with AI agents...'})
             await asyncio.sleep(0.1)
             
             # Step 3: Report Generation  
-            yield f"data: {json.dumps({'step': 'generating', 'message': 'Generating comprehensive report...'})}\n\n"
+            yield sse_event({'step': 'generating', 'message': 'Generating comprehensive report...'})
             await asyncio.sleep(0.1)
             
             # Call CrewAI (this is where the actual work happens)
-            inputs = {
-                'topic': request.query,
-                'documents': documents,
-            }
-            final_report = RagCrew().crew().kickoff(inputs=inputs)
+            documents, fast = _plan_generation(documents, tracker)
+            final_report = await _coalesced_generate(standalone, documents, filters, request.include_archived, fast)
             
-            # Step 4: Complete
-            yield f"data: {json.dumps({'step': 'complete', 'message': 'Analysis complete', 'result': str(final_report.raw), 'meta': {'documents': documents}})}\n\n"
+            # Step 4: Complete, citing the sources by chunk id
+            meta = {'sources': references(documents), 'usage': tracker.summary(), 'session_id': session.id if session else None, 'standalone_query': standalone}
+            with metrics.timer("query.serialize"):
+                event = sse_event({'step': 'complete', 'message': 'Analysis complete', 'result': str(final_report.raw), 'meta': meta})
+            metrics.incr("query.response_bytes", len(event))
+            yield event
             
+        except AdmissionRejected as rejection:
+            logger.warning(f"Streaming query shed by admission control: {rejection.reason}")
+            yield sse_event({'step': 'error', 'message': rejection.reason, 'retry_after': rejection.retry_after})
+        except DependencyUnavailable as e:
+            logger.warning(f"Streaming query failed on an unavailable dependency: {e}")
+            yield sse_event({'step': 'error', 'message': str(e), 'retry_after': _unavailable_retry_after()})
         except Exception as e:
             logger.exception(f"An error occurred during streaming query: {e}")
-            yield f"data: {json.dumps({'step': 'error', 'message': f'Error occurred: {str(e)}'})}\n\n"
+            yield sse_event({'step': 'error', 'message': f'Error occurred: {str(e)}'})
     
     return StreamingResponse(generate_steps(), media_type="text/event-stream", headers={
         "Cache-Control": "no-cache",
@@ -138,40 +753,150 @@ async def query_rag(request: QueryRequest):
     """
     Receives a query, retrieves relevant documents, and generates a report using the RAG crew.
     """
+    filters = _filters_dict(request)
     try:
         logger.info(f"Received query: '{request.query}'")
         
-        # Retrieve documents
-        milvus_manager = MilvusManager()
-        retriever = Retriever(milvus_manager)
-        documents = retriever.retrieve(request.query)
-        
-        if not documents:
-            logger.warning("No relevant documents found for the query.")
-            return {"answer": "I could not find any relevant documents to answer your question. Please try uploading more documents or rephrasing your query."}
-
-        logger.info(f"Retrieved {len(documents)} documents for the query.")
-        logger.info(f"Documents: {documents}")
-
-        # Run the crew to get the final report
-        inputs = {
-            'topic': request.query,
-            'documents': documents,
-        }
-        final_report = RagCrew().crew().kickoff(inputs=inputs)
-        
-        # Return the final report along with the source documents
-        return {
-            "answer": {final_report["raw"]},
-            "meta": {
-                "documents": documents
-            }
-        }
+        with track("query", get_budget().query_usd) as tracker:
+            # Retrieve documents from the part of the knowledge base the filters select
+            documents, standalone, session = await _retrieve_turn(request, filters)
+            # Queries nothing was found for are counted too; an ingestion may answer them.
+            await _log_query(standalone, filters, request.include_archived)
+
+            if not documents:
+                logger.warning("No relevant documents found for the query.")
+                return {"answer": "I could not find any relevant documents to answer your question. Please try uploading more documents or rephrasing your query."}
+
+            logger.info(f"Retrieved {len(documents)} documents for the query.")
+            logger.info(f"Documents: {documents}")
+
+            # Run the crew to get the final report, within the cost budget
+            documents, fast = _plan_generation(documents, tracker)
+            final_report = await _coalesced_generate(standalone, documents, filters, request.include_archived, fast)
 
+        # Return the final report along with references to its sources; their full text is at /chunks/{id}
+        with metrics.timer("query.serialize"):
+            response = ORJSONResponse({
+                "answer": str(final_report.raw),
+                "meta": {
+                    "sources": references(documents),
+                    "usage": tracker.summary(),
+                    "session_id": session.id if session else None,
+                    "standalone_query": standalone,
+                }
+            })
+        metrics.incr("query.response_bytes", len(response.body))
+        return response
+
+    except AdmissionRejected as rejection:
+        raise _rejection_to_http(rejection)
+    except DependencyUnavailable as e:
+        logger.warning(f"Query failed on an unavailable dependency: {e}")
+        raise _unavailable_to_http(e)
     except Exception as e:
         logger.exception(f"An error occurred during the query process: {e}")
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
+def _fetch_chunk(chunk_id: int) -> Optional[Dict[str, object]]:
+    """
+    Returns a stored chunk by id from the hot tier, or from the archive if it has been superseded.
+    """
+    milvus_manager = create_milvus_manager()
+    for tier in ("hot", "archive"):
+        rows = milvus_manager.get_rows([chunk_id], tier, include_embeddings=False)
+        if rows:
+            row = rows[0]
+            return {"id": row["id"], "text": row["text"], "metadata": row["metadata"], "tier": tier}
+    return None
+
+@app.get("/chunks/{chunk_id}")
+async def read_chunk(chunk_id: int):
+    """
+    Returns the full text and metadata of a chunk cited in the `sources` of a query response.
+    """
+    try:
+        chunk = await run_in_threadpool(_fetch_chunk, chunk_id)
+    except Exception as e:
+        logger.exception(f"An error occurred while fetching chunk {chunk_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
+    if chunk is None:
+        raise HTTPException(status_code=404, detail=f"Chunk {chunk_id} not found.")
+    return chunk
+
+@app.get("/metrics")
+def read_metrics():
+    """
+    Returns the in-process counters, including how many pipeline executions
+    were saved by coalescing identical in-flight queries, and per-stage latency percentiles.
+    With several workers, each response describes the worker that served it.
+    """
+    counters = metrics.snapshot()
+    cache = get_shared_cache()
+    return {
+        "worker": os.getpid(),
+        "counters": counters,
+        "coalescing": {
+            "retrieval_executions_saved": counters.get("query.retrieve.coalesced", 0),
+            "generation_executions_saved": counters.get("query.generate.coalesced", 0),
+        },
+        "latency": metrics.latency_summary(),
+        "admission": admission.stats(),
+        "circuits": breaker_states(),
+        "shared_cache": cache.stats() if cache is not None else None,
+        "cost": _cost_stats(counters),
+        "prefetch": {
+            **prefetcher.stats(),
+            "hits": counters.get("prefetch.hits", 0),
+            "executions": counters.get("prefetch.executions", 0),
+            "skipped_busy": counters.get("prefetch.skipped_busy", 0),
+        },
+        "sessions": {
+            **sessions.stats(),
+            "follow_ups": counters.get("session.follow_ups", 0),
+            "candidates_reused": counters.get("retrieve.session_reused", 0),
+        },
+        "prompt_cache": {
+            "crew_input_tokens": counters.get("usage.crew.input_tokens", 0),
+            "crew_cached_input_tokens": counters.get("usage.crew.cached_input_tokens", 0),
+        },
+        "prewarm": _prewarm_stats(counters),
+        "responses": {
+            "query_bytes": counters.get("query.response_bytes", 0),
+            "bytes_before_compression": counters.get("response.bytes_uncompressed", 0),
+            "bytes_after_compression": counters.get("response.bytes_compressed", 0),
+        },
+    }
+
+
+def _prewarm_stats(counters: Dict[str, float]) -> Dict[str, object]:
+    """
+    Returns what the prewarmer did and how many answers served by this worker it had precomputed.
+    """
+    answers = counters.get("query.answers", 0)
+    hits = counters.get("prewarm.answer_hits", 0)
+    return {
+        **prewarmer.stats(),
+        "query_log": query_log.stats() if query_log is not None else None,
+        "answers_prewarmed": counters.get("prewarm.answers", 0),
+        "answer_hits": hits,
+        "answer_hit_rate": round(hits / answers, 4) if answers else 0.0,
+    }
+
+
+def _cost_stats(counters: Dict[str, float]) -> Dict[str, object]:
+    """
+    Returns the estimated spend of this worker and its budgets.
+    """
+    budget = get_budget()
+    return {
+        "total_usd": round(counters.get("cost.usd", 0.0), 6),
+        "last_hour_usd": round(spend_window.total(), 6),
+        "by_endpoint_usd": {name: round(counters.get(f"cost.{name}.usd", 0.0), 6) for name in ("query", "upload", "prewarm")},
+        "degraded": {name: counters.get(f"cost.{name}.degraded", 0) for name in ("query", "upload")},
+        "budgets": {"query_usd": budget.query_usd, "upload_usd": budget.upload_usd, "hourly_usd": budget.hourly_usd},
+        "level": ("normal", "economy", "minimal")[budget.level()],
+    }
+
 @app.get("/")
 def read_root():
     """
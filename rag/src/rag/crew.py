@@ -1,6 +1,59 @@
-from crewai import Agent, Crew, Process, Task
+import os
+from pathlib import Path
+
+import yaml
+from crewai import LLM, Agent, Crew, Process, Task
+from crewai.cli.constants import DEFAULT_LLM_MODEL
 from crewai.project import CrewBase, agent, crew, task
 
+from rag.utils.prompt_cache import mark_cache_points, prompt_cache_enabled
+from rag.utils.shared_cache import CONFIGS, cache_key, get_shared_cache
+
+CONFIG_DIR = Path(__file__).parent / "config"
+CONFIG_FILES = (CONFIG_DIR / "agents.yaml", CONFIG_DIR / "tasks.yaml")
+
+
+def load_config(config_path: Path) -> dict:
+    """
+    Parses a crew config file, sharing the result across worker processes until the file changes.
+    """
+    cache = get_shared_cache()
+    if cache is None:
+        with open(config_path, "r", encoding="utf-8") as file:
+            return yaml.safe_load(file)
+    key = cache_key(str(config_path), os.stat(config_path).st_mtime_ns)
+    config = cache.get(CONFIGS, key)
+    if config is None:
+        with open(config_path, "r", encoding="utf-8") as file:
+            config = yaml.safe_load(file)
+        cache.set(CONFIGS, key, config)
+    return config
+
+
+class PromptCachingLLM(LLM):
+    """
+    An LLM that sends the `[cache_point]` markers of the crew prompts to the provider
+    as prompt cache points, so the static start of each prompt is processed once and
+    then read from the provider's cache. For models without prompt caching the
+    markers are only removed.
+    """
+
+    def __init__(self, model: str, cache_prompts: bool = False, **kwargs):
+        super().__init__(model=model, **kwargs)
+        self.cache_prompts = cache_prompts
+
+    def _format_messages_for_provider(self, messages):
+        return super()._format_messages_for_provider(mark_cache_points(messages, self.cache_prompts))
+
+
+def crew_llm() -> LLM:
+    """
+    Returns the LLM for the crew agents: `MODEL`, with prompt caching as `PROMPT_CACHE` allows.
+    """
+    model = os.environ.get("MODEL") or DEFAULT_LLM_MODEL
+    return PromptCachingLLM(model=model, cache_prompts=prompt_cache_enabled(model))
+
+
 @CrewBase
 class RagCrew():
     """Defines the crew responsible for generating the final report."""
@@ -11,6 +64,7 @@ class RagCrew():
     def search_synthesizer(self) -> Agent:
         return Agent(
             config=self.agents_config['search_synthesizer'],
+            llm=crew_llm(),
             verbose=True
         )
 
@@ -18,6 +72,7 @@ class RagCrew():
     def report_writer(self) -> Agent:
         return Agent(
             config=self.agents_config['report_writer'],
+            llm=crew_llm(),
             verbose=True
         )
 
@@ -45,3 +100,20 @@ class RagCrew():
             process=Process.sequential,
             verbose=True,
         )
+
+    def fast_crew(self) -> Crew:
+        """
+        Creates a single-task crew that writes the report straight from the documents.
+        Used instead of `crew()` when the cost budget runs short; not part of the standard crew.
+        """
+        writer = self.report_writer()
+        return Crew(
+            agents=[writer],
+            tasks=[Task(config=self.tasks_config['quick_report_task'], agent=writer)],
+            process=Process.sequential,
+            verbose=True,
+        )
+
+
+# CrewBase wraps the class, so the loader is replaced on the wrapper rather than overridden in the body.
+RagCrew.load_yaml = staticmethod(load_config)
@@ -1,13 +1,23 @@
 import argparse
+import json
+import os
 import warnings
 from dotenv import load_dotenv
 from loguru import logger
 
 from rag.crew import RagCrew
+from rag.utils.cost import get_budget, track
+from rag.utils.dedup import compact_collection
 from rag.utils.document_processor import DocumentProcessor
+from rag.utils.extraction_cache import DEFAULT_DIR as EXTRACTION_CACHE_DIR
 from rag.utils.logging_config import setup_logging
-from rag.utils.milvus_manager import MilvusManager
+from rag.utils.prewarm import DEFAULT_PATH as QUERY_LOG_PATH
+from rag.utils.prompt_cache import crew_inputs
 from rag.utils.retriever import Retriever
+from rag.utils.shared_cache import DEFAULT_PATH, invalidate_knowledge_base
+from rag.utils.simulation import create_milvus_manager, get_backend, simulation_enabled
+from rag.utils.snapshot import export_snapshot, import_snapshot, read_manifest
+from rag.utils.upload import file_sha256
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
@@ -15,33 +25,60 @@ load_dotenv()
 
 
 
-def train_internal(file_path: str, mock: bool = False):
+def train_internal(file_path: str, mock: bool = False, collection_name: str = "rag_collection", tags: dict = None, force: bool = False,
+                   questions: bool = None, summaries: bool = None):
     """
-    Processes a document and adds it to the knowledge base.
+    Processes a document and adds it to the knowledge base under the given tags.
+    Files identical to an already ingested document are skipped unless `force` is set.
+    `questions` turns question generation on for this document; it defaults to `QUESTION_GENERATION`.
+    `summaries` adds the document to the summary index; it defaults to `SUMMARY_INDEX`.
     """
     logger.info(f"Starting training process for file: {file_path}")
+    # Re-running ingestion, e.g. with other chunking settings, starts from the text extracted last time.
+    os.environ.setdefault("EXTRACTION_CACHE_DIR", EXTRACTION_CACHE_DIR)
     try:
-        doc_processor = DocumentProcessor(mock=mock)
-        milvus_manager = MilvusManager()
-        processed_chunks = doc_processor.process_document(file_path)
+        milvus_manager = create_milvus_manager(collection_name=collection_name)
+        content_hash = file_sha256(file_path)
+        if not force and milvus_manager.has_content(content_hash, (tags or {}).get("tenant")):
+            logger.info(f"{file_path} is identical to an ingested document. Training skipped; use --force to reprocess it.")
+            return
+        doc_processor = DocumentProcessor(mock=mock, embedding_dim=milvus_manager.embedding_dim, generate_questions=questions,
+                                          build_summaries=summaries)
+        with track("ingest", get_budget().upload_usd) as tracker:
+            processed_chunks = doc_processor.process_document(file_path, tags=tags, content_hash=content_hash, milvus_manager=milvus_manager)
+        usage = tracker.summary()
+        logger.info(
+            f"Ingestion used {usage['calls']} model calls, {usage['input_tokens']} input and {usage['output_tokens']} output tokens, "
+            f"an estimated ${usage['cost_usd']:.4f}" + (f"; degraded: {', '.join(usage['degraded'])}" if usage['degraded'] else "")
+        )
         if processed_chunks:
-            milvus_manager.insert_data(processed_chunks)
+            milvus_manager.insert_data(processed_chunks, supersede=True)
+            if doc_processor.summaries:
+                try:
+                    milvus_manager.insert_summaries(doc_processor.summaries)
+                except Exception as e:
+                    # The chunks are stored and searchable directly, so missing summaries only affect broad questions.
+                    logger.warning(f"Could not store the summaries of {file_path}: {e}")
+            invalidate_knowledge_base()
             logger.info(f"Successfully trained on {file_path}")
+        elif doc_processor.merged_chunks:
+            invalidate_knowledge_base()
+            logger.info(f"Every chunk of {file_path} duplicates stored content; its references were added to the existing chunks.")
         else:
             logger.warning(f"No chunks were processed from {file_path}. Training skipped.")
     except Exception as e:
         logger.exception(f"An error occurred during training: {e}")
 
 
-def run(query: str, mock: bool = False):
+def run(query: str, mock: bool = False, collection_name: str = "rag_collection", filters: dict = None, include_archived: bool = False):
     """
-    Run the RAG system with a user query.
+    Run the RAG system with a user query, optionally restricted to documents with matching tags.
     """
     logger.info(f"Received query: '{query}'")
     try:
-        milvus_manager = MilvusManager()
+        milvus_manager = create_milvus_manager(collection_name=collection_name)
         retriever = Retriever(milvus_manager, mock=mock)
-        documents = retriever.retrieve(query)
+        documents = retriever.retrieve(query, filters=filters, include_archived=include_archived)
         logger.info(f"Documents: {documents}")
         if len(documents) == 0:
             logger.warning("No documents found for the query. Returning empty report.")
@@ -50,12 +87,11 @@ def run(query: str, mock: bool = False):
         if mock:
             logger.info("CrewAI execution skipped in mock mode.")
             final_report = "This is a mock report."
+        elif simulation_enabled():
+            final_report = get_backend().generate_report(query, documents)
         else:
             logger.info("Passing documents to CrewAI for final report generation...")
-            inputs = {
-                'topic': query,
-                'documents': documents,
-            }
+            inputs = crew_inputs(query, documents)
             final_report = RagCrew().crew().kickoff(inputs=inputs)
         
         logger.info("\n--- Final Report ---")
@@ -71,15 +107,12 @@ def train():
     """
     query = "What the company's policy?"
     try:
-        milvus_manager = MilvusManager()
+        milvus_manager = create_milvus_manager()
         retriever = Retriever(milvus_manager)
         documents = retriever.retrieve(query)
 
         logger.info("Passing documents to CrewAI for final report generation...")
-        inputs = {
-            'topic': query,
-            'documents': documents,
-        }
+        inputs = crew_inputs(query, documents)
         # final_report = RagCrew().crew().kickoff(inputs=inputs)
         import sys
         RagCrew().crew().train(n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=inputs)
@@ -90,13 +123,141 @@ def train():
         raise Exception(f"An error occurred while training the crew: {e}")
 
 
-def serve():
+def serve(host: str = "0.0.0.0", port: int = 8002, workers: int = None, reload: bool = False, drain_timeout: float = None):
     """
     Serves the RAG Crew API using uvicorn.
+
+    With `reload` a single auto-reloading worker is started for development.
+    Otherwise `workers` processes (default `WEB_CONCURRENCY`, or 1) share the
+    port. The application is imported once before they start so a broken
+    build fails here instead of in every worker, and the workers share
+    query embeddings, answers and parsed crew configs through the on-disk
+    cache at `SHARED_CACHE_PATH`. Queries are counted in the log at
+    `QUERY_LOG_PATH`, from which the answers to the most asked ones are
+    precomputed after an ingestion. On shutdown each worker stops accepting
+    requests and lets in-flight crews finish for up to `drain_timeout`
+    seconds (default `SHUTDOWN_DRAIN_TIMEOUT`, or 120).
     """
     import uvicorn
-    logger.info("Starting the RAG Crew API server...")
-    uvicorn.run("rag.api:app", host="0.0.0.0", port=8002, reload=True)
+    if reload:
+        logger.info("Starting the RAG Crew API server with auto-reload...")
+        uvicorn.run("rag.api:app", host=host, port=port, reload=True)
+        return
+
+    workers = workers or int(os.environ.get("WEB_CONCURRENCY", 1))
+    if drain_timeout is None:
+        drain_timeout = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 120))
+    # Workers are spawned and inherit the environment, so they all open the same cache and query log and drain for as long.
+    os.environ.setdefault("SHARED_CACHE_PATH", DEFAULT_PATH)
+    os.environ.setdefault("QUERY_LOG_PATH", QUERY_LOG_PATH)
+    os.environ.setdefault("EXTRACTION_CACHE_DIR", EXTRACTION_CACHE_DIR)
+    os.environ["SHUTDOWN_DRAIN_TIMEOUT"] = str(drain_timeout)
+
+    import rag.api  # noqa: F401  Fail fast on import errors before spawning workers.
+
+    logger.info(f"Starting the RAG Crew API server on {host}:{port} with {workers} worker(s), shared cache at {os.environ['SHARED_CACHE_PATH']}...")
+    uvicorn.run(
+        "rag.api:app",
+        host=host,
+        port=port,
+        workers=workers,
+        # Uvicorn waits this long for open requests; the app's lifespan then drains detached crews.
+        timeout_graceful_shutdown=int(drain_timeout),
+    )
+
+def tier(action: str, collection_name: str = "rag_collection", tier_name: str = None, source: str = None, filters: dict = None):
+    """
+    Moves documents between the hot and archive tiers, or reports the size of each tier.
+    """
+    try:
+        milvus_manager = create_milvus_manager(collection_name=collection_name)
+        if action == "move":
+            expr = f'metadata["source"] == {json.dumps(source)}' if source else None
+            moved = milvus_manager.move_to_tier(tier_name, expr=expr, filters=filters)
+            if moved:
+                invalidate_knowledge_base()
+            logger.info(f"Moved {moved} chunks to the {tier_name} tier.")
+        elif action == "release":
+            milvus_manager.release_archive()
+            logger.info(f"Released '{milvus_manager.archive_collection_name}' from memory.")
+        else:
+            for entry in milvus_manager.tier_report():
+                logger.info(
+                    f"{entry['tier']:>7} '{entry['collection']}': {entry['rows']} rows, "
+                    f"loaded={entry['loaded']}, {entry['loaded_segments']} segments, "
+                    f"{entry['memory_bytes'] / 2 ** 20:.1f} MiB resident"
+                )
+    except Exception as e:
+        logger.exception(f"An error occurred while managing tiers: {e}")
+
+
+def export_kb(path: str, collection_name: str = "rag_collection", batch_size: int = 2000, include_archive: bool = True):
+    """
+    Exports a collection and its archive to a Parquet snapshot directory.
+    """
+    try:
+        milvus_manager = create_milvus_manager(collection_name=collection_name)
+        tiers = ("hot", "archive") if include_archive else ("hot",)
+        manifest = export_snapshot(milvus_manager, path, batch_size=batch_size, tiers=tiers)
+        rows = {tier: entry["rows"] for tier, entry in manifest["tiers"].items()}
+        logger.info(f"Exported '{collection_name}' to {path}: {rows}")
+    except Exception as e:
+        logger.exception(f"An error occurred while exporting the knowledge base: {e}")
+
+
+def import_kb(path: str, collection_name: str = "rag_collection", quantization: str = None, batch_size: int = 2000):
+    """
+    Bulk-loads a Parquet snapshot into a fresh collection, reusing the stored embeddings.
+    """
+    try:
+        manifest = read_manifest(path)
+        milvus_manager = create_milvus_manager(
+            collection_name=collection_name,
+            embedding_dim=manifest["embedding_dim"],
+            quantization=quantization or manifest["quantization"],
+        )
+        imported = import_snapshot(milvus_manager, path, batch_size=batch_size)
+        invalidate_knowledge_base()
+        logger.info(f"Imported {path} into '{collection_name}': {imported}")
+    except Exception as e:
+        logger.exception(f"An error occurred while importing the knowledge base: {e}")
+
+
+def compact(collection_name: str = "rag_collection", threshold: float = None, dry_run: bool = False, sample_queries: int = 100, top_k: int = 50):
+    """
+    Merges near-duplicate chunks of the hot tier and reports the storage and candidate-diversity change.
+    """
+    try:
+        milvus_manager = create_milvus_manager(collection_name=collection_name)
+        report = compact_collection(milvus_manager, threshold=threshold, dry_run=dry_run, sample_queries=sample_queries, top_k=top_k)
+        if not dry_run and report["duplicate_rows"]:
+            invalidate_knowledge_base()
+        logger.info(
+            f"{'Would merge' if dry_run else 'Merged'} {report['duplicate_rows']} chunks into {report['duplicate_groups']} groups: "
+            f"{report['rows_before']} -> {report['rows_after']} rows, ~{report['estimated_bytes_saved'] / 2 ** 20:.1f} MiB saved."
+        )
+        logger.info(f"Distinct candidates in the top {top_k}: {report['diversity_before']} before, {report['diversity_after']} after.")
+    except Exception as e:
+        logger.exception(f"An error occurred while compacting the collection: {e}")
+
+
+def _add_tag_arguments(parser: argparse.ArgumentParser, action: str):
+    """
+    Adds the --tenant, --department, --region and --doc-type options to a sub-parser.
+    """
+    parser.add_argument("--tenant", type=str, help=f"The tenant to {action}.")
+    parser.add_argument("--department", type=str, help=f"The department to {action}.")
+    parser.add_argument("--region", type=str, help=f"The region to {action}.")
+    parser.add_argument("--doc-type", dest="doc_type", type=str, help=f"The document type to {action}.")
+
+
+def _tags_from_args(args) -> dict:
+    """
+    Returns the tag options that were given on the command line.
+    """
+    tags = {key: getattr(args, key) for key in ("tenant", "department", "region", "doc_type")}
+    return {key: value for key, value in tags.items() if value}
+
 
 def main():
     """
@@ -110,32 +271,102 @@ def main():
     train_parser = subparsers.add_parser("train", help="Train the RAG system by processing a document.")
     train_parser.add_argument("file", type=str, help="The absolute path to the document file to process.")
     train_parser.add_argument("--mock", action="store_true", help="Run in mock mode without actual API calls.")
+    train_parser.add_argument("--collection", type=str, default="rag_collection", help="The collection to add the document to.")
+    _add_tag_arguments(train_parser, "tag the document with")
+    train_parser.add_argument("--force", action="store_true", help="Reprocess the file even if an identical document was already ingested.")
+    train_parser.add_argument("--questions", action="store_true", default=None,
+                              help="Generate and index likely questions for every chunk. Defaults to QUESTION_GENERATION.")
+    train_parser.add_argument("--summaries", action="store_true", default=None,
+                              help="Summarize the document and its sections for broad questions. Defaults to SUMMARY_INDEX.")
 
     # Sub-parser for the 'run' command
     run_parser = subparsers.add_parser("run", help="Run the RAG system with a query.")
     run_parser.add_argument("query", type=str, help="The user query to process.")
     run_parser.add_argument("--mock", action="store_true", help="Run in mock mode without actual API calls.")
+    run_parser.add_argument("--collection", type=str, default="rag_collection", help="The collection to search.")
+    _add_tag_arguments(run_parser, "restrict the search to")
+    run_parser.add_argument("--include-archived", action="store_true", help="Also search superseded and archived documents.")
 
     # Sub-parser for the 'reset-db' command
     reset_parser = subparsers.add_parser("reset-db", help="Reset the Milvus database by dropping the collection.")
+    reset_parser.add_argument("--collection", type=str, default="rag_collection", help="The collection to drop.")
+
+    # Sub-parser for the 'create-collection' command
+    create_parser = subparsers.add_parser("create-collection", help="Create a collection with compact vector storage settings.")
+    create_parser.add_argument("collection", type=str, help="The name of the collection to create.")
+    create_parser.add_argument("--dim", type=int, choices=[256, 512, 1024], default=1024, help="Titan v2 embedding dimension.")
+    create_parser.add_argument("--quantization", choices=["none", "sq8"], default="none", help="Vector quantization; quantized collections re-score candidates at full precision.")
+
+    # Sub-parser for the 'tier' command
+    tier_parser = subparsers.add_parser("tier", help="Manage the hot and archive storage tiers.")
+    tier_parser.add_argument("action", choices=["move", "report", "release"], help="Move documents, report resident memory per tier, or release the archive.")
+    tier_parser.add_argument("--to", dest="tier", choices=["hot", "archive"], help="The tier to move documents to.")
+    tier_parser.add_argument("--source", type=str, help="The document file name to move.")
+    tier_parser.add_argument("--collection", type=str, default="rag_collection", help="The hot collection.")
+    _add_tag_arguments(tier_parser, "move documents of")
+
+    # Sub-parser for the 'export' command
+    export_parser = subparsers.add_parser("export", help="Export the knowledge base to Parquet files.")
+    export_parser.add_argument("path", type=str, help="The snapshot directory to write.")
+    export_parser.add_argument("--collection", type=str, default="rag_collection", help="The collection to export.")
+    export_parser.add_argument("--batch-size", type=int, default=2000, help="Rows per batch.")
+    export_parser.add_argument("--hot-only", action="store_true", help="Skip the archive tier.")
+
+    # Sub-parser for the 'import' command
+    import_parser = subparsers.add_parser("import", help="Bulk-load a Parquet snapshot into a fresh collection.")
+    import_parser.add_argument("path", type=str, help="The snapshot directory to read.")
+    import_parser.add_argument("--collection", type=str, default="rag_collection", help="The empty collection to load into.")
+    import_parser.add_argument("--quantization", choices=["none", "sq8"], help="Vector quantization of the new collection. Defaults to the exported one.")
+    import_parser.add_argument("--batch-size", type=int, default=2000, help="Rows per insert.")
+
+    # Sub-parser for the 'compact' command
+    compact_parser = subparsers.add_parser("compact", help="Merge near-duplicate chunks into one chunk with several source references.")
+    compact_parser.add_argument("--collection", type=str, default="rag_collection", help="The collection to compact.")
+    compact_parser.add_argument("--threshold", type=float, help="Minimum Jaccard similarity of near-duplicates. Defaults to NEAR_DUPLICATE_THRESHOLD.")
+    compact_parser.add_argument("--dry-run", action="store_true", help="Only report what would be merged.")
+    compact_parser.add_argument("--sample-queries", type=int, default=100, help="Stored chunks used as queries to measure candidate diversity.")
+    compact_parser.add_argument("--top-k", type=int, default=50, help="Candidates per diversity query.")
 
     # Sub-parser for the 'serve' command
     serve_parser = subparsers.add_parser("serve", help="Start the FastAPI server.")
+    serve_parser.add_argument("--host", type=str, default="0.0.0.0", help="The interface to bind.")
+    serve_parser.add_argument("--port", type=int, default=8002, help="The port to bind.")
+    serve_parser.add_argument("--workers", type=int, help="Worker processes. Defaults to WEB_CONCURRENCY, or 1.")
+    serve_parser.add_argument("--reload", action="store_true", help="Run one auto-reloading worker for development.")
+    serve_parser.add_argument("--drain-timeout", type=float,
+                              help="Seconds to let in-flight requests finish on shutdown. Defaults to SHUTDOWN_DRAIN_TIMEOUT, or 120.")
 
     args = parser.parse_args()
 
     if args.command == "train":
-        train_internal(args.file, mock=args.mock)
+        train_internal(args.file, mock=args.mock, collection_name=args.collection, tags=_tags_from_args(args), force=args.force,
+                       questions=args.questions, summaries=args.summaries)
     elif args.command == "run":
-        run(args.query, mock=args.mock)
+        run(args.query, mock=args.mock, collection_name=args.collection, filters=_tags_from_args(args), include_archived=args.include_archived)
     elif args.command == "reset-db":
         try:
-            milvus_manager = MilvusManager()
+            milvus_manager = create_milvus_manager(collection_name=args.collection)
             milvus_manager.reset_collection()
+            invalidate_knowledge_base()
         except Exception as e:
             logger.exception(f"An error occurred while resetting the database: {e}")
+    elif args.command == "create-collection":
+        try:
+            create_milvus_manager(collection_name=args.collection, embedding_dim=args.dim, quantization=args.quantization)
+        except Exception as e:
+            logger.exception(f"An error occurred while creating the collection: {e}")
+    elif args.command == "tier":
+        if args.action == "move" and not (args.tier and (args.source or _tags_from_args(args))):
+            parser.error("tier move requires --to and at least one of --source, --tenant, --department, --region or --doc-type.")
+        tier(args.action, collection_name=args.collection, tier_name=args.tier, source=args.source, filters=_tags_from_args(args))
+    elif args.command == "export":
+        export_kb(args.path, collection_name=args.collection, batch_size=args.batch_size, include_archive=not args.hot_only)
+    elif args.command == "import":
+        import_kb(args.path, collection_name=args.collection, quantization=args.quantization, batch_size=args.batch_size)
+    elif args.command == "compact":
+        compact(args.collection, threshold=args.threshold, dry_run=args.dry_run, sample_queries=args.sample_queries, top_k=args.top_k)
     elif args.command == "serve":
-        serve()
+        serve(host=args.host, port=args.port, workers=args.workers, reload=args.reload, drain_timeout=args.drain_timeout)
 
 
 if __name__ == "__main__":
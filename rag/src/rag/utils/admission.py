@@ -0,0 +1,251 @@
+import asyncio
+import bisect
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from loguru import logger
+
+from .metrics import metrics
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request cannot be admitted because its endpoint is saturated.
+    """
+
+    def __init__(self, endpoint: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.endpoint = endpoint
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class EndpointLimits:
+    """
+    Admission limits for one class of work (e.g. "query" or "upload").
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, priority: int):
+        """
+        Args:
+            max_concurrency (int): Maximum number of requests of this class running at once.
+            max_queue (int): Maximum number of requests of this class waiting for a slot.
+            queue_timeout (float): Seconds a request may wait for a slot before it is shed.
+            priority (int): Lower values are served first when slots free up.
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.priority = priority
+
+    @classmethod
+    def from_env(cls, prefix: str, max_concurrency: int, max_queue: int, queue_timeout: float, priority: int) -> "EndpointLimits":
+        """
+        Builds limits from `<PREFIX>_MAX_CONCURRENCY`, `<PREFIX>_MAX_QUEUE` and
+        `<PREFIX>_QUEUE_TIMEOUT`, falling back to the given defaults.
+        """
+        return cls(
+            max_concurrency=int(os.environ.get(f"{prefix}_MAX_CONCURRENCY", max_concurrency)),
+            max_queue=int(os.environ.get(f"{prefix}_MAX_QUEUE", max_queue)),
+            queue_timeout=float(os.environ.get(f"{prefix}_QUEUE_TIMEOUT", queue_timeout)),
+            priority=priority,
+        )
+
+
+class _Waiter:
+    """A queued request waiting for a slot."""
+
+    def __init__(self, endpoint: str, future: asyncio.Future):
+        self.endpoint = endpoint
+        self.future = future
+
+
+class AdmissionController:
+    """
+    Bounds how much LLM-bound work runs at once.
+
+    Each endpoint has its own concurrency limit and bounded wait queue, and all
+    endpoints share a global slot budget that reflects what the model backends
+    can sustain. When a slot frees up, queued requests are granted in priority
+    order, so interactive queries overtake background uploads. Requests that
+    find the queue full are rejected immediately (429) and requests that wait
+    past their deadline are shed (503), both with a Retry-After estimate.
+    """
+
+    def __init__(self, limits: Dict[str, EndpointLimits], total_concurrency: int):
+        """
+        Args:
+            limits (Dict[str, EndpointLimits]): Limits keyed by endpoint name.
+            total_concurrency (int): Slots shared by all endpoints.
+        """
+        self.limits = limits
+        self.total_concurrency = total_concurrency
+        self._active: Dict[str, int] = {name: 0 for name in limits}
+        self._queued: Dict[str, int] = {name: 0 for name in limits}
+        self._total_active = 0
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        # Exponentially weighted service time per endpoint, used for Retry-After.
+        self._service_time: Dict[str, float] = {name: 1.0 for name in limits}
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """
+        Creates a controller configured from environment variables.
+        """
+        limits = {
+            "query": EndpointLimits.from_env("QUERY", max_concurrency=4, max_queue=32, queue_timeout=15.0, priority=0),
+            "upload": EndpointLimits.from_env("UPLOAD", max_concurrency=1, max_queue=4, queue_timeout=60.0, priority=10),
+            # Answers precomputed for frequent queries after an ingestion; served after everything else.
+            "prewarm": EndpointLimits.from_env("PREWARM", max_concurrency=1, max_queue=1, queue_timeout=300.0, priority=20),
+        }
+        total = int(os.environ.get("ADMISSION_TOTAL_CONCURRENCY", 4))
+        return cls(limits, total_concurrency=total)
+
+    def saturated(self, endpoint: str) -> bool:
+        """
+        Returns True if a new request for the endpoint would be rejected outright.
+        """
+        limits = self.limits[endpoint]
+        return not self._has_capacity(endpoint) and self._queued[endpoint] >= limits.max_queue
+
+    def check(self, endpoint: str):
+        """
+        Fails fast without queueing if the endpoint is saturated.
+
+        Raises:
+            AdmissionRejected: If a new request for the endpoint would be rejected.
+        """
+        if self.saturated(endpoint):
+            metrics.incr(f"admission.{endpoint}.rejected_queue_full")
+            raise AdmissionRejected(endpoint, 429, self._retry_after(endpoint), f"Too many pending '{endpoint}' requests.")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the current active and queued counts per endpoint.
+        """
+        return {
+            name: {"active": self._active[name], "queued": self._queued[name], "service_time": round(self._service_time[name], 3)}
+            for name in self.limits
+        }
+
+    async def drain(self, timeout: float, poll_interval: float = 0.1) -> bool:
+        """
+        Waits for running and queued requests to finish, e.g. before the process exits.
+
+        Args:
+            timeout (float): Seconds to wait at most.
+            poll_interval (float): Seconds between checks.
+
+        Returns:
+            bool: True if nothing was left running when it returned.
+        """
+        deadline = time.monotonic() + timeout
+        while self._total_active or any(self._queued.values()):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(poll_interval)
+        return True
+
+    @asynccontextmanager
+    async def slot(self, endpoint: str):
+        """
+        Holds an admission slot for the duration of the `async with` block.
+
+        Raises:
+            AdmissionRejected: If the endpoint queue is full or the wait deadline passes.
+        """
+        await self.acquire(endpoint)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(endpoint, time.monotonic() - started)
+
+    async def acquire(self, endpoint: str):
+        """
+        Waits for a slot for the endpoint, or raises AdmissionRejected.
+        """
+        limits = self.limits[endpoint]
+        if self._has_capacity(endpoint):
+            self._grant(endpoint)
+            metrics.observe(f"admission.{endpoint}.wait", 0.0)
+            return
+
+        self.check(endpoint)
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(endpoint, loop.create_future())
+        entry = (limits.priority, next(self._sequence), waiter)
+        bisect.insort(self._waiters, entry, key=lambda item: item[:2])
+        self._queued[endpoint] += 1
+        enqueued = time.monotonic()
+        try:
+            # asyncio.wait does not cancel the future, so a grant that races the deadline is kept.
+            await asyncio.wait({waiter.future}, timeout=limits.queue_timeout)
+        except BaseException:
+            # The caller went away while queued; hand back a slot it may have just been granted.
+            if waiter.future.done():
+                self.release(endpoint)
+            else:
+                self._abandon(entry)
+            raise
+        finally:
+            waited = time.monotonic() - enqueued
+            metrics.incr(f"admission.{endpoint}.queue_wait_seconds", waited)
+            metrics.observe(f"admission.{endpoint}.wait", waited)
+
+        if not waiter.future.done():
+            self._abandon(entry)
+            metrics.incr(f"admission.{endpoint}.rejected_timeout")
+            logger.warning(f"Shedding '{endpoint}' request after waiting {limits.queue_timeout}s for a slot.")
+            raise AdmissionRejected(endpoint, 503, self._retry_after(endpoint), f"Timed out waiting for a '{endpoint}' slot.")
+
+    def release(self, endpoint: str, elapsed: float = None):
+        """
+        Returns a slot and hands freed capacity to the highest-priority waiters.
+        """
+        self._active[endpoint] -= 1
+        self._total_active -= 1
+        if elapsed is not None:
+            self._service_time[endpoint] = 0.8 * self._service_time[endpoint] + 0.2 * elapsed
+        self._dispatch()
+
+    def _abandon(self, entry: tuple):
+        waiter = entry[2]
+        waiter.future.cancel()
+        self._waiters.remove(entry)
+        self._queued[waiter.endpoint] -= 1
+
+    def _has_capacity(self, endpoint: str) -> bool:
+        return (
+            self._total_active < self.total_concurrency
+            and self._active[endpoint] < self.limits[endpoint].max_concurrency
+        )
+
+    def _grant(self, endpoint: str):
+        self._active[endpoint] += 1
+        self._total_active += 1
+        metrics.incr(f"admission.{endpoint}.admitted")
+
+    def _dispatch(self):
+        index = 0
+        while index < len(self._waiters) and self._total_active < self.total_concurrency:
+            waiter = self._waiters[index][2]
+            if self._has_capacity(waiter.endpoint):
+                del self._waiters[index]
+                self._queued[waiter.endpoint] -= 1
+                self._grant(waiter.endpoint)
+                waiter.future.set_result(True)
+            else:
+                index += 1
+
+    def _retry_after(self, endpoint: str) -> int:
+        limits = self.limits[endpoint]
+        backlog = self._queued[endpoint] + self._active[endpoint] + 1
+        return max(1, math.ceil(self._service_time[endpoint] * backlog / max(1, limits.max_concurrency)))
@@ -0,0 +1,198 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .text_utils import count_tokens
+
+_IMAGE_TAG_RE = re.compile(r"\[image_info\].*?\[/image_info\]|\[image_placeholder:[^\]]*\]", re.DOTALL)
+# A sentence ends at terminal punctuation followed by whitespace, so "3.5 days" and URLs stay whole.
+_SENTENCE_RE = re.compile(r".+?(?:[.!?]+(?=\s)|\Z)", re.DOTALL)
+_WORD_RE = re.compile(r"\S+")
+
+
+class StructuredChunker:
+    """
+    Splits a document on its own structure instead of a fixed character window.
+
+    The input is the ordered list of blocks produced by DocumentProcessor, where
+    each block is a dict with `text`, `page` and `heading_level` (0 for body
+    text). Headings start new sections and close the current chunk once it has
+    reached `min_size`; body blocks are packed into chunks of at most `max_size`
+    units, and only blocks that are larger than that on their own are split,
+    at sentence boundaries. Every chunk records its page range, section path and
+    character offsets into the document text (blocks joined by newlines).
+    """
+
+    def __init__(self, max_size: int = 300, min_size: int = 60, overlap: int = 0, length_unit: str = "tokens"):
+        """
+        Initializes the StructuredChunker.
+
+        Args:
+            max_size (int): Maximum chunk size in `length_unit`.
+            min_size (int): Chunks smaller than this are merged into the next section instead of being emitted.
+            overlap (int): Size of trailing content repeated at the start of the next chunk within a section.
+            length_unit (str): "tokens" (approximate model tokens) or "chars".
+        """
+        if length_unit not in ("tokens", "chars"):
+            raise ValueError(f"Unsupported length unit: {length_unit}")
+        self.max_size = max_size
+        self.min_size = min_size
+        self.overlap = overlap
+        self.length_unit = length_unit
+        self._measure: Callable[[str], int] = count_tokens if length_unit == "tokens" else len
+
+    def chunk(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Groups blocks into chunks.
+
+        Args:
+            blocks (List[Dict[str, Any]]): Ordered blocks with `text`, `page` and `heading_level`.
+
+        Returns:
+            List[Dict[str, Any]]: Chunks as dicts with `text` and `metadata`.
+        """
+        chunks: List[Dict[str, Any]] = []
+        headings: List[Tuple[int, str]] = []
+        current: List[Dict[str, Any]] = []
+        current_section = ""
+        offset = 0
+
+        for block in blocks:
+            text = block.get("text") or ""
+            start = offset
+            offset += len(text) + 1
+            if not text.strip():
+                continue
+
+            level = block.get("heading_level") or 0
+            page = block.get("page")
+            if level:
+                if self._size(current) >= self.min_size:
+                    self._flush(chunks, current, current_section)
+                    current = []
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, text.strip()))
+                # A chunk that holds only headings so far belongs to the innermost one.
+                if all(piece.get("heading") for piece in current):
+                    current_section = self._section_path(headings)
+                current.append({"text": text, "start": start, "end": start + len(text), "page": page, "size": self._measure(text),
+                                "heading": True})
+                continue
+
+            for piece in self._split_block(text, start, page):
+                if current and self._size(current) + piece["size"] > self.max_size:
+                    self._flush(chunks, current, current_section)
+                    current = self._overlap_tail(current)
+                    current_section = self._section_path(headings)
+                if not current:
+                    current_section = self._section_path(headings)
+                current.append(piece)
+
+        if current:
+            self._flush(chunks, current, current_section)
+        return chunks
+
+    def measure(self, text: str) -> int:
+        """
+        Returns the size of a text in the chunker's length unit.
+        """
+        return self._measure(text)
+
+    def _size(self, pieces: List[Dict[str, Any]]) -> int:
+        return sum(piece["size"] for piece in pieces)
+
+    @staticmethod
+    def _section_path(headings: List[Tuple[int, str]]) -> str:
+        return " > ".join(title for _, title in headings)
+
+    def _split_block(self, text: str, start: int, page: Optional[int]) -> List[Dict[str, Any]]:
+        """
+        Returns the block as one piece, or as sentence-aligned pieces if it is too large.
+        """
+        size = self._measure(text)
+        if size <= self.max_size:
+            return [{"text": text, "start": start, "end": start + len(text), "page": page, "size": size}]
+
+        units = []
+        for begin, end in self._sentence_spans(text):
+            unit_text = text[begin:end]
+            unit_size = self._measure(unit_text)
+            if unit_size > self.max_size and not _IMAGE_TAG_RE.fullmatch(unit_text.strip()):
+                units.extend(self._word_spans(text, begin, end))
+            elif unit_text.strip():
+                units.append((begin, end, unit_size))
+
+        pieces, piece_begin, piece_end, piece_size = [], None, None, 0
+        for begin, end, unit_size in units:
+            if piece_begin is not None and piece_size + unit_size > self.max_size:
+                pieces.append(self._piece(text, start, piece_begin, piece_end, page))
+                piece_begin, piece_size = None, 0
+            if piece_begin is None:
+                piece_begin = begin
+            piece_end = end
+            piece_size += unit_size
+        if piece_begin is not None:
+            pieces.append(self._piece(text, start, piece_begin, piece_end, page))
+        return pieces
+
+    def _piece(self, text: str, base: int, begin: int, end: int, page: Optional[int]) -> Dict[str, Any]:
+        piece_text = text[begin:end].strip()
+        begin += len(text[begin:end]) - len(text[begin:end].lstrip())
+        return {"text": piece_text, "start": base + begin, "end": base + begin + len(piece_text), "page": page, "size": self._measure(piece_text)}
+
+    @staticmethod
+    def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+        """
+        Splits text into sentences, keeping image tags intact.
+        """
+        spans, cursor = [], 0
+        for match in _IMAGE_TAG_RE.finditer(text):
+            spans.extend((cursor + m.start(), cursor + m.end()) for m in _SENTENCE_RE.finditer(text[cursor:match.start()]))
+            spans.append((match.start(), match.end()))
+            cursor = match.end()
+        spans.extend((cursor + m.start(), cursor + m.end()) for m in _SENTENCE_RE.finditer(text[cursor:]))
+        return spans
+
+    def _word_spans(self, text: str, begin: int, end: int) -> List[Tuple[int, int, int]]:
+        """
+        Splits an oversized sentence into word runs that each fit in a chunk.
+        """
+        spans, run_begin, run_end, run_size = [], None, None, 0
+        for match in _WORD_RE.finditer(text, begin, end):
+            word_size = self._measure(match.group())
+            if run_begin is not None and run_size + word_size > self.max_size:
+                spans.append((run_begin, run_end, run_size))
+                run_begin, run_size = None, 0
+            if run_begin is None:
+                run_begin = match.start()
+            run_end = match.end()
+            run_size += word_size
+        if run_begin is not None:
+            spans.append((run_begin, run_end, run_size))
+        return spans
+
+    def _overlap_tail(self, pieces: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Returns the trailing pieces that fit in the configured overlap.
+        """
+        tail, size = [], 0
+        for piece in reversed(pieces):
+            if size + piece["size"] > self.overlap:
+                break
+            tail.insert(0, piece)
+            size += piece["size"]
+        return tail
+
+    def _flush(self, chunks: List[Dict[str, Any]], pieces: List[Dict[str, Any]], section: str):
+        pages = [piece["page"] for piece in pieces if piece["page"] is not None]
+        chunks.append({
+            "text": "\n".join(piece["text"] for piece in pieces),
+            "metadata": {
+                "page": pages[0] if pages else None,
+                "page_end": pages[-1] if pages else None,
+                "section": section,
+                "char_start": pieces[0]["start"],
+                "char_end": pieces[-1]["end"],
+                "chunk_index": len(chunks),
+            },
+        })
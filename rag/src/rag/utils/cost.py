@@ -0,0 +1,390 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from .metrics import metrics
+
+# On-demand prices in USD: per 1,000 input and output tokens, or per rerank search unit.
+# Prompt tokens read from the provider's prompt cache cost "cached_input" instead of "input".
+# Cross-region prefixes ("apac.", "us.") are ignored when looking a model up.
+# Override or extend with MODEL_PRICES, a JSON object of the same shape.
+DEFAULT_PRICES = {
+    "amazon.titan-embed-text-v2:0": {"input": 0.00002},
+    "amazon.titan-embed-image-v1": {"input": 0.0008},
+    "amazon.nova-lite-v1:0": {"input": 0.00006, "cached_input": 0.000015, "output": 0.00024},
+    "amazon.nova-pro-v1:0": {"input": 0.0008, "cached_input": 0.0002, "output": 0.0032},
+    "anthropic.claude-3-5-sonnet-20240620-v1:0": {"input": 0.003, "output": 0.015},
+    "cohere.rerank-v3-5:0": {"search_unit": 0.002},
+}
+_REGION_PREFIXES = ("apac.", "us.", "eu.", "ap.")
+
+# Rough token counts used to estimate the cost of a call before making it.
+CHARS_PER_TOKEN = 4
+CREW_PROMPT_TOKENS = 800
+CREW_OUTPUT_TOKENS = 1000
+CAPTION_IMAGE_TOKENS = 1500
+CAPTION_OUTPUT_TOKENS = 300
+
+# Degradation levels derived from the spend of the last hour.
+NORMAL = 0
+ECONOMY = 1
+MINIMAL = 2
+
+_current: contextvars.ContextVar[Optional["CostTracker"]] = contextvars.ContextVar("cost_tracker", default=None)
+
+
+def _model_key(model: str) -> str:
+    model = (model or "").split("/", 1)[-1]
+    for prefix in _REGION_PREFIXES:
+        if model.startswith(prefix):
+            return model[len(prefix):]
+    return model
+
+
+def load_prices() -> Dict[str, Dict[str, float]]:
+    """
+    Returns the price table, with `MODEL_PRICES` entries taking precedence.
+    """
+    prices = dict(DEFAULT_PRICES)
+    overrides = os.environ.get("MODEL_PRICES")
+    if overrides:
+        prices.update({_model_key(model): price for model, price in json.loads(overrides).items()})
+    return prices
+
+
+def price_of(model: str, input_tokens: int = 0, output_tokens: int = 0, units: int = 0, cached_input_tokens: int = 0) -> float:
+    """
+    Returns the estimated cost in USD of one call. Unknown models cost nothing and are logged once.
+    `cached_input_tokens` are the part of `input_tokens` read from the prompt cache.
+    """
+    price = _prices.get(_model_key(model))
+    if price is None:
+        if model not in _unpriced:
+            _unpriced.add(model)
+            logger.warning(f"No price configured for model '{model}'; its calls are counted at no cost. Set MODEL_PRICES to fix.")
+        return 0.0
+    return (
+        (input_tokens - cached_input_tokens) / 1000 * price.get("input", 0.0)
+        + cached_input_tokens / 1000 * price.get("cached_input", price.get("input", 0.0))
+        + output_tokens / 1000 * price.get("output", 0.0)
+        + units * price.get("search_unit", 0.0)
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Returns a rough token count for a text.
+    """
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class CostTracker:
+    """
+    Accumulates the model calls, tokens and estimated cost of one request or ingestion.
+
+    The tracker of the running request is held in a context variable, so calls
+    recorded from the threadpool or from a coalesced execution are attributed
+    to the request that started the work.
+    """
+
+    def __init__(self, name: str, budget: Optional[float] = None):
+        """
+        Args:
+            name (str): What is being accounted, e.g. "query" or "upload".
+            budget (Optional[float]): The most the request should spend, in USD.
+        """
+        self.name = name
+        self.budget = budget
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.by_operation: Dict[str, Dict[str, Any]] = {}
+        self.degraded: List[str] = []
+        self._lock = threading.Lock()
+
+    def add(self, operation: str, model: str, input_tokens: int, output_tokens: int, units: int, cost: float, calls: int = 1):
+        with self._lock:
+            self.calls += calls
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cost += cost
+            entry = self.by_operation.setdefault(
+                operation, {"model": model, "calls": 0, "input_tokens": 0, "output_tokens": 0, "units": 0, "cost_usd": 0.0}
+            )
+            entry["calls"] += calls
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["units"] += units
+            entry["cost_usd"] += cost
+
+    def remaining(self) -> Optional[float]:
+        """
+        Returns the budget left in USD, or None without a budget.
+        """
+        return None if self.budget is None else self.budget - self.cost
+
+    def degrade(self, step: str):
+        """
+        Records that the request was served more cheaply than usual, and how.
+        """
+        with self._lock:
+            self.degraded.append(step)
+        metrics.incr(f"cost.{self.name}.degraded")
+        logger.info(f"Degrading {self.name} to stay within budget: {step}")
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns the accounting of the request, for response metadata.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cost_usd": round(self.cost, 6),
+                "budget_usd": self.budget,
+                "by_operation": {
+                    operation: dict(entry, cost_usd=round(entry["cost_usd"], 6)) for operation, entry in self.by_operation.items()
+                },
+                "degraded": list(self.degraded),
+            }
+
+
+class SpendWindow:
+    """
+    The estimated spend of this process over a sliding time window.
+    """
+
+    def __init__(self, window: float = 3600.0):
+        self.window = window
+        self._events: deque = deque()
+        self._total = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, cost: float, now: Optional[float] = None):
+        if cost <= 0:
+            return
+        with self._lock:
+            self._events.append((now or time.monotonic(), cost))
+            self._total += cost
+
+    def total(self, now: Optional[float] = None) -> float:
+        with self._lock:
+            cutoff = (now or time.monotonic()) - self.window
+            while self._events and self._events[0][0] < cutoff:
+                self._total -= self._events.popleft()[1]
+            if not self._events:
+                # Drop the rounding error left by the subtractions.
+                self._total = 0.0
+            return max(self._total, 0.0)
+
+
+class CostBudget:
+    """
+    Decides how to degrade work so spending stays within budget.
+
+    Each query and upload may spend up to its own budget. Across requests, once
+    the spend of the last hour reaches `degrade_at` of the hourly budget, work
+    runs in economy mode (fewer documents for the crew, no image captions or
+    generated questions); past the hourly budget every query also runs the
+    single-task fast crew. Embeddings and search are never skipped.
+    """
+
+    def __init__(self, query_usd: Optional[float] = None, upload_usd: Optional[float] = None, hourly_usd: Optional[float] = None,
+                 degrade_at: float = 0.8, economy_documents: int = 3, spend: Optional[SpendWindow] = None):
+        """
+        Args:
+            query_usd (Optional[float]): The most one query may spend.
+            upload_usd (Optional[float]): The most one document ingestion may spend.
+            hourly_usd (Optional[float]): The most this process should spend per hour.
+            degrade_at (float): The share of the hourly budget after which economy mode starts.
+            economy_documents (int): Documents given to the crew in economy mode.
+            spend (Optional[SpendWindow]): The spend to check; defaults to the process-wide window.
+        """
+        self.query_usd = query_usd
+        self.upload_usd = upload_usd
+        self.hourly_usd = hourly_usd
+        self.degrade_at = degrade_at
+        self.economy_documents = economy_documents
+        self.spend = spend or spend_window
+
+    @classmethod
+    def from_env(cls) -> "CostBudget":
+        """
+        Builds the budget from `QUERY_BUDGET_USD`, `UPLOAD_BUDGET_USD`, `COST_BUDGET_PER_HOUR_USD`,
+        `COST_DEGRADE_AT` and `ECONOMY_DOCUMENTS`. Unset budgets are unlimited; the hourly
+        budget applies to each worker process.
+        """
+        def optional(name: str) -> Optional[float]:
+            value = os.environ.get(name)
+            return float(value) if value else None
+
+        return cls(
+            query_usd=optional("QUERY_BUDGET_USD"),
+            upload_usd=optional("UPLOAD_BUDGET_USD"),
+            hourly_usd=optional("COST_BUDGET_PER_HOUR_USD"),
+            degrade_at=float(os.environ.get("COST_DEGRADE_AT", 0.8)),
+            economy_documents=int(os.environ.get("ECONOMY_DOCUMENTS", 3)),
+        )
+
+    def request_budget(self, name: str) -> Optional[float]:
+        return self.query_usd if name == "query" else self.upload_usd
+
+    def level(self) -> int:
+        """
+        Returns NORMAL, ECONOMY or MINIMAL from the spend of the last hour.
+        """
+        if not self.hourly_usd:
+            return NORMAL
+        spent = self.spend.total()
+        if spent >= self.hourly_usd:
+            return MINIMAL
+        return ECONOMY if spent >= self.degrade_at * self.hourly_usd else NORMAL
+
+    def allows(self, estimated_cost: float, tracker: Optional[CostTracker] = None) -> bool:
+        """
+        Returns True if optional work (captions, generated questions) of the given cost should run.
+        """
+        if self.level() >= ECONOMY:
+            return False
+        remaining = tracker.remaining() if tracker is not None else None
+        return remaining is None or estimated_cost <= remaining
+
+    def plan_generation(self, documents: list, model: str, tracker: Optional[CostTracker] = None) -> Tuple[list, bool]:
+        """
+        Chooses how many documents the crew sees and whether it runs in fast mode.
+
+        Plans are tried from the most to the least thorough, and the first whose
+        estimated cost fits the request's remaining budget is used.
+
+        Returns:
+            Tuple[list, bool]: The documents to use and whether to run the fast crew.
+        """
+        level = self.level()
+        economy = min(len(documents), self.economy_documents) or len(documents)
+        plans = [] if level >= ECONOMY else [(count, False) for count in range(len(documents), economy, -1)]
+        plans += [] if level >= MINIMAL else [(economy, False)]
+        plans += [(count, True) for count in range(economy, 0, -1)]
+        remaining = tracker.remaining() if tracker is not None else None
+        count, fast = next(
+            (plan for plan in plans if remaining is None or estimate_generation(documents[:plan[0]], model, plan[1]) <= remaining),
+            plans[-1] if plans else (len(documents), True),
+        )
+        if tracker is not None:
+            if count < len(documents):
+                tracker.degrade(f"documents {len(documents)}->{count}")
+            if fast:
+                tracker.degrade("fast_mode")
+        return documents[:count], fast
+
+
+def estimate_generation(documents: list, model: str, fast: bool = False) -> float:
+    """
+    Estimates the cost of a crew run over the documents: the standard crew passes
+    the documents to the first task and its guide to the second, the fast crew runs one task.
+    """
+    document_tokens = sum(estimate_tokens(str(document)) for document in documents)
+    if fast:
+        return price_of(model, document_tokens + CREW_PROMPT_TOKENS, CREW_OUTPUT_TOKENS)
+    return price_of(model, document_tokens + 2 * CREW_PROMPT_TOKENS + CREW_OUTPUT_TOKENS, 2 * CREW_OUTPUT_TOKENS)
+
+
+def estimate_caption(model: str) -> float:
+    """
+    Estimates the cost of captioning one downscaled image.
+    """
+    return price_of(model, CAPTION_IMAGE_TOKENS, CAPTION_OUTPUT_TOKENS)
+
+
+def current_tracker() -> Optional[CostTracker]:
+    """
+    Returns the tracker of the running request, if any.
+    """
+    return _current.get()
+
+
+@contextmanager
+def track(name: str, budget: Optional[float] = None) -> Iterator[CostTracker]:
+    """
+    Accounts the model calls made inside the block to a new tracker.
+
+    Args:
+        name (str): What is being accounted, e.g. "query" or "upload".
+        budget (Optional[float]): The most the request should spend, in USD.
+    """
+    tracker = CostTracker(name, budget)
+    token = _current.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current.reset(token)
+        metrics.incr(f"cost.{name}.requests")
+        metrics.incr(f"cost.{name}.usd", tracker.cost)
+
+
+def record_usage(operation: str, model: str, input_tokens: int = 0, output_tokens: int = 0, units: int = 0, calls: int = 1,
+                 cached_input_tokens: int = 0) -> float:
+    """
+    Records a model call against the running request and the process totals.
+
+    Args:
+        operation (str): The pipeline step, e.g. "embedding", "rerank", "caption" or "crew".
+        model (str): The model id, used to look up the price.
+        input_tokens (int): Prompt tokens billed.
+        output_tokens (int): Completion tokens billed.
+        units (int): Search units billed by the reranker.
+        calls (int): The number of model invocations covered.
+        cached_input_tokens (int): The part of `input_tokens` read from the provider's prompt cache.
+
+    Returns:
+        float: The estimated cost in USD.
+    """
+    input_tokens, output_tokens, units = int(input_tokens or 0), int(output_tokens or 0), int(units or 0)
+    cached_input_tokens = min(int(cached_input_tokens or 0), input_tokens)
+    cost = price_of(model, input_tokens, output_tokens, units, cached_input_tokens)
+    tracker = _current.get()
+    if tracker is not None:
+        tracker.add(operation, model, input_tokens, output_tokens, units, cost, calls)
+    spend_window.add(cost)
+    metrics.incr(f"usage.{operation}.calls", calls)
+    metrics.incr(f"usage.{operation}.input_tokens", input_tokens)
+    metrics.incr(f"usage.{operation}.output_tokens", output_tokens)
+    if cached_input_tokens:
+        metrics.incr(f"usage.{operation}.cached_input_tokens", cached_input_tokens)
+    metrics.incr("cost.usd", cost)
+    return cost
+
+
+_prices = load_prices()
+_unpriced: set = set()
+# The spend of this process over the last hour, checked by the hourly budget.
+spend_window = SpendWindow()
+_budget: Optional[CostBudget] = None
+
+
+def get_budget() -> CostBudget:
+    """
+    Returns the process-wide budget, read from the environment on first use.
+    """
+    global _budget
+    if _budget is None:
+        _budget = CostBudget.from_env()
+    return _budget
+
+
+def reset_budget():
+    """
+    Forgets the process-wide budget and prices, so the next use re-reads the environment.
+    """
+    global _budget, _prices
+    _budget = None
+    _prices = load_prices()
+    _unpriced.clear()
@@ -0,0 +1,303 @@
+import hashlib
+import os
+import random
+import re
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+
+from .milvus_manager import DEFAULT_TENANT, PARTITION_KEY_FIELD, TAG_FIELDS, MilvusManager
+
+# Chunks are compared on sets of word 3-grams. 64 MinHash permutations are
+# split into 16 bands of 4 rows: pairs with a Jaccard similarity of 0.85 share
+# at least one band with a probability above 0.99, pairs below 0.3 rarely do.
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+DEFAULT_THRESHOLD = 0.85
+# Metadata keys written by deduplication.
+BANDS_KEY = "lsh_bands"
+REFERENCES_KEY = "references"
+SOURCES_KEY = "sources"
+REFERENCE_FIELDS = ("source", "page", "page_end", "section")
+
+_PRIME = 4294967291  # The largest prime below 2**32, so hash values fit in uint32.
+_WORD_RE = re.compile(r"\w+")
+_perm_rng = np.random.RandomState(20240501)
+_PERM_A = _perm_rng.randint(1, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _perm_rng.randint(0, 2 ** 31 - 1, size=NUM_PERM).astype(np.uint64)
+
+
+def near_duplicate_threshold() -> float:
+    """
+    Returns the Jaccard similarity above which two chunks are near-duplicates (`NEAR_DUPLICATE_THRESHOLD`).
+    """
+    return float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", DEFAULT_THRESHOLD))
+
+
+def detection_enabled() -> bool:
+    """
+    Returns True unless ingest-time detection is switched off with `NEAR_DUPLICATE_DETECTION=off`.
+    """
+    return os.environ.get("NEAR_DUPLICATE_DETECTION", "on").lower() != "off"
+
+
+def shingles(text: str) -> Set[int]:
+    """
+    Returns the hashed word 3-grams of a text, case-insensitive and ignoring punctuation.
+    Texts shorter than three words are a single shingle.
+    """
+    words = _WORD_RE.findall(text.lower())
+    grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))]
+    return {int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest(), "little") for gram in grams}
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    """
+    Returns the exact Jaccard similarity of two shingle sets.
+    """
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(shingle_set: Set[int]) -> np.ndarray:
+    """
+    Returns the MinHash signature of a shingle set.
+    """
+    values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+    if values.size == 0:
+        return np.zeros(NUM_PERM, dtype=np.uint32)
+    hashed = (_PERM_A[:, None] * values[None, :] + _PERM_B[:, None]) % _PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray) -> List[str]:
+    """
+    Returns the LSH bucket keys of a signature, one per band.
+    """
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes(), digest_size=4).hexdigest()}"
+        for band in range(NUM_BANDS)
+    ]
+
+
+def estimated_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Estimates the Jaccard similarity of two texts from their signatures.
+    """
+    return float(np.mean(a == b))
+
+
+def reference(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the location of a chunk (source, pages and section) as stored in `references`.
+    """
+    return {field: metadata[field] for field in REFERENCE_FIELDS if metadata.get(field) is not None}
+
+
+def merge_references(metadata: Dict[str, Any], references: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns a copy of a chunk's metadata with additional source references.
+
+    `references` lists every location of the chunk's text, starting with its
+    own; `sources` lists the distinct documents, for source-level lookups.
+    """
+    merged = dict(metadata)
+    existing = list(merged.get(REFERENCES_KEY) or [reference(metadata)])
+    for ref in references:
+        if ref not in existing:
+            existing.append(ref)
+    merged[REFERENCES_KEY] = existing
+    merged[SOURCES_KEY] = list(dict.fromkeys(ref["source"] for ref in existing if ref.get("source")))
+    return merged
+
+
+def remove_source(metadata: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """
+    Returns a copy of a merged chunk's metadata without the references to one document.
+    The first remaining reference becomes the chunk's primary location.
+    """
+    remaining = [ref for ref in metadata.get(REFERENCES_KEY) or [] if ref.get("source") != source]
+    detached = {key: value for key, value in metadata.items() if key not in REFERENCE_FIELDS}
+    if remaining:
+        detached.update(remaining[0])
+    detached[REFERENCES_KEY] = remaining
+    detached[SOURCES_KEY] = list(dict.fromkeys(ref["source"] for ref in remaining if ref.get("source")))
+    return detached
+
+
+def tag_scope(metadata: Dict[str, Any]) -> Tuple:
+    """
+    Returns the tag values of a chunk. Only chunks with identical tags are merged,
+    so tag-filtered searches find the merged chunk for every document.
+    """
+    return tuple(metadata.get(tag) or (DEFAULT_TENANT if tag == PARTITION_KEY_FIELD else None) for tag in TAG_FIELDS)
+
+
+class NearDuplicateIndex:
+    """
+    An in-memory LSH index that maps a signature to the first indexed near-duplicate.
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        """
+        Args:
+            threshold (Optional[float]): Minimum estimated Jaccard similarity. Defaults to `NEAR_DUPLICATE_THRESHOLD`.
+        """
+        self.threshold = near_duplicate_threshold() if threshold is None else threshold
+        self._buckets: Dict[Tuple[Hashable, str], List[Hashable]] = {}
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def find(self, signature: np.ndarray, scope: Hashable = None) -> Optional[Hashable]:
+        """
+        Returns the key of the most similar indexed signature in the same scope, if it is a near-duplicate.
+        """
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for key in band_keys(signature):
+            for candidate in self._buckets.get((scope, key), ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = estimated_similarity(signature, self._signatures[candidate])
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+        return best
+
+    def add(self, key: Hashable, signature: np.ndarray, scope: Hashable = None):
+        """
+        Indexes a signature under a key.
+        """
+        self._signatures[key] = signature
+        for band in band_keys(signature):
+            self._buckets.setdefault((scope, band), []).append(key)
+
+
+def add_references(milvus_manager: MilvusManager, merges: Dict[int, List[Dict[str, Any]]]) -> int:
+    """
+    Adds the references of dropped duplicate chunks to the stored chunks they duplicate.
+
+    Args:
+        milvus_manager (MilvusManager): The collection holding the chunks.
+        merges (Dict[int, List[Dict[str, Any]]]): References to add, by stored chunk id.
+
+    Returns:
+        int: The number of stored chunks updated.
+    """
+    if not merges:
+        return 0
+    rows = milvus_manager.get_rows(list(merges))
+    updated = [
+        {"embedding": row["embedding"], "text": row["text"], "metadata": merge_references(row["metadata"], merges[row["id"]]), "replaces": [row["id"]]}
+        for row in rows
+    ]
+    milvus_manager.replace_rows(updated, [row["id"] for row in rows])
+    return len(updated)
+
+
+def compact_collection(
+    milvus_manager: MilvusManager,
+    threshold: Optional[float] = None,
+    dry_run: bool = False,
+    batch_size: int = 1000,
+    sample_queries: int = 100,
+    top_k: int = 50,
+) -> Dict[str, Any]:
+    """
+    Merges near-duplicate chunks of the hot tier into one chunk per group.
+
+    The first chunk of each group is kept with the references of all members
+    and the others are deleted. Candidate diversity is the share of distinct
+    groups among the top-k results for a sample of stored chunks used as
+    queries, measured before and after merging.
+
+    Args:
+        milvus_manager (MilvusManager): The collection to compact.
+        threshold (Optional[float]): Minimum estimated Jaccard similarity. Defaults to `NEAR_DUPLICATE_THRESHOLD`.
+        dry_run (bool): Only report what would be merged.
+        batch_size (int): Rows per scan batch and groups per rewrite.
+        sample_queries (int): Number of stored chunks used as diversity queries.
+        top_k (int): Number of candidates per diversity query.
+
+    Returns:
+        Dict[str, Any]: Row counts, estimated bytes saved and diversity before and after.
+    """
+    index = NearDuplicateIndex(threshold)
+    groups: Dict[int, List[int]] = {}
+    row_bytes: Dict[int, int] = {}
+    samples: List[List[float]] = []
+    sampler = random.Random(0)
+    rows_before = 0
+    for batch in milvus_manager.iter_rows("hot", batch_size=batch_size):
+        for row in batch:
+            rows_before += 1
+            # Reservoir-sample the diversity queries so the scan stays one pass.
+            if len(samples) < sample_queries:
+                samples.append(row["embedding"])
+            elif sampler.random() < sample_queries / rows_before:
+                samples[sampler.randrange(sample_queries)] = row["embedding"]
+            signature = minhash(shingles(row["text"]))
+            scope = tag_scope(row["metadata"])
+            representative = index.find(signature, scope)
+            if representative is None:
+                index.add(row["id"], signature, scope)
+            else:
+                groups.setdefault(representative, []).append(row["id"])
+                row_bytes[row["id"]] = len(row["embedding"]) * 4 + len(row["text"].encode()) + len(str(row["metadata"]))
+
+    group_of = {member: rep for rep, members in groups.items() for member in members}
+    report = {
+        "rows_before": rows_before,
+        "duplicate_groups": len(groups),
+        "duplicate_rows": len(group_of),
+        "estimated_bytes_saved": sum(row_bytes.values()),
+        "diversity_before": _candidate_diversity(milvus_manager, samples, top_k, group_of),
+        "rows_after": rows_before - len(group_of),
+        "diversity_after": None,
+    }
+    if dry_run or not groups:
+        return report
+
+    representatives = list(groups)
+    for start in range(0, len(representatives), batch_size):
+        batch_reps = representatives[start:start + batch_size]
+        ids = batch_reps + [member for rep in batch_reps for member in groups[rep]]
+        rows = {row["id"]: row for row in milvus_manager.get_rows(ids)}
+        merged = []
+        for rep in batch_reps:
+            if rep not in rows:
+                continue
+            references = []
+            for member in groups[rep]:
+                if member in rows:
+                    member_metadata = rows[member]["metadata"]
+                    references.extend(member_metadata.get(REFERENCES_KEY) or [reference(member_metadata)])
+            metadata = merge_references(rows[rep]["metadata"], references)
+            metadata[BANDS_KEY] = band_keys(minhash(shingles(rows[rep]["text"])))
+            # The questions of the dropped members are answered by the merged chunk too.
+            replaces = [rep] + [member for member in groups[rep] if member in rows]
+            merged.append({"embedding": rows[rep]["embedding"], "text": rows[rep]["text"], "metadata": metadata, "replaces": replaces})
+        milvus_manager.replace_rows(merged, list(rows))
+        logger.info(f"Merged {min(start + batch_size, len(representatives))}/{len(representatives)} duplicate groups...")
+
+    report["rows_after"] = milvus_manager.count_rows("hot")
+    report["diversity_after"] = _candidate_diversity(milvus_manager, samples, top_k, {})
+    return report
+
+
+def _candidate_diversity(milvus_manager: MilvusManager, queries: List[List[float]], top_k: int, group_of: Dict[int, int]) -> Optional[float]:
+    """
+    Returns the mean share of distinct duplicate groups among the top-k search results.
+    """
+    shares = []
+    for query in queries:
+        hits = milvus_manager.search(query, limit=top_k)
+        if hits:
+            shares.append(len({group_of.get(hit["id"], hit["id"]) for hit in hits}) / len(hits))
+    return round(float(np.mean(shares)), 4) if shares else None
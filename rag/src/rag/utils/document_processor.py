@@ -1,23 +1,80 @@
 import base64
+import contextvars
+import hashlib
 import io
 import json
 import mimetypes
 import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import boto3
-import docx
 from PIL import Image
-import fitz  # PyMuPDF
 from botocore.exceptions import ClientError
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from loguru import logger
 from dotenv import load_dotenv
 
+from .chunker import StructuredChunker
+from .dedup import (
+    BANDS_KEY,
+    REFERENCES_KEY,
+    SOURCES_KEY,
+    NearDuplicateIndex,
+    add_references,
+    band_keys,
+    detection_enabled,
+    jaccard,
+    merge_references,
+    minhash,
+    near_duplicate_threshold,
+    reference,
+    shingles,
+    tag_scope,
+)
+from .cost import current_tracker, estimate_caption, estimate_tokens, get_budget, price_of, record_usage
+from .docx_reader import heading_level, iter_docx
+from .extraction_cache import ExtractionCache
+from .image_triage import ImageTriage, new_image_stats
+from .metrics import metrics
+from .milvus_manager import PARTITION_KEY_FIELD, MilvusManager, normalize_tags
+from .pdf_reader import read_pdf
+from .simulation import get_backend, pseudo_embedding, simulation_enabled
+from .resilience import boto_client_config, get_caller
+from .summary_index import (
+    DOCUMENT,
+    DOCUMENT_SUMMARY_PROMPT,
+    SECTION,
+    SECTION_SUMMARY_PROMPT,
+    SUMMARY_SYSTEM_PROMPT,
+    group_sections,
+    summary_label,
+)
+
 # Constants
 IMAGE_DIR = Path("rag/knowledge/images")
 IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+IMAGE_PLACEHOLDER_RE = re.compile(r"\[image_placeholder:([^\]]+)\]")
+# A PDF text block is treated as a heading when its font is this much larger than the body font.
+HEADING_FONT_RATIO = 1.15
+CAPTION_MODEL = "apac.amazon.nova-lite-v1:0"
+# Why an image was not captioned when the cost budget ran short.
+OVER_BUDGET = "over_budget"
+# Bump when a change to extraction or captioning alters the text of a document, so cached extractions are not reused.
+EXTRACTION_VERSION = 1
+HEADING_MAX_CHARS = 200
+QUESTION_SYSTEM_PROMPT = "You write the questions employees type into an HR policy assistant."
+QUESTION_PROMPT = (
+    "Write {count} different questions that an employee might ask which are answered by the policy excerpt below. "
+    "Use the words an employee would use rather than the wording of the excerpt. "
+    "Return one question per line, without numbering.\n\n{text}"
+)
+QUESTION_LINE_PREFIX_RE = re.compile(r"^\s*(?:[-*\u2022]|\d+[.)])\s*")
+# Characters of section text sent to the summary model.
+SUMMARY_INPUT_CHARS = 12000
 
 class DocumentProcessor:
     """
@@ -25,20 +82,43 @@ class DocumentProcessor:
     embedding generation, and preparing data for the knowledge base.
     """
 
-    def __init__(self, mock: bool = False):
+    def __init__(self, mock: bool = False, chunking_strategy: Optional[str] = None, embedding_dim: Optional[int] = None,
+                 generate_questions: Optional[bool] = None, build_summaries: Optional[bool] = None):
         """
         Initializes the DocumentProcessor.
 
         Args:
             mock (bool): If True, runs in mock mode without actual API calls.
+            embedding_dim (Optional[int]): Output dimension requested from Titan v2 (256, 512 or 1024);
+                should match the target collection. Defaults to `EMBEDDING_DIMENSIONS`.
+            chunking_strategy (Optional[str]): "structured" (split on headings and sections) or
+                "recursive" (the legacy fixed-size character splitter). Defaults to `CHUNKING_STRATEGY`.
+            generate_questions (Optional[bool]): Generate and embed likely questions for every chunk.
+                Defaults to `QUESTION_GENERATION=on`.
+            build_summaries (Optional[bool]): Summarize every section and the whole document for the
+                summary index. Defaults to `SUMMARY_INDEX=on`.
         """
         # Load environment variables from .env file
         load_dotenv()
         
         self.mock = mock
-        if not self.mock:
-            self.bedrock_client = boto3.client("bedrock-runtime", region_name=os.environ.get("AWS_REGION", "ap-southeast-2"))
-            self.s3_client = boto3.client("s3")
+        self.merged_chunks = 0
+        self.summaries: List[Dict[str, Any]] = []
+        self.image_triage = ImageTriage.from_env()
+        self.image_stats = new_image_stats()
+        self.extraction_cache = None if mock else ExtractionCache.from_env()
+        if not self.mock and simulation_enabled():
+            backend = get_backend()
+            self.bedrock_client = backend.bedrock
+            self.s3_client = backend.s3
+            self.s3_bucket_name = "simulated-bucket"
+        elif not self.mock:
+            self.bedrock_client = boto3.client(
+                "bedrock-runtime",
+                region_name=os.environ.get("AWS_REGION", "ap-southeast-2"),
+                config=boto_client_config(),
+            )
+            self.s3_client = boto3.client("s3", config=boto_client_config())
             self.s3_bucket_name = os.environ.get("AWS_S3_BUCKET_NAME","reco-demo-res")
             if not self.s3_bucket_name:
                 raise ValueError("AWS_S3_BUCKET_NAME environment variable not set.")
@@ -49,25 +129,333 @@ class DocumentProcessor:
             logger.info("DocumentProcessor running in mock mode.")
             
         self.embedding_model_id = "amazon.titan-embed-text-v2:0"
+        self.embedding_dim = int(embedding_dim or os.environ.get("EMBEDDING_DIMENSIONS", 1024))
+        if generate_questions is None:
+            generate_questions = os.environ.get("QUESTION_GENERATION", "off").lower() == "on"
+        self.generate_questions = generate_questions
+        self.question_model_id = os.environ.get("QUESTION_MODEL", "apac.amazon.nova-lite-v1:0")
+        self.questions_per_chunk = int(os.environ.get("QUESTIONS_PER_CHUNK", 3))
+        self.question_concurrency = int(os.environ.get("QUESTION_GENERATION_CONCURRENCY", 4))
+        if build_summaries is None:
+            build_summaries = os.environ.get("SUMMARY_INDEX", "off").lower() == "on"
+        self.build_summaries = build_summaries
+        self.summary_model_id = os.environ.get("SUMMARY_MODEL", "apac.amazon.nova-lite-v1:0")
+        self.summary_words = int(os.environ.get("SUMMARY_WORDS", 120))
+        self.summary_max_depth = int(os.environ.get("SUMMARY_MAX_SECTION_DEPTH", 3))
+        self.summary_concurrency = int(os.environ.get("SUMMARY_CONCURRENCY", 4))
+        self.chunking_strategy = chunking_strategy or os.environ.get("CHUNKING_STRATEGY", "structured")
+        if self.chunking_strategy not in ("structured", "recursive"):
+            raise ValueError(f"Unsupported chunking strategy: {self.chunking_strategy}")
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len
         )
+        self.chunker = StructuredChunker(
+            max_size=int(os.environ.get("CHUNK_MAX_SIZE", 300)),
+            min_size=int(os.environ.get("CHUNK_MIN_SIZE", 60)),
+            overlap=int(os.environ.get("CHUNK_OVERLAP", 0)),
+            length_unit=os.environ.get("CHUNK_LENGTH_UNIT", "tokens"),
+        )
 
-    def process_document(self, file_path: str) -> List[Dict[str, Any]]:
+    def process_document(self, file_path: str, tags: Optional[Dict[str, str]] = None, content_hash: Optional[str] = None,
+                         milvus_manager: Optional[MilvusManager] = None) -> List[Dict[str, Any]]:
         """
         Main function to process a single document.
+
+        Near-duplicate chunks (repeated headers, footers and disclaimers) are
+        merged before embedding: repeats within the document are folded into
+        their first occurrence, and chunks that duplicate a stored chunk of
+        another document are dropped and added to that chunk's references.
+        `merged_chunks` holds the number of chunks merged by the last call.
+
+        When the summary index is on, the sections and the whole document are
+        summarized and embedded too, and left in `summaries` for the caller to
+        store with `MilvusManager.insert_summaries`.
+
+        Args:
+            file_path (str): The document to process.
+            tags (Optional[Dict[str, str]]): Tenant, department, region and doc_type tags
+                copied into the metadata of every chunk.
+            content_hash (Optional[str]): SHA-256 of the file, stored with every chunk so
+                identical re-uploads can be detected.
+            milvus_manager (Optional[MilvusManager]): The collection the chunks are for,
+                checked for near-duplicates of other documents.
         """
+        self.merged_chunks = 0
+        self.summaries = []
+        tags = normalize_tags(tags)
         logger.info(f"Processing document: {file_path}")
-        raw_text, extracted_images = self._extract_text_and_images(file_path)
-        processed_text = self._describe_images_and_insert_placeholders(raw_text, extracted_images)
-        logger.info(f"Processed text: {processed_text}")
-        text_chunks = self.text_splitter.split_text(processed_text)
-        processed_chunks = self._generate_embeddings(text_chunks)
+        blocks = self._extract_blocks(file_path, content_hash)
+        chunks = self._chunk_blocks(blocks)
+        source = Path(file_path).name
+        for chunk in chunks:
+            chunk["metadata"]["source"] = source
+            if content_hash:
+                chunk["metadata"]["content_hash"] = content_hash
+            chunk["metadata"].update(tags)
+        # Summaries cover the whole document, including chunks merged into other documents below.
+        summary_chunks = list(chunks)
+        merges = {}
+        if detection_enabled():
+            with metrics.timer("ingest.dedup"):
+                chunks, merges = self._merge_near_duplicates(chunks, source, milvus_manager)
+        with metrics.timer("ingest.embed"):
+            processed_chunks = self._generate_embeddings(
+                [chunk["text"] for chunk in chunks],
+                [chunk["metadata"] for chunk in chunks],
+            )
+        if merges:
+            add_references(milvus_manager, merges)
+        if self.generate_questions and processed_chunks:
+            if self._questions_within_budget(processed_chunks):
+                with metrics.timer("ingest.questions"):
+                    self._add_questions(processed_chunks)
+        if self.build_summaries and summary_chunks:
+            groups = group_sections(summary_chunks, self.summary_max_depth)
+            if self._summaries_within_budget(groups):
+                with metrics.timer("ingest.summaries"):
+                    self.summaries = self._summarize_document(groups, {"source": source, **tags})
         logger.info(f"Successfully processed {len(processed_chunks)} chunks from {file_path}")
         return processed_chunks
 
+    def _extract_blocks(self, file_path: str, content_hash: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the text blocks of a document with its images described, read
+        from the extraction cache when the file was extracted before with the
+        same settings. Only complete extractions are cached: none with captions
+        skipped for the budget or failed.
+        """
+        cache = self.extraction_cache if content_hash else None
+        key = cache.key(content_hash, self._extraction_version()) if cache else None
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            self.image_stats = new_image_stats()
+            logger.info(f"Using the cached extraction of {file_path} ({len(cached['blocks'])} blocks).")
+            return cached["blocks"]
+
+        with metrics.timer("ingest.extract"):
+            blocks, extracted_images = self._extract_text_and_images(file_path)
+        with metrics.timer("ingest.images"):
+            blocks = self._describe_images_and_insert_placeholders(blocks, extracted_images)
+        if cache and not self.image_stats["errors"] and not self.image_stats["skipped"].get(OVER_BUDGET):
+            cache.set(key, {"source": Path(file_path).name, "blocks": blocks})
+        return blocks
+
+    def _extraction_version(self) -> Dict[str, Any]:
+        """
+        Returns everything besides the file that determines its extracted text.
+        """
+        return {
+            "version": EXTRACTION_VERSION,
+            "caption_model": CAPTION_MODEL,
+            "image_triage": vars(self.image_triage),
+            "image_bucket": self.s3_bucket_name,
+            "simulated": simulation_enabled(),
+        }
+
+    def _add_questions(self, processed_chunks: List[Dict[str, Any]]):
+        """
+        Generates and embeds likely questions for every chunk, several chunks at a time,
+        and stores them under the chunk's `questions` key.
+        """
+        logger.info(f"Generating {self.questions_per_chunk} questions for each of {len(processed_chunks)} chunks...")
+        with ThreadPoolExecutor(max_workers=self.question_concurrency) as pool:
+            # Each call runs in a copy of this context, so its usage is accounted to the current ingestion.
+            futures = [pool.submit(contextvars.copy_context().run, self._questions_for_chunk, chunk) for chunk in processed_chunks]
+            for chunk, future in zip(processed_chunks, futures):
+                chunk["questions"] = future.result()
+        logger.info(f"Generated {sum(len(chunk['questions']) for chunk in processed_chunks)} questions.")
+
+    def _questions_within_budget(self, processed_chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Returns False, recording the degradation, when generating questions would overspend.
+        """
+        output_tokens = 60 * self.questions_per_chunk
+        estimated_cost = sum(
+            price_of(self.question_model_id, estimate_tokens(chunk["text"]) + 100, output_tokens)
+            + price_of(self.embedding_model_id, output_tokens)
+            for chunk in processed_chunks
+        )
+        if get_budget().allows(estimated_cost, current_tracker()):
+            return True
+        tracker = current_tracker()
+        if tracker is not None:
+            tracker.degrade("questions_skipped")
+        logger.info("Skipping question generation to stay within the cost budget.")
+        return False
+
+    def _summaries_within_budget(self, groups: List[tuple]) -> bool:
+        """
+        Returns False, recording the degradation, when summarizing the document would overspend.
+        """
+        output_tokens = 2 * self.summary_words
+        calls = len(groups) + 1 if len(groups) > 1 else 1
+        estimated_cost = (
+            price_of(self.summary_model_id, sum(estimate_tokens(text) for _, text in groups) + calls * (100 + output_tokens), calls * output_tokens)
+            + price_of(self.embedding_model_id, calls * output_tokens)
+        )
+        if get_budget().allows(estimated_cost, current_tracker()):
+            return True
+        tracker = current_tracker()
+        if tracker is not None:
+            tracker.degrade("summaries_skipped")
+        logger.info("Skipping the document summaries to stay within the cost budget.")
+        return False
+
+    def _summarize_document(self, groups: List[tuple], metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Summarizes every section, several at a time, then the document from its section summaries,
+        and returns the embedded summaries. A document with a single section only gets a document summary.
+        Failures are logged and leave the document without summaries, since its chunks stay searchable.
+        """
+        source = metadata["source"]
+        logger.info(f"Summarizing {len(groups)} sections of {source}...")
+        try:
+            summaries = []
+            if len(groups) > 1:
+                with ThreadPoolExecutor(max_workers=self.summary_concurrency) as pool:
+                    # Each call runs in a copy of this context, so its usage is accounted to the current ingestion.
+                    futures = [
+                        pool.submit(contextvars.copy_context().run, self._summarize, SECTION_SUMMARY_PROMPT, text, source=source, section=section)
+                        for section, text in groups
+                    ]
+                    for (section, _), future in zip(groups, futures):
+                        summaries.append((SECTION, section, future.result()))
+                document_text = "\n\n".join(f"{section or source}: {summary}" for _, section, summary in summaries)
+            else:
+                document_text = groups[0][1]
+            summaries.insert(0, (DOCUMENT, "", self._summarize(DOCUMENT_SUMMARY_PROMPT, document_text, source=source)))
+            embedded = self._generate_embeddings(
+                [f"{summary_label(source, section)}\n{summary}" for _, section, summary in summaries],
+                [{**metadata, "level": level, "section": section} for level, section, _ in summaries],
+            )
+        except Exception as e:
+            logger.warning(f"Could not summarize {source}: {e}")
+            return []
+        logger.info(f"Built {len(embedded)} summaries of {source}.")
+        return embedded
+
+    def _summarize(self, prompt: str, text: str, **fields) -> str:
+        """
+        Asks the LLM for a summary of a section or document. Text already shorter
+        than a summary is used as it is.
+        """
+        if len(text.split()) <= self.summary_words:
+            return text.strip()
+        if self.mock:
+            return " ".join(text.split()[:self.summary_words])
+
+        request_body = {
+            "system": [{"text": SUMMARY_SYSTEM_PROMPT}],
+            "messages": [{"role": "user", "content": [{"text": prompt.format(words=self.summary_words, text=text[:SUMMARY_INPUT_CHARS], **fields)}]}],
+            "inferenceConfig": {"max_new_tokens": 2 * self.summary_words, "temperature": 0.3, "top_p": 0.9},
+        }
+        response_body = get_caller("bedrock_summary").call(self._invoke_bedrock, self.summary_model_id, request_body)
+        self._record_llm_usage("summary", self.summary_model_id, response_body)
+        return response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', '').strip()
+
+    def _questions_for_chunk(self, chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Returns the generated questions of one chunk with their embeddings.
+        Failures are logged and leave the chunk without questions, since it stays searchable directly.
+        """
+        try:
+            questions = self._generate_questions(chunk["text"])
+            return [{"text": item["text"], "embedding": item["embedding"]} for item in self._generate_embeddings(questions)]
+        except Exception as e:
+            logger.warning(f"Could not generate questions for a chunk of {chunk['metadata'].get('source')}: {e}")
+            return []
+
+    def _generate_questions(self, text: str) -> List[str]:
+        """
+        Asks the LLM for questions the chunk answers.
+        """
+        if self.mock:
+            heading = text.split("\n", 1)[0].strip().rstrip(".:")[:100]
+            return [f"What does the policy say about {heading}?"][:self.questions_per_chunk]
+
+        request_body = {
+            "system": [{"text": QUESTION_SYSTEM_PROMPT}],
+            "messages": [{"role": "user", "content": [{"text": QUESTION_PROMPT.format(count=self.questions_per_chunk, text=text)}]}],
+            "inferenceConfig": {"max_new_tokens": 60 * self.questions_per_chunk, "temperature": 0.7, "top_p": 0.9},
+        }
+        response_body = get_caller("bedrock_questions").call(self._invoke_bedrock, self.question_model_id, request_body)
+        self._record_llm_usage("questions", self.question_model_id, response_body)
+        output = response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', '')
+        questions = [QUESTION_LINE_PREFIX_RE.sub("", line).strip() for line in output.splitlines()]
+        return [question for question in questions if len(question) > 10][:self.questions_per_chunk]
+
+    def _merge_near_duplicates(self, chunks: List[Dict[str, Any]], source: str, milvus_manager: Optional[MilvusManager]) -> (List[Dict[str, Any]], Dict[int, List[Dict[str, Any]]]):
+        """
+        Folds near-duplicate chunks into their first occurrence and finds chunks already stored for other documents.
+
+        Returns:
+            The chunks to embed, and the references to add to stored chunks by id.
+        """
+        threshold = near_duplicate_threshold()
+        index = NearDuplicateIndex(threshold)
+        kept, kept_shingles = [], []
+        for chunk in chunks:
+            chunk_shingles = shingles(chunk["text"])
+            signature = minhash(chunk_shingles)
+            chunk["metadata"][BANDS_KEY] = band_keys(signature)
+            # All chunks of a document share its tags, so no scope is needed here.
+            duplicate = index.find(signature)
+            if duplicate is None:
+                index.add(len(kept), signature)
+                kept.append(chunk)
+                kept_shingles.append(chunk_shingles)
+            else:
+                kept[duplicate]["metadata"] = merge_references(kept[duplicate]["metadata"], [reference(chunk["metadata"])])
+        within_document = len(chunks) - len(kept)
+
+        merges = {}
+        if milvus_manager is not None and kept:
+            band_rows: Dict[str, List[Dict[str, Any]]] = {}
+            tenant = kept[0]["metadata"].get(PARTITION_KEY_FIELD)
+            for row in milvus_manager.find_by_bands([key for chunk in kept for key in chunk["metadata"][BANDS_KEY]], tenant):
+                # Chunks of an earlier version of this document are superseded, not merged into.
+                if row["metadata"].get("source") == source or source in (row["metadata"].get(SOURCES_KEY) or []):
+                    continue
+                for key in row["metadata"].get(BANDS_KEY) or []:
+                    band_rows.setdefault(key, []).append(row)
+            row_shingles: Dict[int, set] = {}
+            remaining = []
+            for chunk, chunk_shingles in zip(kept, kept_shingles):
+                best, best_similarity = None, threshold
+                scope = tag_scope(chunk["metadata"])
+                for row in {row["id"]: row for key in chunk["metadata"][BANDS_KEY] for row in band_rows.get(key, [])}.values():
+                    if tag_scope(row["metadata"]) != scope:
+                        continue
+                    if row["id"] not in row_shingles:
+                        row_shingles[row["id"]] = shingles(row["text"])
+                    similarity = jaccard(chunk_shingles, row_shingles[row["id"]])
+                    if similarity >= best_similarity:
+                        best, best_similarity = row, similarity
+                if best is None:
+                    remaining.append(chunk)
+                else:
+                    merges.setdefault(best["id"], []).extend(chunk["metadata"].get(REFERENCES_KEY) or [reference(chunk["metadata"])])
+            kept = remaining
+
+        self.merged_chunks = len(chunks) - len(kept)
+        if self.merged_chunks:
+            logger.info(
+                f"Merged {within_document} repeated chunks within {source} and "
+                f"{self.merged_chunks - within_document} chunks into {len(merges)} stored near-duplicates."
+            )
+        return kept, merges
+
+    def _chunk_blocks(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Splits the document blocks into chunks with the configured strategy.
+        """
+        if self.chunking_strategy == "recursive":
+            text = "\n".join(block["text"] for block in blocks)
+            return [{"text": chunk, "metadata": {}} for chunk in self.text_splitter.split_text(text)]
+        return self.chunker.chunk(blocks)
+
     def _upload_image_to_s3(self, image_bytes: bytes, image_filename: str) -> str:
         """Uploads image bytes to S3 and returns the public URL."""
         if self.mock:
@@ -78,12 +466,14 @@ class DocumentProcessor:
         content_type = mimetypes.guess_type(image_filename)[0] or 'application/octet-stream'
         s3_object_name = f"images/{image_filename}"
         
+        s3 = get_caller("s3")
         try:
-            self.s3_client.head_object(Bucket=self.s3_bucket_name, Key=s3_object_name)
+            s3.call(self.s3_client.head_object, Bucket=self.s3_bucket_name, Key=s3_object_name)
             logger.info(f"Image already exists in S3: s3://{self.s3_bucket_name}/{s3_object_name}")
         except ClientError as e:
             if e.response['Error']['Code'] == '404':
-                self.s3_client.upload_fileobj(
+                s3.call(
+                    self.s3_client.upload_fileobj,
                     io.BytesIO(image_bytes),
                     self.s3_bucket_name,
                     s3_object_name,
@@ -97,10 +487,12 @@ class DocumentProcessor:
         # Return the public URL of the image
         return f"https://{self.s3_bucket_name}.s3.amazonaws.com/{s3_object_name}"
 
-    def _extract_text_and_images(self, file_path: str) -> (str, List[Dict[str, Any]]):
+    def _extract_text_and_images(self, file_path: str) -> (List[Dict[str, Any]], List[Dict[str, Any]]):
         """
-        Extracts text and images from a given document (PDF or DOCX).
-        Images are handled in memory and passed to subsequent functions.
+        Extracts text blocks and images from a given document (PDF or DOCX).
+        Each block is a dict with `text`, `page` (None when unknown) and
+        `heading_level` (0 for body text). Images are handled in memory and
+        referenced from the blocks by placeholders.
         """
         file_extension = Path(file_path).suffix.lower()
         if file_extension == ".pdf":
@@ -110,112 +502,158 @@ class DocumentProcessor:
         else:
             raise ValueError(f"Unsupported file type: {file_extension}")
 
-    def _extract_from_pdf(self, file_path: str) -> (str, List[Dict[str, Any]]):
-        """Extracts text and image bytes from a PDF file."""
+    def _extract_from_pdf(self, file_path: str) -> (List[Dict[str, Any]], List[Dict[str, Any]]):
+        """
+        Extracts text blocks and image bytes from a PDF file. Large files are
+        parsed in page ranges across worker processes (see `read_pdf`).
+        """
         logger.info(f"Extracting from PDF: {file_path}")
-        text = ""
-        extracted_images = []
-        doc = fitz.open(file_path)
-
-        for page_num, page in enumerate(doc):
-            text += page.get_text()
-            image_list = page.get_images(full=True)
-            for img_index, img in enumerate(image_list):
-                xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_bytes = base_image["image"]
-                image_ext = base_image["ext"]
-                
-                image_filename = f"pdf_{Path(file_path).stem}_p{page_num+1}_img{img_index+1}.{image_ext}"
-                placeholder = f"\n[image_placeholder:{image_filename}]\n"
-                text += placeholder
-                
-                extracted_images.append({"bytes": image_bytes, "filename": image_filename})
-
-        doc.close()
-        logger.info(f"Extracted {len(extracted_images)} images from {file_path}")
-        return text, extracted_images
-
-    def _extract_from_docx(self, file_path: str) -> (str, List[Dict[str, Any]]):
-        """Extracts text and image bytes from a DOCX file, preserving their order."""
+        blocks, extracted_images, font_size_chars = read_pdf(file_path, image_prefix=f"pdf_{Path(file_path).stem}")
+        self._assign_pdf_heading_levels(blocks, font_size_chars)
+        logger.info(f"Extracted {len(blocks)} text blocks and {len(extracted_images)} images from {file_path}")
+        return blocks, extracted_images
+
+    @staticmethod
+    def _assign_pdf_heading_levels(blocks: List[Dict[str, Any]], font_size_chars: Counter):
+        """
+        Marks short blocks set in a larger font than the body text as headings.
+        The largest heading font becomes level 1, the next level 2, and so on.
+        """
+        body_size = font_size_chars.most_common(1)[0][0] if font_size_chars else 0.0
+        headings = [
+            block for block in blocks
+            if body_size and block["font_size"] >= body_size * HEADING_FONT_RATIO and len(block["text"]) <= HEADING_MAX_CHARS
+        ]
+        heading_sizes = sorted({block["font_size"] for block in headings}, reverse=True)[:3]
+        heading_ids = {id(block) for block in headings}
+        for block in blocks:
+            font_size = block.pop("font_size")
+            is_heading = id(block) in heading_ids and font_size in heading_sizes
+            block["heading_level"] = heading_sizes.index(font_size) + 1 if is_heading else 0
+
+    def _extract_from_docx(self, file_path: str) -> (List[Dict[str, Any]], List[Dict[str, Any]]):
+        """
+        Extracts paragraph and table blocks and image bytes from a DOCX file, preserving their order.
+        Tables become Markdown blocks of whole rows, each repeating the header rows, with the cell
+        texts kept under the block's `rows` key.
+        """
         logger.info(f"Extracting from DOCX: {file_path}")
-        doc = docx.Document(file_path)
-        text_content = ""
+        blocks = []
         extracted_images = []
-        
-        image_part_map = {
-            rId: rel.target_part
-            for rId, rel in doc.part.rels.items()
-            if "image" in rel.target_ref
-        }
-        
-        img_counter = 0
-        NAMESPACES = {
-            'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-            'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-            'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-        }
+        tables = 0
+        for element in iter_docx(file_path, f"docx_{Path(file_path).stem}"):
+            extracted_images.extend(element["images"])
+            if element["type"] == "paragraph":
+                blocks.append({"text": element["text"], "page": None, "heading_level": heading_level(element["style"])})
+                continue
+            tables += 1
+            for text, rows in self._table_blocks(element["rows"], element["header_rows"]):
+                blocks.append({"text": text, "page": None, "heading_level": 0, "rows": rows})
 
-        for para in doc.paragraphs:
-            para_content = ""
-            for run in para.runs:
-                drawing_elems = run.element.findall('.//w:drawing', namespaces=NAMESPACES)
-                if drawing_elems:
-                    for drawing in drawing_elems:
-                        blip_elems = drawing.findall('.//a:blip', namespaces=NAMESPACES)
-                        for blip in blip_elems:
-                            rId = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-                            if rId and rId in image_part_map:
-                                image_part = image_part_map[rId]
-                                image_bytes = image_part.blob
-                                
-                                img_counter += 1
-                                image_ext = image_part.content_type.split('/')[-1]
-                                if image_ext == "jpeg": image_ext = "jpg"
-                                
-                                image_filename = f"docx_{Path(file_path).stem}_img{img_counter}.{image_ext}"
-                                placeholder = f"\n[image_placeholder:{image_filename}]\n"
-                                para_content += placeholder
-                                extracted_images.append({"bytes": image_bytes, "filename": image_filename})
-                else:
-                    para_content += run.text
-            text_content += para_content + "\n"
+        logger.info(f"Extracted {len(blocks)} blocks, {tables} tables and {len(extracted_images)} images from {file_path}")
+        return blocks, extracted_images
 
-        logger.info(f"Extracted {len(extracted_images)} images from {file_path}")
-        return text_content, extracted_images
+    def _table_blocks(self, rows: List[List[str]], header_rows: int) -> List[tuple]:
+        """
+        Renders a table as Markdown, split between rows into blocks that each fit in a chunk.
 
-    def _describe_images_and_insert_placeholders(self, text: str, images: List[Dict[str, Any]]) -> str:
+        Returns:
+            List[tuple]: The text of each block and the rows it holds, header rows included.
         """
-        Uploads images to S3, gets descriptions, and inserts info into text.
+        cell = lambda text: text.replace("\n", " ").replace("|", "\\|")
+        lines = [f"| {' | '.join(cell(text) for text in row)} |" for row in rows]
+        header = lines[:header_rows]
+        if header:
+            header.append(f"|{'|'.join(' --- ' for _ in rows[header_rows - 1])}|")
+        budget = self.chunker.max_size - self.chunker.measure("\n".join(header))
+        groups, group, size = [], [], 0
+        for row, line in zip(rows[header_rows:], lines[header_rows:]):
+            line_size = self.chunker.measure(line)
+            if group and size + line_size > budget:
+                groups.append(group)
+                group, size = [], 0
+            group.append((row, line))
+            size += line_size
+        if group or not groups:
+            groups.append(group)
+        return [
+            ("\n".join(header + [line for _, line in group]), rows[:header_rows] + [row for row, _ in group])
+            for group in groups
+        ]
+
+    def _describe_images_and_insert_placeholders(self, blocks: List[Dict[str, Any]], images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Uploads images to S3, gets descriptions, and inserts info into the blocks.
+
+        Decorative images are dropped along with their placeholders, the rest are
+        downscaled before captioning, and an image repeated in the document (a logo
+        on every page) is captioned once. Counts and bytes are kept in `image_stats`.
         """
+        self.image_stats = new_image_stats()
         if not images:
-            return text
+            return blocks
 
         logger.info(f"Describing and processing {len(images)} images...")
+        image_infos = {}
+        described = {}
+        budget, tracker = get_budget(), current_tracker()
         for image_data in images:
             image_bytes = image_data["bytes"]
             image_filename = image_data["filename"]
+            self.image_stats["images"] += 1
+            self.image_stats["bytes_embedded"] += len(image_bytes)
+
+            digest = hashlib.sha256(image_bytes).hexdigest()
+            if digest in described:
+                self.image_stats["duplicates"] += 1
+                image_infos[image_filename] = described[digest]
+                continue
+
+            prepared = self.image_triage.prepare(image_bytes)
+            if not prepared.keep:
+                skipped = self.image_stats["skipped"]
+                skipped[prepared.reason] = skipped.get(prepared.reason, 0) + 1
+                described[digest] = image_infos[image_filename] = ""
+                continue
 
             # Upload to S3 and get public URL
             s3_url = self._upload_image_to_s3(image_bytes, image_filename)
-            
-            # Get image description from bytes
-            description = self._get_image_description(image_bytes)
+
+            if budget.allows(estimate_caption(CAPTION_MODEL), tracker):
+                # Get image description from the downscaled bytes
+                description = self._get_image_description(prepared.data, prepared.format)
+                self.image_stats["captioned"] += 1
+                self.image_stats["bytes_sent"] += len(prepared.data)
+            else:
+                # Keep the link to the image, without paying for its caption.
+                if not self.image_stats["skipped"].get(OVER_BUDGET) and tracker is not None:
+                    tracker.degrade("captions_skipped")
+                self.image_stats["skipped"][OVER_BUDGET] = self.image_stats["skipped"].get(OVER_BUDGET, 0) + 1
+                description = ""
             
             image_info = {
                 "description": description,
                 "imgpath": s3_url
             }
-            info_str = f"[image_info]{json.dumps(image_info)}[/image_info]"
-            
-            placeholder = f"[image_placeholder:{image_filename}]"
-            text = text.replace(placeholder, info_str)
-            
-        return text
+            described[digest] = image_infos[image_filename] = f"[image_info]{json.dumps(image_info)}[/image_info]"
+
+        stats = self.image_stats
+        logger.info(
+            f"Captioned {stats['captioned']} of {stats['images']} images ({stats['duplicates']} repeats, skipped {stats['skipped'] or 'none'}); "
+            f"sent {stats['bytes_sent']} of {stats['bytes_embedded']} embedded bytes."
+        )
+        metrics.incr("ingest.images.captioned", stats["captioned"])
+        metrics.incr("ingest.images.skipped", sum(stats["skipped"].values()) + stats["duplicates"])
+        metrics.incr("ingest.images.bytes_sent", stats["bytes_sent"])
+        metrics.incr("ingest.images.bytes_embedded", stats["bytes_embedded"])
+
+        replace = lambda match: image_infos.get(match.group(1), match.group(0))
+        return [dict(block, text=IMAGE_PLACEHOLDER_RE.sub(replace, block["text"])) for block in blocks]
 
-    def _get_image_description(self, image_bytes: bytes) -> str:
+    def _get_image_description(self, image_bytes: bytes, image_format: Optional[str] = None) -> str:
         """
         Generates a text description for a single image's bytes using a multimodal LLM.
+        The format is detected from the bytes when not given.
         """
         if self.mock:
             logger.info(f"Getting mock description for an image...")
@@ -226,11 +664,12 @@ class DocumentProcessor:
             base64_image = base64.b64encode(image_bytes).decode("utf-8")
             
             # Infer image format from bytes if possible, otherwise default
-            try:
-                img = Image.open(io.BytesIO(image_bytes))
-                image_format = img.format.lower() if img.format else 'png'
-            except Exception:
-                image_format = 'png' # Default if format detection fails
+            if image_format is None:
+                try:
+                    img = Image.open(io.BytesIO(image_bytes))
+                    image_format = img.format.lower() if img.format else 'png'
+                except Exception:
+                    image_format = 'png' # Default if format detection fails
 
             content = [
                 {
@@ -245,40 +684,47 @@ class DocumentProcessor:
                 "messages": [{"role": "user", "content": content}],
                 "inferenceConfig": {"max_new_tokens": 300, "temperature": 0.5, "top_p": 0.9}
             }
-            response_body = self._invoke_bedrock("apac.amazon.nova-lite-v1:0", request_body)
+            response_body = get_caller("bedrock_caption").call(self._invoke_bedrock, CAPTION_MODEL, request_body)
+            self._record_llm_usage("caption", CAPTION_MODEL, response_body)
             return response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', '')
 
         except Exception as e:
             logger.exception(f"Error getting image description: {e}")
+            self.image_stats["errors"] += 1
             return f"Error describing image: {e}"
 
-    def _generate_embeddings(self, text_chunks: List[str]) -> List[Dict[str, Any]]:
+    def _generate_embeddings(self, text_chunks: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         """
         Generates vector embeddings for a list of text chunks using Bedrock.
         """
+        metadatas = metadatas or [{} for _ in text_chunks]
         if self.mock:
             logger.info(f"Generating embeddings for {len(text_chunks)} chunks (mock)...")
-            return [{"text": chunk, "embedding": [0.0] * 1536, "metadata": {}} for chunk in text_chunks]
+            return [{"text": chunk, "embedding": pseudo_embedding(chunk, self.embedding_dim), "metadata": metadata} for chunk, metadata in zip(text_chunks, metadatas)]
 
         logger.info(f"Generating embeddings for {len(text_chunks)} chunks (real)...")
+        embedding_caller = get_caller("bedrock_embedding")
         processed_chunks = []
-        for chunk in text_chunks:
+        for index, (chunk, metadata) in enumerate(zip(text_chunks, metadatas)):
             try:
-                body = json.dumps({"inputText": chunk})
-                response = self.bedrock_client.invoke_model(
-                    body=body,
-                    modelId=self.embedding_model_id,
-                    accept="application/json",
-                    contentType="application/json"
-                )
-                response_body = json.loads(response.get("body").read())
+                body = {"inputText": chunk, "dimensions": self.embedding_dim, "normalize": True}
+                response_body = embedding_caller.call(self._invoke_bedrock, self.embedding_model_id, body)
                 embedding = response_body.get("embedding")
-                processed_chunks.append({"text": chunk, "embedding": embedding, "metadata": {}})
+                record_usage("embedding", self.embedding_model_id, input_tokens=response_body.get("inputTextTokenCount", 0))
+                processed_chunks.append({"text": chunk, "embedding": embedding, "metadata": metadata})
             except Exception as e:
-                logger.exception(f"Error generating embedding for chunk: {e}")
-                continue
+                # A partially embedded document would silently lose content, so fail the ingestion instead.
+                raise RuntimeError(f"Failed to embed chunk {index + 1} of {len(text_chunks)}: {e}") from e
         return processed_chunks
     
+    @staticmethod
+    def _record_llm_usage(operation: str, model_id: str, response_body: Dict[str, Any]):
+        """
+        Records the token usage reported by a Bedrock Converse-style response.
+        """
+        usage = response_body.get("usage", {})
+        record_usage(operation, model_id, input_tokens=usage.get("inputTokens", 0), output_tokens=usage.get("outputTokens", 0))
+
     def _invoke_bedrock(self, model_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
         """Generic method to invoke a Bedrock model."""
         try:
@@ -0,0 +1,240 @@
+import posixpath
+import re
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional
+
+from lxml import etree
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+_PACKAGE_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+_OFFICE_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+_IMAGE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
+# Tags handled by the parser; lxml skips events for all others without calling back into Python.
+_P, _T, _TAB, _BR, _CR, _R_TAG = _W + "p", _W + "t", _W + "tab", _W + "br", _W + "cr", _W + "r"
+_TBL, _TR, _TC, _TBL_HEADER, _P_STYLE = _W + "tbl", _W + "tr", _W + "tc", _W + "tblHeader", _W + "pStyle"
+_BLIP, _FALLBACK = _A + "blip", _MC + "Fallback"
+_TAGS = {_P, _T, _TAB, _BR, _CR, _TBL, _TR, _TC, _TBL_HEADER, _P_STYLE, _BLIP, _FALLBACK}
+
+_HEADING_STYLE_RE = re.compile(r"heading (\d+)$", re.IGNORECASE)
+
+
+def image_placeholder(filename: str) -> str:
+    """
+    Returns the marker that stands for an image in extracted text until it is captioned.
+    """
+    return f"[image_placeholder:{filename}]"
+
+
+def heading_level(style_name: Optional[str]) -> int:
+    """
+    Derives a heading level from a paragraph style name ("Title" is 1, "Heading N" is N + 1).
+    """
+    if not isinstance(style_name, str):
+        return 0
+    if style_name.lower() == "title":
+        return 1
+    match = _HEADING_STYLE_RE.match(style_name)
+    return int(match.group(1)) + 1 if match else 0
+
+
+def iter_docx(file_path: str, image_prefix: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the body of a DOCX file as paragraphs and tables, in document order.
+
+    The document XML is read in a single pass with `iterparse`, and every
+    top-level element is released once it has been emitted, so memory stays
+    flat on long documents. Paragraphs are yielded as
+    `{"type": "paragraph", "text", "style", "images"}` and tables as
+    `{"type": "table", "rows", "header_rows", "images"}`, where `rows` holds the
+    cell texts of every row and the first `header_rows` rows are the rows Word
+    repeats on each page (at least one for a table with several rows). Text
+    boxes are folded into their paragraph, nested tables into their cell, and
+    images are replaced by placeholders and returned, with their bytes, in the
+    `images` of the element they appear in.
+
+    Args:
+        file_path (str): The DOCX file.
+        image_prefix (str): Prefix of the generated image file names.
+    """
+    with zipfile.ZipFile(file_path) as package:
+        document_path = _main_document_path(package)
+        styles = _style_names(package, posixpath.join(posixpath.dirname(document_path), "styles.xml"))
+        images = _image_targets(package, document_path)
+        reader = _BodyReader(package, styles, images, image_prefix)
+        with package.open(document_path) as document:
+            yield from reader.read(document)
+
+
+def _main_document_path(package: zipfile.ZipFile) -> str:
+    """
+    Returns the path of the main document part, as declared in the package relationships.
+    """
+    try:
+        rels = etree.fromstring(package.read("_rels/.rels"))
+    except KeyError:
+        return "word/document.xml"
+    for rel in rels.iter(_PACKAGE_RELS):
+        if rel.get("Type") == _OFFICE_DOCUMENT:
+            return rel.get("Target").lstrip("/")
+    return "word/document.xml"
+
+
+def _style_names(package: zipfile.ZipFile, styles_path: str) -> Dict[str, str]:
+    """
+    Maps paragraph style ids to their names.
+    """
+    try:
+        styles = etree.fromstring(package.read(styles_path))
+    except KeyError:
+        return {}
+    names = {}
+    for style in styles.iter(_W + "style"):
+        name = style.find(_W + "name")
+        if name is not None:
+            names[style.get(_W + "styleId")] = name.get(_W + "val")
+    return names
+
+
+def _image_targets(package: zipfile.ZipFile, document_path: str) -> Dict[str, str]:
+    """
+    Maps the relationship ids of the document's embedded images to their paths in the package.
+    """
+    directory, name = posixpath.split(document_path)
+    try:
+        rels = etree.fromstring(package.read(posixpath.join(directory, "_rels", f"{name}.rels")))
+    except KeyError:
+        return {}
+    return {
+        rel.get("Id"): posixpath.normpath(posixpath.join(directory, rel.get("Target")))
+        for rel in rels.iter(_PACKAGE_RELS)
+        if rel.get("Type") == _IMAGE and rel.get("TargetMode") != "External"
+    }
+
+
+class _BodyReader:
+    """
+    The state of one pass over a document body: open paragraphs, tables and cells.
+    """
+
+    def __init__(self, package: zipfile.ZipFile, styles: Dict[str, str], images: Dict[str, str], image_prefix: str):
+        self.package = package
+        self.styles = styles
+        self.image_targets = images
+        self.image_prefix = image_prefix
+        self.image_count = 0
+        self.paragraphs: List[Dict[str, Any]] = []
+        self.tables: List[Dict[str, Any]] = []
+        self.cells: List[List[str]] = []
+        self.images: List[Dict[str, Any]] = []
+        self.skip = 0
+
+    def read(self, document) -> Iterator[Dict[str, Any]]:
+        for event, element in etree.iterparse(document, events=("start", "end"), tag=_TAGS):
+            tag = element.tag
+            if tag == _FALLBACK:
+                # Alternate content repeats the preferred choice for older readers.
+                self.skip += 1 if event == "start" else -1
+                continue
+            if self.skip:
+                continue
+            if event == "start":
+                self._start(tag)
+                continue
+
+            item = self._end(tag, element)
+            if item is not None:
+                item["images"], self.images = self.images, []
+                yield item
+            if (tag == _P or tag == _TBL) and not self.paragraphs and not self.tables:
+                # Release the finished top-level element and everything before it.
+                element.clear()
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+
+    def _start(self, tag: str):
+        if tag == _P:
+            self.paragraphs.append({"parts": [], "style": None})
+        elif tag == _TBL:
+            self.tables.append({"rows": [], "header_rows": 0, "headers_done": False})
+        elif tag == _TR and self.tables:
+            self.tables[-1]["rows"].append([])
+        elif tag == _TC:
+            self.cells.append([])
+
+    def _end(self, tag: str, element) -> Optional[Dict[str, Any]]:
+        if tag == _T:
+            if self.paragraphs:
+                self.paragraphs[-1]["parts"].append(element.text or "")
+        elif tag in (_TAB, _BR, _CR):
+            if self.paragraphs and element.getparent().tag == _R_TAG:
+                self.paragraphs[-1]["parts"].append("\t" if tag == _TAB else "\n")
+        elif tag == _P_STYLE:
+            if self.paragraphs:
+                style_id = element.get(_W + "val")
+                self.paragraphs[-1]["style"] = self.styles.get(style_id, style_id)
+        elif tag == _BLIP:
+            self._add_image(element.get(_R + "embed"))
+        elif tag == _P:
+            return self._end_paragraph()
+        elif tag == _TBL_HEADER:
+            table = self.tables[-1] if self.tables else None
+            if table and not table["headers_done"] and element.get(_W + "val", "true") not in ("0", "false"):
+                table["header_rows"] += 1
+        elif tag == _TR:
+            if self.tables:
+                table = self.tables[-1]
+                table["headers_done"] = table["headers_done"] or table["header_rows"] < len(table["rows"])
+        elif tag == _TC:
+            text = "\n".join(part.strip() for part in self.cells.pop() if part.strip())
+            if self.tables and self.tables[-1]["rows"]:
+                self.tables[-1]["rows"][-1].append(text)
+        elif tag == _TBL:
+            return self._end_table()
+        return None
+
+    def _add_image(self, relationship_id: Optional[str]):
+        target = self.image_targets.get(relationship_id)
+        if not target or not self.paragraphs:
+            return
+        try:
+            image_bytes = self.package.read(target)
+        except KeyError:
+            return
+        self.image_count += 1
+        extension = posixpath.splitext(target)[1].lstrip(".").lower() or "png"
+        if extension == "jpeg":
+            extension = "jpg"
+        filename = f"{self.image_prefix}_img{self.image_count}.{extension}"
+        self.paragraphs[-1]["parts"].append(f"\n{image_placeholder(filename)}\n")
+        self.images.append({"bytes": image_bytes, "filename": filename})
+
+    def _end_paragraph(self) -> Optional[Dict[str, Any]]:
+        paragraph = self.paragraphs.pop()
+        text = "".join(paragraph["parts"])
+        if self.paragraphs:
+            # A text box inside a paragraph.
+            if text.strip():
+                self.paragraphs[-1]["parts"].append("\n" + text)
+        elif self.cells:
+            self.cells[-1].append(text)
+        else:
+            return {"type": "paragraph", "text": text, "style": paragraph["style"]}
+        return None
+
+    def _end_table(self) -> Optional[Dict[str, Any]]:
+        table = self.tables.pop()
+        rows = [row for row in table["rows"] if any(row)]
+        header_rows = table["header_rows"] if table["header_rows"] < len(rows) else 0
+        if not header_rows and len(rows) > 1:
+            # Most tables are laid out with their column titles in the first row.
+            header_rows = 1
+        if self.cells:
+            # A nested table becomes text in the enclosing cell.
+            self.cells[-1].append("\n".join(" | ".join(row) for row in rows))
+            return None
+        return {"type": "table", "rows": rows, "header_rows": header_rows}
@@ -0,0 +1,121 @@
+import gzip
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from .metrics import metrics
+from .shared_cache import cache_key
+
+# Where `rag train` and `rag serve` keep extracted documents unless EXTRACTION_CACHE_DIR is set.
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "rag_extraction_cache")
+
+
+class ExtractionCache:
+    """
+    Keeps the text extracted from documents, with their images captioned, in
+    gzipped JSON files, so that re-chunking and re-embedding a document skips
+    parsing it and paying for its captions again.
+
+    Entries are keyed by the file's content hash and by everything that changes
+    the extraction (the processor version, the caption model and the image
+    triage settings), so a change to any of them misses instead of serving
+    stale text. Beyond `max_bytes`, the least recently used files go first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            directory (str): Where the entries are written, created if missing.
+            max_bytes (int): Total size of the entries kept.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["ExtractionCache"]:
+        """
+        Opens the cache at `EXTRACTION_CACHE_DIR`, or returns None when the variable is unset or "off".
+
+        `EXTRACTION_CACHE_MAX_MB` bounds its size.
+        """
+        directory = os.environ.get("EXTRACTION_CACHE_DIR", "")
+        if not directory or directory.lower() == "off":
+            return None
+        try:
+            return cls(directory, max_bytes=int(float(os.environ.get("EXTRACTION_CACHE_MAX_MB", 512)) * 1024 * 1024))
+        except OSError as e:
+            logger.warning(f"Extraction cache unavailable at {directory}: {e}")
+            return None
+
+    @staticmethod
+    def key(content_hash: str, version: Dict[str, Any]) -> str:
+        """
+        Returns the entry key of a file's extraction with the given processor settings.
+        """
+        return cache_key(content_hash, version)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached extraction, or None if it is missing or unreadable.
+        """
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rb") as file:
+                value = json.loads(file.read())
+            os.utime(path)
+        except FileNotFoundError:
+            metrics.incr("ingest.extraction_cache.misses")
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the cached extraction {path}: {e}")
+            metrics.incr("ingest.extraction_cache.misses")
+            return None
+        metrics.incr("ingest.extraction_cache.hits")
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """
+        Stores an extraction. Failures are logged, since the cache is only an optimization.
+        """
+        path = self._path(key)
+        try:
+            # Written under a temporary name and renamed, so a concurrent reader never sees a partial file.
+            data = gzip.compress(json.dumps(value).encode(), compresslevel=1)
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as file:
+                file.write(data)
+            os.replace(file.name, path)
+            self.prune()
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not cache the extraction {path}: {e}")
+
+    def prune(self) -> int:
+        """
+        Deletes the least recently used entries beyond `max_bytes`.
+
+        Returns:
+            int: The number of entries deleted.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json.gz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        deleted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            deleted += 1
+        return deleted
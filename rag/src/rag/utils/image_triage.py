@@ -0,0 +1,140 @@
+import io
+import os
+from typing import Any, Dict, Optional
+
+from PIL import Image, UnidentifiedImageError
+
+# Formats the captioning model accepts as they are.
+CAPTION_FORMATS = {"png": "png", "jpeg": "jpeg", "jpg": "jpeg", "gif": "gif", "webp": "webp"}
+
+# Reasons an image is not captioned.
+TOO_SMALL = "too_small"
+EXTREME_ASPECT = "extreme_aspect"
+LOW_ENTROPY = "low_entropy"
+UNREADABLE = "unreadable"
+
+
+class PreparedImage:
+    """
+    The outcome of triaging one embedded image.
+    """
+
+    def __init__(self, keep: bool, reason: Optional[str] = None, data: bytes = b"", image_format: Optional[str] = None,
+                 width: int = 0, height: int = 0):
+        """
+        Args:
+            keep (bool): Whether the image is worth captioning.
+            reason (Optional[str]): Why it was dropped, e.g. "too_small".
+            data (bytes): The bytes to send for captioning, possibly downscaled and recompressed.
+            image_format (Optional[str]): The format of `data` ("png", "jpeg", ...).
+            width (int): Width of `data` in pixels.
+            height (int): Height of `data` in pixels.
+        """
+        self.keep = keep
+        self.reason = reason
+        self.data = data
+        self.format = image_format
+        self.width = width
+        self.height = height
+
+
+class ImageTriage:
+    """
+    Drops decorative images and shrinks the rest before they are sent for captioning.
+
+    Bullets, icons, rules and spacers are recognised by their size, aspect ratio
+    and the entropy of their grey-level histogram, which is close to zero only
+    for blank or single-colour images (sparse line diagrams still score ~0.1 bits). Images larger than `max_side` are downscaled; photos are
+    re-encoded as JPEG, while transparent images and flat graphics of at most 256
+    colours (charts, diagrams) become optimised PNG. The original bytes are kept
+    whenever re-encoding would not make them smaller.
+    """
+
+    def __init__(self, min_side: int = 48, min_pixels: int = 10000, max_aspect: float = 8.0, min_entropy: float = 0.05,
+                 max_side: int = 1024, jpeg_quality: int = 80):
+        """
+        Args:
+            min_side (int): Images narrower or shorter than this many pixels are dropped.
+            min_pixels (int): Images with fewer pixels than this are dropped.
+            max_aspect (float): Images more elongated than this ratio (rules, borders) are dropped.
+            min_entropy (float): Images whose grey-level entropy in bits is lower are dropped.
+            max_side (int): The longest side, in pixels, of the images sent for captioning.
+            jpeg_quality (int): JPEG quality used when recompressing.
+        """
+        self.min_side = min_side
+        self.min_pixels = min_pixels
+        self.max_aspect = max_aspect
+        self.min_entropy = min_entropy
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+
+    @classmethod
+    def from_env(cls) -> "ImageTriage":
+        """
+        Builds the triage from `IMAGE_MIN_SIDE`, `IMAGE_MIN_PIXELS`, `IMAGE_MAX_ASPECT`,
+        `IMAGE_MIN_ENTROPY`, `IMAGE_MAX_SIDE` and `IMAGE_JPEG_QUALITY`.
+        """
+        return cls(
+            min_side=int(os.environ.get("IMAGE_MIN_SIDE", 48)),
+            min_pixels=int(os.environ.get("IMAGE_MIN_PIXELS", 10000)),
+            max_aspect=float(os.environ.get("IMAGE_MAX_ASPECT", 8.0)),
+            min_entropy=float(os.environ.get("IMAGE_MIN_ENTROPY", 0.05)),
+            max_side=int(os.environ.get("IMAGE_MAX_SIDE", 1024)),
+            jpeg_quality=int(os.environ.get("IMAGE_JPEG_QUALITY", 80)),
+        )
+
+    def prepare(self, image_bytes: bytes) -> PreparedImage:
+        """
+        Decides whether an image is worth captioning and returns the bytes to send.
+
+        Args:
+            image_bytes (bytes): The image as embedded in the document.
+
+        Returns:
+            PreparedImage: The decision and, for kept images, the bytes and format to send.
+        """
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+        except (UnidentifiedImageError, OSError, ValueError):
+            return PreparedImage(False, UNREADABLE)
+
+        width, height = image.size
+        if min(width, height) < self.min_side or width * height < self.min_pixels:
+            return PreparedImage(False, TOO_SMALL, width=width, height=height)
+        if max(width, height) / min(width, height) > self.max_aspect:
+            return PreparedImage(False, EXTREME_ASPECT, width=width, height=height)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        sample = image.copy()
+        sample.thumbnail((256, 256))
+        if sample.convert("L").entropy() < self.min_entropy:
+            return PreparedImage(False, LOW_ENTROPY, width=width, height=height)
+
+        original_format = CAPTION_FORMATS.get((image.format or "").lower())
+        resized = max(width, height) > self.max_side
+        if resized:
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        if has_alpha:
+            image.convert("RGBA").save(buffer, format="PNG", optimize=True)
+            image_format = "png"
+        elif image.getcolors(256) is not None:
+            image.convert("RGB").save(buffer, format="PNG", optimize=True)
+            image_format = "png"
+        else:
+            image.convert("RGB").save(buffer, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            image_format = "jpeg"
+        data = buffer.getvalue()
+
+        if not resized and original_format and len(image_bytes) <= len(data):
+            return PreparedImage(True, data=image_bytes, image_format=original_format, width=width, height=height)
+        return PreparedImage(True, data=data, image_format=image_format, width=image.width, height=image.height)
+
+
+def new_image_stats() -> Dict[str, Any]:
+    """
+    Returns empty per-document image counters.
+    """
+    return {"images": 0, "captioned": 0, "errors": 0, "skipped": {}, "duplicates": 0, "bytes_embedded": 0, "bytes_sent": 0}
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+
+# Latency samples kept per timer; older samples are dropped.
+MAX_SAMPLES = 10000
+
+
+class Metrics:
+    """
+    A minimal, thread-safe in-process registry of named counters and latency timers.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty metrics registry.
+        """
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(int)
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+    def incr(self, name: str, value: float = 1):
+        """
+        Increments a counter.
+
+        Args:
+            name (str): The counter name, dot-separated by convention (e.g. "query.coalesced").
+            value (float): The amount to add.
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        """
+        Records one latency sample.
+
+        Args:
+            name (str): The timer name, e.g. "retrieve.embed".
+            seconds (float): The observed duration.
+        """
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Records the duration of the `with` block as a latency sample, whether or not it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def latency_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the sample count, mean and p50/p95/p99 in seconds of every timer.
+        """
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items() if values}
+        summary = {}
+        for name, values in sorted(samples.items()):
+            pick = lambda pct: values[min(len(values) - 1, int(pct / 100 * len(values)))]
+            summary[name] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values), 4),
+                "p50": round(pick(50), 4),
+                "p95": round(pick(95), 4),
+                "p99": round(pick(99), 4),
+            }
+        return summary
+
+    def get(self, name: str) -> float:
+        """
+        Returns the current value of a counter, or 0 if it was never incremented.
+        """
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Returns a point-in-time copy of all counters.
+        """
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def reset(self):
+        """
+        Clears all counters and latency samples.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+
+
+# Process-wide registry shared by the API and the utilities.
+metrics = Metrics()
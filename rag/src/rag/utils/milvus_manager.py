@@ -1,21 +1,122 @@
-from pymilvus import connections, utility, FieldSchema, CollectionSchema, DataType, Collection
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+from pymilvus import connections, utility, FieldSchema, CollectionSchema, DataType, Collection, MilvusException
+from pymilvus.client.types import LoadState
 from loguru import logger
 
+# Output dimensions supported by Titan Text Embeddings v2.
+SUPPORTED_DIMENSIONS = (256, 512, 1024)
+# "none": float32 IVF_FLAT; "sq8": 8-bit scalar-quantized IVF_SQ8. Reduced dimensions
+# shrink everything a collection loads; sq8 shrinks the index, while the float vectors
+# re-scoring reads stay loaded beside it unless the field is memory-mapped. There is no
+# binary mode: Milvus 2.4 loads every vector field of a collection, so sign bits would
+# add to that memory rather than replace it.
+SUPPORTED_QUANTIZATIONS = ("none", "sq8")
+# Scalar tags that scope a search. `tenant` is the partition key, so a tenant
+# filter prunes whole partitions; the others are pre-filters applied before the ANN search.
+TAG_FIELDS = ("tenant", "department", "region", "doc_type")
+PARTITION_KEY_FIELD = "tenant"
+DEFAULT_TENANT = "default"
+TAG_MAX_LENGTH = 128
+# Superseded and archived chunks live in a companion collection that is only
+# loaded for historical queries. Partition-key collections cannot have manual
+# partitions, so the cold tier is a collection rather than a partition.
+ARCHIVE_SUFFIX = "_archive"
+TIERS = ("hot", "archive")
+MOVE_BATCH_SIZE = 1000
+# Questions generated for hot chunks at ingest time live in a companion
+# collection; each row points back to its chunk through `parent_id`.
+QUESTIONS_SUFFIX = "_questions"
+QUESTION_MAX_LENGTH = 2048
+# Summaries of whole documents and of their sections, built at ingest time for
+# broad questions, live in a companion collection tagged with their level.
+SUMMARIES_SUFFIX = "_summaries"
+SUMMARY_LEVELS = ("document", "section")
+SUMMARY_MAX_LENGTH = 8192
+SOURCE_MAX_LENGTH = 1024
+
+# When each archive collection was last searched in this process, for idle release.
+_archive_last_used: Dict[str, float] = {}
+_archive_lock = threading.Lock()
+
+
+def normalize_tags(tags: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Validates document tags and drops empty ones.
+
+    Raises:
+        ValueError: If a tag is unknown or its value is too long.
+    """
+    normalized = {}
+    for key, value in (tags or {}).items():
+        if key not in TAG_FIELDS:
+            raise ValueError(f"Unknown tag '{key}'; expected one of {TAG_FIELDS}.")
+        if value is None or str(value).strip() == "":
+            continue
+        value = str(value).strip()
+        if len(value) > TAG_MAX_LENGTH:
+            raise ValueError(f"Tag '{key}' is longer than {TAG_MAX_LENGTH} characters.")
+        normalized[key] = value
+    return normalized
+
+
 class MilvusManager:
     """
     Manages interactions with a Milvus Lite vector database.
     """
 
-    def __init__(self, host: str = "127.0.0.1", port: str = "19530", collection_name: str = "rag_collection"):
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: str = "19530",
+        collection_name: str = "rag_collection",
+        embedding_dim: Optional[int] = None,
+        quantization: Optional[str] = None,
+    ):
         """
         Initializes the MilvusManager and connects to the Milvus server.
         Assumes that a Milvus instance (like Milvus Lite) is already running.
+
+        The embedding dimension and quantization only apply when the collection is
+        created; an existing collection keeps the storage settings it was created
+        with, which are read back from its schema and index.
+
+        Args:
+            host (str): The Milvus host.
+            port (str): The Milvus port.
+            collection_name (str): The collection to use.
+            embedding_dim (Optional[int]): 256, 512 or 1024. Defaults to `EMBEDDING_DIMENSIONS`.
+            quantization (Optional[str]): "none" or "sq8". Defaults to `VECTOR_QUANTIZATION`.
         """
         self.collection_name = collection_name
+        self.archive_collection_name = f"{collection_name}{ARCHIVE_SUFFIX}"
+        # Seconds an on-demand loaded archive stays in memory after its last search.
+        self.archive_idle_timeout = float(os.environ.get("ARCHIVE_IDLE_TIMEOUT", 300))
+        self._archive: Optional[Collection] = None
+        self.questions_collection_name = f"{collection_name}{QUESTIONS_SUFFIX}"
+        self._questions: Optional[Collection] = None
+        self.summaries_collection_name = f"{collection_name}{SUMMARIES_SUFFIX}"
+        self._summaries: Optional[Collection] = None
+        self.embedding_dim = int(embedding_dim or os.environ.get("EMBEDDING_DIMENSIONS", 1024))
+        self.quantization = quantization or os.environ.get("VECTOR_QUANTIZATION", "none")
+        # How many extra candidates to fetch from a quantized index for full-precision re-scoring.
+        self.rescore_oversample = int(os.environ.get("RESCORE_OVERSAMPLE", 4))
+        # Tags stored as scalar fields; collections created before tagging only have them in `metadata`.
+        self.tag_fields = TAG_FIELDS
+        if self.embedding_dim not in SUPPORTED_DIMENSIONS:
+            raise ValueError(f"Unsupported embedding dimension {self.embedding_dim}; expected one of {SUPPORTED_DIMENSIONS}.")
+        if self.quantization not in SUPPORTED_QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization '{self.quantization}'; expected one of {SUPPORTED_QUANTIZATIONS}.")
         try:
             connections.connect("default", host=host, port=port)
             logger.info("Successfully connected to Milvus.")
             self._create_collection_if_not_exists()
+            self._release_idle_archive()
         except Exception as e:
             logger.exception(f"Error connecting to Milvus. Please ensure Milvus is running. Details: {e}")
             raise
@@ -27,52 +128,860 @@ class MilvusManager:
         if utility.has_collection(self.collection_name):
             logger.info(f"Collection '{self.collection_name}' already exists.")
             self.collection = Collection(self.collection_name)
+            self._load_storage_settings()
             self.collection.load()
             return
 
-        logger.info(f"Collection '{self.collection_name}' not found. Creating new collection...")
+        logger.info(
+            f"Collection '{self.collection_name}' not found. Creating new collection "
+            f"(dim={self.embedding_dim}, quantization={self.quantization})..."
+        )
         fields = [
             FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=1024),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_dim),
             FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
             FieldSchema(name="metadata", dtype=DataType.JSON)
         ]
+        fields.extend(
+            FieldSchema(name=tag, dtype=DataType.VARCHAR, max_length=TAG_MAX_LENGTH, is_partition_key=tag == PARTITION_KEY_FIELD)
+            for tag in TAG_FIELDS
+        )
         schema = CollectionSchema(fields, description="Collection for RAG documents")
         self.collection = Collection(name=self.collection_name, schema=schema)
+        self._create_indexes(self.collection)
+        self.collection.load()
+        logger.info(f"Successfully created collection '{self.collection_name}', index, and loaded into memory.")
 
+    def _create_indexes(self, collection: Collection):
+        """
+        Creates the vector indexes for the configured quantization.
+        """
         # Create an index for the embedding field for efficient searching
         index_params = {
             "metric_type": "L2",
-            "index_type": "IVF_FLAT",
+            "index_type": "IVF_FLAT" if self.quantization == "none" else "IVF_SQ8",
             "params": {"nlist": 128}
         }
-        self.collection.create_index(field_name="embedding", index_params=index_params)
-        self.collection.load()
-        logger.info(f"Successfully created collection '{self.collection_name}', index, and loaded into memory.")
+        collection.create_index(field_name="embedding", index_params=index_params)
+
+    def _get_archive(self, create: bool = False) -> Optional[Collection]:
+        """
+        Returns the archive collection without loading it, creating it with the
+        hot collection's schema and indexes if `create` is set.
+        """
+        if self._archive is None:
+            if utility.has_collection(self.archive_collection_name):
+                self._archive = Collection(self.archive_collection_name)
+            elif create:
+                logger.info(f"Creating archive collection '{self.archive_collection_name}'...")
+                self._archive = Collection(name=self.archive_collection_name, schema=self.collection.schema)
+                self._create_indexes(self._archive)
+        return self._archive
+
+    def _get_questions(self, create: bool = False) -> Optional[Collection]:
+        """
+        Returns the loaded question collection, creating it if `create` is set.
+        """
+        if self._questions is None:
+            if utility.has_collection(self.questions_collection_name):
+                self._questions = Collection(self.questions_collection_name)
+            elif create:
+                logger.info(f"Creating question collection '{self.questions_collection_name}'...")
+                fields = [
+                    FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+                    FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_dim),
+                    FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=QUESTION_MAX_LENGTH),
+                    FieldSchema(name="parent_id", dtype=DataType.INT64),
+                    FieldSchema(name="metadata", dtype=DataType.JSON),
+                ]
+                fields.extend(
+                    FieldSchema(name=tag, dtype=DataType.VARCHAR, max_length=TAG_MAX_LENGTH, is_partition_key=tag == PARTITION_KEY_FIELD)
+                    for tag in TAG_FIELDS
+                )
+                schema = CollectionSchema(fields, description="Generated questions pointing to RAG document chunks")
+                self._questions = Collection(name=self.questions_collection_name, schema=schema)
+                self._questions.create_index(
+                    field_name="embedding",
+                    index_params={"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 128}},
+                )
+            else:
+                return None
+            self._questions.load()
+        return self._questions
+
+    def _get_summaries(self, create: bool = False) -> Optional[Collection]:
+        """
+        Returns the loaded summary collection, creating it if `create` is set.
+        """
+        if self._summaries is None:
+            if utility.has_collection(self.summaries_collection_name):
+                self._summaries = Collection(self.summaries_collection_name)
+            elif create:
+                logger.info(f"Creating summary collection '{self.summaries_collection_name}'...")
+                fields = [
+                    FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+                    FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.embedding_dim),
+                    FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=SUMMARY_MAX_LENGTH),
+                    FieldSchema(name="level", dtype=DataType.VARCHAR, max_length=16),
+                    FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=SOURCE_MAX_LENGTH),
+                    FieldSchema(name="metadata", dtype=DataType.JSON),
+                ]
+                fields.extend(
+                    FieldSchema(name=tag, dtype=DataType.VARCHAR, max_length=TAG_MAX_LENGTH, is_partition_key=tag == PARTITION_KEY_FIELD)
+                    for tag in TAG_FIELDS
+                )
+                schema = CollectionSchema(fields, description="Document and section summaries of RAG documents")
+                self._summaries = Collection(name=self.summaries_collection_name, schema=schema)
+                self._summaries.create_index(
+                    field_name="embedding",
+                    index_params={"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 128}},
+                )
+            else:
+                return None
+            self._summaries.load()
+        return self._summaries
+
+    def _load_archive(self, reload: bool = False) -> Optional[Collection]:
+        """
+        Loads the archive collection on demand and records its use.
+
+        Another worker or `rag tier release` may have released it, so its load
+        state is read from the server rather than trusted from this process.
+
+        Args:
+            reload (bool): Load it even if the server reports it loaded, e.g. after a failed search.
+        """
+        archive = self._get_archive()
+        if archive is None:
+            return None
+        with _archive_lock:
+            if reload or utility.load_state(self.archive_collection_name) != LoadState.Loaded:
+                logger.info(f"Loading archive collection '{self.archive_collection_name}' for a historical query...")
+                archive.load()
+            _archive_last_used[self.archive_collection_name] = time.monotonic()
+        return archive
+
+    def _release_idle_archive(self):
+        """
+        Releases the archive collection once it has not been searched for `ARCHIVE_IDLE_TIMEOUT` seconds.
+        """
+        with _archive_lock:
+            last_used = _archive_last_used.get(self.archive_collection_name)
+            if last_used is None or time.monotonic() - last_used < self.archive_idle_timeout:
+                return
+            del _archive_last_used[self.archive_collection_name]
+        try:
+            archive = self._get_archive()
+            if archive is not None:
+                archive.release()
+                logger.info(f"Released idle archive collection '{self.archive_collection_name}'.")
+        except Exception as e:
+            logger.warning(f"Could not release archive collection '{self.archive_collection_name}': {e}")
+
+    def release_archive(self):
+        """
+        Releases the archive collection from memory.
+        """
+        with _archive_lock:
+            _archive_last_used.pop(self.archive_collection_name, None)
+        archive = self._get_archive()
+        if archive is not None:
+            archive.release()
+
+    def _load_storage_settings(self):
+        """
+        Reads the embedding dimension, quantization and tag fields of an existing collection.
+        """
+        try:
+            fields = {field.name: field for field in self.collection.schema.fields}
+            self.tag_fields = tuple(tag for tag in TAG_FIELDS if tag in fields)
+            dim = fields["embedding"].params.get("dim")
+            if dim:
+                self.embedding_dim = int(dim)
+            index_types = {index.field_name: index.params.get("index_type") for index in self.collection.indexes}
+            self.quantization = "sq8" if index_types.get("embedding") == "IVF_SQ8" else "none"
+        except Exception as e:
+            # Filtering on `metadata` works for every collection, so fall back to it.
+            self.tag_fields = ()
+            logger.warning(f"Could not read storage settings of '{self.collection_name}'; using defaults. Details: {e}")
+
+    def build_filter_expr(self, filters: Optional[Dict[str, Union[str, List[str]]]]) -> Optional[str]:
+        """
+        Builds a Milvus boolean expression from tag filters.
+
+        Each tag matches one value or any of a list of values, and tags are
+        combined with `and`. Tags stored as scalar fields are filtered on the
+        field (the tenant field prunes partitions); on older collections the
+        copy in `metadata` is used.
+
+        Args:
+            filters (Optional[Dict[str, Union[str, List[str]]]]): Tag values keyed by tag name.
+
+        Returns:
+            Optional[str]: The expression, or None if there is nothing to filter on.
+
+        Raises:
+            ValueError: If a tag is unknown or a value is too long.
+        """
+        clauses = []
+        for key, value in (filters or {}).items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            values = sorted({v for v in (normalize_tags({key: v}).get(key) for v in values) if v})
+            if not values:
+                continue
+            field = key if key in self.tag_fields else f'metadata["{key}"]'
+            if len(values) == 1:
+                clauses.append(f"{field} == {json.dumps(values[0])}")
+            else:
+                clauses.append(f"{field} in {json.dumps(values)}")
+        return " and ".join(clauses) or None
+
+    def _scope_expr(self, expr: Optional[str], filters: Optional[Dict[str, Union[str, List[str]]]]) -> Optional[str]:
+        """
+        Combines a Milvus boolean expression with tag filters.
+        """
+        filter_expr = self.build_filter_expr(filters)
+        if filter_expr:
+            return f"({expr}) and {filter_expr}" if expr else filter_expr
+        return expr
+
+    def search(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        expr: Optional[str] = None,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        include_archived: bool = False,
+        include_embeddings: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Searches the collection and returns the closest chunks.
+
+        Archived chunks are only searched when `include_archived` is set, which
+        loads the archive collection if it is not resident yet. On quantized collections `limit * RESCORE_OVERSAMPLE` candidates are taken
+        from the compact index and re-ranked by exact L2 distance against the
+        stored full-precision vectors.
+
+        Args:
+            query_embedding (List[float]): The query vector.
+            limit (int): The number of results to return.
+            expr (Optional[str]): A Milvus boolean filter expression.
+            filters (Optional[Dict[str, Union[str, List[str]]]]): Tag filters, combined with `expr`.
+            include_archived (bool): Also search superseded and archived chunks.
+            include_embeddings (bool): Also return the stored vector of every hit as `embedding`.
+
+        Returns:
+            List[Dict[str, Any]]: Hits as dicts with `id`, `distance`, `text`, `metadata` and `tier`, closest first.
+        """
+        expr = self._scope_expr(expr, filters)
+        hits = self._search_collection(self.collection, query_embedding, limit, expr, include_embeddings)
+        for hit in hits:
+            hit["tier"] = "hot"
+        if include_archived:
+            archive = self._load_archive()
+            if archive is not None:
+                try:
+                    archived = self._search_collection(archive, query_embedding, limit, expr, include_embeddings)
+                except MilvusException as e:
+                    # Released between the load check and the search; load it again and retry once.
+                    logger.warning(f"Search of archive collection '{self.archive_collection_name}' failed, reloading it: {e}")
+                    archived = self._search_collection(self._load_archive(reload=True), query_embedding, limit, expr, include_embeddings)
+                for hit in archived:
+                    hit["tier"] = "archive"
+                hits = sorted(hits + archived, key=lambda hit: hit["distance"])[:limit]
+        return hits
+
+    def _search_collection(self, collection: Collection, query_embedding: List[float], limit: int, expr: Optional[str],
+                           include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """
+        Searches one collection, re-scoring quantized candidates at full precision.
+        """
+        output_fields = ["text", "metadata", "embedding"] if include_embeddings else ["text", "metadata"]
+        if self.quantization == "none":
+            results = collection.search(
+                data=[query_embedding],
+                anns_field="embedding",
+                param={"metric_type": "L2", "params": {"nprobe": 10}},
+                limit=limit,
+                expr=expr,
+                output_fields=output_fields,
+            )
+            return [self._hit_to_dict(hit) for hit in results[0]]
+
+        results = collection.search(
+            data=[query_embedding],
+            anns_field="embedding",
+            param={"metric_type": "L2", "params": {"nprobe": 10}},
+            limit=limit * self.rescore_oversample,
+            expr=expr,
+            output_fields=output_fields,
+        )
+        candidates = [self._hit_to_dict(hit) for hit in results[0]]
+        return self._rescore(collection, query_embedding, candidates)[:limit]
+
+    def _rescore(self, collection: Collection, query_embedding: List[float], candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Re-ranks candidates by exact L2 distance using their full-precision vectors.
+        """
+        if not candidates:
+            return candidates
+        ids = [candidate["id"] for candidate in candidates]
+        rows = collection.query(expr=f"id in {ids}", output_fields=["embedding"])
+        vectors = {row["id"]: row["embedding"] for row in rows}
+        query = np.asarray(query_embedding, dtype=np.float32)
+        for candidate in candidates:
+            vector = vectors.get(candidate["id"])
+            if vector is not None:
+                candidate["distance"] = float(np.sum((np.asarray(vector, dtype=np.float32) - query) ** 2))
+        return sorted(candidates, key=lambda candidate: candidate["distance"])
+
+    def search_questions(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Searches the generated questions and returns the hot chunks they belong to.
+
+        Args:
+            query_embedding (List[float]): The query vector.
+            limit (int): The number of questions to search.
+            filters (Optional[Dict[str, Union[str, List[str]]]]): Tag filters.
+
+        Returns:
+            List[Dict[str, Any]]: Parent chunks as search hits, closest first, with the
+            distance and text of their best-matching question in `distance` and
+            `matched_question`. Empty if no questions have been generated.
+        """
+        questions = self._get_questions()
+        if questions is None:
+            return []
+        results = questions.search(
+            data=[query_embedding],
+            anns_field="embedding",
+            param={"metric_type": "L2", "params": {"nprobe": 10}},
+            limit=limit,
+            expr=self.build_filter_expr(filters),
+            output_fields=["text", "parent_id"],
+        )
+        best: Dict[int, Dict[str, Any]] = {}
+        for hit in results[0]:
+            parent_id = hit.entity.get("parent_id")
+            if parent_id not in best or hit.distance < best[parent_id]["distance"]:
+                best[parent_id] = {"distance": hit.distance, "matched_question": hit.entity.get("text")}
+        if not best:
+            return []
+        # Questions of archived chunks have no hot parent and are dropped here.
+        parents = self.collection.query(expr=f"id in {list(best)}", output_fields=["id", "text", "metadata"])
+        hits = [
+            {"id": row["id"], "text": row["text"], "metadata": row["metadata"], "tier": "hot", **best[row["id"]]}
+            for row in parents
+        ]
+        return sorted(hits, key=lambda hit: hit["distance"])
+
+    def _insert_questions(self, processed_chunks: list, primary_keys: List[int]) -> int:
+        """
+        Stores the generated questions of newly inserted chunks.
+        """
+        entities = []
+        for chunk, parent_id in zip(processed_chunks, primary_keys):
+            tags = {tag: str(chunk.get("metadata", {}).get(tag) or "") for tag in TAG_FIELDS}
+            tags[PARTITION_KEY_FIELD] = tags[PARTITION_KEY_FIELD] or DEFAULT_TENANT
+            for question in chunk.get("questions") or []:
+                entities.append({
+                    "embedding": question["embedding"],
+                    "text": question["text"][:QUESTION_MAX_LENGTH],
+                    "parent_id": parent_id,
+                    "metadata": {key: value for key, value in tags.items() if value},
+                    **tags,
+                })
+        if not entities:
+            return 0
+        questions = self._get_questions(create=True)
+        questions.insert(entities)
+        questions.flush()
+        return len(entities)
+
+    def _move_questions(self, moves: Dict[int, int]):
+        """
+        Points the generated questions of replaced chunks at the chunks replacing them.
+
+        Args:
+            moves (Dict[int, int]): New parent primary key by old parent primary key.
+        """
+        questions = self._get_questions() if moves else None
+        if questions is None:
+            return
+        rows = questions.query(
+            expr=f"parent_id in {list(moves)}",
+            output_fields=["id", "embedding", "text", "parent_id", "metadata", *TAG_FIELDS],
+        )
+        if not rows:
+            return
+        ids = [row.pop("id") for row in rows]
+        for row in rows:
+            row["parent_id"] = moves[row["parent_id"]]
+        # Milvus cannot update a field in place, so the questions are copied and the originals deleted.
+        questions.insert(rows)
+        questions.delete(expr=f"id in {ids}")
+        questions.flush()
+
+    def _delete_questions(self, parent_ids: List[int]):
+        """
+        Deletes the generated questions of chunks leaving the hot tier.
+        """
+        if not parent_ids:
+            return
+        questions = self._get_questions()
+        if questions is not None:
+            questions.delete(expr=f"parent_id in {list(parent_ids)}")
+
+    def search_summaries(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        level: str,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        sources: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Searches the document or section summaries.
+
+        Args:
+            query_embedding (List[float]): The query vector.
+            limit (int): The number of summaries to return.
+            level (str): "document" or "section".
+            filters (Optional[Dict[str, Union[str, List[str]]]]): Tag filters.
+            sources (Optional[List[str]]): Only search summaries of these documents.
+
+        Returns:
+            List[Dict[str, Any]]: Hits as dicts with `id`, `distance`, `text` and `metadata`
+            (`level`, `source`, `section` and the tags), closest first. Empty if no
+            summaries have been built.
+        """
+        if level not in SUMMARY_LEVELS:
+            raise ValueError(f"Unknown summary level '{level}'; expected one of {SUMMARY_LEVELS}.")
+        summaries = self._get_summaries()
+        if summaries is None:
+            return []
+        clauses = [f"level == {json.dumps(level)}"]
+        if sources is not None:
+            clauses.append(f"source in {json.dumps(sorted(set(sources)))}")
+        filter_expr = self.build_filter_expr(filters)
+        if filter_expr:
+            clauses.append(filter_expr)
+        results = summaries.search(
+            data=[query_embedding],
+            anns_field="embedding",
+            param={"metric_type": "L2", "params": {"nprobe": 10}},
+            limit=limit,
+            expr=" and ".join(clauses),
+            output_fields=["text", "metadata"],
+        )
+        return [self._hit_to_dict(hit) for hit in results[0]]
+
+    def insert_summaries(self, summaries: List[Dict[str, Any]]) -> int:
+        """
+        Stores the summaries of ingested documents, replacing the earlier summaries of the same documents.
+
+        Args:
+            summaries (List[Dict[str, Any]]): Summaries with `embedding`, `text` and `metadata`
+                holding `level`, `source`, `section` and the document tags.
+
+        Returns:
+            int: The number of summaries stored.
+        """
+        if not summaries:
+            return 0
+        entities = []
+        for summary in summaries:
+            metadata = dict(summary["metadata"])
+            tags = {tag: str(metadata.get(tag) or "") for tag in TAG_FIELDS}
+            tags[PARTITION_KEY_FIELD] = tags[PARTITION_KEY_FIELD] or DEFAULT_TENANT
+            entities.append({
+                "embedding": summary["embedding"],
+                "text": summary["text"][:SUMMARY_MAX_LENGTH],
+                "level": metadata["level"],
+                "source": metadata["source"][:SOURCE_MAX_LENGTH],
+                "metadata": metadata,
+                **tags,
+            })
+        collection = self._get_summaries(create=True)
+        for source, tenant in {(entity["source"], entity[PARTITION_KEY_FIELD]) for entity in entities}:
+            self._delete_summaries(source, tenant)
+        collection.insert(entities)
+        collection.flush()
+        logger.info(f"Inserted {len(entities)} summaries.")
+        return len(entities)
 
-    def insert_data(self, processed_chunks: list):
+    def _delete_summaries(self, source: str, tenant: Optional[str] = None):
+        """
+        Deletes the summaries of a document.
+        """
+        summaries = self._get_summaries()
+        if summaries is not None:
+            summaries.delete(expr=f"source == {json.dumps(source)} and {PARTITION_KEY_FIELD} == {json.dumps(tenant or DEFAULT_TENANT)}")
+
+    def _delete_orphaned_summaries(self, sources: set):
+        """
+        Deletes the summaries of documents that no longer have chunks in the hot tier.
+        """
+        for source, tenant in sources:
+            if not source:
+                continue
+            expr = f'metadata["source"] == {json.dumps(source)}'
+            if PARTITION_KEY_FIELD in self.tag_fields:
+                expr += f" and {PARTITION_KEY_FIELD} == {json.dumps(tenant or DEFAULT_TENANT)}"
+            if not self._query_hot(expr, output_fields=["id"], limit=1):
+                self._delete_summaries(source, tenant)
+
+    @staticmethod
+    def _hit_to_dict(hit) -> Dict[str, Any]:
+        result = {
+            "id": hit.id,
+            "distance": hit.distance,
+            "text": hit.entity.get("text"),
+            "metadata": hit.entity.get("metadata"),
+        }
+        embedding = hit.entity.get("embedding")
+        if embedding is not None:
+            result["embedding"] = embedding
+        return result
+
+    def insert_data(self, processed_chunks: list, supersede: bool = False):
         """
         Inserts processed data chunks into the Milvus collection.
+
+        Tags found in a chunk's metadata are also written to the collection's
+        scalar tag fields; chunks without a tenant go to the default tenant.
+
+        Args:
+            processed_chunks (list): Chunks with `embedding`, `text` and `metadata`.
+            supersede (bool): Move chunks of earlier versions of the same source
+                documents to the archive tier once the new chunks are stored.
         """
         if not processed_chunks:
             logger.warning("No data to insert.")
             return
 
-        entities = [
-            [chunk['embedding'] for chunk in processed_chunks],
-            [chunk['text'] for chunk in processed_chunks],
-            [chunk.get('metadata', {}) for chunk in processed_chunks]
-        ]
-
+        entities = self._build_entities(processed_chunks)
         try:
             insert_result = self.collection.insert(entities)
             self.collection.flush()
             logger.info(f"Successfully inserted {len(insert_result.primary_keys)} entities.")
-            return insert_result
         except Exception as e:
             logger.exception(f"Error inserting data into Milvus: {e}")
             return None
 
+        try:
+            inserted_questions = self._insert_questions(processed_chunks, insert_result.primary_keys)
+            if inserted_questions:
+                logger.info(f"Inserted {inserted_questions} generated questions.")
+        except Exception as e:
+            # The chunks are stored and searchable directly, so missing questions only cost recall.
+            logger.warning(f"Could not store generated questions: {e}")
+
+        if supersede:
+            sources = {(entity["metadata"].get("source"), entity["metadata"].get(PARTITION_KEY_FIELD)) for entity in entities}
+            for source, tenant in sources:
+                if not source:
+                    continue
+                try:
+                    archived = self.supersede_source(source, insert_result.primary_keys, tenant)
+                    if archived:
+                        logger.info(f"Archived {archived} chunks of the previous version of '{source}'.")
+                except Exception as e:
+                    logger.warning(f"Could not archive the previous version of '{source}': {e}")
+        return insert_result
+
+    def _build_entities(self, processed_chunks: list) -> List[Dict[str, Any]]:
+        """
+        Converts chunks into rows for the collection's schema.
+        """
+        entities = []
+        for chunk in processed_chunks:
+            entity = {
+                "embedding": chunk['embedding'],
+                "text": chunk['text'],
+                "metadata": chunk.get('metadata', {}),
+            }
+            for tag in self.tag_fields:
+                default = DEFAULT_TENANT if tag == PARTITION_KEY_FIELD else ""
+                entity[tag] = str(entity["metadata"].get(tag) or default)
+            entities.append(entity)
+        return entities
+
+    def _tier_collection(self, tier: str, create: bool = False) -> Optional[Collection]:
+        """
+        Returns the collection holding a tier; the archive is None if it does not exist.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}'; expected one of {TIERS}.")
+        return self.collection if tier == "hot" else self._get_archive(create=create)
+
+    def iter_rows(self, tier: str = "hot", batch_size: int = MOVE_BATCH_SIZE, expr: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields the stored chunks of a tier in batches of at most `batch_size` rows.
+
+        Each row has `id`, `embedding`, `text` and `metadata`; the tag fields
+        are derived from these and are not returned.
+
+        Args:
+            tier (str): "hot" or "archive".
+            batch_size (int): Rows fetched per round trip.
+            expr (Optional[str]): A Milvus boolean filter expression.
+        """
+        collection = self._tier_collection(tier)
+        if collection is None:
+            return
+        if tier == "archive":
+            collection.load()
+        iterator = collection.query_iterator(batch_size=batch_size, expr=expr, output_fields=["id", "embedding", "text", "metadata"])
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                yield rows
+        finally:
+            iterator.close()
+
+    def bulk_insert(self, processed_chunks: list, tier: str = "hot") -> int:
+        """
+        Inserts a batch of chunks into a tier without flushing.
+
+        Unlike `insert_data`, errors are raised so a bulk load can stop at the
+        failing batch. Call `flush` once all batches are inserted.
+
+        Args:
+            processed_chunks (list): Chunks with `embedding`, `text` and `metadata`.
+            tier (str): "hot" or "archive".
+
+        Returns:
+            int: The number of chunks inserted.
+        """
+        if not processed_chunks:
+            return 0
+        result = self._tier_collection(tier, create=True).insert(self._build_entities(processed_chunks))
+        return len(result.primary_keys)
+
+    def flush(self):
+        """
+        Flushes pending inserts of both tiers to storage.
+        """
+        self.collection.flush()
+        archive = self._get_archive()
+        if archive is not None:
+            archive.flush()
+
+    def count_rows(self, tier: str = "hot") -> int:
+        """
+        Returns the number of flushed rows in a tier.
+        """
+        collection = self._tier_collection(tier)
+        return collection.num_entities if collection is not None else 0
+
+    def move_to_tier(self, tier: str, expr: Optional[str] = None, filters: Optional[Dict[str, Union[str, List[str]]]] = None) -> int:
+        """
+        Moves the chunks matching a filter to the given tier.
+
+        Rows are copied in batches to the target collection and then deleted
+        from the source, so a chunk is never missing from both tiers.
+
+        Args:
+            tier (str): "hot" or "archive".
+            expr (Optional[str]): A Milvus boolean filter expression.
+            filters (Optional[Dict[str, Union[str, List[str]]]]): Tag filters, combined with `expr`.
+
+        Returns:
+            int: The number of chunks moved.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}'; expected one of {TIERS}.")
+        expr = self._scope_expr(expr, filters)
+        if not expr:
+            raise ValueError("Refusing to move chunks without a filter.")
+
+        if tier == "archive":
+            source, target = self.collection, self._get_archive(create=True)
+        else:
+            source, target = self._get_archive(), self.collection
+            if source is None:
+                return 0
+            source.load()
+
+        output_fields = ["id", "embedding", "text", "metadata", *self.tag_fields]
+        moved = 0
+        moved_sources = set()
+        iterator = source.query_iterator(batch_size=MOVE_BATCH_SIZE, expr=expr, output_fields=output_fields)
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                ids = [row.pop("id") for row in rows]
+                target.insert(rows)
+                source.delete(expr=f"id in {ids}")
+                if tier == "archive":
+                    self._delete_questions(ids)
+                    moved_sources.update((row["metadata"].get("source"), row["metadata"].get(PARTITION_KEY_FIELD)) for row in rows)
+                moved += len(ids)
+        finally:
+            iterator.close()
+        target.flush()
+        source.flush()
+        if moved_sources:
+            # Summaries stay with the hot tier; a document moved back has to be re-ingested to get them again.
+            self._delete_orphaned_summaries(moved_sources)
+        logger.info(f"Moved {moved} chunks matching '{expr}' to the {tier} tier.")
+        return moved
+
+    def supersede_source(self, source: str, keep_ids: List[int], tenant: Optional[str] = None) -> int:
+        """
+        Archives the older chunks of a re-uploaded document.
+
+        Chunks merged with near-duplicates of other documents are archived as
+        well, and a copy without this document's references stays in the hot
+        tier for the other documents.
+
+        Args:
+            source (str): The document file name stored in the chunk metadata.
+            keep_ids (List[int]): Primary keys of the chunks of the new version.
+            tenant (Optional[str]): The tenant the document belongs to.
+
+        Returns:
+            int: The number of chunks archived.
+        """
+        # Imported here because dedup builds on this module.
+        from .dedup import SOURCES_KEY, remove_source
+
+        filters = {PARTITION_KEY_FIELD: tenant or DEFAULT_TENANT}
+        expr = f'(metadata["source"] == {json.dumps(source)} or json_contains(metadata["{SOURCES_KEY}"], {json.dumps(source)}))'
+        if keep_ids:
+            expr += f" and id not in {list(keep_ids)}"
+        shared = [
+            row["id"]
+            for row in self._query_hot(self._scope_expr(expr, filters), output_fields=["id", "metadata"])
+            if len(row["metadata"].get(SOURCES_KEY) or []) > 1
+        ]
+        if shared:
+            detached = [
+                {"embedding": row["embedding"], "text": row["text"], "metadata": remove_source(row["metadata"], source), "replaces": [row["id"]]}
+                for row in self.get_rows(shared)
+            ]
+            keep_ids = list(keep_ids) + self.replace_rows(detached, [])
+            expr += f" and id not in {keep_ids}"
+        return self.move_to_tier("archive", expr=expr, filters=filters)
+
+    def find_by_bands(self, band_keys: List[str], tenant: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Returns hot chunks of a tenant that share an LSH band with the given keys.
+
+        Args:
+            band_keys (List[str]): Keys from `dedup.band_keys`.
+            tenant (Optional[str]): The tenant to search.
+            limit (int): Maximum number of candidates.
+
+        Returns:
+            List[Dict[str, Any]]: Rows with `id`, `text` and `metadata`.
+        """
+        if not band_keys:
+            return []
+        expr = f'json_contains_any(metadata["lsh_bands"], {json.dumps(sorted(set(band_keys)))})'
+        filters = {PARTITION_KEY_FIELD: tenant or DEFAULT_TENANT}
+        return self._query_hot(self._scope_expr(expr, filters), output_fields=["id", "text", "metadata"], limit=limit)
+
+    def _query_hot(self, expr: str, output_fields: List[str], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the hot chunks matching an expression, with the given fields.
+        """
+        if limit is None:
+            return self.collection.query(expr=expr, output_fields=output_fields)
+        return self.collection.query(expr=expr, output_fields=output_fields, limit=limit)
+
+    def get_rows(self, ids: List[int], tier: str = "hot", include_embeddings: bool = True) -> List[Dict[str, Any]]:
+        """
+        Returns the chunks with the given primary keys, with `id`, `embedding`, `text` and `metadata`;
+        without `embedding` if `include_embeddings` is False.
+        """
+        if not ids:
+            return []
+        collection = self._tier_collection(tier)
+        if collection is None:
+            return []
+        output_fields = ["id", "embedding", "text", "metadata"] if include_embeddings else ["id", "text", "metadata"]
+        return collection.query(expr=f"id in {list(ids)}", output_fields=output_fields)
+
+    def replace_rows(self, processed_chunks: list, delete_ids: List[int], tier: str = "hot") -> List[int]:
+        """
+        Replaces stored chunks with updated ones.
+
+        The new chunks are inserted before the old ones are deleted, so their
+        content is never missing from the tier. New primary keys are assigned,
+        and in the hot tier the generated questions of the chunks listed in a
+        chunk's `replaces` are moved to it; the questions of other deleted
+        chunks are deleted with them.
+
+        Args:
+            processed_chunks (list): Chunks with `embedding`, `text`, `metadata` and optionally `replaces`.
+            delete_ids (List[int]): Primary keys of the chunks to remove.
+            tier (str): "hot" or "archive".
+
+        Returns:
+            List[int]: The primary keys of the inserted chunks.
+        """
+        collection = self._tier_collection(tier, create=True)
+        primary_keys = []
+        if processed_chunks:
+            primary_keys = list(collection.insert(self._build_entities(processed_chunks)).primary_keys)
+        moves = {}
+        if tier == "hot":
+            moves = {old_id: new_id for chunk, new_id in zip(processed_chunks, primary_keys) for old_id in chunk.get("replaces") or []}
+            self._move_questions(moves)
+        if delete_ids:
+            collection.delete(expr=f"id in {list(delete_ids)}")
+            if tier == "hot":
+                self._delete_questions([row_id for row_id in delete_ids if row_id not in moves])
+        collection.flush()
+        return primary_keys
+
+    def has_content(self, content_hash: str, tenant: Optional[str] = None) -> bool:
+        """
+        Returns True if a document with this content hash is already in the hot tier for the tenant.
+
+        Args:
+            content_hash (str): Hex SHA-256 of the document file.
+            tenant (Optional[str]): The tenant the document is uploaded for.
+        """
+        expr = f'metadata["content_hash"] == {json.dumps(content_hash)}'
+        filters = {PARTITION_KEY_FIELD: tenant or DEFAULT_TENANT}
+        return bool(self._query_hot(self._scope_expr(expr, filters), output_fields=["id"], limit=1))
+
+    def tier_report(self) -> List[Dict[str, Any]]:
+        """
+        Reports the size and resident memory of each tier.
+
+        Returns:
+            List[Dict[str, Any]]: One entry per tier with `collection`, `rows`,
+            `loaded`, `loaded_segments` and `memory_bytes`.
+        """
+        report = []
+        for tier, name in (("hot", self.collection_name), ("archive", self.archive_collection_name)):
+            if not utility.has_collection(name):
+                report.append({"tier": tier, "collection": name, "rows": 0, "loaded": False, "loaded_segments": 0, "memory_bytes": 0})
+                continue
+            segments = utility.get_query_segment_info(name)
+            report.append({
+                "tier": tier,
+                "collection": name,
+                "rows": Collection(name).num_entities,
+                "loaded": utility.load_state(name) == LoadState.Loaded,
+                "loaded_segments": len(segments),
+                "memory_bytes": sum(segment.mem_size for segment in segments),
+            })
+        return report
+
     def reset_collection(self):
         """
         Drops the collection if it exists.
@@ -81,6 +990,10 @@ class MilvusManager:
             logger.info(f"Dropping collection '{self.collection_name}'...")
             utility.drop_collection(self.collection_name)
             logger.info("Collection dropped.")
+            for name in (self.archive_collection_name, self.questions_collection_name, self.summaries_collection_name):
+                if utility.has_collection(name):
+                    utility.drop_collection(name)
+                    logger.info(f"Companion collection '{name}' dropped.")
         else:
             logger.warning(f"Collection '{self.collection_name}' does not exist. Nothing to drop.")
 
@@ -97,8 +1010,8 @@ if __name__ == '__main__':
         # This example requires a running Milvus instance.
         milvus_manager = MilvusManager()
         dummy_chunks = [
-            {"embedding": [0.1] * 768, "text": "Test chunk 1.", "metadata": {"source": "test.txt"}},
-            {"embedding": [0.2] * 768, "text": "Test chunk 2.", "metadata": {"source": "test.txt"}}
+            {"embedding": [0.1] * milvus_manager.embedding_dim, "text": "Test chunk 1.", "metadata": {"source": "test.txt"}},
+            {"embedding": [0.2] * milvus_manager.embedding_dim, "text": "Test chunk 2.", "metadata": {"source": "test.txt"}}
         ]
         milvus_manager.insert_data(dummy_chunks)
         milvus_manager.disconnect()
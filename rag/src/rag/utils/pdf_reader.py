@@ -0,0 +1,176 @@
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from loguru import logger
+
+from .docx_reader import image_placeholder
+from .metrics import metrics
+
+# A block that does not end with one of these is continued by the next block set in the same font.
+SENTENCE_END = (".", "!", "?", ":", ";", "]")
+# Each worker gets several page ranges, so a range of slow scanned pages does not hold up the others.
+SHARDS_PER_WORKER = 4
+MIN_SHARD_PAGES = 16
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def block_runs(block: Dict[str, Any], font_size_chars: Counter) -> List[tuple]:
+    """
+    Splits a PyMuPDF text block into runs of consecutive lines set in the same
+    font size, so that a heading grouped with adjacent body lines is kept apart.
+    Also tallies characters per font size to find the body font.
+    """
+    runs = []
+    for line in block.get("lines", []):
+        line_text = "".join(span["text"] for span in line["spans"]).strip()
+        if not line_text:
+            continue
+        font_size = max(round(span["size"], 1) for span in line["spans"])
+        for span in line["spans"]:
+            font_size_chars[round(span["size"], 1)] += len(span["text"].strip())
+        if runs and runs[-1][1] == font_size:
+            runs[-1][0].append(line_text)
+        else:
+            runs.append(([line_text], font_size))
+    return [("\n".join(lines), font_size) for lines, font_size in runs]
+
+
+def append_block(blocks: List[Dict[str, Any]], block: Dict[str, Any]):
+    """
+    Appends a block, or joins it to the previous one when it continues a sentence
+    that runs over a page break or a layout block boundary.
+    """
+    previous = blocks[-1] if blocks else None
+    if previous and previous["font_size"] == block["font_size"] and not previous["text"].endswith(SENTENCE_END):
+        previous["text"] += "\n" + block["text"]
+    else:
+        blocks.append(block)
+
+
+def read_pages(file_path: str, start: int, stop: int, image_prefix: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Counter]:
+    """
+    Extracts the text blocks and images of pages `start` to `stop` (0-based, exclusive).
+
+    Opens the file itself, so it can run in a worker process.
+
+    Returns:
+        Tuple: The blocks (`text`, 1-based `page`, `font_size`; images as
+        placeholder blocks with font size 0), the images (`bytes`, `filename`)
+        and the characters per font size.
+    """
+    blocks = []
+    images = []
+    font_size_chars = Counter()
+    doc = fitz.open(file_path)
+    try:
+        for page_num in range(start, stop):
+            page = doc[page_num]
+            for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+                for text, font_size in block_runs(block, font_size_chars):
+                    append_block(blocks, {"text": text, "page": page_num + 1, "font_size": font_size})
+
+            for img_index, img in enumerate(page.get_images(full=True)):
+                base_image = doc.extract_image(img[0])
+                image_filename = f"{image_prefix}_p{page_num + 1}_img{img_index + 1}.{base_image['ext']}"
+                blocks.append({"text": image_placeholder(image_filename), "page": page_num + 1, "font_size": 0.0})
+                images.append({"bytes": base_image["image"], "filename": image_filename})
+    finally:
+        doc.close()
+    return blocks, images, font_size_chars
+
+
+def page_ranges(page_count: int, shards: int) -> List[Tuple[int, int]]:
+    """
+    Splits `page_count` pages into at most `shards` contiguous ranges of nearly equal length.
+    """
+    shards = max(1, min(shards, page_count))
+    size, extra = divmod(page_count, shards)
+    ranges, start = [], 0
+    for shard in range(shards):
+        stop = start + size + (1 if shard < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the shared worker pool, started on first use.
+
+    Workers are spawned rather than forked, since the API process runs threads
+    and MuPDF is not safe to use across a fork.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def read_pdf(file_path: str, image_prefix: str, workers: Optional[int] = None,
+             min_pages: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Counter]:
+    """
+    Extracts the text blocks and images of a PDF, parsing large files in parallel.
+
+    A PDF with at least `min_pages` pages is split into page ranges that worker
+    processes parse independently. The results are joined in page order, and a
+    sentence that runs over the boundary between two ranges is joined as it is
+    within a range, so the output is the same as from a single process.
+
+    Args:
+        file_path (str): The PDF file.
+        image_prefix (str): Prefix of the generated image filenames.
+        workers (Optional[int]): Worker processes. Defaults to `PDF_WORKERS`, or the number of CPUs.
+        min_pages (Optional[int]): Smallest page count parsed in parallel. Defaults to `PDF_PARALLEL_MIN_PAGES`.
+
+    Returns:
+        Tuple: As `read_pages`, for the whole document.
+    """
+    workers = int(workers or os.environ.get("PDF_WORKERS") or os.cpu_count() or 1)
+    min_pages = int(min_pages or os.environ.get("PDF_PARALLEL_MIN_PAGES", 100))
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+    if workers <= 1 or page_count < min_pages:
+        return read_pages(file_path, 0, page_count, image_prefix)
+
+    ranges = page_ranges(page_count, min(workers * SHARDS_PER_WORKER, page_count // MIN_SHARD_PAGES))
+    logger.info(f"Parsing {page_count} pages of {file_path} in {len(ranges)} ranges across {workers} processes")
+    try:
+        pool = _get_pool(workers)
+        futures = [pool.submit(read_pages, file_path, start, stop, image_prefix) for start, stop in ranges]
+        shards = [future.result() for future in futures]
+    except BrokenProcessPool:
+        logger.warning(f"PDF worker pool failed while parsing {file_path}; parsing it in a single process")
+        _reset_pool()
+        return read_pages(file_path, 0, page_count, image_prefix)
+    metrics.incr("ingest.pdf.parallel_documents")
+    metrics.incr("ingest.pdf.shards", len(ranges))
+
+    blocks, images, font_size_chars = [], [], Counter()
+    for shard_blocks, shard_images, shard_font_size_chars in shards:
+        if shard_blocks:
+            append_block(blocks, shard_blocks[0])
+            blocks.extend(shard_blocks[1:])
+        images.extend(shard_images)
+        font_size_chars.update(shard_font_size_chars)
+    return blocks, images, font_size_chars
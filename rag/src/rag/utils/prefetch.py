@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from .metrics import metrics
+
+# Outcomes of a prefetch request.
+SCHEDULED = "scheduled"
+CACHED = "cached"
+TOO_SHORT = "too_short"
+DISABLED = "disabled"
+
+
+class Prefetcher:
+    """
+    Speculatively runs work for queries that are still being typed.
+
+    Each client has at most one pending prefetch: a new one replaces it, and
+    the work only starts once the client has been quiet for `debounce`
+    seconds, so a burst of keystrokes costs a single execution. Results are
+    kept for `ttl` seconds and read by the real request for the same key;
+    work that returns None has nothing worth keeping.
+
+    Speculation never queues: when the debounce fires it is dropped if
+    `max_inflight` speculative runs are already going or if `should_run`
+    reports the backends busy, so it only ever uses spare capacity.
+    """
+
+    def __init__(self, debounce: float = 0.3, ttl: float = 30.0, max_inflight: int = 2, min_chars: int = 12,
+                 max_entries: int = 1000, should_run: Optional[Callable[[], bool]] = None, enabled: bool = True):
+        """
+        Args:
+            debounce (float): Seconds a client must stop typing before its prefetch runs.
+            ttl (float): Seconds a prefetched result stays usable.
+            max_inflight (int): Speculative executions allowed at once.
+            min_chars (int): Shorter partial queries are not prefetched.
+            max_entries (int): Results and pending prefetches kept at most; the oldest go first.
+            should_run (Optional[Callable[[], bool]]): Checked when the debounce fires; False skips the prefetch.
+            enabled (bool): Whether prefetching is on at all.
+        """
+        self.debounce = debounce
+        self.ttl = ttl
+        self.max_inflight = max_inflight
+        self.min_chars = min_chars
+        self.max_entries = max_entries
+        self.should_run = should_run or (lambda: True)
+        self.enabled = enabled
+        self._results: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+        self._running: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_env(cls, should_run: Optional[Callable[[], bool]] = None) -> "Prefetcher":
+        """
+        Builds the prefetcher from `PREFETCH`, `PREFETCH_DEBOUNCE_MS`, `PREFETCH_TTL`,
+        `PREFETCH_MAX_INFLIGHT`, `PREFETCH_MIN_CHARS` and `PREFETCH_MAX_ENTRIES`.
+        """
+        return cls(
+            debounce=float(os.environ.get("PREFETCH_DEBOUNCE_MS", 300)) / 1000,
+            ttl=float(os.environ.get("PREFETCH_TTL", 30)),
+            max_inflight=int(os.environ.get("PREFETCH_MAX_INFLIGHT", 2)),
+            min_chars=int(os.environ.get("PREFETCH_MIN_CHARS", 12)),
+            max_entries=int(os.environ.get("PREFETCH_MAX_ENTRIES", 1000)),
+            should_run=should_run,
+            enabled=os.environ.get("PREFETCH", "on").lower() != "off",
+        )
+
+    def schedule(self, client: str, key: str, fn: Callable[[], Awaitable[Any]]) -> str:
+        """
+        Replaces the client's pending prefetch with one for `key`.
+
+        Args:
+            client (str): Identifies the typing user, e.g. a client id or address.
+            key (str): The key the real request will look the result up by.
+            fn (Callable[[], Awaitable[Any]]): A factory for the coroutine to run speculatively.
+
+        Returns:
+            str: SCHEDULED, or CACHED if the result is already available or being computed.
+        """
+        if not self.enabled:
+            return DISABLED
+        pending = self._pending.pop(client, None)
+        if pending is not None and not pending.done():
+            pending.cancel()
+            metrics.incr("prefetch.debounced")
+        if self.get(key, count=False) is not None or key in self._running:
+            return CACHED
+
+        self._pending[client] = asyncio.ensure_future(self._run_later(client, key, fn))
+        while len(self._pending) > self.max_entries:
+            _, oldest = self._pending.popitem(last=False)
+            oldest.cancel()
+        metrics.incr("prefetch.scheduled")
+        return SCHEDULED
+
+    def get(self, key: str, count: bool = True) -> Optional[Any]:
+        """
+        Returns a prefetched result that has not expired.
+        """
+        entry = self._results.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._results[key]
+            entry = None
+        if count and entry is not None:
+            metrics.incr("prefetch.hits")
+            logger.info(f"Using the prefetched result for '{key}'.")
+        return entry[1] if entry is not None else None
+
+    def cancel_all(self):
+        """
+        Cancels every pending prefetch, e.g. on shutdown; running ones finish.
+        """
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": len(self._pending), "running": len(self._running), "results": len(self._results)}
+
+    async def _run_later(self, client: str, key: str, fn: Callable[[], Awaitable[Any]]):
+        await asyncio.sleep(self.debounce)
+        if self._pending.get(client) is asyncio.current_task():
+            del self._pending[client]
+        if key in self._running:
+            return
+        if len(self._running) >= self.max_inflight or not self.should_run():
+            metrics.incr("prefetch.skipped_busy")
+            return
+
+        self._running[key] = asyncio.current_task()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except Exception as e:
+            metrics.incr("prefetch.errors")
+            logger.warning(f"Prefetch for '{key}' failed: {e}")
+            return
+        finally:
+            self._running.pop(key, None)
+        metrics.incr("prefetch.executions")
+        metrics.observe("prefetch.run", time.monotonic() - started)
+        if result is None:
+            return
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from .metrics import metrics
+from .text_utils import normalize_query
+
+# Where `rag serve` keeps the query log unless QUERY_LOG_PATH is set.
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "rag_query_log.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    normalized TEXT NOT NULL,
+    filters TEXT NOT NULL,
+    include_archived INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (normalized, filters, include_archived)
+);
+CREATE INDEX IF NOT EXISTS queries_count ON queries (count);
+"""
+
+
+class QueryLog:
+    """
+    Counts how often each query is asked, in a local SQLite file shared by every worker on the host.
+
+    Queries are counted by their normalized text and scope (filters and
+    archive), so trivially different phrasings add up; the latest phrasing is
+    kept to be asked again. Queries not asked within `window` seconds are
+    forgotten, and beyond `max_entries` the least asked go first.
+    """
+
+    def __init__(self, path: str, window: float = 7 * 24 * 3600.0, max_entries: int = 10000):
+        """
+        Args:
+            path (str): The SQLite file, created if missing.
+            window (float): Seconds a query is remembered after it was last asked.
+            max_entries (int): Distinct queries kept once old ones are pruned.
+        """
+        self.path = path
+        self.window = window
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["QueryLog"]:
+        """
+        Opens the log at `QUERY_LOG_PATH`, or returns None when the variable is unset or "off".
+
+        `QUERY_LOG_WINDOW_DAYS` and `QUERY_LOG_MAX_ENTRIES` bound what it keeps.
+        """
+        path = os.environ.get("QUERY_LOG_PATH", "")
+        if not path or path.lower() == "off":
+            return None
+        return cls(
+            path,
+            window=float(os.environ.get("QUERY_LOG_WINDOW_DAYS", 7)) * 24 * 3600,
+            max_entries=int(os.environ.get("QUERY_LOG_MAX_ENTRIES", 10000)),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Returns this thread's connection, opening it in this process if needed.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def record(self, query: str, filters: Optional[Dict[str, Any]] = None, include_archived: bool = False):
+        """
+        Counts one asking of the query. Failures are logged, since the log is only used for prewarming.
+        """
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        try:
+            self._connect().execute(
+                "INSERT INTO queries (normalized, filters, include_archived, query, count, last_seen) VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (normalized, filters, include_archived) DO UPDATE SET "
+                "count = count + 1, query = excluded.query, last_seen = excluded.last_seen",
+                (normalized, json.dumps(filters or {}, sort_keys=True), int(include_archived), query.strip(), time.time()),
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self.prune()
+        except sqlite3.Error as e:
+            logger.warning(f"Query log write failed: {e}")
+
+    def top(self, limit: int, min_count: int = 2) -> List[Dict[str, Any]]:
+        """
+        Returns the most frequently asked queries within the window.
+
+        Args:
+            limit (int): The most queries returned.
+            min_count (int): Queries asked fewer times are left out.
+
+        Returns:
+            List[Dict[str, Any]]: `query`, `filters`, `include_archived` and `count`, most asked first.
+        """
+        try:
+            rows = self._connect().execute(
+                "SELECT query, filters, include_archived, count FROM queries WHERE last_seen > ? AND count >= ? "
+                "ORDER BY count DESC, last_seen DESC LIMIT ?",
+                (time.time() - self.window, min_count, limit),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Query log read failed: {e}")
+            return []
+        return [
+            {"query": query, "filters": json.loads(filters), "include_archived": bool(include_archived), "count": count}
+            for query, filters, include_archived, count in rows
+        ]
+
+    def prune(self) -> int:
+        """
+        Deletes queries not asked within the window, then the least asked beyond `max_entries`.
+
+        Returns:
+            int: The number of queries deleted.
+        """
+        connection = self._connect()
+        deleted = connection.execute("DELETE FROM queries WHERE last_seen <= ?", (time.time() - self.window,)).rowcount
+        deleted += connection.execute(
+            "DELETE FROM queries WHERE rowid IN (SELECT rowid FROM queries ORDER BY count DESC, last_seen DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the number of distinct queries logged and how often they were asked in total.
+        """
+        try:
+            distinct, total = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(count), 0) FROM queries").fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Query log read failed: {e}")
+            distinct, total = 0, 0
+        return {"path": self.path, "distinct_queries": distinct, "queries": total}
+
+
+class Prewarmer:
+    """
+    Precomputes answers to the most frequently asked queries after the knowledge base changes.
+
+    Every change to the knowledge base invalidates the cached answers, so the
+    first employees to ask the common questions afterwards would wait for a
+    full retrieval and crew run. `trigger` schedules a run `delay` seconds
+    after an ingestion; a further ingestion pushes it back and cancels a run in
+    progress, whose answers would be stale. With an `interval`, the knowledge-base
+    generation is also checked that often, which catches changes made by
+    other workers or the CLI.
+
+    A run warms the `top_n` queries one at a time, at low priority: before each
+    query it waits while `should_run` reports the backends busy.
+    """
+
+    def __init__(self, warm: Callable[[Dict[str, Any]], Awaitable[bool]], top_queries: Callable[[int, int], List[Dict[str, Any]]],
+                 generation: Callable[[], Optional[int]], top_n: int = 20, min_count: int = 2, delay: float = 30.0, interval: float = 0.0,
+                 busy_wait: float = 5.0, should_run: Optional[Callable[[], bool]] = None, enabled: bool = True):
+        """
+        Args:
+            warm (Callable[[Dict[str, Any]], Awaitable[bool]]): Computes and caches the answer to a logged
+                query; returns False if it was already cached.
+            top_queries (Callable[[int, int], List[Dict[str, Any]]]): Returns up to the given number of queries
+                asked at least the given number of times, most asked first.
+            generation (Callable[[], Optional[int]]): Returns the knowledge-base generation, or None when
+                answers are not cached at all.
+            top_n (int): Queries warmed per run.
+            min_count (int): Queries asked fewer times are not warmed.
+            delay (float): Seconds after a trigger before the run starts.
+            interval (float): Seconds between checks of the generation; 0 only warms after triggers.
+            busy_wait (float): Seconds to wait before checking `should_run` again.
+            should_run (Optional[Callable[[], bool]]): Checked before each query; False waits.
+            enabled (bool): Whether prewarming is on at all.
+        """
+        self.warm = warm
+        self.top_queries = top_queries
+        self.generation = generation
+        self.top_n = top_n
+        self.min_count = min_count
+        self.delay = delay
+        self.interval = interval
+        self.busy_wait = busy_wait
+        self.should_run = should_run or (lambda: True)
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._warmed_generation: Optional[int] = None
+        self._last_run: Dict[str, Any] = {}
+
+    @classmethod
+    def from_env(cls, warm: Callable[[Dict[str, Any]], Awaitable[bool]], top_queries: Callable[[int, int], List[Dict[str, Any]]],
+                 generation: Callable[[], Optional[int]], should_run: Optional[Callable[[], bool]] = None) -> "Prewarmer":
+        """
+        Builds the prewarmer from `PREWARM`, `PREWARM_TOP_N`, `PREWARM_MIN_COUNT`, `PREWARM_DELAY`
+        and `PREWARM_INTERVAL`.
+        """
+        return cls(
+            warm,
+            top_queries,
+            generation,
+            top_n=int(os.environ.get("PREWARM_TOP_N", 20)),
+            min_count=int(os.environ.get("PREWARM_MIN_COUNT", 2)),
+            delay=float(os.environ.get("PREWARM_DELAY", 30)),
+            interval=float(os.environ.get("PREWARM_INTERVAL", 0)),
+            should_run=should_run,
+            enabled=os.environ.get("PREWARM", "on").lower() != "off",
+        )
+
+    def start(self):
+        """
+        Starts checking the knowledge-base generation every `interval` seconds, if set.
+        """
+        if self.enabled and self.interval > 0 and self._watcher is None:
+            self._watcher = asyncio.ensure_future(self._watch())
+
+    def trigger(self):
+        """
+        Schedules a run after the knowledge base changed, replacing a pending or running one.
+        """
+        if not self.enabled:
+            return
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            metrics.incr("prewarm.restarted")
+        self._task = asyncio.ensure_future(self._run(self.delay))
+
+    def cancel_all(self):
+        """
+        Cancels the pending or running prewarm and the generation checks, e.g. on shutdown.
+        """
+        for task in (self._task, self._watcher):
+            if task is not None:
+                task.cancel()
+        self._task = self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "warmed_generation": self._warmed_generation,
+            "last_run": self._last_run,
+        }
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._task is not None and not self._task.done():
+                continue
+            generation = await asyncio.to_thread(self.generation)
+            if generation is not None and generation != self._warmed_generation:
+                self._task = asyncio.ensure_future(self._run(0.0))
+
+    async def _run(self, delay: float):
+        await asyncio.sleep(delay)
+        generation = await asyncio.to_thread(self.generation)
+        if generation is None:
+            logger.info("Answers are not cached; skipping prewarming.")
+            return
+        queries = await asyncio.to_thread(self.top_queries, self.top_n, self.min_count)
+        started = time.monotonic()
+        warmed = already_cached = failed = 0
+        for entry in queries:
+            while not self.should_run():
+                metrics.incr("prewarm.waited_busy")
+                await asyncio.sleep(self.busy_wait)
+            try:
+                if await self.warm(entry):
+                    warmed += 1
+                else:
+                    already_cached += 1
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Prewarming '{entry['query']}' failed: {e}")
+        metrics.incr("prewarm.runs")
+        metrics.incr("prewarm.answers", warmed)
+        metrics.incr("prewarm.already_cached", already_cached)
+        metrics.incr("prewarm.errors", failed)
+        metrics.observe("prewarm.run", time.monotonic() - started)
+        self._warmed_generation = generation
+        self._last_run = {"generation": generation, "queries": len(queries), "warmed": warmed,
+                          "already_cached": already_cached, "errors": failed}
+        logger.info(f"Prewarmed {warmed} answers for generation {generation} ({already_cached} already cached, {failed} failed).")
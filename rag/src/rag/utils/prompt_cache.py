@@ -0,0 +1,172 @@
+import os
+import threading
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from .cost import _model_key
+
+# Written in the crew task prompts between the static part and the part that
+# changes with every request; providers cache everything before it.
+CACHE_POINT = "[cache_point]"
+CACHE_CONTROL = {"type": "ephemeral"}
+# Model families that accept cache points on Bedrock, after the region prefix.
+CACHING_MODELS = ("amazon.nova", "anthropic.claude")
+CONFIG_DIR = Path(__file__).resolve().parent.parent / "config"
+NO_PINNED_DOCUMENTS = "none"
+
+
+def prompt_cache_enabled(model: Optional[str]) -> bool:
+    """
+    Returns True if crew prompts sent to the model should carry cache points.
+
+    `PROMPT_CACHE` is "on", "off" or "auto" (the default), which enables them
+    for the model families in `CACHING_MODELS`.
+    """
+    mode = os.environ.get("PROMPT_CACHE", "auto").lower()
+    if mode in ("on", "off"):
+        return mode == "on"
+    return _model_key(model or "").startswith(CACHING_MODELS)
+
+
+def split_prompt(text: str) -> List[str]:
+    """
+    Splits a prompt at its cache points; the last segment is the part that is not cached.
+    """
+    return [segment.strip() for segment in text.split(CACHE_POINT)]
+
+
+def mark_cache_points(messages: List[Dict[str, Any]], enabled: bool = True) -> List[Dict[str, Any]]:
+    """
+    Converts the cache points of chat messages into provider cache markers.
+
+    With caching enabled, the system message is cached as a whole and a message
+    with cache points becomes text blocks, each one before a cache point carrying
+    a `cache_control` marker (LiteLLM sends these to Bedrock as `cachePoint`
+    blocks). Without it, the cache points are only removed.
+
+    Args:
+        messages (List[Dict[str, Any]]): Messages with `role` and string `content`.
+        enabled (bool): Whether the provider supports prompt caching.
+
+    Returns:
+        List[Dict[str, Any]]: New messages; the given ones are not modified.
+    """
+    marked = []
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, str):
+            marked.append(message)
+            continue
+        segments = [segment for segment in split_prompt(content) if segment]
+        if not enabled:
+            marked.append({**message, "content": "\n".join(segments)})
+        elif message.get("role") == "system" or len(segments) > 1:
+            cached = segments if message.get("role") == "system" else segments[:-1]
+            blocks = [{"type": "text", "text": segment, "cache_control": CACHE_CONTROL} for segment in cached]
+            if len(cached) < len(segments):
+                blocks.append({"type": "text", "text": segments[-1]})
+            marked.append({**message, "content": blocks})
+        else:
+            marked.append({**message, "content": "\n".join(segments)})
+    return marked
+
+
+def crew_inputs(topic: str, documents: List[str], pinned_documents: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Returns the inputs the crew prompts are filled with.
+
+    Args:
+        topic (str): The user's query.
+        documents (List[str]): The retrieved document texts.
+        pinned_documents (Optional[List[str]]): Frequently used document texts, sent in the cached part of the prompt.
+    """
+    return {'topic': topic, 'pinned_documents': pinned_documents or NO_PINNED_DOCUMENTS, 'documents': documents}
+
+
+@lru_cache(maxsize=None)
+def _crew_config(name: str) -> Dict[str, Any]:
+    with open(CONFIG_DIR / name, "r", encoding="utf-8") as file:
+        return yaml.safe_load(file)
+
+
+def render_task_messages(agent: str, task: str, inputs: Dict[str, Any], context: str = "") -> List[Dict[str, str]]:
+    """
+    Renders the messages a crew agent sends for one task, laid out as CrewAI does:
+    the agent's role, backstory and goal as the system message, then the task
+    description, its expected output and the output of the previous task.
+
+    Used by the simulated backend, which runs no crew, so prompt caching can be
+    measured on the real prompt templates.
+    """
+    agent_config = _crew_config("agents.yaml")[agent]
+    task_config = _crew_config("tasks.yaml")[task]
+
+    def fill(text: str) -> str:
+        for key, value in inputs.items():
+            text = text.replace("{" + key + "}", str(value))
+        return text.strip()
+
+    system = f"You are {fill(agent_config['role'])}. {fill(agent_config['backstory'])}\nYour personal goal is: {fill(agent_config['goal'])}"
+    user = f"Current Task: {fill(task_config['description'])}\n\nThis is the expected criteria for your final answer: {fill(task_config['expected_output'])}"
+    if context:
+        user += f"\n\nThis is the context you're working with:\n{context}"
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+class ChunkPopularity:
+    """
+    Counts how often each chunk is sent to the crew, so the most frequently used
+    chunks can be placed in the cached part of the prompt.
+
+    A chunk is pinned once it has been used `min_uses` times. Pinned chunks are
+    sent in id order, so requests that share them share the same prompt prefix
+    however they were ranked. Counts are halved when more than `max_tracked`
+    chunks are known, so chunks that stop being asked about lose their place.
+    """
+
+    def __init__(self, min_uses: int = 3, max_pinned: int = 3, max_tracked: int = 10000):
+        """
+        Args:
+            min_uses (int): Uses after which a chunk is pinned; 0 disables pinning.
+            max_pinned (int): The most chunks pinned in one prompt.
+            max_tracked (int): Chunks counted before the counts decay.
+        """
+        self.min_uses = min_uses
+        self.max_pinned = max_pinned
+        self.max_tracked = max_tracked
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ChunkPopularity":
+        """
+        Builds the counter from `PROMPT_CACHE_PIN_USES` and `PROMPT_CACHE_PINNED`.
+        """
+        return cls(
+            min_uses=int(os.environ.get("PROMPT_CACHE_PIN_USES", 3)),
+            max_pinned=int(os.environ.get("PROMPT_CACHE_PINNED", 3)),
+        )
+
+    def split(self, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Counts a use of each document and separates the pinned ones.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]: The pinned documents in id
+            order, and the others in their given order.
+        """
+        ids = [document.get("id") for document in documents if document.get("id") is not None]
+        with self._lock:
+            self._counts.update(ids)
+            if len(self._counts) > self.max_tracked:
+                self._counts = Counter({chunk_id: count // 2 for chunk_id, count in self._counts.items() if count > 1})
+            if not self.min_uses:
+                return [], list(documents)
+            popular = {chunk_id for chunk_id in ids if self._counts[chunk_id] >= self.min_uses}
+        pinned_ids = set(sorted(popular)[:self.max_pinned])
+        pinned = sorted((document for document in documents if document.get("id") in pinned_ids), key=lambda document: document["id"])
+        return pinned, [document for document in documents if document.get("id") not in pinned_ids]
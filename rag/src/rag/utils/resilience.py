@@ -0,0 +1,312 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+from botocore.config import Config
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+from loguru import logger
+
+from .metrics import metrics
+
+# Error codes returned by Bedrock and S3 that are worth retrying.
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "SlowDown",
+    "ServiceUnavailable",
+    "InternalError",
+}
+
+TRANSIENT_EXCEPTIONS = (ConnectTimeoutError, ReadTimeoutError, EndpointConnectionError, ConnectionClosedError, TimeoutError, ConnectionError)
+
+
+class DependencyUnavailable(Exception):
+    """Raised when a remote dependency a request cannot do without is failing or short-circuited."""
+
+
+class CircuitOpenError(DependencyUnavailable):
+    """Raised when a call is short-circuited because its circuit breaker is open."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Returns True if the exception is a throttling, timeout or server-side error.
+    """
+    if isinstance(exc, ClientError):
+        error = exc.response.get("Error", {})
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return error.get("Code") in RETRYABLE_ERROR_CODES or status == 429 or status >= 500
+    if isinstance(exc, TRANSIENT_EXCEPTIONS):
+        return True
+    # Cohere raises ApiError subclasses carrying the HTTP status, and httpx timeouts.
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    return type(exc).__name__.endswith(("Timeout", "TimeoutException", "ConnectError"))
+
+
+def boto_client_config(read_timeout: Optional[float] = None) -> Config:
+    """
+    Returns the botocore configuration shared by all model and storage clients.
+
+    Each attempt is bounded by connect/read timeouts and the SDK's own retries
+    are disabled, because retries are handled by ResilientCaller so that they
+    respect the overall call deadline and feed the circuit breaker.
+
+    Args:
+        read_timeout (Optional[float]): Per-attempt read timeout; defaults to `BOTO_READ_TIMEOUT`.
+    """
+    return Config(
+        connect_timeout=float(os.environ.get("BOTO_CONNECT_TIMEOUT", 5)),
+        read_timeout=read_timeout or float(os.environ.get("BOTO_READ_TIMEOUT", 60)),
+        max_pool_connections=int(os.environ.get("BOTO_MAX_POOL_CONNECTIONS", 50)),
+        retries={"total_max_attempts": 1, "mode": "standard"},
+    )
+
+
+class CircuitBreaker:
+    """
+    A thread-safe closed / open / half-open circuit breaker.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        """
+        Args:
+            name (str): The dependency name, used in logs and metrics.
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds to stay open before letting a probe call through.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Returns True if a call may proceed. Only one probe is let through while half-open.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_caller_error(self):
+        """
+        Records a call rejected for its input. The dependency answered, so a probe closes the circuit,
+        while consecutive failures are otherwise left as they were.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._failures = 0
+
+    def release_probe(self):
+        """
+        Re-opens the circuit if a probe ended without recording its outcome, so it does not stay half-open.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self._failures} consecutive failures.")
+                    metrics.incr(f"resilience.{self.name}.breaker_opened")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """
+    Wraps calls to one remote dependency with a deadline, jittered retries and a circuit breaker.
+    """
+
+    def __init__(self, name: str, deadline: float, max_attempts: int, base_delay: float, max_delay: float, breaker: CircuitBreaker):
+        """
+        Args:
+            name (str): The dependency name, used in logs and metrics.
+            deadline (float): Total seconds allowed for a call including all retries.
+            max_attempts (int): Maximum number of attempts per call.
+            base_delay (float): Base delay for exponential backoff.
+            max_delay (float): Maximum backoff delay.
+            breaker (CircuitBreaker): The breaker guarding the dependency.
+        """
+        self.name = name
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+
+    def call(self, fn: Callable[..., Any], *args, fallback: Optional[Callable[[], Any]] = None, **kwargs) -> Any:
+        """
+        Calls `fn(*args, **kwargs)` with retries, or returns `fallback()` if it cannot succeed.
+
+        Args:
+            fn (Callable): The remote call.
+            fallback (Optional[Callable[[], Any]]): Produces a substitute result when the
+                circuit is open or the call fails. If omitted, the error is raised.
+
+        Returns:
+            Any: The result of `fn`, or of `fallback` when the call could not succeed.
+        """
+        metrics.incr(f"resilience.{self.name}.calls")
+        if not self.breaker.allow():
+            metrics.incr(f"resilience.{self.name}.short_circuits")
+            return self._fail(CircuitOpenError(f"Circuit '{self.name}' is open; failing fast."), fallback)
+
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        started = time.monotonic()
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    result = self._attempt(fn, args, kwargs, self.deadline - (time.monotonic() - started))
+                    self.breaker.record_success()
+                    return result
+                except Exception as e:
+                    if not is_retryable(e):
+                        # Caller errors (bad input, missing objects) say nothing about the dependency's health.
+                        self.breaker.record_caller_error()
+                        raise
+                    if isinstance(e, TRANSIENT_EXCEPTIONS):
+                        metrics.incr(f"resilience.{self.name}.timeouts")
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                    remaining = self.deadline - (time.monotonic() - started)
+                    if attempt == self.max_attempts or delay >= remaining or not self.breaker.allow():
+                        # One failed call counts once against the breaker, however many attempts it made.
+                        self.breaker.record_failure()
+                        logger.error(f"Call to '{self.name}' failed after {attempt} attempt(s): {e}")
+                        return self._fail(e, fallback)
+                    metrics.incr(f"resilience.{self.name}.retries")
+                    logger.warning(f"Retrying '{self.name}' in {delay:.2f}s after attempt {attempt} failed: {e}")
+                    time.sleep(delay)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    def _attempt(self, fn: Callable[..., Any], args: tuple, kwargs: dict, timeout: float) -> Any:
+        """
+        Runs one attempt on the attempt pool, raising TimeoutError once the call's deadline has passed.
+
+        The abandoned attempt keeps its thread until the client's own timeouts end it,
+        but the caller retries or falls back without waiting for it.
+        """
+        future = _attempt_pool().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        try:
+            return future.result(timeout=max(timeout, 0.0))
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Call to '{self.name}' exceeded its {self.deadline:.0f}s deadline.") from None
+
+    def _fail(self, error: Exception, fallback: Optional[Callable[[], Any]]) -> Any:
+        metrics.incr(f"resilience.{self.name}.failures")
+        if fallback is None:
+            raise error
+        metrics.incr(f"resilience.{self.name}.fallbacks")
+        return fallback()
+
+
+_callers: Dict[str, ResilientCaller] = {}
+_callers_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _attempt_pool() -> ThreadPoolExecutor:
+    """
+    Returns the threads that run attempts, sized by `RESILIENCE_MAX_THREADS`.
+    """
+    global _pool
+    with _callers_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=int(os.environ.get("RESILIENCE_MAX_THREADS", 64)), thread_name_prefix="resilience")
+        return _pool
+
+# Per-dependency defaults: (deadline seconds, max attempts).
+_DEFAULTS = {
+    "bedrock_embedding": (20.0, 4),
+    "bedrock_caption": (60.0, 3),
+    "bedrock_questions": (30.0, 3),
+    "bedrock_summary": (60.0, 3),
+    "bedrock_condense": (10.0, 2),
+    "cohere_rerank": (10.0, 2),
+    "s3": (30.0, 3),
+}
+
+
+def get_caller(name: str) -> ResilientCaller:
+    """
+    Returns the process-wide caller for a dependency, so breaker state is shared by
+    every Retriever and DocumentProcessor instance.
+
+    Settings are read from `<NAME>_DEADLINE` and `<NAME>_MAX_ATTEMPTS` (e.g.
+    `COHERE_RERANK_DEADLINE`), and `CIRCUIT_FAILURE_THRESHOLD` /
+    `CIRCUIT_RESET_TIMEOUT` for the breaker.
+    """
+    with _callers_lock:
+        caller = _callers.get(name)
+        if caller is None:
+            deadline, max_attempts = _DEFAULTS.get(name, (30.0, 3))
+            prefix = name.upper()
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5)),
+                reset_timeout=float(os.environ.get("CIRCUIT_RESET_TIMEOUT", 30)),
+            )
+            caller = ResilientCaller(
+                name,
+                deadline=float(os.environ.get(f"{prefix}_DEADLINE", deadline)),
+                max_attempts=int(os.environ.get(f"{prefix}_MAX_ATTEMPTS", max_attempts)),
+                base_delay=float(os.environ.get("RETRY_BASE_DELAY", 0.5)),
+                max_delay=float(os.environ.get("RETRY_MAX_DELAY", 8.0)),
+                breaker=breaker,
+            )
+            _callers[name] = caller
+        return caller
+
+
+def breaker_states() -> Dict[str, str]:
+    """
+    Returns the current circuit state of every dependency that has been called.
+    """
+    with _callers_lock:
+        return {name: caller.breaker.state for name, caller in _callers.items()}
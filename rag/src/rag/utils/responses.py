@@ -0,0 +1,175 @@
+import os
+import zlib
+from typing import Any, Dict, List, Optional
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import metrics
+
+# Metadata of a retrieved chunk that is returned with its reference.
+REFERENCE_FIELDS = ("source", "page", "section", "level")
+
+
+def snippet_chars() -> int:
+    """
+    Returns the length of the snippets sent with source references, from `RESPONSE_SNIPPET_CHARS`.
+    """
+    return int(os.environ.get("RESPONSE_SNIPPET_CHARS", 200))
+
+
+def snippet(text: Optional[str], chars: Optional[int] = None) -> str:
+    """
+    Returns the start of a text, with whitespace collapsed and cut at a word boundary.
+
+    Args:
+        text (Optional[str]): The full text.
+        chars (Optional[int]): The maximum length; defaults to `RESPONSE_SNIPPET_CHARS`.
+    """
+    chars = chars if chars is not None else snippet_chars()
+    text = text or ""
+    # Only the start of a long chunk is looked at.
+    head = " ".join(text[:chars * 2].split())
+    if len(head) <= chars and len(text) <= chars * 2:
+        return head
+    cut = head[:chars]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip(" ,;:.") + "..."
+
+
+def as_documents(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Converts search hits into the documents a query works with: the text, the chunk id
+    and the metadata needed to cite it, plus the tier for chunks from the archive.
+
+    Summary hits come from a separate collection whose ids are not chunk ids, so
+    they have no id; their text is short and is returned in full.
+    """
+    documents = []
+    for hit in hits:
+        metadata = hit.get("metadata") or {}
+        document = {"id": None if metadata.get("level") else hit.get("id"), "text": hit.get("text") or ""}
+        document.update({field: metadata[field] for field in REFERENCE_FIELDS if metadata.get(field) is not None})
+        if hit.get("tier") == "archive":
+            # A superseded version is cited as such.
+            document["tier"] = "archive"
+        documents.append(document)
+    return documents
+
+
+def from_cached(documents: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Reads documents from the shared retrieval cache; entries written before
+    documents carried ids hold only their texts.
+    """
+    return [document if isinstance(document, dict) else {"id": None, "text": document} for document in documents]
+
+
+def texts(documents: List[Dict[str, Any]]) -> List[str]:
+    """
+    Returns the texts of the documents, as given to the crew.
+    """
+    return [document["text"] for document in documents]
+
+
+def references(documents: List[Dict[str, Any]], chars: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Returns the source references sent with an answer: each document without its
+    text but with a snippet of it. The full text of a chunk is served by `GET /chunks/{id}`.
+    """
+    chars = chars if chars is not None else snippet_chars()
+    return [
+        {**{key: value for key, value in document.items() if key != "text"}, "snippet": snippet(document["text"], chars)}
+        for document in documents
+    ]
+
+
+def dumps(payload: Any) -> bytes:
+    """
+    Serializes a response payload with orjson.
+    """
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def sse_event(payload: Dict[str, Any]) -> str:
+    """
+    Formats a payload as one server-sent event.
+    """
+    return f"data: {dumps(payload).decode()}\n\n"
+
+
+class CompressionMiddleware:
+    """
+    Gzips responses for clients that accept it.
+
+    Unlike Starlette's GZipMiddleware, which holds a streamed body in its gzip
+    buffer until the stream ends, every chunk of a streamed response is flushed
+    as soon as it is written, so server-sent events still arrive one at a time.
+    Responses smaller than `minimum_size` and responses that already have a
+    content encoding are sent as they are.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1000, compresslevel: int = 6):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+        responder = _GzipResponder(self.minimum_size, self.compresslevel, send)
+        await self.app(scope, receive, responder.send_compressed)
+
+
+class _GzipResponder:
+    """
+    Compresses the body of one response, deciding on the first body message.
+    """
+
+    def __init__(self, minimum_size: int, compresslevel: int, send: Send):
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.send = send
+        self.start: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start["headers"])
+            if "content-encoding" in headers or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            # wbits=31 writes a gzip header and trailer.
+            self.compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31)
+            compressed = self._compress(body, more_body)
+            headers["Content-Encoding"] = "gzip"
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(compressed))
+            await self.send(self.start)
+        else:
+            compressed = self._compress(body, more_body)
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        compressed = self.compressor.compress(body) + self.compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+        metrics.incr("response.bytes_uncompressed", len(body))
+        metrics.incr("response.bytes_compressed", len(compressed))
+        return compressed
@@ -0,0 +1,145 @@
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+RETRIEVAL_MODES = ("adaptive", "fixed")
+# Actions of a retrieval decision.
+EXPAND = "expand"
+RERANK = "rerank"
+SKIP_RERANK = "skip_rerank"
+
+
+class RetrievalDecision:
+    """
+    What the retriever does with a set of search hits, and why.
+    """
+
+    def __init__(self, action: str, candidates: List[Dict[str, Any]], reason: str, depth: int, top_distance: Optional[float] = None,
+                 margin: Optional[float] = None):
+        """
+        Args:
+            action (str): "expand" (search deeper), "rerank" or "skip_rerank".
+            candidates (List[Dict[str, Any]]): The hits to rerank, or to return as they are when reranking is skipped.
+            reason (str): Why the action was chosen, for the logs.
+            depth (int): How many hits were requested from Milvus.
+            top_distance (Optional[float]): L2 distance of the best hit.
+            margin (Optional[float]): Distance between the best and second-best hit.
+        """
+        self.action = action
+        self.candidates = candidates
+        self.reason = reason
+        self.depth = depth
+        self.top_distance = top_distance
+        self.margin = margin
+
+    @property
+    def rerank(self) -> bool:
+        return self.action == RERANK
+
+    def __repr__(self) -> str:
+        top = "n/a" if self.top_distance is None else f"{self.top_distance:.3f}"
+        margin = "n/a" if self.margin is None or math.isinf(self.margin) else f"{self.margin:.3f}"
+        return (
+            f"RetrievalDecision(action={self.action}, depth={self.depth}, candidates={len(self.candidates)}, "
+            f"top_distance={top}, margin={margin}, reason={self.reason!r})"
+        )
+
+
+class RetrievalPolicy:
+    """
+    Chooses the search depth and whether to call the reranker from the distances of the search hits.
+
+    In "adaptive" mode the retriever first searches `probe_depth` candidates.
+    A near-exact top hit, or one far ahead of the runner-up, is returned in
+    vector order without reranking. Otherwise only the hits within
+    `candidate_window` of the best one are reranked; when every probed hit is
+    within the window the distribution is flat, so the search is repeated at
+    the full depth first. "fixed" mode always searches the full depth and
+    reranks every hit.
+
+    Distances are squared L2 between normalized embeddings (2 - 2 * cosine).
+    """
+
+    def __init__(
+        self,
+        mode: str = "adaptive",
+        probe_depth: int = 10,
+        skip_rerank_distance: float = 0.2,
+        skip_rerank_margin: float = 0.3,
+        candidate_window: float = 0.4,
+        max_distance: Optional[float] = None,
+        final_k: int = 5,
+    ):
+        """
+        Args:
+            mode (str): "adaptive" or "fixed".
+            probe_depth (int): Candidates fetched by the first search.
+            skip_rerank_distance (float): Reranking is skipped when the best hit is at most this far.
+            skip_rerank_margin (float): Reranking is skipped when the second-best hit is at least this much farther.
+            candidate_window (float): Hits farther than this from the best hit are not reranked.
+            max_distance (Optional[float]): When the best hit is farther than this, nothing is returned. Off by default.
+            final_k (int): The number of documents returned.
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}'; expected one of {RETRIEVAL_MODES}.")
+        self.mode = mode
+        self.probe_depth = probe_depth
+        self.skip_rerank_distance = skip_rerank_distance
+        self.skip_rerank_margin = skip_rerank_margin
+        self.candidate_window = candidate_window
+        self.max_distance = max_distance
+        self.final_k = final_k
+
+    @classmethod
+    def from_env(cls) -> "RetrievalPolicy":
+        """
+        Builds the policy from `RETRIEVAL_MODE`, `RETRIEVAL_PROBE_DEPTH`,
+        `RETRIEVAL_SKIP_RERANK_DISTANCE`, `RETRIEVAL_SKIP_RERANK_MARGIN`,
+        `RETRIEVAL_CANDIDATE_WINDOW` and `RETRIEVAL_MAX_DISTANCE`.
+        """
+        max_distance = os.environ.get("RETRIEVAL_MAX_DISTANCE")
+        return cls(
+            mode=os.environ.get("RETRIEVAL_MODE", "adaptive"),
+            probe_depth=int(os.environ.get("RETRIEVAL_PROBE_DEPTH", 10)),
+            skip_rerank_distance=float(os.environ.get("RETRIEVAL_SKIP_RERANK_DISTANCE", 0.2)),
+            skip_rerank_margin=float(os.environ.get("RETRIEVAL_SKIP_RERANK_MARGIN", 0.3)),
+            candidate_window=float(os.environ.get("RETRIEVAL_CANDIDATE_WINDOW", 0.4)),
+            max_distance=float(max_distance) if max_distance else None,
+        )
+
+    def initial_depth(self, max_depth: int) -> int:
+        """
+        Returns the number of candidates to fetch first.
+        """
+        return max_depth if self.mode == "fixed" else min(self.probe_depth, max_depth)
+
+    def plan(self, hits: List[Dict[str, Any]], depth: int, max_depth: int) -> RetrievalDecision:
+        """
+        Decides what to do with the hits of a search.
+
+        Args:
+            hits (List[Dict[str, Any]]): Search hits ordered by ascending `distance`.
+            depth (int): The number of hits that were requested.
+            max_depth (int): The deepest search allowed.
+
+        Returns:
+            RetrievalDecision: The action and the candidates it applies to.
+        """
+        if not hits:
+            return RetrievalDecision(SKIP_RERANK, [], "no hits", depth)
+        if self.mode == "fixed":
+            return RetrievalDecision(RERANK, hits, "fixed policy", depth, hits[0]["distance"])
+
+        top = hits[0]["distance"]
+        margin = hits[1]["distance"] - top if len(hits) > 1 else math.inf
+        if self.max_distance is not None and top > self.max_distance:
+            return RetrievalDecision(SKIP_RERANK, [], f"best hit farther than {self.max_distance}", depth, top, margin)
+
+        within = [hit for hit in hits if hit["distance"] <= top + self.candidate_window]
+        if top <= self.skip_rerank_distance:
+            return RetrievalDecision(SKIP_RERANK, within[:self.final_k], "near-exact match", depth, top, margin)
+        if margin >= self.skip_rerank_margin:
+            return RetrievalDecision(SKIP_RERANK, within[:self.final_k], "clear margin over the runner-up", depth, top, margin)
+        if len(within) == len(hits) == depth and depth < max_depth:
+            return RetrievalDecision(EXPAND, hits, "flat distances across the probe", depth, top, margin)
+        return RetrievalDecision(RERANK, hits[:max(self.final_k, len(within))], "ambiguous top hits", depth, top, margin)
@@ -1,9 +1,24 @@
 import os
+from typing import Dict, List, Optional, Union
+
 import boto3
 import json
 import cohere
+import numpy as np
 from loguru import logger
 from .milvus_manager import MilvusManager
+from .cost import record_usage
+from .metrics import metrics
+from .resilience import CircuitOpenError, DependencyUnavailable, boto_client_config, get_caller, is_retryable
+from .retrieval_policy import EXPAND, RetrievalPolicy
+from .shared_cache import EMBEDDINGS, cache_key, get_shared_cache
+from .simulation import get_backend, pseudo_embedding, simulation_enabled
+from .sessions import CONDENSE_SYSTEM_PROMPT, condense_prompt, template_condense
+from .summary_index import DOCUMENT, SECTION, in_section
+
+# "auto" answers from the summaries when a document summary matches the query
+# better than any chunk, "always" whenever summaries exist, "off" never.
+SUMMARY_SEARCH_MODES = ("off", "auto", "always")
 
 class Retriever:
     """
@@ -11,57 +26,239 @@ class Retriever:
     re-ranking, and initial synthesis of the answer.
     """
 
-    def __init__(self, milvus_manager: MilvusManager, mock: bool = False):
+    def __init__(self, milvus_manager: MilvusManager, mock: bool = False, policy: Optional[RetrievalPolicy] = None):
         """
         Initializes the Retriever.
 
         Args:
             milvus_manager (MilvusManager): An instance of the MilvusManager.
             mock (bool): If True, runs in mock mode without actual API calls.
+            policy (Optional[RetrievalPolicy]): Decides the search depth and whether to rerank.
+                Defaults to `RetrievalPolicy.from_env()`.
         """
         self.mock = mock
         self.milvus_manager = milvus_manager
+        self.policy = policy or RetrievalPolicy.from_env()
+        # Also match queries against the questions generated for each chunk at ingest time.
+        self.use_questions = os.environ.get("QUESTION_INDEX_SEARCH", "on").lower() != "off"
+        self.summary_search = os.environ.get("SUMMARY_SEARCH", "auto").lower()
+        if self.summary_search not in SUMMARY_SEARCH_MODES:
+            raise ValueError(f"Unsupported summary search mode '{self.summary_search}'; expected one of {SUMMARY_SEARCH_MODES}.")
+        self.summary_documents = int(os.environ.get("SUMMARY_SEARCH_DOCUMENTS", 2))
+        self.summary_sections = int(os.environ.get("SUMMARY_SEARCH_SECTIONS", 4))
+        self.summary_chunks = int(os.environ.get("SUMMARY_SEARCH_CHUNKS", 3))
+        self.condense_model_id = os.environ.get("CONDENSE_MODEL", "apac.amazon.nova-lite-v1:0")
+        # A follow-up this close to the previous query reuses its candidates without searching.
+        self.session_reuse_distance = float(os.environ.get("SESSION_REUSE_DISTANCE", 0.1))
+        # The candidates and query embedding of the last call, for sessions.
+        self.candidates: list = []
+        self.query_embedding: Optional[list] = None
+        # The search hits behind the documents the last call returned, with their ids and metadata.
+        self.hits: list = []
+        # Whether the last call fell back after a failed search or rerank, so its result should not be cached.
+        self.degraded = False
+        self.embedding_dim = getattr(milvus_manager, "embedding_dim", 1024)
         self.embedding_model_id = os.environ.get("EMBEDDING_MODEL", "amazon.titan-embed-text-v2:0")
         self.llm_model_id = os.environ.get("CONTENT_STRUCTURING_MODEL")
         self.rerank_model_id = os.environ.get("RERANK_MODEL")
 
-        if not self.mock:
-            self.bedrock_client = boto3.client("bedrock-runtime", region_name=os.environ.get("AWS_REGION"))
+        if not self.mock and simulation_enabled():
+            self.bedrock_client = get_backend().bedrock
+        elif not self.mock:
+            self.bedrock_client = boto3.client(
+                "bedrock-runtime",
+                region_name=os.environ.get("AWS_REGION"),
+                config=boto_client_config(read_timeout=float(os.environ.get("EMBEDDING_READ_TIMEOUT", 10))),
+            )
         else:
             self.bedrock_client = None
             logger.info("Retriever running in mock mode.")
 
-    def retrieve(self, query: str, top_n: int = 50) -> list:
+    def retrieve(
+        self,
+        query: str,
+        top_n: int = 50,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        include_archived: bool = False,
+        prior: Optional[list] = None,
+        prior_embedding: Optional[list] = None,
+    ) -> list:
         """
-        Embeds a query, retrieves the top_n most relevant document chunks from Milvus,
-        and then reranks them for relevance.
+        Embeds a query, retrieves the most relevant document chunks from Milvus,
+        and then reranks them for relevance when the retrieval policy calls for it.
+
+        Broad questions are answered from the summary index instead, when one has
+        been built: see `_search_summaries`.
+
+        In a session, `prior` holds the candidates of the previous turn with their
+        embeddings. They are re-scored against the new query and merged with a
+        shallow search instead of searching at full depth again, or reused as they
+        are when the query embedding has moved less than `SESSION_REUSE_DISTANCE`.
+        The merged candidates, with embeddings, and the query embedding are left in
+        `candidates` and `query_embedding` for the next turn. The hits behind the
+        returned documents are left in `hits`, so callers can cite them by chunk id.
 
         Args:
             query (str): The user's query.
-            top_n (int): The number of documents to retrieve.
+            top_n (int): The maximum number of documents to retrieve.
+            filters (Optional[Dict[str, Union[str, List[str]]]]): Tenant, department, region or
+                doc_type values; only matching chunks are searched and reranked.
+            include_archived (bool): Also search superseded and archived document versions.
+            prior (Optional[list]): The previous turn's candidates; an empty list starts a session.
+            prior_embedding (Optional[list]): The previous turn's query embedding.
 
         Returns:
             list: A list of reranked document chunks.
+
+        Raises:
+            DependencyUnavailable: If the query cannot be embedded because Bedrock is failing.
         """
         logger.info(f"Embedding query and retrieving documents for: '{query}'")
-        query_embedding = self._embed_query(query)
-        search_results = self._search_milvus(query_embedding, top_n=top_n)
-        logger.info(f"search_results type: {type(search_results)}, value: {search_results}")
-        
+        self.hits = []
+        self.degraded = False
+        with metrics.timer("retrieve.embed"):
+            query_embedding = self._embed_query(query)
+        self.query_embedding = query_embedding
+        if not query_embedding:
+            self.degraded = True
+        with metrics.timer("retrieve.search"):
+            depth = self.policy.initial_depth(top_n)
+            if prior and query_embedding:
+                search_results = self._extend_prior(query_embedding, prior, prior_embedding, depth, top_n, filters, include_archived)
+                decision = self.policy.plan(list(search_results), top_n, top_n)
+            else:
+                search_results = self._search_milvus(query_embedding, top_n=depth, filters=filters, include_archived=include_archived,
+                                                     include_embeddings=prior is not None)
+                decision = self.policy.plan(list(search_results), depth, top_n)
+            if decision.action == EXPAND:
+                metrics.incr("retrieve.depth_expanded")
+                search_results = self._search_milvus(query_embedding, top_n=top_n, filters=filters, include_archived=include_archived,
+                                                     include_embeddings=prior is not None)
+                decision = self.policy.plan(list(search_results), top_n, top_n)
+        if prior is not None:
+            self.candidates = list(search_results)
+            logged_results = [{key: value for key, value in hit.items() if key != "embedding"} for hit in search_results]
+        else:
+            self.candidates, logged_results = [], search_results
+        logger.info(f"search_results type: {type(search_results)}, value: {logged_results}")
+        logger.info(f"Retrieval decision: {decision}")
+
         if not search_results:
             return []
 
-        # Robustly convert Hits/SequenceIterator to list
+        results = list(search_results)
 
-        results = []
-        for hit in search_results:
-            results.append(hit.entity)
+        if self.summary_search != "off" and not include_archived:
+            with metrics.timer("retrieve.summaries"):
+                summary_results = self._search_summaries(query_embedding, results, filters)
+            if summary_results:
+                metrics.incr("retrieve.summary_mode")
+                self.hits = summary_results
+                return summary_results if self.mock else [hit.get('text') for hit in summary_results]
 
         if self.mock:
             logger.info("Skipping reranking in mock mode.")
-            return results[:5]
+            self.hits = results[:5]
+            return self.hits
+
+        if not decision.rerank:
+            metrics.incr("retrieve.rerank_skipped")
+            self.hits = list(decision.candidates)
+            return [hit.get('text') for hit in self.hits]
+
+        with metrics.timer("retrieve.rerank"):
+            return self._rerank_documents(query, decision.candidates)
+
+    def _extend_prior(self, query_embedding: list, prior: list, prior_embedding: Optional[list], depth: int, top_n: int,
+                      filters: Optional[Dict[str, Union[str, List[str]]]] = None, include_archived: bool = False) -> list:
+        """
+        Re-scores the previous turn's candidates against a follow-up query and merges
+        them with a shallow search, so the candidate set is extended rather than rebuilt.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        rescored = [
+            {**hit, "distance": float(np.sum((np.asarray(hit["embedding"], dtype=np.float32) - query) ** 2))}
+            for hit in prior if hit.get("embedding") is not None
+        ]
+        metrics.incr("retrieve.session_candidates", len(rescored))
+        moved = prior_embedding is None or float(np.sum((np.asarray(prior_embedding, dtype=np.float32) - query) ** 2)) > self.session_reuse_distance
+        if moved:
+            merged = {hit["id"]: hit for hit in rescored}
+            for hit in self._search_milvus(query_embedding, top_n=depth, filters=filters, include_archived=include_archived, include_embeddings=True):
+                if hit["id"] not in merged or hit["distance"] < merged[hit["id"]]["distance"]:
+                    merged[hit["id"]] = hit
+            rescored = list(merged.values())
+        else:
+            metrics.incr("retrieve.session_reused")
+            logger.info("The follow-up is close to the previous query; reusing its candidates without searching.")
+        return sorted(rescored, key=lambda hit: hit["distance"])[:top_n]
+
+    def condense_query(self, history: List[str], query: str) -> str:
+        """
+        Rewrites a follow-up as a standalone question using the previous questions of the conversation.
+        Falls back to appending the follow-up to the last question if the LLM call fails.
+        """
+        if not history:
+            return query
+        if self.mock:
+            return template_condense(history, query)
+        request_body = {
+            "system": [{"text": CONDENSE_SYSTEM_PROMPT}],
+            "messages": [{"role": "user", "content": [{"text": condense_prompt(history, query)}]}],
+            "inferenceConfig": {"max_new_tokens": 100, "temperature": 0.0, "top_p": 0.9},
+        }
+        try:
+            body = json.dumps(request_body)
+            response_body = get_caller("bedrock_condense").call(self._invoke_model, self.condense_model_id, body)
+            usage = response_body.get("usage", {})
+            record_usage("condense", self.condense_model_id, input_tokens=usage.get("inputTokens", 0), output_tokens=usage.get("outputTokens", 0))
+            standalone = response_body.get("output", {}).get("message", {}).get("content", [{}])[0].get("text", "").strip()
+        except Exception as e:
+            logger.warning(f"Could not condense the follow-up '{query}': {e}")
+            standalone = ""
+        return standalone or template_condense(history, query)
+
+    def _search_summaries(self, query_embedding: list, chunk_hits: list,
+                          filters: Optional[Dict[str, Union[str, List[str]]]] = None) -> list:
+        """
+        Searches the summary index top-down: the closest document summaries, then the
+        closest section summaries of those documents, then a few of the retrieved
+        chunks from those sections.
+
+        In "auto" mode this only happens when the best document summary is closer to
+        the query than the best chunk, i.e. for questions about a document as a whole
+        rather than about one of its details.
+
+        Returns:
+            list: The summaries and chunks as search hits, broadest first, or an empty
+            list to answer from the chunks as usual.
+        """
+        try:
+            documents = self.milvus_manager.search_summaries(query_embedding, self.summary_documents, DOCUMENT, filters=filters)
+            if not documents:
+                return []
+            if self.summary_search == "auto" and chunk_hits and documents[0]["distance"] >= chunk_hits[0]["distance"]:
+                return []
+            sources = [document["metadata"]["source"] for document in documents]
+            sections = self.milvus_manager.search_summaries(
+                query_embedding, self.summary_sections, SECTION, filters=filters, sources=sources
+            )
+        except Exception as e:
+            logger.warning(f"Error searching the summary index, using chunk hits only: {e}")
+            self.degraded = True
+            return []
 
-        return self._rerank_documents(query, results)
+        scopes = [(section["metadata"]["source"], section["metadata"].get("section") or "") for section in sections]
+
+        def within(hit) -> bool:
+            metadata = hit.get("metadata") or {}
+            if not scopes:
+                return metadata.get("source") in sources
+            return any(metadata.get("source") == source and in_section(metadata.get("section"), key) for source, key in scopes)
+
+        chunks = [hit for hit in chunk_hits if within(hit)][:self.summary_chunks]
+        logger.info(f"Answering from {len(documents)} document summaries, {len(sections)} section summaries and {len(chunks)} chunks.")
+        return documents + sections + chunks
 
     def _rerank_documents(self, query: str, results: list, threshold: float = 0.1) -> list:
         """
@@ -74,81 +271,149 @@ class Retriever:
             documents.append(result.get('text'))
             logger.info(f": type: {type(result.get('text'))}, value: {result.get('text')}")
         try:
-            co = cohere.BedrockClientV2(aws_region="ap-northeast-1")
+            if simulation_enabled():
+                co = get_backend().reranker
+            else:
+                co = cohere.BedrockClientV2(aws_region="ap-northeast-1", timeout=float(os.environ.get("RERANK_TIMEOUT", 5)))
 
-
-            rerank_response = co.rerank(
+            rerank_response = get_caller("cohere_rerank").call(
+                co.rerank,
                 model="cohere.rerank-v3-5:0",
                 query=query,
                 documents=documents,
                 top_n=min(5, len(documents)),
             )
-            
+            billed_units = getattr(getattr(rerank_response, "meta", None), "billed_units", None)
+            record_usage("rerank", "cohere.rerank-v3-5:0", units=getattr(billed_units, "search_units", None) or 1)
+
             reranked_docs = []
+            self.hits = []
             for hit in rerank_response.results:
                 if hit.relevance_score >= threshold:
                     reranked_docs.append(documents[hit.index])
+                    self.hits.append(results[hit.index])
                     logger.info(f"  - Document (index {hit.index}) is relevant with score {hit.relevance_score:.4f}")
                 else:
                     logger.warning(f"  - Document (index {hit.index}) is IRRELEVANT with score {hit.relevance_score:.4f}. Filtering out.")
 
             logger.info(f"Reranked and filtered {len(reranked_docs)} documents from an initial {len(documents)}.")
             return reranked_docs
+        except CircuitOpenError as e:
+            logger.warning(f"{e} Returning documents in vector-search order.")
+            self.hits = results[:5]
+            self.degraded = True
+            return documents[:5]
         except Exception as e:
             logger.exception(f"Error reranking documents: {e}")
             # Fallback to returning the original documents if reranking fails
+            self.hits = results[:5]
+            self.degraded = True
             return documents[:5]
 
     def _embed_query(self, query: str) -> list:
         """
         Embeds the user's query using the specified Bedrock embedding model.
+        Embeddings are reused from the shared cache when one is configured.
+
+        Raises:
+            DependencyUnavailable: If the circuit is open or the call failed with a throttling,
+                timeout or server error, so that an outage is not mistaken for an empty result.
         """
         if self.mock:
             logger.info("Embedding query (mock)...")
-            return [0.0] * 1024 # Titan text embedding dimension
+            return pseudo_embedding(query, self.embedding_dim)
+
+        cache = get_shared_cache()
+        key = cache_key(self.embedding_model_id, self.embedding_dim, query)
+        if cache is not None:
+            cached = cache.get(EMBEDDINGS, key)
+            if cached is not None:
+                return cached
 
         logger.info("Embedding query (real)...")
         try:
-            body = json.dumps({"inputText": query})
-            response = self.bedrock_client.invoke_model(
-                body=body,
-                modelId=self.embedding_model_id,
-                accept="application/json",
-                contentType="application/json"
-            )
-            response_body = json.loads(response.get("body").read())
-            return response_body.get("embedding")
+            body = json.dumps({"inputText": query, "dimensions": self.embedding_dim, "normalize": True})
+            response_body = get_caller("bedrock_embedding").call(self._invoke_embedding_model, body)
+            embedding = response_body.get("embedding")
+            record_usage("query_embedding", self.embedding_model_id, input_tokens=response_body.get("inputTextTokenCount", 0))
+            if cache is not None and embedding:
+                cache.set(EMBEDDINGS, key, embedding)
+            return embedding
+        except DependencyUnavailable:
+            raise
         except Exception as e:
+            if is_retryable(e):
+                raise DependencyUnavailable(f"The embedding model is unavailable: {e}") from e
             logger.exception(f"Error embedding query: {e}")
             return None
 
-    def _search_milvus(self, query_embedding: list, top_n: int) -> list:
+    def _invoke_embedding_model(self, body: str) -> dict:
+        """
+        Performs a single embedding request against Bedrock.
+        """
+        return self._invoke_model(self.embedding_model_id, body)
+
+    def _invoke_model(self, model_id: str, body: str) -> dict:
+        """
+        Performs a single Bedrock model invocation.
+        """
+        response = self.bedrock_client.invoke_model(
+            body=body,
+            modelId=model_id,
+            accept="application/json",
+            contentType="application/json"
+        )
+        return json.loads(response.get("body").read())
+
+    def _search_milvus(
+        self,
+        query_embedding: list,
+        top_n: int,
+        filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+        include_archived: bool = False,
+        include_embeddings: bool = False,
+    ) -> list:
         """
         Searches the Milvus collection for the most relevant document chunks.
+
+        When generated questions are searched as well, a chunk found through both
+        keeps the smaller distance, so a question phrased like the query lifts its chunk.
         """
         if not query_embedding:
             logger.warning("No query embedding provided. Skipping search.")
             return []
             
-        logger.info(f"Searching Milvus for top {top_n} results...")
+        logger.info(f"Searching Milvus for top {top_n} results with filters {filters or {}}...")
         try:
-            search_params = {
-                "metric_type": "L2",
-                "params": {"nprobe": 10},
-            }
-            results = self.milvus_manager.collection.search(
-                data=[query_embedding],
-                anns_field="embedding",
-                param=search_params,
-                limit=top_n,
-                output_fields=["text", "metadata"]
-            )
-
-            return results[0]  # search returns a list of results for each query
+            if include_embeddings:
+                results = self.milvus_manager.search(query_embedding, limit=top_n, filters=filters, include_archived=include_archived,
+                                                     include_embeddings=True)
+            else:
+                results = self.milvus_manager.search(query_embedding, limit=top_n, filters=filters, include_archived=include_archived)
+        except ValueError:
+            # Invalid filters are the caller's error, not an empty result.
+            raise
         except Exception as e:
             logger.exception(f"Error searching Milvus: {e}")
+            self.degraded = True
             return []
+        if not self.use_questions:
+            return results
 
+        try:
+            question_hits = self.milvus_manager.search_questions(query_embedding, limit=top_n, filters=filters)
+        except Exception as e:
+            logger.warning(f"Error searching generated questions, using chunk hits only: {e}")
+            self.degraded = True
+            return results
+        if not question_hits:
+            return results
+        merged = {hit["id"]: hit for hit in results}
+        for hit in question_hits:
+            if hit["id"] not in merged or hit["distance"] < merged[hit["id"]]["distance"]:
+                merged[hit["id"]] = hit
+        metrics.incr("retrieve.question_hits", len(question_hits))
+        return sorted(merged.values(), key=lambda hit: hit["distance"])[:top_n]
     
 
 
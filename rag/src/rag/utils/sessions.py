@@ -0,0 +1,195 @@
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from .metrics import metrics
+
+CONDENSE_SYSTEM_PROMPT = "You rewrite follow-up questions to an HR policy assistant as standalone questions."
+CONDENSE_PROMPT = (
+    "Rewrite the follow-up question so that it can be understood without the conversation, "
+    "keeping its meaning and the employee's wording. If it already stands on its own, return it unchanged. "
+    "Return only the question.\n\n"
+    "{history}\nFollow-up: {query}"
+)
+# Openings that only make sense after an earlier question.
+_LEADING_CONNECTOR_RE = re.compile(r"^\s*(?:and|or|but|also|so|then|what about|how about|same for|what if)\b\s*", re.IGNORECASE)
+# Words that open a complete question; a short query without one is a fragment ("for part-timers?").
+_QUESTION_WORD_RE = re.compile(
+    r"\b(?:what|when|where|which|who|whom|whose|why|how)\b"
+    r"|^\s*(?:is|are|was|were|do|does|did|can|could|may|might|must|shall|should|will|would|have|has)\b",
+    re.IGNORECASE,
+)
+FOLLOW_UP_MAX_WORDS = 4
+
+
+def is_follow_up(query: str, history: Sequence[str]) -> bool:
+    """
+    Returns True if a query clearly needs the conversation's previous question to be understood.
+
+    Only a leading connector ("and for part-timers?", "what about contractors?")
+    or a short fragment without a question word counts. Complete questions are
+    taken as standalone even if they contain a pronoun, so they are retrieved,
+    shared and cached like any other query.
+    """
+    if not history:
+        return False
+    if _LEADING_CONNECTOR_RE.match(query):
+        return True
+    return len(query.split()) <= FOLLOW_UP_MAX_WORDS and not _QUESTION_WORD_RE.search(query)
+
+
+def condense_prompt(history: List[str], query: str) -> str:
+    """
+    Returns the prompt asking the LLM to rewrite a follow-up as a standalone question.
+    """
+    lines = "\n".join(f"Previous question: {question}" for question in history)
+    return CONDENSE_PROMPT.format(history=lines, query=query)
+
+
+def template_condense(history: List[str], query: str) -> str:
+    """
+    Combines the previous question and the follow-up without an LLM; used in mock mode and as a fallback.
+    """
+    if not history:
+        return query
+    follow_up = _LEADING_CONNECTOR_RE.sub("", query).strip()
+    return f"{history[-1].rstrip()} ({follow_up})"
+
+
+class Session:
+    """
+    One conversation: its recent standalone questions, and the candidates and query
+    embedding of its last retrieval, kept so a follow-up can start from them.
+    """
+
+    def __init__(self, session_id: str, max_turns: int):
+        self.id = session_id
+        self.history: deque = deque(maxlen=max_turns)
+        self.candidates: List[Dict[str, Any]] = []
+        self.query_embedding: Optional[np.ndarray] = None
+        self.scope: Optional[str] = None
+        self.last_used = time.monotonic()
+        self.size = 0
+
+    def prior(self, scope: str) -> List[Dict[str, Any]]:
+        """
+        Returns the last candidates if they were retrieved with the same filters, otherwise none.
+        """
+        return list(self.candidates) if self.scope == scope else []
+
+
+class SessionStore:
+    """
+    A bounded in-memory store of conversation sessions.
+
+    Sessions idle for `ttl` seconds are dropped, and the least recently used
+    ones go first once the kept candidates and embeddings exceed `max_bytes`.
+    Each worker process has its own store, so a conversation should stick to
+    one worker; a session the worker does not know simply starts afresh.
+    """
+
+    def __init__(self, ttl: float = 1800.0, max_bytes: int = 64 * 2 ** 20, max_turns: int = 5, max_candidates: int = 20,
+                 enabled: bool = True):
+        """
+        Args:
+            ttl (float): Seconds a session is kept after its last request.
+            max_bytes (int): Approximate memory allowed for all sessions.
+            max_turns (int): Previous questions kept for condensing follow-ups.
+            max_candidates (int): Retrieved chunks kept per session.
+            enabled (bool): Whether sessions are kept at all.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.max_candidates = max_candidates
+        self.enabled = enabled
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """
+        Builds the store from `SESSIONS`, `SESSION_TTL`, `SESSION_MAX_MB`, `SESSION_MAX_TURNS`
+        and `SESSION_CANDIDATES`.
+        """
+        return cls(
+            ttl=float(os.environ.get("SESSION_TTL", 1800)),
+            max_bytes=int(float(os.environ.get("SESSION_MAX_MB", 64)) * 2 ** 20),
+            max_turns=int(os.environ.get("SESSION_MAX_TURNS", 5)),
+            max_candidates=int(os.environ.get("SESSION_CANDIDATES", 20)),
+            enabled=os.environ.get("SESSIONS", "on").lower() != "off",
+        )
+
+    def get(self, session_id: Optional[str]) -> Session:
+        """
+        Returns the session with the given id, or a new session if it is unknown or has expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = Session(session_id or uuid.uuid4().hex, self.max_turns)
+                self._sessions[session.id] = session
+                metrics.incr("session.created")
+            else:
+                self._sessions.move_to_end(session.id)
+            session.last_used = now
+            return session
+
+    def update(self, session: Session, question: str, candidates: Optional[List[Dict[str, Any]]] = None,
+               query_embedding: Optional[List[float]] = None, scope: Optional[str] = None):
+        """
+        Records a turn: its standalone question and, when retrieval ran, its candidates and query embedding.
+        """
+        with self._lock:
+            session.history.append(question)
+            if candidates is not None:
+                kept = [
+                    {**hit, "embedding": np.asarray(hit["embedding"], dtype=np.float32)}
+                    for hit in candidates if hit.get("embedding") is not None
+                ][:self.max_candidates]
+                session.candidates = kept
+                session.query_embedding = np.asarray(query_embedding, dtype=np.float32) if query_embedding is not None else None
+                session.scope = scope
+            self._bytes -= session.size
+            session.size = self._measure(session)
+            self._bytes += session.size
+            session.last_used = time.monotonic()
+            if session.id not in self._sessions:
+                # Evicted while the turn was running; keep the conversation going.
+                self._sessions[session.id] = session
+            else:
+                self._sessions.move_to_end(session.id)
+            self._evict(session.last_used)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes}
+
+    def _evict(self, now: float):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.ttl and self._bytes <= self.max_bytes:
+                break
+            del self._sessions[session_id]
+            self._bytes -= session.size
+            metrics.incr("session.evicted")
+            logger.info(f"Evicted session {session_id}.")
+
+    @staticmethod
+    def _measure(session: Session) -> int:
+        size = sum(len(question) for question in session.history)
+        for hit in session.candidates:
+            size += len(hit.get("text") or "") + hit["embedding"].nbytes + 200
+        if session.query_embedding is not None:
+            size += session.query_embedding.nbytes
+        return size
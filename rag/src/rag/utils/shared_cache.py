@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from .metrics import metrics
+
+# Where `rag serve` keeps the cache unless SHARED_CACHE_PATH is set.
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), "rag_shared_cache.sqlite3")
+# Namespaces of the shared cache and their default time-to-live in seconds.
+EMBEDDINGS = "embedding"
+RETRIEVALS = "retrieval"
+ANSWERS = "answer"
+CONFIGS = "config"
+_DEFAULT_TTLS = {
+    EMBEDDINGS: 7 * 24 * 3600.0,
+    RETRIEVALS: 3600.0,
+    ANSWERS: 3600.0,
+    CONFIGS: 24 * 3600.0,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_expiry ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    Returns a fixed-length key for arbitrary JSON-serializable parts.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SharedCache:
+    """
+    A key-value cache in a local SQLite file, shared by every worker process on the host.
+
+    Values are stored as JSON under a namespace with a time-to-live. The file
+    also holds the knowledge-base generation: a counter bumped by every write
+    to the knowledge base, which callers put in the key of anything derived
+    from search results, so answers never outlive the documents they cite.
+    SQLite's write-ahead log lets readers in all workers proceed while one
+    writes, and each thread keeps its own connection.
+    """
+
+    def __init__(self, path: str, max_entries: int = 20000, ttls: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            path (str): The SQLite file, created if missing.
+            max_entries (int): Entries kept once expired ones are pruned; the soonest to expire go first.
+            ttls (Optional[Dict[str, float]]): Time-to-live in seconds by namespace.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = {**_DEFAULT_TTLS, **(ttls or {})}
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> Optional["SharedCache"]:
+        """
+        Creates the cache at `SHARED_CACHE_PATH`, or returns None when the variable is unset or "off".
+
+        `SHARED_CACHE_MAX_ENTRIES` bounds its size and `<NAMESPACE>_CACHE_TTL`
+        (e.g. `ANSWER_CACHE_TTL`) overrides a namespace's time-to-live; a TTL of 0 disables the namespace.
+        """
+        path = os.environ.get("SHARED_CACHE_PATH", "")
+        if not path or path.lower() == "off":
+            return None
+        ttls = {
+            namespace: float(os.environ[f"{namespace.upper()}_CACHE_TTL"])
+            for namespace in _DEFAULT_TTLS
+            if f"{namespace.upper()}_CACHE_TTL" in os.environ
+        }
+        return cls(path, max_entries=int(os.environ.get("SHARED_CACHE_MAX_ENTRIES", 20000)), ttls=ttls)
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Returns this thread's connection, opening it in this process if needed.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Returns the cached value, or None if it is missing, expired or unreadable.
+        """
+        if not self.ttls.get(namespace):
+            return None
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?", (namespace, key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            return None
+        metrics.incr(f"cache.{namespace}.{'hits' if row else 'misses'}")
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Stores a JSON-serializable value. Failures are logged, since the cache is only an optimization.
+        """
+        ttl = self.ttls.get(namespace) if ttl is None else ttl
+        if not ttl:
+            return
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), time.time() + ttl),
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self.prune()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Shared cache write failed: {e}")
+
+    def prune(self) -> int:
+        """
+        Deletes expired entries, then the soonest-expiring ones beyond `max_entries`.
+
+        Returns:
+            int: The number of entries deleted.
+        """
+        connection = self._connect()
+        deleted = connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),)).rowcount
+        deleted += connection.execute(
+            "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        return deleted
+
+    def generation(self) -> int:
+        """
+        Returns the current knowledge-base generation.
+        """
+        try:
+            row = self._connect().execute("SELECT value FROM state WHERE name = 'generation'").fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            return -1
+        return row[0] if row else 0
+
+    def bump_generation(self) -> int:
+        """
+        Marks every cached result derived from the knowledge base as stale, in every worker.
+
+        Returns:
+            int: The new generation.
+        """
+        connection = self._connect()
+        connection.execute(
+            "INSERT INTO state (name, value) VALUES ('generation', 1) ON CONFLICT(name) DO UPDATE SET value = value + 1"
+        )
+        # Results of older generations can never be read again.
+        connection.execute("DELETE FROM entries WHERE namespace IN (?, ?)", (RETRIEVALS, ANSWERS))
+        return self.generation()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the live entry count per namespace and the knowledge-base generation.
+        """
+        rows = self._connect().execute(
+            "SELECT namespace, COUNT(*) FROM entries WHERE expires_at > ? GROUP BY namespace", (time.time(),)
+        ).fetchall()
+        return {"path": self.path, "generation": self.generation(), "entries": dict(rows)}
+
+    def clear(self):
+        """
+        Deletes every entry and resets the generation.
+        """
+        connection = self._connect()
+        connection.execute("DELETE FROM entries")
+        connection.execute("DELETE FROM state")
+
+
+_cache: Optional[SharedCache] = None
+_cache_loaded = False
+_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """
+    Returns the process-wide shared cache, or None when `SHARED_CACHE_PATH` is not set.
+    """
+    global _cache, _cache_loaded
+    with _cache_lock:
+        if not _cache_loaded:
+            try:
+                _cache = SharedCache.from_env()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Shared cache unavailable, caching disabled: {e}")
+                _cache = None
+            _cache_loaded = True
+            if _cache is not None:
+                logger.info(f"Using the shared cache at {_cache.path}.")
+        return _cache
+
+
+def reset_shared_cache():
+    """
+    Forgets the process-wide cache, so the next use re-reads the environment.
+    """
+    global _cache, _cache_loaded
+    with _cache_lock:
+        _cache, _cache_loaded = None, False
+
+
+def invalidate_knowledge_base():
+    """
+    Bumps the knowledge-base generation after documents were added, moved or removed.
+
+    Without `SHARED_CACHE_PATH` the cache at `DEFAULT_PATH` is invalidated if a
+    server created it, so CLI commands reach a server started with the defaults.
+    """
+    cache = get_shared_cache()
+    try:
+        if cache is None and os.path.exists(DEFAULT_PATH) and os.environ.get("SHARED_CACHE_PATH", "").lower() != "off":
+            cache = SharedCache(DEFAULT_PATH)
+        if cache is None:
+            return
+        generation = cache.bump_generation()
+        logger.info(f"Knowledge base changed; cached answers invalidated (generation {generation}).")
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Could not invalidate the shared cache: {e}")
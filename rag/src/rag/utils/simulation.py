@@ -0,0 +1,851 @@
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+from botocore.exceptions import ClientError
+from loguru import logger
+
+from .cost import estimate_tokens
+from .metrics import metrics
+from .prompt_cache import CACHE_CONTROL, crew_inputs, mark_cache_points, prompt_cache_enabled, render_task_messages
+from .sessions import template_condense
+from .milvus_manager import (
+    ARCHIVE_SUFFIX,
+    DEFAULT_TENANT,
+    PARTITION_KEY_FIELD,
+    QUESTIONS_SUFFIX,
+    SUMMARIES_SUFFIX,
+    SUMMARY_LEVELS,
+    TAG_FIELDS,
+    TIERS,
+    MilvusManager,
+)
+
+_TOKEN_RE = re.compile(r"\w+")
+# Strings, numbers, operators and punctuation, and names of a Milvus boolean expression.
+_EXPR_TOKEN_RE = re.compile(r'\s*(?:("(?:[^"\\]|\\.)*")|(-?\d+(?:\.\d+)?)|(==|!=|[()\[\],])|([A-Za-z_]\w*))')
+
+# Default behaviour of each simulated dependency: (median ms, p99 ms).
+# Override with SIM_<NAME>_LATENCY_MS="median,p99", SIM_<NAME>_ERROR_RATE and
+# SIM_<NAME>_CAPACITY (concurrent calls served before throttling; 0 is unlimited).
+_DEFAULT_LATENCIES = {
+    "bedrock_embedding": (60.0, 250.0),
+    "bedrock_caption": (1200.0, 4000.0),
+    "cohere_rerank": (150.0, 600.0),
+    "s3": (25.0, 120.0),
+    "milvus_search": (10.0, 60.0),
+    "milvus_insert": (20.0, 100.0),
+    "llm": (6000.0, 15000.0),
+}
+
+
+def simulation_enabled() -> bool:
+    """
+    Returns True if external calls should go to the simulated backend (`RAG_BACKEND=simulated`).
+    """
+    return os.environ.get("RAG_BACKEND", "aws").lower() == "simulated"
+
+
+def pseudo_embedding(text: str, dim: int = 1024) -> List[float]:
+    """
+    Returns a deterministic, normalized embedding for a text.
+
+    Unigrams and bigrams are hashed to signed buckets, so texts that share
+    words are close to each other and retrieval and reranking behave roughly
+    as they would on real embeddings, at no cost.
+
+    Args:
+        text (str): The text to embed.
+        dim (int): The embedding dimension.
+    """
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    vector = np.zeros(dim, dtype=np.float32)
+    for gram in tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]:
+        digest = int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "little")
+        vector[digest % dim] += 1.0 if digest >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    if not norm:
+        vector[0], norm = 1.0, 1.0
+    return (vector / norm).tolist()
+
+
+def _client_error(code: str, status: int, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": f"Simulated {code}"}, "ResponseMetadata": {"HTTPStatusCode": status}}, operation)
+
+
+class ServiceProfile:
+    """
+    Latency distribution, error rate and capacity of one simulated dependency.
+    """
+
+    def __init__(self, median_ms: float, p99_ms: float, error_rate: float = 0.0, capacity: int = 0):
+        """
+        Args:
+            median_ms (float): Median latency of one call.
+            p99_ms (float): 99th percentile latency; latencies are log-normal.
+            error_rate (float): Probability that a call fails with a retryable 503.
+            capacity (int): Concurrent calls served before further calls are throttled; 0 is unlimited.
+        """
+        self.median_ms = median_ms
+        self.p99_ms = max(p99_ms, median_ms)
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.sigma = math.log(self.p99_ms / self.median_ms) / 2.326 if median_ms > 0 else 0.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "ServiceProfile":
+        """
+        Builds the profile of a dependency from its defaults and `SIM_<NAME>_*` overrides.
+        """
+        prefix = f"SIM_{name.upper()}"
+        median, p99 = _DEFAULT_LATENCIES.get(name, (50.0, 200.0))
+        latency = os.environ.get(f"{prefix}_LATENCY_MS")
+        if latency:
+            median, p99 = (float(value) for value in latency.split(","))
+        return cls(
+            median_ms=median,
+            p99_ms=p99,
+            error_rate=float(os.environ.get(f"{prefix}_ERROR_RATE", 0.0)),
+            capacity=int(os.environ.get(f"{prefix}_CAPACITY", 0)),
+        )
+
+
+class SimulatedService:
+    """
+    A dependency that sleeps for a sampled latency and fails or throttles like the real one.
+    """
+
+    def __init__(self, name: str, profile: ServiceProfile, latency_scale: float = 1.0):
+        """
+        Args:
+            name (str): The dependency name, used in metrics.
+            profile (ServiceProfile): How the dependency behaves.
+            latency_scale (float): Multiplier applied to every latency, to compress long runs.
+        """
+        self.name = name
+        self.profile = profile
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def call(self, work: float = 1.0, operation: str = "InvokeModel"):
+        """
+        Simulates one call.
+
+        Args:
+            work (float): Relative size of the request; latency scales with it.
+            operation (str): Operation name reported in errors.
+
+        Raises:
+            ClientError: A ThrottlingException when over capacity, or a ServiceUnavailableException
+                at the configured error rate.
+        """
+        with self._lock:
+            self._active += 1
+            active = self._active
+        try:
+            metrics.incr(f"simulation.{self.name}.calls")
+            if self.profile.capacity and active > self.profile.capacity:
+                metrics.incr(f"simulation.{self.name}.throttled")
+                time.sleep(0.005 * self.latency_scale)
+                raise _client_error("ThrottlingException", 429, operation)
+            if self.profile.error_rate and random.random() < self.profile.error_rate:
+                metrics.incr(f"simulation.{self.name}.errors")
+                raise _client_error("ServiceUnavailableException", 503, operation)
+            latency = random.lognormvariate(math.log(self.profile.median_ms), self.profile.sigma) / 1000
+            time.sleep(latency * work * self.latency_scale)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+
+class SimulatedBedrockClient:
+    """
+    Stands in for the `bedrock-runtime` client: Titan embeddings, and Nova image captions,
+    question generation, summaries and follow-up condensing.
+    """
+
+    def __init__(self, embedding: SimulatedService, caption: SimulatedService):
+        self.embedding = embedding
+        self.caption = caption
+
+    def invoke_model(self, body: str, modelId: str, accept: str = None, contentType: str = None) -> Dict[str, Any]:
+        payload = json.loads(body)
+        if "inputText" in payload:
+            text = payload["inputText"]
+            self.embedding.call(work=0.5 + min(len(text), 8000) / 4000)
+            response = {
+                "embedding": pseudo_embedding(text, int(payload.get("dimensions", 1024))),
+                "inputTextTokenCount": len(_TOKEN_RE.findall(text)),
+            }
+        elif "system" in payload:
+            prompt = payload["messages"][0]["content"][0]["text"]
+            self.caption.call(work=0.5)
+            excerpt = prompt.split("\n\n", 1)[-1]
+            sentences = [sentence.strip() for sentence in re.split(r"[.\n]", excerpt) if len(sentence.split()) >= 3]
+            system = payload["system"][0]["text"].lower()
+            if "standalone" in system:
+                follow_up = re.search(r"^Follow-up: (.*)$", excerpt, re.MULTILINE)
+                text = template_condense(re.findall(r"^Previous question: (.*)$", excerpt, re.MULTILINE), follow_up.group(1))
+            elif "summar" in system:
+                text = ". ".join(sentences[:3]) + "."
+            else:
+                text = "\n".join(f"{i + 1}. What does the policy say about {sentence.lower()}?" for i, sentence in enumerate(sentences[:3]))
+            response = {
+                "output": {"message": {"content": [{"text": text}]}},
+                "usage": {"inputTokens": len(_TOKEN_RE.findall(prompt)) + 40, "outputTokens": len(_TOKEN_RE.findall(text))},
+            }
+        else:
+            image = payload["messages"][0]["content"][0]["image"]["source"]["bytes"]
+            # Larger images take longer to upload and to encode into vision tokens.
+            self.caption.call(work=0.5 + len(image) / 1_000_000)
+            text = "A simulated description of a chart in the document."
+            response = {
+                "output": {"message": {"content": [{"text": text}]}},
+                # Nova bills images by area; the base64 size is a close enough proxy here.
+                "usage": {"inputTokens": 100 + len(image) // 1000, "outputTokens": len(_TOKEN_RE.findall(text))},
+            }
+        return {"body": io.BytesIO(json.dumps(response).encode())}
+
+
+class SimulatedS3Client:
+    """
+    Stands in for the S3 client used to publish document images.
+    """
+
+    def __init__(self, service: SimulatedService):
+        self.service = service
+        self._objects = set()
+        self._lock = threading.Lock()
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        self.service.call(operation="HeadObject")
+        with self._lock:
+            if (Bucket, Key) not in self._objects:
+                raise _client_error("404", 404, "HeadObject")
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket: str, Key: str, ExtraArgs: Optional[Dict[str, Any]] = None):
+        size = len(Fileobj.read())
+        self.service.call(work=1 + size / (1024 * 1024), operation="PutObject")
+        with self._lock:
+            self._objects.add((Bucket, Key))
+
+
+class _RerankHit:
+    def __init__(self, index: int, relevance_score: float):
+        self.index = index
+        self.relevance_score = relevance_score
+
+
+class _BilledUnits:
+    def __init__(self, search_units: int):
+        self.search_units = search_units
+
+
+class _RerankMeta:
+    def __init__(self, billed_units: _BilledUnits):
+        self.billed_units = billed_units
+
+
+class _RerankResponse:
+    def __init__(self, results: List[_RerankHit], search_units: int = 1):
+        self.results = results
+        self.meta = _RerankMeta(_BilledUnits(search_units))
+
+
+class SimulatedReranker:
+    """
+    Stands in for the Cohere rerank client, scoring documents by pseudo-embedding similarity.
+    """
+
+    def __init__(self, service: SimulatedService):
+        self.service = service
+
+    def rerank(self, model: str, query: str, documents: List[str], top_n: int, **kwargs) -> _RerankResponse:
+        self.service.call(work=0.5 + len(documents) / 100, operation="Rerank")
+        query_vector = np.asarray(pseudo_embedding(query, 512))
+        scores = [float(np.dot(query_vector, pseudo_embedding(document or "", 512))) for document in documents]
+        order = sorted(range(len(documents)), key=lambda index: scores[index], reverse=True)[:top_n]
+        # Cohere bills one search unit per query and up to 100 documents.
+        return _RerankResponse([_RerankHit(index, max(0.0, scores[index])) for index in order], search_units=-(-len(documents) // 100) or 1)
+
+
+class _UsageMetrics:
+    def __init__(self, prompt_tokens: int, completion_tokens: int, successful_requests: int, cached_prompt_tokens: int = 0):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.successful_requests = successful_requests
+        self.cached_prompt_tokens = cached_prompt_tokens
+
+
+class SimulatedPromptCache:
+    """
+    Stands in for a provider's prompt cache and counts the prompt tokens of each
+    call that are read from it versus processed in full.
+
+    As on Bedrock, the prompt up to each cache marker is cached when it has at
+    least `min_tokens` tokens, and stays cached for `ttl` seconds after its last
+    use; a call whose prompt starts with a cached prefix reads the longest one
+    from the cache.
+    """
+
+    def __init__(self, ttl: float = 300.0, min_tokens: int = 1024):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self._prefixes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SimulatedPromptCache":
+        return cls(ttl=float(os.environ.get("SIM_PROMPT_CACHE_TTL", 300)),
+                   min_tokens=int(os.environ.get("SIM_PROMPT_CACHE_MIN_TOKENS", 1024)))
+
+    def complete(self, messages: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Accounts one call with the given messages.
+
+        Returns:
+            Dict[str, int]: `prompt_tokens` in total, and the `cached_tokens` among them.
+        """
+        prefix, tokens, checkpoints = hashlib.sha256(), 0, []
+        for message in messages:
+            content = message["content"]
+            blocks = content if isinstance(content, list) else [{"type": "text", "text": content}]
+            prefix.update(message["role"].encode())
+            for block in blocks:
+                prefix.update(block["text"].encode())
+                tokens += estimate_tokens(block["text"])
+                if block.get("cache_control") == CACHE_CONTROL and tokens >= self.min_tokens:
+                    checkpoints.append((prefix.copy().hexdigest(), tokens))
+        now = time.monotonic()
+        cached = 0
+        with self._lock:
+            for key, prefix_tokens in checkpoints:
+                if now - self._prefixes.get(key, -math.inf) < self.ttl:
+                    cached = prefix_tokens
+                self._prefixes[key] = now
+        metrics.incr("simulation.prompt_cache.prompt_tokens", tokens)
+        metrics.incr("simulation.prompt_cache.cached_tokens", cached)
+        return {"prompt_tokens": tokens, "cached_tokens": cached}
+
+
+class SimulatedReport:
+    """
+    The result of a simulated crew run, readable like a CrewOutput.
+    """
+
+    def __init__(self, raw: str, token_usage: Optional[_UsageMetrics] = None):
+        self.raw = raw
+        self.token_usage = token_usage or _UsageMetrics(0, 0, 0)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __str__(self):
+        return self.raw
+
+
+class _SimulatedStore:
+    """
+    The rows of one hot collection, its archive, its generated questions and its summaries, held in memory.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows: Dict[str, List[Dict[str, Any]]] = {tier: [] for tier in TIERS}
+        self.questions: List[Dict[str, Any]] = []
+        self.summaries: List[Dict[str, Any]] = []
+        self.next_id = 1
+
+
+class SimulatedBackend:
+    """
+    Process-wide simulated dependencies and in-memory knowledge base.
+    """
+
+    def __init__(self):
+        scale = float(os.environ.get("SIM_LATENCY_SCALE", 1.0))
+        self.services = {name: SimulatedService(name, ServiceProfile.from_env(name), scale) for name in _DEFAULT_LATENCIES}
+        self.bedrock = SimulatedBedrockClient(self.services["bedrock_embedding"], self.services["bedrock_caption"])
+        self.s3 = SimulatedS3Client(self.services["s3"])
+        self.reranker = SimulatedReranker(self.services["cohere_rerank"])
+        self.prompt_cache = SimulatedPromptCache.from_env()
+        self._stores: Dict[str, _SimulatedStore] = {}
+        self._lock = threading.Lock()
+
+    def store(self, collection_name: str) -> _SimulatedStore:
+        with self._lock:
+            return self._stores.setdefault(collection_name, _SimulatedStore())
+
+    def generate_report(self, query: str, documents: list, fast: bool = False, pinned_documents: Optional[list] = None) -> SimulatedReport:
+        """
+        Simulates the two-task crew run, or the single-task fast crew: latency
+        and token usage grow with the amount of context.
+
+        The prompts are rendered from the crew's task templates, with cache points
+        when `prompt_cache_enabled` says the model supports them, and accounted by
+        the simulated prompt cache.
+        """
+        pinned_documents = pinned_documents or []
+        every_document = list(pinned_documents) + list(documents)
+        context = sum(len(str(document)) for document in every_document)
+        tasks = 1 if fast else 2
+        self.services["llm"].call(work=(0.4 * tasks) + context / 20000, operation="Converse")
+        excerpt = " ".join(str(document).split(".")[0] for document in every_document[:3])
+        raw = f"# Report: {query}\n\nBased on {len(every_document)} documents. {excerpt}"
+        output_tokens = len(_TOKEN_RE.findall(raw))
+        inputs = crew_inputs(query, documents, pinned_documents)
+        # The standard crew passes the guide written by its first task on to the second.
+        steps = [("report_writer", "quick_report_task", "")] if fast else [
+            ("search_synthesizer", "synthesize_guide_task", ""),
+            ("report_writer", "report_generation_task", raw),
+        ]
+        caching = prompt_cache_enabled(os.environ.get("MODEL"))
+        prompt_tokens = cached_tokens = 0
+        for agent, task, previous_output in steps:
+            messages = mark_cache_points(render_task_messages(agent, task, inputs, previous_output), caching)
+            usage = self.prompt_cache.complete(messages)
+            prompt_tokens += usage["prompt_tokens"]
+            cached_tokens += usage["cached_tokens"]
+        return SimulatedReport(raw, _UsageMetrics(prompt_tokens, output_tokens * tasks, tasks, cached_tokens))
+
+
+_backend: Optional[SimulatedBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> SimulatedBackend:
+    """
+    Returns the process-wide simulated backend, creating it from the environment on first use.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = SimulatedBackend()
+            logger.info("Using the simulated backend for Bedrock, Cohere, S3 and Milvus.")
+        return _backend
+
+
+def reset_backend():
+    """
+    Discards the simulated backend and its data, so the next use re-reads the environment.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def compile_expr(expr: str) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Compiles a Milvus boolean expression into a predicate over simulated rows.
+
+    The expressions MilvusManager builds are supported: `==`, `!=`, `in` and
+    `not in` on `id`, tag fields and `metadata["key"]`, `json_contains` and
+    `json_contains_any`, combined with `and`, `or`, `not` and parentheses.
+    Tag fields missing from a row are read from its metadata, with the defaults
+    MilvusManager stores them with.
+
+    Raises:
+        ValueError: If the expression uses anything else.
+    """
+    return _ExprParser(expr).parse()
+
+
+def _row_field(row: Dict[str, Any], name: str) -> Any:
+    if name not in row and name in TAG_FIELDS:
+        return str(row["metadata"].get(name) or (DEFAULT_TENANT if name == PARTITION_KEY_FIELD else ""))
+    return row.get(name)
+
+
+class _ExprParser:
+    """
+    A recursive-descent parser for the subset of Milvus expressions `compile_expr` supports.
+    """
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        self.tokens = []
+        self.position = 0
+        text, offset = expr.rstrip(), 0
+        while offset < len(text):
+            match = _EXPR_TOKEN_RE.match(text, offset)
+            if match is None:
+                self._fail()
+            string, number, symbol, name = match.groups()
+            if string is not None:
+                self.tokens.append(("value", json.loads(string)))
+            elif number is not None:
+                self.tokens.append(("value", float(number) if "." in number else int(number)))
+            elif symbol is not None:
+                self.tokens.append(("symbol", symbol))
+            else:
+                self.tokens.append(("name", name))
+            offset = match.end()
+
+    def parse(self) -> Callable[[Dict[str, Any]], bool]:
+        predicate = self._or()
+        if self.position != len(self.tokens):
+            self._fail()
+        return predicate
+
+    def _fail(self):
+        raise ValueError(f"The simulated backend does not support the expression '{self.expr}'.")
+
+    def _peek(self, kind: str, text: Optional[str] = None) -> bool:
+        if self.position >= len(self.tokens):
+            return False
+        token_kind, value = self.tokens[self.position]
+        return token_kind == kind and (text is None or value == text)
+
+    def _take(self, kind: str, text: Optional[str] = None) -> Any:
+        if not self._peek(kind, text):
+            self._fail()
+        self.position += 1
+        return self.tokens[self.position - 1][1]
+
+    def _or(self):
+        terms = [self._and()]
+        while self._peek("name", "or"):
+            self.position += 1
+            terms.append(self._and())
+        return terms[0] if len(terms) == 1 else lambda row: any(term(row) for term in terms)
+
+    def _and(self):
+        terms = [self._not()]
+        while self._peek("name", "and"):
+            self.position += 1
+            terms.append(self._not())
+        return terms[0] if len(terms) == 1 else lambda row: all(term(row) for term in terms)
+
+    def _not(self):
+        if self._peek("name", "not"):
+            self.position += 1
+            term = self._not()
+            return lambda row: not term(row)
+        return self._comparison()
+
+    def _comparison(self):
+        if self._peek("symbol", "("):
+            self.position += 1
+            term = self._or()
+            self._take("symbol", ")")
+            return term
+        name = self._take("name")
+        if name in ("json_contains", "json_contains_any"):
+            self._take("symbol", "(")
+            field = self._field(self._take("name"))
+            self._take("symbol", ",")
+            value = self._value()
+            self._take("symbol", ")")
+            if name == "json_contains":
+                return lambda row: isinstance(field(row), list) and value in field(row)
+            if not isinstance(value, list):
+                self._fail()
+            return lambda row: isinstance(field(row), list) and any(item in field(row) for item in value)
+        field = self._field(name)
+        if self._peek("symbol", "==") or self._peek("symbol", "!="):
+            equal = self._take("symbol") == "=="
+            value = self._value()
+            return lambda row: field(row) is not None and (field(row) == value) == equal
+        negated = self._peek("name", "not")
+        if negated:
+            self.position += 1
+        self._take("name", "in")
+        values = self._value()
+        if not isinstance(values, list):
+            self._fail()
+        return lambda row: field(row) is not None and (field(row) in values) != negated
+
+    def _field(self, name: str):
+        if not self._peek("symbol", "["):
+            return lambda row: _row_field(row, name)
+        self.position += 1
+        key = self._take("value")
+        self._take("symbol", "]")
+        if name != "metadata" or not isinstance(key, str):
+            self._fail()
+        return lambda row: row["metadata"].get(key)
+
+    def _value(self) -> Any:
+        if not self._peek("symbol", "["):
+            return self._take("value")
+        self.position += 1
+        values = []
+        while not self._peek("symbol", "]"):
+            if values:
+                self._take("symbol", ",")
+            values.append(self._take("value"))
+        self.position += 1
+        return values
+
+
+class SimulatedMilvusManager(MilvusManager):
+    """
+    An in-memory MilvusManager with simulated search and insert latency.
+
+    Search is exact L2 over the stored vectors. Tag filters and expressions are
+    evaluated over the rows with `compile_expr`, so the operations MilvusManager
+    builds on expressions, such as superseding a document, are inherited from it.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: str = "19530", collection_name: str = "rag_collection",
+                 embedding_dim: Optional[int] = None, quantization: Optional[str] = None):
+        self.collection_name = collection_name
+        self.archive_collection_name = f"{collection_name}{ARCHIVE_SUFFIX}"
+        self.questions_collection_name = f"{collection_name}{QUESTIONS_SUFFIX}"
+        self.summaries_collection_name = f"{collection_name}{SUMMARIES_SUFFIX}"
+        self.embedding_dim = int(embedding_dim or os.environ.get("EMBEDDING_DIMENSIONS", 1024))
+        self.quantization = "none"
+        self.tag_fields = TAG_FIELDS
+        self.backend = get_backend()
+        self._store = self.backend.store(collection_name)
+
+    def search(self, query_embedding: List[float], limit: int, expr: Optional[str] = None,
+               filters: Optional[Dict[str, Union[str, List[str]]]] = None, include_archived: bool = False,
+               include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        matches = self._where(self._scope_expr(expr, filters))
+        self.backend.services["milvus_search"].call(operation="Search")
+        tiers = TIERS if include_archived else ("hot",)
+        with self._store.lock:
+            rows = [(tier, row) for tier in tiers for row in self._store.rows[tier] if matches(row)]
+        if not rows:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = np.sum((np.stack([row["embedding"] for _, row in rows]) - query) ** 2, axis=1)
+        hits = [
+            {"id": rows[i][1]["id"], "distance": float(distances[i]), "text": rows[i][1]["text"], "metadata": rows[i][1]["metadata"], "tier": rows[i][0]}
+            for i in np.argsort(distances)[:limit]
+        ]
+        if include_embeddings:
+            embeddings = {row["id"]: row["embedding"] for _, row in rows}
+            for hit in hits:
+                hit["embedding"] = embeddings[hit["id"]].tolist()
+        return hits
+
+    def search_questions(self, query_embedding: List[float], limit: int,
+                         filters: Optional[Dict[str, Union[str, List[str]]]] = None) -> List[Dict[str, Any]]:
+        matches = self._where(self.build_filter_expr(filters))
+        self.backend.services["milvus_search"].call(operation="Search")
+        with self._store.lock:
+            parents = {row["id"]: row for row in self._store.rows["hot"] if matches(row)}
+            questions = [question for question in self._store.questions if question["parent_id"] in parents]
+        if not questions:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = np.sum((np.stack([question["embedding"] for question in questions]) - query) ** 2, axis=1)
+        best: Dict[int, Dict[str, Any]] = {}
+        for i in np.argsort(distances)[:limit]:
+            parent_id = questions[i]["parent_id"]
+            if parent_id not in best:
+                best[parent_id] = {"distance": float(distances[i]), "matched_question": questions[i]["text"]}
+        return [
+            {"id": parent_id, "text": parents[parent_id]["text"], "metadata": parents[parent_id]["metadata"], "tier": "hot", **match}
+            for parent_id, match in best.items()
+        ]
+
+    def search_summaries(self, query_embedding: List[float], limit: int, level: str,
+                         filters: Optional[Dict[str, Union[str, List[str]]]] = None,
+                         sources: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if level not in SUMMARY_LEVELS:
+            raise ValueError(f"Unknown summary level '{level}'; expected one of {SUMMARY_LEVELS}.")
+        matches = self._where(self.build_filter_expr(filters))
+        self.backend.services["milvus_search"].call(operation="Search")
+        wanted = set(sources) if sources is not None else None
+        with self._store.lock:
+            rows = [
+                row for row in self._store.summaries
+                if row["metadata"]["level"] == level and (wanted is None or row["metadata"]["source"] in wanted) and matches(row)
+            ]
+        if not rows:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = np.sum((np.stack([row["embedding"] for row in rows]) - query) ** 2, axis=1)
+        return [
+            {"id": rows[i]["id"], "distance": float(distances[i]), "text": rows[i]["text"], "metadata": rows[i]["metadata"]}
+            for i in np.argsort(distances)[:limit]
+        ]
+
+    def insert_summaries(self, summaries: List[Dict[str, Any]]) -> int:
+        if not summaries:
+            return 0
+        self.backend.services["milvus_insert"].call(work=0.5 + len(summaries) / 200, operation="Insert")
+        replaced = {(summary["metadata"]["source"], summary["metadata"].get(PARTITION_KEY_FIELD) or DEFAULT_TENANT) for summary in summaries}
+        with self._store.lock:
+            self._store.summaries = [
+                row for row in self._store.summaries
+                if (row["metadata"]["source"], row["metadata"].get(PARTITION_KEY_FIELD) or DEFAULT_TENANT) not in replaced
+            ]
+            for summary in summaries:
+                self._store.summaries.append({
+                    "id": self._store.next_id,
+                    "embedding": np.asarray(summary["embedding"], dtype=np.float32),
+                    "text": summary["text"],
+                    "metadata": dict(summary["metadata"]),
+                })
+                self._store.next_id += 1
+        return len(summaries)
+
+    @staticmethod
+    def _where(expr: Optional[str]) -> Callable[[Dict[str, Any]], bool]:
+        return compile_expr(expr) if expr else lambda row: True
+
+    def insert_data(self, processed_chunks: list, supersede: bool = False):
+        if not processed_chunks:
+            logger.warning("No data to insert.")
+            return None
+        self.backend.services["milvus_insert"].call(work=0.5 + len(processed_chunks) / 200, operation="Insert")
+        with self._store.lock:
+            ids = list(range(self._store.next_id, self._store.next_id + len(processed_chunks)))
+            self._store.next_id += len(processed_chunks)
+            for row_id, chunk in zip(ids, processed_chunks):
+                self._store.rows["hot"].append({
+                    "id": row_id,
+                    "embedding": np.asarray(chunk["embedding"], dtype=np.float32),
+                    "text": chunk["text"],
+                    "metadata": dict(chunk.get("metadata", {})),
+                })
+                self._store.questions.extend(
+                    {"parent_id": row_id, "text": question["text"], "embedding": np.asarray(question["embedding"], dtype=np.float32)}
+                    for question in chunk.get("questions") or []
+                )
+        if supersede:
+            for source, tenant in {(c.get("metadata", {}).get("source"), c.get("metadata", {}).get(PARTITION_KEY_FIELD)) for c in processed_chunks}:
+                if source:
+                    self.supersede_source(source, ids, tenant)
+        return _InsertResult(ids)
+
+    def iter_rows(self, tier: str = "hot", batch_size: int = 1000, expr: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}'; expected one of {TIERS}.")
+        matches = self._where(expr)
+        with self._store.lock:
+            rows = [row for row in self._store.rows[tier] if matches(row)]
+        for start in range(0, len(rows), batch_size):
+            yield [{**row, "embedding": row["embedding"].tolist()} for row in rows[start:start + batch_size]]
+
+    def bulk_insert(self, processed_chunks: list, tier: str = "hot") -> int:
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}'; expected one of {TIERS}.")
+        with self._store.lock:
+            for chunk in processed_chunks:
+                self._store.rows[tier].append({
+                    "id": self._store.next_id,
+                    "embedding": np.asarray(chunk["embedding"], dtype=np.float32),
+                    "text": chunk["text"],
+                    "metadata": dict(chunk.get("metadata", {})),
+                })
+                self._store.next_id += 1
+        return len(processed_chunks)
+
+    def flush(self):
+        pass
+
+    def count_rows(self, tier: str = "hot") -> int:
+        with self._store.lock:
+            return len(self._store.rows[tier])
+
+    def _query_hot(self, expr: str, output_fields: List[str], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        matches = self._where(expr)
+        with self._store.lock:
+            rows = [row for row in self._store.rows["hot"] if matches(row)][:limit]
+        return [
+            {field: row[field].tolist() if field == "embedding" else row[field] for field in output_fields}
+            for row in rows
+        ]
+
+    def get_rows(self, ids: List[int], tier: str = "hot", include_embeddings: bool = True) -> List[Dict[str, Any]]:
+        wanted = set(ids)
+        with self._store.lock:
+            rows = [row for row in self._store.rows[tier] if row["id"] in wanted]
+            if not include_embeddings:
+                return [{key: value for key, value in row.items() if key != "embedding"} for row in rows]
+            return [{**row, "embedding": row["embedding"].tolist()} for row in rows]
+
+    def replace_rows(self, processed_chunks: list, delete_ids: List[int], tier: str = "hot") -> List[int]:
+        deleted = set(delete_ids)
+        with self._store.lock:
+            ids = list(range(self._store.next_id, self._store.next_id + len(processed_chunks)))
+            self._store.next_id += len(processed_chunks)
+            self._store.rows[tier] = [row for row in self._store.rows[tier] if row["id"] not in deleted]
+            if tier == "hot":
+                moves = {old_id: new_id for chunk, new_id in zip(processed_chunks, ids) for old_id in chunk.get("replaces") or []}
+                self._store.questions = [
+                    {**question, "parent_id": moves[question["parent_id"]]} if question["parent_id"] in moves else question
+                    for question in self._store.questions
+                    if question["parent_id"] in moves or question["parent_id"] not in deleted
+                ]
+            for row_id, chunk in zip(ids, processed_chunks):
+                self._store.rows[tier].append({
+                    "id": row_id,
+                    "embedding": np.asarray(chunk["embedding"], dtype=np.float32),
+                    "text": chunk["text"],
+                    "metadata": dict(chunk.get("metadata", {})),
+                })
+        return ids
+
+    def move_to_tier(self, tier: str, expr: Optional[str] = None, filters: Optional[Dict[str, Union[str, List[str]]]] = None) -> int:
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}'; expected one of {TIERS}.")
+        expr = self._scope_expr(expr, filters)
+        if not expr:
+            raise ValueError("Refusing to move chunks without a filter.")
+        return self._move(compile_expr(expr), tier)
+
+    def _move(self, predicate, tier: str) -> int:
+        source_tier = "hot" if tier == "archive" else "archive"
+        with self._store.lock:
+            moving = [row for row in self._store.rows[source_tier] if predicate(row)]
+            self._store.rows[source_tier] = [row for row in self._store.rows[source_tier] if not predicate(row)]
+            self._store.rows[tier].extend(moving)
+            if tier == "archive":
+                moved = {row["id"] for row in moving}
+                self._store.questions = [question for question in self._store.questions if question["parent_id"] not in moved]
+                document = lambda row: (row["metadata"].get("source"), row["metadata"].get(PARTITION_KEY_FIELD) or DEFAULT_TENANT)
+                orphaned = {document(row) for row in moving} - {document(row) for row in self._store.rows["hot"]}
+                self._store.summaries = [row for row in self._store.summaries if document(row) not in orphaned]
+        return len(moving)
+
+    def tier_report(self) -> List[Dict[str, Any]]:
+        report = []
+        with self._store.lock:
+            for tier, name in (("hot", self.collection_name), ("archive", self.archive_collection_name)):
+                rows = self._store.rows[tier]
+                memory = sum(row["embedding"].nbytes + len(row["text"]) for row in rows)
+                report.append({"tier": tier, "collection": name, "rows": len(rows), "loaded": True, "loaded_segments": 1 if rows else 0, "memory_bytes": memory})
+        return report
+
+    def release_archive(self):
+        pass
+
+    def reset_collection(self):
+        with self._store.lock:
+            self._store.rows = {tier: [] for tier in TIERS}
+            self._store.questions = []
+            self._store.summaries = []
+
+    def disconnect(self):
+        pass
+
+
+class _InsertResult:
+    def __init__(self, primary_keys: List[int]):
+        self.primary_keys = primary_keys
+
+
+def create_milvus_manager(**kwargs) -> MilvusManager:
+    """
+    Returns a MilvusManager for the configured backend: the in-memory simulation
+    when `RAG_BACKEND=simulated`, otherwise a connection to Milvus.
+    """
+    if simulation_enabled():
+        return SimulatedMilvusManager(**kwargs)
+    return MilvusManager(**kwargs)
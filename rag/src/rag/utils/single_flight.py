@@ -0,0 +1,73 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from loguru import logger
+
+from .metrics import metrics
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single in-flight execution.
+
+    The first caller for a key (the leader) starts the work; every caller that
+    arrives while it is still running awaits the same result instead of starting
+    its own. Once the execution finishes the key is forgotten, so results are
+    never served stale.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initializes the SingleFlight group.
+
+        Args:
+            name (str): The metric prefix for this group (e.g. "query.retrieve").
+        """
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def inflight(self) -> int:
+        """
+        Returns the number of keys currently being executed.
+        """
+        return len(self._inflight)
+
+    def is_inflight(self, key: str) -> bool:
+        """
+        Returns True if an execution for the key is currently running.
+        """
+        return key in self._inflight
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `fn` once per key among concurrent callers and shares its outcome.
+
+        Args:
+            key (str): The coalescing key.
+            fn (Callable[[], Awaitable[Any]]): A factory for the coroutine to execute.
+
+        Returns:
+            Any: The result of the shared execution. If the execution raises,
+            every caller waiting on it receives the same exception.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.incr(f"{self.name}.coalesced")
+            logger.info(f"[{self.name}] Joining in-flight execution for key: '{key}'")
+            # Shield so that a cancelled follower does not cancel the shared work.
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = future
+        metrics.incr(f"{self.name}.executions")
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        """
+        Removes a finished execution and marks its exception as retrieved.
+        """
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled() and future.exception() is not None:
+            metrics.incr(f"{self.name}.failures")
@@ -0,0 +1,171 @@
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+
+from .milvus_manager import TIERS, MilvusManager
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EXPORT_BATCH_SIZE = 2000
+IMPORT_BATCH_SIZE = 2000
+
+
+def snapshot_schema(embedding_dim: int) -> pa.Schema:
+    """
+    Returns the Arrow schema of a snapshot file. Tags are kept inside `metadata`,
+    from which they are written back to the scalar tag fields on import.
+    """
+    return pa.schema([
+        pa.field("id", pa.int64()),
+        pa.field("embedding", pa.list_(pa.float32(), embedding_dim)),
+        pa.field("text", pa.string()),
+        pa.field("metadata", pa.string()),
+    ])
+
+
+def rows_to_batch(rows: List[Dict[str, Any]], schema: pa.Schema) -> pa.RecordBatch:
+    """
+    Converts Milvus rows into an Arrow record batch.
+    """
+    dim = schema.field("embedding").type.list_size
+    embeddings = np.asarray([row["embedding"] for row in rows], dtype=np.float32).reshape(-1)
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array([row["id"] for row in rows], type=pa.int64()),
+            pa.FixedSizeListArray.from_arrays(pa.array(embeddings, type=pa.float32()), dim),
+            pa.array([row["text"] for row in rows], type=pa.string()),
+            pa.array([json.dumps(row.get("metadata") or {}, ensure_ascii=False) for row in rows], type=pa.string()),
+        ],
+        schema=schema,
+    )
+
+
+def batch_to_chunks(batch: pa.RecordBatch) -> List[Dict[str, Any]]:
+    """
+    Converts an Arrow record batch back into chunks for `MilvusManager.bulk_insert`.
+    """
+    column = batch.column("embedding")
+    embeddings = column.flatten().to_numpy(zero_copy_only=False).reshape(len(batch), column.type.list_size)
+    return [
+        {"embedding": embedding.tolist(), "text": text, "metadata": json.loads(metadata)}
+        for embedding, text, metadata in zip(embeddings, batch.column("text").to_pylist(), batch.column("metadata").to_pylist())
+    ]
+
+
+def export_snapshot(milvus_manager: MilvusManager, path: str, batch_size: int = EXPORT_BATCH_SIZE,
+                    tiers: Iterable[str] = TIERS) -> Dict[str, Any]:
+    """
+    Exports a collection and its archive to Parquet files without any model calls.
+
+    Rows are streamed from Milvus in batches and written as one row group per
+    batch, so memory use does not grow with the collection. The manifest is
+    written last; a directory without one is an incomplete export.
+
+    Args:
+        milvus_manager (MilvusManager): The collection to export.
+        path (str): The snapshot directory; created if needed.
+        batch_size (int): Rows per Milvus round trip and Parquet row group.
+        tiers (Iterable[str]): The tiers to export.
+
+    Returns:
+        Dict[str, Any]: The snapshot manifest.
+    """
+    target = Path(path)
+    target.mkdir(parents=True, exist_ok=True)
+    if (target / MANIFEST_FILE).exists():
+        raise ValueError(f"'{target}' already contains a snapshot.")
+
+    schema = snapshot_schema(milvus_manager.embedding_dim)
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "collection": milvus_manager.collection_name,
+        "embedding_dim": milvus_manager.embedding_dim,
+        "embedding_model": os.environ.get("EMBEDDING_MODEL", "amazon.titan-embed-text-v2:0"),
+        "quantization": milvus_manager.quantization,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tiers": {},
+    }
+    for tier in tiers:
+        file_name = f"{tier}.parquet"
+        partial = target / f"{file_name}.partial"
+        rows = 0
+        with pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+            for batch in milvus_manager.iter_rows(tier, batch_size=batch_size):
+                writer.write_batch(rows_to_batch(batch, schema))
+                rows += len(batch)
+                logger.debug(f"Exported {rows} {tier} rows of '{milvus_manager.collection_name}'...")
+        partial.rename(target / file_name)
+        manifest["tiers"][tier] = {"file": file_name, "rows": rows}
+        logger.info(f"Exported {rows} {tier} rows of '{milvus_manager.collection_name}' to {target / file_name}.")
+
+    (target / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """
+    Reads and validates the manifest of a snapshot directory.
+
+    Raises:
+        ValueError: If the directory is not a complete snapshot of a supported format.
+    """
+    manifest_path = Path(path) / MANIFEST_FILE
+    if not manifest_path.exists():
+        raise ValueError(f"'{path}' is not a snapshot or the export did not finish.")
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version {manifest.get('format_version')}.")
+    return manifest
+
+
+def import_snapshot(milvus_manager: MilvusManager, path: str, batch_size: int = IMPORT_BATCH_SIZE,
+                    tiers: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Bulk-loads a snapshot into an empty collection.
+
+    The stored embeddings are inserted as they are, so the target may use a
+    different quantization than the source but must have the same embedding
+    dimension. Primary keys are reassigned by the target collection.
+
+    Args:
+        milvus_manager (MilvusManager): The collection to load into.
+        path (str): The snapshot directory.
+        batch_size (int): Rows per insert.
+        tiers (Optional[Iterable[str]]): The tiers to import. Defaults to all tiers in the snapshot.
+
+    Returns:
+        Dict[str, int]: The number of rows imported per tier.
+
+    Raises:
+        ValueError: If the snapshot does not match the collection or the collection is not empty.
+    """
+    manifest = read_manifest(path)
+    if manifest["embedding_dim"] != milvus_manager.embedding_dim:
+        raise ValueError(
+            f"Snapshot embeddings have {manifest['embedding_dim']} dimensions but "
+            f"'{milvus_manager.collection_name}' has {milvus_manager.embedding_dim}."
+        )
+    if any(milvus_manager.count_rows(tier) for tier in TIERS):
+        raise ValueError(f"Collection '{milvus_manager.collection_name}' is not empty; import into a fresh collection.")
+
+    imported = {}
+    for tier in tiers or manifest["tiers"]:
+        entry = manifest["tiers"][tier]
+        parquet_file = pq.ParquetFile(Path(path) / entry["file"])
+        rows = 0
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=["embedding", "text", "metadata"]):
+            rows += milvus_manager.bulk_insert(batch_to_chunks(batch), tier=tier)
+            logger.debug(f"Imported {rows}/{entry['rows']} {tier} rows into '{milvus_manager.collection_name}'...")
+        imported[tier] = rows
+        if rows != entry["rows"]:
+            logger.warning(f"Snapshot lists {entry['rows']} {tier} rows but {rows} were imported.")
+    milvus_manager.flush()
+    logger.info(f"Imported snapshot '{path}' into '{milvus_manager.collection_name}': {imported}.")
+    return imported
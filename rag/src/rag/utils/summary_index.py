@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Separator between the headings of a chunk's section path, as written by the StructuredChunker.
+SECTION_SEPARATOR = " > "
+DOCUMENT = "document"
+SECTION = "section"
+SUMMARY_SYSTEM_PROMPT = "You summarise HR policy documents for an employee assistant."
+SECTION_SUMMARY_PROMPT = (
+    "Summarise the section \"{section}\" of the policy document \"{source}\" in at most {words} words. "
+    "Name every topic, rule and entitlement it covers so the summary can be used to find it. "
+    "Return only the summary.\n\n{text}"
+)
+DOCUMENT_SUMMARY_PROMPT = (
+    "Summarise the policy document \"{source}\" in at most {words} words, based on the summaries of its sections below. "
+    "Say what the document is for and list the topics it covers. Return only the summary.\n\n{text}"
+)
+
+
+def section_key(section: Optional[str], depth: int) -> str:
+    """
+    Truncates a section path to its first `depth` headings.
+    """
+    return SECTION_SEPARATOR.join((section or "").split(SECTION_SEPARATOR)[:depth])
+
+
+def in_section(section: Optional[str], key: str) -> bool:
+    """
+    Returns True if a chunk's section path lies within the section `key`.
+    """
+    section = section or ""
+    return section == key or bool(key) and section.startswith(key + SECTION_SEPARATOR)
+
+
+def group_sections(chunks: List[Dict[str, Any]], max_depth: int = 3) -> List[Tuple[str, str]]:
+    """
+    Groups chunk texts by section, in document order.
+
+    Documents usually open with a title that every section path starts with,
+    so the shallowest heading depth that splits the document into more than one
+    section is used, up to `max_depth`.
+
+    Args:
+        chunks (List[Dict[str, Any]]): Chunks with the `section` path in their metadata.
+        max_depth (int): The deepest heading level to group by.
+
+    Returns:
+        List[Tuple[str, str]]: The section path and the text of each section; a single
+        group when the document has no headings.
+    """
+    sections = [chunk["metadata"].get("section") or "" for chunk in chunks]
+    depth = 1
+    while depth < max_depth and len({section_key(section, depth) for section in sections}) < 2:
+        depth += 1
+    groups: "OrderedDict[str, List[str]]" = OrderedDict()
+    for chunk, section in zip(chunks, sections):
+        texts = groups.setdefault(section_key(section, depth), [])
+        if chunk["text"] not in texts:
+            texts.append(chunk["text"])
+    return [(section, "\n".join(texts)) for section, texts in groups.items()]
+
+
+def summary_label(source: str, section: str = "") -> str:
+    """
+    Returns the heading a stored summary starts with, so the crew can tell summaries from chunks.
+    """
+    return f"Summary of {source}{SECTION_SEPARATOR + section if section else ''}:"
@@ -0,0 +1,39 @@
+import re
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = "?!. "
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a user query so that trivially different phrasings of the same
+    question (case, surrounding whitespace, trailing punctuation) map to one key.
+
+    Args:
+        query (str): The raw user query.
+
+    Returns:
+        str: The normalized query.
+    """
+    normalized = _WHITESPACE_RE.sub(" ", query).strip().lower()
+    return normalized.rstrip(_TRAILING_PUNCTUATION)
+
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximates the number of model tokens in a text.
+
+    Words and punctuation marks are counted individually, which tracks the
+    subword tokenizers of the embedding models closely enough for sizing chunks
+    and estimating cost without shipping a tokenizer.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The approximate token count.
+    """
+    return len(_TOKEN_RE.findall(text))
@@ -0,0 +1,231 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from loguru import logger
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import metrics
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """
+    Raised when an upload is refused before or while it is being received.
+    """
+
+    def __init__(self, status_code: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+
+
+class StreamedUpload:
+    """
+    A file received by StreamingUploadParser.
+    """
+
+    def __init__(self, filename: str, path: Path, sha256: str, size: int, fields: Dict[str, str]):
+        """
+        Args:
+            filename (str): The client file name, without any directory part.
+            path (Path): Where the file was written.
+            sha256 (str): Hex SHA-256 of the file content.
+            size (int): Size of the file in bytes.
+            fields (Dict[str, str]): The other form fields of the request.
+        """
+        self.filename = filename
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.fields = fields
+
+
+def max_upload_bytes() -> int:
+    """
+    Returns the upload size limit from `MAX_UPLOAD_MB` (default 100 MB).
+    """
+    return int(float(os.environ.get("MAX_UPLOAD_MB", 100)) * 1024 * 1024)
+
+
+def file_sha256(path: str) -> str:
+    """
+    Returns the hex SHA-256 of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StreamingUploadParser:
+    """
+    Parses a multipart/form-data request body straight into a file on disk.
+
+    Unlike `UploadFile`, which spools the whole body before the endpoint runs,
+    the file part is written to `target_dir` as it arrives and hashed on the
+    way, so the body is never held in memory or copied a second time. The file
+    type is checked as soon as the part headers arrive and the size limit is
+    enforced while receiving, so rejected uploads stop early. Small non-file
+    fields are collected as strings.
+    """
+
+    def __init__(self, content_type: str, target_dir: Path, max_bytes: int, file_field: str = "file", max_field_bytes: int = 4096):
+        """
+        Args:
+            content_type (str): The request Content-Type header, including the boundary.
+            target_dir (Path): Directory the file is written to.
+            max_bytes (int): Maximum file size in bytes.
+            file_field (str): Name of the form field carrying the file.
+            max_field_bytes (int): Maximum size of any other form field.
+        """
+        media_type, params = parse_options_header(content_type or "")
+        if media_type != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadRejected(400, "Expected a multipart/form-data request with a boundary.")
+        self.boundary = params[b"boundary"]
+        self.target_dir = Path(target_dir)
+        self.max_bytes = max_bytes
+        self.file_field = file_field
+        self.max_field_bytes = max_field_bytes
+
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.path: Optional[Path] = None
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = None
+        self._pending = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._part_name: Optional[str] = None
+        self._part_is_file = False
+        self._part_data = b""
+
+    async def parse(self, stream: AsyncIterator[bytes]) -> StreamedUpload:
+        """
+        Consumes the request body.
+
+        Args:
+            stream (AsyncIterator[bytes]): The raw request body, e.g. `request.stream()`.
+
+        Returns:
+            StreamedUpload: The received file and form fields.
+
+        Raises:
+            UploadRejected: If the body is malformed, the file type is unsupported,
+                the file is too large or no file was sent. Any partial file is removed.
+        """
+        callbacks = {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        }
+        parser = MultipartParser(self.boundary, callbacks)
+        try:
+            async for chunk in stream:
+                parser.write(chunk)
+                if self._pending:
+                    # Disk writes and hashing run in the threadpool so a large upload does not block the event loop.
+                    data, self._pending = b"".join(self._pending), []
+                    await run_in_threadpool(self._write, data)
+            parser.finalize()
+        except UploadRejected:
+            self._discard()
+            raise
+        except Exception as e:
+            self._discard()
+            raise UploadRejected(400, f"Malformed multipart body: {e}")
+        finally:
+            if self._file is not None:
+                self._file.close()
+
+        if self.path is None:
+            raise UploadRejected(400, f"The request has no '{self.file_field}' file part.")
+        metrics.incr("upload.bytes_received", self.size)
+        return StreamedUpload(self.filename, self.path, self._digest.hexdigest(), self.size, self.fields)
+
+    def _write(self, data: bytes):
+        self._digest.update(data)
+        self._file.write(data)
+
+    def _discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+            logger.info(f"Removed partial upload '{self.path}'.")
+
+    def _on_part_begin(self):
+        self._disposition = b""
+        self._part_name = None
+        self._part_is_file = False
+        self._part_data = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        self._part_name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        if self._part_name != self.file_field:
+            return
+        if self.path is not None:
+            raise UploadRejected(400, "Only one file can be uploaded per request.")
+
+        filename = Path(options.get(b"filename", b"").decode("utf-8", errors="replace")).name
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            raise UploadRejected(400, "Unsupported file type. Please upload a .pdf or .docx file.")
+        self.filename = filename
+        self.path = self.target_dir / filename
+        self._file = open(self.path, "wb")
+        self._part_is_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._part_is_file:
+            self.size += end - start
+            if self.size > self.max_bytes:
+                metrics.incr("upload.rejected_too_large")
+                raise UploadRejected(413, f"File exceeds the maximum upload size of {self.max_bytes // (1024 * 1024)} MB.")
+            self._pending.append(data[start:end])
+        else:
+            self._part_data += data[start:end]
+            if len(self._part_data) > self.max_field_bytes:
+                raise UploadRejected(400, f"Form field '{self._part_name}' is too large.")
+
+    def _on_part_end(self):
+        if self._part_is_file:
+            self._part_is_file = False
+        elif self._part_name:
+            self.fields[self._part_name] = self._part_data.decode("utf-8", errors="replace")
+
+
+def check_content_length(content_length: Optional[str], max_bytes: int):
+    """
+    Rejects a request up front when its declared size already exceeds the limit.
+
+    Raises:
+        UploadRejected: If the declared Content-Length is over `max_bytes` plus multipart framing.
+    """
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        metrics.incr("upload.rejected_too_large")
+        raise UploadRejected(413, f"File exceeds the maximum upload size of {max_bytes // (1024 * 1024)} MB.")
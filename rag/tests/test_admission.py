@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from rag.src.rag.utils.admission import AdmissionController, AdmissionRejected, EndpointLimits
+from rag.src.rag.utils.metrics import metrics
+
+
+def make_controller(total=1, query_queue=2, upload_queue=2, queue_timeout=1.0):
+    limits = {
+        "query": EndpointLimits(max_concurrency=1, max_queue=query_queue, queue_timeout=queue_timeout, priority=0),
+        "upload": EndpointLimits(max_concurrency=1, max_queue=upload_queue, queue_timeout=queue_timeout, priority=10),
+    }
+    return AdmissionController(limits, total_concurrency=total)
+
+
+class TestAdmissionController(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_queue_full_is_rejected_with_429(self):
+        """Test that requests beyond the queue bound are rejected immediately."""
+        controller = make_controller(query_queue=1)
+
+        async def run():
+            await controller.acquire("query")
+            waiter = asyncio.ensure_future(controller.acquire("query"))
+            await asyncio.sleep(0)
+            with self.assertRaises(AdmissionRejected) as ctx:
+                await controller.acquire("query")
+            controller.release("query")
+            await waiter
+            controller.release("query")
+            return ctx.exception
+
+        rejection = asyncio.run(run())
+        self.assertEqual(rejection.status_code, 429)
+        self.assertGreaterEqual(rejection.retry_after, 1)
+        self.assertEqual(metrics.get("admission.query.rejected_queue_full"), 1)
+
+    def test_queue_deadline_sheds_with_503(self):
+        """Test that a request waiting past its deadline is shed."""
+        controller = make_controller(queue_timeout=0.05)
+
+        async def run():
+            await controller.acquire("query")
+            with self.assertRaises(AdmissionRejected) as ctx:
+                await controller.acquire("query")
+            return ctx.exception
+
+        rejection = asyncio.run(run())
+        self.assertEqual(rejection.status_code, 503)
+        self.assertEqual(controller.stats()["query"]["queued"], 0)
+
+    def test_queries_are_granted_before_uploads(self):
+        """Test that a freed slot goes to a waiting query before an earlier upload."""
+        controller = make_controller(total=1)
+        order = []
+
+        async def worker(endpoint):
+            async with controller.slot(endpoint):
+                order.append(endpoint)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await controller.acquire("query")
+            upload = asyncio.ensure_future(worker("upload"))
+            await asyncio.sleep(0)
+            query = asyncio.ensure_future(worker("query"))
+            await asyncio.sleep(0)
+            controller.release("query")
+            await asyncio.gather(upload, query)
+
+        asyncio.run(run())
+        self.assertEqual(order, ["query", "upload"])
+        self.assertEqual(controller.stats()["query"]["active"], 0)
+        self.assertEqual(controller.stats()["upload"]["active"], 0)
+
+    def test_drain_waits_for_running_and_queued_work(self):
+        """Test that draining returns once in-flight work finishes, and reports work left after the timeout."""
+        controller = make_controller(total=1)
+
+        async def worker():
+            async with controller.slot("query"):
+                await asyncio.sleep(0.05)
+
+        async def run():
+            workers = [asyncio.ensure_future(worker()) for _ in range(2)]
+            await asyncio.sleep(0)
+            stuck = not await controller.drain(timeout=0.01, poll_interval=0.005)
+            drained = await controller.drain(timeout=1.0, poll_interval=0.005)
+            await asyncio.gather(*workers)
+            return stuck, drained
+
+        self.assertEqual(asyncio.run(run()), (True, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from rag.src.rag.utils.chunker import StructuredChunker
+from rag.src.rag.utils.text_utils import count_tokens
+
+
+def body(text, page=1):
+    return {"text": text, "page": page, "heading_level": 0}
+
+
+def heading(text, level, page=1):
+    return {"text": text, "page": page, "heading_level": level}
+
+
+class TestStructuredChunker(unittest.TestCase):
+
+    def test_headings_start_new_chunks_with_section_path(self):
+        """Test that sections become separate chunks carrying their heading path."""
+        blocks = [
+            heading("Leave Policy", 1),
+            heading("Annual Leave", 2),
+            body("Full-time employees receive 20 days of annual leave each year."),
+            heading("Sick Leave", 2, page=2),
+            body("Employees receive 10 days of paid sick leave.", page=2),
+        ]
+        chunker = StructuredChunker(max_size=100, min_size=5)
+
+        chunks = chunker.chunk(blocks)
+
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(chunks[0]["metadata"]["section"], "Leave Policy > Annual Leave")
+        self.assertIn("20 days", chunks[0]["text"])
+        self.assertEqual(chunks[1]["metadata"]["section"], "Leave Policy > Sick Leave")
+        self.assertEqual(chunks[1]["metadata"]["page"], 2)
+        self.assertTrue(chunks[1]["text"].startswith("Sick Leave"))
+
+    def test_small_section_keeps_its_own_path_when_merged(self):
+        """Test that body text merged into the next section keeps the path of the section it started in."""
+        blocks = [heading("Benefits", 1), body("Dental."), heading("Travel", 1), heading("Flights", 2), body("Book economy class.")]
+        chunks = StructuredChunker(max_size=100, min_size=50).chunk(blocks)
+        self.assertEqual([chunk["metadata"]["section"] for chunk in chunks], ["Benefits"])
+
+    def test_offsets_point_into_document_text(self):
+        """Test that char offsets locate the chunk text in the joined document."""
+        blocks = [heading("Benefits", 1), body("Dental is covered."), heading("Travel", 1), body("Book economy class.")]
+        document = "\n".join(block["text"] for block in blocks)
+        chunker = StructuredChunker(max_size=100, min_size=1)
+
+        for chunk in chunker.chunk(blocks):
+            metadata = chunk["metadata"]
+            self.assertEqual(document[metadata["char_start"]:metadata["char_end"]], chunk["text"])
+
+    def test_oversized_block_is_split_on_sentences_within_limit(self):
+        """Test that a long block is split at sentence boundaries under the token limit."""
+        sentences = [f"Rule number {i} applies to every employee in the region." for i in range(30)]
+        chunker = StructuredChunker(max_size=40, min_size=1)
+
+        chunks = chunker.chunk([body(" ".join(sentences), page=3)])
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(count_tokens(chunk["text"]), 40)
+            self.assertTrue(chunk["text"].endswith("."))
+            self.assertEqual(chunk["metadata"]["page"], 3)
+
+    def test_image_tags_are_not_split(self):
+        """Test that an image tag survives splitting intact."""
+        tag = '[image_info]{"description": "A chart. It shows leave.", "imgpath": "https://b.s3.amazonaws.com/x.png"}[/image_info]'
+        text = " ".join(["Some policy sentence here."] * 10) + " " + tag + " " + " ".join(["Another sentence follows."] * 10)
+        chunker = StructuredChunker(max_size=60, min_size=1)
+
+        chunks = chunker.chunk([body(text)])
+
+        self.assertEqual(sum(tag in chunk["text"] for chunk in chunks), 1)
+
+    def test_small_sections_are_merged(self):
+        """Test that sections below the minimum size are merged into the next one."""
+        blocks = [heading("A", 1), body("Short."), heading("B", 1), body("Also short.")]
+        chunks = StructuredChunker(max_size=100, min_size=50).chunk(blocks)
+        self.assertEqual(len(chunks), 1)
+
+    def test_char_length_unit(self):
+        """Test sizing by characters instead of tokens."""
+        chunker = StructuredChunker(max_size=30, min_size=1, length_unit="chars")
+        chunks = chunker.chunk([body("a" * 20), body("b" * 20)])
+        self.assertEqual(len(chunks), 2)
+        with self.assertRaises(ValueError):
+            StructuredChunker(length_unit="words")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import contextvars
+import os
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from rag.src.rag.utils import cost
+from rag.src.rag.utils.cost import ECONOMY, MINIMAL, NORMAL, CostBudget, SpendWindow, price_of, record_usage, track
+from rag.src.rag.utils.document_processor import OVER_BUDGET, DocumentProcessor
+from rag.src.rag.utils.metrics import metrics
+
+NOVA_PRO = "apac.amazon.nova-pro-v1:0"
+
+
+class TestCostAccounting(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_prices_ignore_region_prefixes(self):
+        """Test the per-token and per-search-unit prices."""
+        self.assertAlmostEqual(price_of(NOVA_PRO, 1000, 1000), 0.0008 + 0.0032)
+        self.assertAlmostEqual(price_of("cohere.rerank-v3-5:0", units=2), 0.004)
+        self.assertEqual(price_of("unknown-model", 1000, 1000), 0.0)
+
+    def test_usage_is_accounted_to_the_running_request(self):
+        """Test that calls made in worker threads count towards the request that started them."""
+        with track("query") as tracker:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                futures = [
+                    pool.submit(contextvars.copy_context().run, record_usage, "embedding", "amazon.titan-embed-text-v2:0", 500)
+                    for _ in range(2)
+                ]
+                [future.result() for future in futures]
+            record_usage("crew", NOVA_PRO, 2000, 500, calls=2)
+        record_usage("embedding", "amazon.titan-embed-text-v2:0", 500)
+
+        summary = tracker.summary()
+        self.assertEqual((summary["calls"], summary["input_tokens"], summary["output_tokens"]), (4, 3000, 500))
+        self.assertEqual(summary["by_operation"]["embedding"]["calls"], 2)
+        self.assertAlmostEqual(metrics.get("cost.query.usd"), tracker.cost)
+        self.assertEqual(metrics.get("usage.embedding.calls"), 3)
+
+
+class TestCostBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.spend = SpendWindow()
+        self.budget = CostBudget(hourly_usd=1.0, degrade_at=0.5, economy_documents=2, spend=self.spend)
+        self.documents = ["A paragraph about annual leave entitlements. " * 20] * 5
+
+    def test_levels_follow_the_hourly_spend(self):
+        """Test the switch to economy and minimal mode, and that old spend ages out."""
+        self.assertEqual(self.budget.level(), NORMAL)
+        self.spend.add(0.6)
+        self.assertEqual(self.budget.level(), ECONOMY)
+        self.assertFalse(self.budget.allows(0.001))
+        self.spend.add(0.5)
+        self.assertEqual(self.budget.level(), MINIMAL)
+        self.assertEqual(self.spend.total(now=time.monotonic() + 3601), 0.0)
+
+    def test_generation_degrades_under_load(self):
+        """Test that economy mode trims the documents and minimal mode also runs the fast crew."""
+        self.assertEqual(self.budget.plan_generation(self.documents, NOVA_PRO), (self.documents, False))
+        self.spend.add(0.6)
+        self.assertEqual(self.budget.plan_generation(self.documents, NOVA_PRO), (self.documents[:2], False))
+        self.spend.add(0.5)
+        with track("query") as tracker:
+            self.assertEqual(self.budget.plan_generation(self.documents, NOVA_PRO, tracker), (self.documents[:2], True))
+        self.assertEqual(tracker.degraded, ["documents 5->2", "fast_mode"])
+
+    def test_request_budget_picks_the_most_thorough_affordable_plan(self):
+        """Test that a query budget drops documents before switching to the fast crew."""
+        budget = CostBudget(query_usd=0.0108, economy_documents=2, spend=self.spend)
+        with track("query", budget.query_usd) as tracker:
+            record_usage("crew", NOVA_PRO, 2000, 0)
+            documents, fast = budget.plan_generation(self.documents, NOVA_PRO, tracker)
+        self.assertFalse(fast)
+        self.assertLess(len(documents), len(self.documents))
+        self.assertLessEqual(tracker.cost + cost.estimate_generation(documents, NOVA_PRO), budget.query_usd)
+
+    def test_from_env(self):
+        """Test that budgets are unlimited unless configured."""
+        with patch.dict(os.environ, {"QUERY_BUDGET_USD": "0.05", "COST_BUDGET_PER_HOUR_USD": ""}):
+            budget = CostBudget.from_env()
+        self.assertEqual((budget.query_usd, budget.upload_usd, budget.hourly_usd), (0.05, None, None))
+
+
+class TestIngestionBudget(unittest.TestCase):
+
+    def tearDown(self):
+        cost.reset_budget()
+
+    def test_captions_are_skipped_over_budget(self):
+        """Test that images keep their link but are not captioned once the upload budget is spent."""
+        cost._budget = CostBudget(upload_usd=0.0001, spend=SpendWindow())
+        processor = DocumentProcessor(mock=True)
+        processor.image_triage.prepare = MagicMock(return_value=MagicMock(keep=True, data=b"x", format="png"))
+        processor._upload_image_to_s3 = MagicMock(return_value="https://bucket/chart.png")
+        processor._get_image_description = MagicMock(return_value="A chart.")
+        images = [{"bytes": b"chart", "filename": "chart.png"}]
+
+        with track("upload", 0.0001) as tracker:
+            record_usage("embedding", "amazon.titan-embed-text-v2:0", 10000)
+            blocks = processor._describe_images_and_insert_placeholders([{"text": "[image_placeholder:chart.png]"}], images)
+
+        processor._get_image_description.assert_not_called()
+        self.assertIn("https://bucket/chart.png", blocks[0]["text"])
+        self.assertEqual(processor.image_stats["skipped"], {OVER_BUDGET: 1})
+        self.assertEqual(tracker.degraded, ["captions_skipped"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from rag.src.rag.utils.dedup import (
+    NearDuplicateIndex,
+    add_references,
+    band_keys,
+    compact_collection,
+    estimated_similarity,
+    jaccard,
+    merge_references,
+    minhash,
+    remove_source,
+    shingles,
+)
+from rag.src.rag.utils.document_processor import DocumentProcessor
+from rag.src.rag.utils.simulation import SimulatedMilvusManager, pseudo_embedding, reset_backend
+
+DISCLAIMER = (
+    "This handbook is provided for information only and does not form part of any contract of employment. "
+    "The company may amend, replace or withdraw any policy at any time without notice to employees."
+)
+NEAR_DISCLAIMER = DISCLAIMER.replace("at any time", "at any time,") + " Version 2."
+
+
+def chunk(text, source, page=1, **tags):
+    return {"text": text, "metadata": {"source": source, "page": page, **tags}}
+
+
+class TestMinHash(unittest.TestCase):
+
+    def test_near_duplicates_are_detected_and_distinct_policies_are_not(self):
+        """Test that boilerplate variants match while region-specific policies stay apart."""
+        a, b = shingles(DISCLAIMER), shingles(NEAR_DISCLAIMER)
+        self.assertGreater(jaccard(a, b), 0.85)
+        self.assertGreater(estimated_similarity(minhash(a), minhash(b)), 0.7)
+        self.assertTrue(set(band_keys(minhash(a))) & set(band_keys(minhash(b))))
+
+        sg = shingles("Employees in Singapore receive 14 days of annual leave per calendar year.")
+        de = shingles("Employees in Germany receive 30 days of annual leave per calendar year.")
+        self.assertLess(jaccard(sg, de), 0.85)
+
+    def test_index_respects_scope_and_threshold(self):
+        """Test that the index only returns near-duplicates with the same tags."""
+        index = NearDuplicateIndex(threshold=0.8)
+        index.add("kept", minhash(shingles(DISCLAIMER)), scope=("acme",))
+        self.assertEqual(index.find(minhash(shingles(DISCLAIMER)), scope=("acme",)), "kept")
+        self.assertIsNone(index.find(minhash(shingles(DISCLAIMER)), scope=("globex",)))
+        self.assertIsNone(index.find(minhash(shingles("Overtime is paid at 1.5 times the hourly rate.")), scope=("acme",)))
+
+    def test_references_merge_and_detach(self):
+        """Test that references accumulate without repeats and can be removed per document."""
+        merged = merge_references({"source": "a.pdf", "page": 1}, [{"source": "b.pdf", "page": 3}, {"source": "a.pdf", "page": 1}])
+        self.assertEqual(merged["references"], [{"source": "a.pdf", "page": 1}, {"source": "b.pdf", "page": 3}])
+        self.assertEqual(merged["sources"], ["a.pdf", "b.pdf"])
+
+        detached = remove_source(merged, "a.pdf")
+        self.assertEqual((detached["source"], detached["page"]), ("b.pdf", 3))
+        self.assertEqual(detached["sources"], ["b.pdf"])
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestIngestDeduplication(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+        self.manager = SimulatedMilvusManager(collection_name="dedup", embedding_dim=256)
+        self.processor = DocumentProcessor(mock=True, embedding_dim=256)
+
+    def tearDown(self):
+        reset_backend()
+
+    def ingest(self, source, chunks):
+        kept, merges = self.processor._merge_near_duplicates(chunks, source, self.manager)
+        for item in kept:
+            item["embedding"] = pseudo_embedding(item["text"], 256)
+        self.manager.insert_data(kept, supersede=True)
+        add_references(self.manager, merges)
+        return kept
+
+    def hot_rows(self):
+        return [row for batch in self.manager.iter_rows("hot") for row in batch]
+
+    def test_repeats_within_a_document_are_folded(self):
+        """Test that a footer repeated on every page is embedded once with all its pages referenced."""
+        chunks = [chunk(DISCLAIMER, "a.pdf", page) for page in (1, 2, 3)] + [chunk("Leave is 20 days per year.", "a.pdf", 2)]
+        kept, merges = self.processor._merge_near_duplicates(chunks, "a.pdf", None)
+
+        self.assertEqual(len(kept), 2)
+        self.assertEqual(self.processor.merged_chunks, 2)
+        self.assertEqual([ref["page"] for ref in kept[0]["metadata"]["references"]], [1, 2, 3])
+        self.assertEqual(merges, {})
+
+    def test_duplicates_of_other_documents_are_merged_and_detached_on_supersede(self):
+        """Test cross-document merging within a tenant and that re-uploading the first document keeps the second's reference."""
+        self.ingest("a.pdf", [chunk(DISCLAIMER, "a.pdf", tenant="acme")])
+        self.assertEqual(self.ingest("b.pdf", [chunk(NEAR_DISCLAIMER, "b.pdf", 4, tenant="acme")]), [])
+        self.assertEqual(len(self.ingest("c.pdf", [chunk(DISCLAIMER, "c.pdf", tenant="globex")])), 1)
+
+        acme = [row for row in self.hot_rows() if row["metadata"].get("tenant") == "acme"]
+        self.assertEqual(len(acme), 1)
+        self.assertEqual(acme[0]["metadata"]["sources"], ["a.pdf", "b.pdf"])
+
+        self.ingest("a.pdf", [chunk("A completely rewritten introduction.", "a.pdf", tenant="acme")])
+        acme = [row for row in self.hot_rows() if row["metadata"].get("tenant") == "acme"]
+        self.assertEqual(sorted(row["metadata"]["source"] for row in acme), ["a.pdf", "b.pdf"])
+        self.assertEqual(self.manager.count_rows("archive"), 1)
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestCompaction(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+        self.manager = SimulatedMilvusManager(collection_name="compact", embedding_dim=256)
+        chunks = []
+        for i in range(20):
+            source = f"handbook_{i}.pdf"
+            chunks.append({"text": DISCLAIMER, "metadata": {"source": source, "page": 1}})
+            chunks.append({"text": f"Policy {i}: employees receive {i + 10} days of leave for reason {i}.", "metadata": {"source": source, "page": 2}})
+        for item in chunks:
+            item["embedding"] = pseudo_embedding(item["text"], 256)
+        self.manager.insert_data(chunks)
+
+    def tearDown(self):
+        reset_backend()
+
+    def test_dry_run_reports_without_changes(self):
+        """Test that a dry run measures duplicates but leaves the collection alone."""
+        report = compact_collection(self.manager, threshold=0.85, dry_run=True, sample_queries=5, top_k=10)
+        self.assertEqual((report["duplicate_groups"], report["duplicate_rows"]), (1, 19))
+        self.assertEqual(self.manager.count_rows("hot"), 40)
+        self.assertIsNone(report["diversity_after"])
+
+    def test_compaction_merges_groups_and_improves_diversity(self):
+        """Test that duplicates collapse into one chunk referencing every source."""
+        report = compact_collection(self.manager, threshold=0.85, sample_queries=40, top_k=10)
+
+        self.assertEqual((report["rows_before"], report["rows_after"]), (40, 21))
+        self.assertGreater(report["estimated_bytes_saved"], 19 * 256 * 4)
+        self.assertGreater(report["diversity_after"], report["diversity_before"])
+        merged = [row for batch in self.manager.iter_rows("hot") for row in batch if row["text"] == DISCLAIMER]
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(len(merged[0]["metadata"]["sources"]), 20)
+        self.assertIn("lsh_bands", merged[0]["metadata"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,8 @@ import os
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
+import docx
+
 from rag.src.rag.utils.document_processor import DocumentProcessor
 
 class TestDocumentProcessor(unittest.TestCase):
@@ -55,13 +57,14 @@ class TestDocumentProcessor(unittest.TestCase):
         self.assertIn('embedding', result[0])
         processor._generate_embeddings.assert_called_once()
 
-    @patch('rag.src.rag.utils.document_processor.docx.Document')
-    def test_process_docx(self, mock_docx_document):
+    def test_process_docx(self):
         """Test basic DOCX processing workflow."""
         # Arrange
-        mock_para = MagicMock()
-        mock_para.text = "This is DOCX text."
-        mock_docx_document.return_value.paragraphs = [mock_para]
+        document = docx.Document()
+        document.add_paragraph("This is DOCX text.")
+        docx_file = "dummy.docx"
+        document.save(docx_file)
+        self.addCleanup(os.remove, docx_file)
 
         processor = DocumentProcessor()
 
@@ -70,7 +73,6 @@ class TestDocumentProcessor(unittest.TestCase):
         processor._generate_embeddings = MagicMock(return_value=[{"text": "This is DOCX text.", "embedding": dummy_embedding, "metadata": {}}])
 
         # Act
-        docx_file = "dummy.docx"
         result = processor.process_document(docx_file)
 
         # Assert
@@ -78,7 +80,7 @@ class TestDocumentProcessor(unittest.TestCase):
         self.assertEqual(result[0]['text'], "This is DOCX text.")
         self.assertIn('embedding', result[0])
         processor._generate_embeddings.assert_called_once()
-
+        self.assertEqual(processor._generate_embeddings.call_args[0][0], ["This is DOCX text."])
 
 if __name__ == '__main__':
     unittest.main()
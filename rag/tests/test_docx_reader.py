@@ -0,0 +1,72 @@
+import io
+import os
+import tempfile
+import unittest
+
+import docx
+from PIL import Image
+
+from rag.src.rag.utils.docx_reader import heading_level, iter_docx
+from rag.src.rag.utils.document_processor import DocumentProcessor
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (80, 60), "navy").save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+class TestDocxReader(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "handbook.docx")
+        document = docx.Document()
+        document.add_heading("Leave", 1)
+        paragraph = document.add_paragraph("Annual leave ")
+        paragraph.add_run("accrues").bold = True
+        paragraph.add_run(" monthly.")
+        table = document.add_table(rows=3, cols=2)
+        for row, cells in enumerate([("Leave type", "Days"), ("Annual", "20"), ("Sick", "10")]):
+            for column, text in enumerate(cells):
+                table.cell(row, column).text = text
+        table.cell(2, 1).add_paragraph().add_run().add_picture(png())
+        document.add_paragraph("Entitlements by region:").add_run().add_picture(png())
+        document.save(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_elements_are_emitted_in_document_order(self):
+        """Test that runs are joined and tables and images are returned where they appear."""
+        elements = list(iter_docx(self.path, "docx_handbook"))
+
+        self.assertEqual([element["type"] for element in elements], ["paragraph", "paragraph", "table", "paragraph"])
+        self.assertEqual((elements[0]["text"], heading_level(elements[0]["style"])), ("Leave", 2))
+        self.assertEqual(elements[1]["text"], "Annual leave accrues monthly.")
+        table = elements[2]
+        self.assertEqual(table["rows"][:2], [["Leave type", "Days"], ["Annual", "20"]])
+        self.assertEqual(table["rows"][2], ["Sick", "10\n[image_placeholder:docx_handbook_img1.png]"])
+        self.assertEqual(table["header_rows"], 1)
+        self.assertEqual([image["filename"] for image in table["images"]], ["docx_handbook_img1.png"])
+        self.assertIn("[image_placeholder:docx_handbook_img2.png]", elements[3]["text"])
+        self.assertTrue(elements[3]["images"][0]["bytes"].startswith(b"\x89PNG"))
+
+    def test_tables_are_split_between_rows_with_their_header(self):
+        """Test that a long table becomes several blocks that each repeat the header row."""
+        processor = DocumentProcessor(mock=True)
+        processor.chunker.max_size = 30
+        rows = [["Grade", "Annual leave days"]] + [[f"Grade {i}", f"{10 + i} days"] for i in range(10)]
+
+        blocks = processor._table_blocks(rows, header_rows=1)
+
+        self.assertGreater(len(blocks), 1)
+        for text, block_rows in blocks:
+            self.assertTrue(text.startswith("| Grade | Annual leave days |\n| --- | --- |\n"))
+            self.assertEqual(block_rows[0], rows[0])
+        self.assertEqual(sum(len(block_rows) - 1 for _, block_rows in blocks), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from rag.src.rag.utils.document_processor import DocumentProcessor
+from rag.src.rag.utils.extraction_cache import ExtractionCache
+from rag.src.rag.utils.metrics import metrics
+
+
+def build_pdf(path: str):
+    """Writes a two-page policy with a heading, body text and a chart."""
+    chart = io.BytesIO()
+    Image.effect_noise((300, 200), 64).convert("RGB").save(chart, format="PNG")
+    doc = fitz.open()
+    for number in (1, 2):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Leave policy {number}", fontsize=16)
+        page.insert_text((72, 110), f"Employees receive {number * 10} days of leave per year.", fontsize=10)
+    doc[1].insert_image(fitz.Rect(72, 140, 372, 340), stream=chart.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+class TestExtractionCache(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ExtractionCache(os.path.join(self.temp_dir.name, "cache"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_entries_are_keyed_by_content_and_settings(self):
+        """Test the round trip, and that another processor version misses."""
+        key = self.cache.key("abc", {"version": 1})
+        self.cache.set(key, {"blocks": [{"text": "Leave", "page": 1, "heading_level": 1}]})
+
+        self.assertEqual(self.cache.get(key), {"blocks": [{"text": "Leave", "page": 1, "heading_level": 1}]})
+        self.assertIsNone(self.cache.get(self.cache.key("abc", {"version": 2})))
+        self.assertEqual((metrics.get("ingest.extraction_cache.hits"), metrics.get("ingest.extraction_cache.misses")), (1, 1))
+
+    def test_least_recently_used_entries_are_pruned(self):
+        """Test that the entries read or written longest ago go first once the size limit is exceeded."""
+        for name in ("first", "second"):
+            self.cache.set(name, {"blocks": [{"text": os.urandom(2000).hex()}]})
+            time.sleep(0.02)
+        self.cache.get("first")
+        self.cache.max_bytes = os.path.getsize(self.cache._path("first")) * 2 + 100
+
+        self.cache.set("third", {"blocks": [{"text": os.urandom(2000).hex()}]})
+
+        self.assertIsNotNone(self.cache.get("first"))
+        self.assertIsNone(self.cache.get("second"))
+        self.assertIsNotNone(self.cache.get("third"))
+
+
+class TestCachedExtraction(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.pdf = os.path.join(self.temp_dir.name, "policy.pdf")
+        build_pdf(self.pdf)
+        self.processor = DocumentProcessor(mock=True)
+        self.processor.extraction_cache = ExtractionCache(os.path.join(self.temp_dir.name, "cache"))
+        self.processor._upload_image_to_s3 = MagicMock(return_value="https://bucket/chart.png")
+        self.processor._get_image_description = MagicMock(return_value="A chart of leave taken per quarter.")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_second_extraction_skips_parsing_and_captioning(self):
+        """Test that a re-run reads the captioned blocks from the cache and chunks them the same way."""
+        first = self.processor._extract_blocks(self.pdf, "hash-1")
+        with patch.object(self.processor, "_extract_text_and_images") as extract:
+            second = self.processor._extract_blocks(self.pdf, "hash-1")
+
+        extract.assert_not_called()
+        self.processor._get_image_description.assert_called_once()
+        self.assertEqual(second, first)
+        self.assertIn("A chart of leave taken per quarter.", second[-1]["text"])
+        self.assertEqual(self.processor._chunk_blocks(second), self.processor._chunk_blocks(first))
+
+    def test_changed_settings_and_unhashed_files_are_extracted_again(self):
+        """Test that another caption setting misses, and that nothing is cached without a content hash."""
+        self.processor._extract_blocks(self.pdf, "hash-1")
+        self.processor.image_triage.max_side = 512
+        self.processor._extract_blocks(self.pdf, "hash-1")
+        self.processor._extract_blocks(self.pdf)
+
+        self.assertEqual(self.processor._get_image_description.call_count, 3)
+
+    def test_incomplete_extractions_are_not_cached(self):
+        """Test that an extraction whose captions failed is extracted again on the next run."""
+        def failing_caption(image_bytes, image_format=None):
+            self.processor.image_stats["errors"] += 1
+            return "Error describing image: throttled"
+        self.processor._get_image_description = MagicMock(side_effect=failing_caption)
+
+        self.processor._extract_blocks(self.pdf, "hash-1")
+        self.processor._extract_blocks(self.pdf, "hash-1")
+
+        self.assertEqual(self.processor._get_image_description.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
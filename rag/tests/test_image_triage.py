@@ -0,0 +1,88 @@
+import io
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from rag.src.rag.utils.document_processor import DocumentProcessor
+from rag.src.rag.utils.image_triage import EXTREME_ASPECT, LOW_ENTROPY, TOO_SMALL, UNREADABLE, ImageTriage
+
+
+def encode(image, image_format="PNG", **kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **kwargs)
+    return buffer.getvalue()
+
+
+def photo(width, height):
+    pixels = np.random.RandomState(0).randint(0, 255, size=(height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def chart(width=600, height=400):
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for i, value in enumerate((120, 260, 180, 320)):
+        draw.rectangle([60 + i * 120, height - 40 - value, 140 + i * 120, height - 40], fill=(30, 90, 200))
+    draw.line([40, height - 40, width - 20, height - 40], fill="black", width=3)
+    return image
+
+
+class TestImageTriage(unittest.TestCase):
+
+    def setUp(self):
+        self.triage = ImageTriage(max_side=1024)
+
+    def test_decorative_images_are_dropped(self):
+        """Test the size, aspect-ratio, entropy and readability heuristics."""
+        self.assertEqual(self.triage.prepare(encode(photo(16, 16))).reason, TOO_SMALL)
+        self.assertEqual(self.triage.prepare(encode(photo(900, 60))).reason, EXTREME_ASPECT)
+        self.assertEqual(self.triage.prepare(encode(Image.new("RGB", (400, 400), "white"))).reason, LOW_ENTROPY)
+        self.assertEqual(self.triage.prepare(b"not an image").reason, UNREADABLE)
+
+    def test_large_photos_are_downscaled_to_jpeg(self):
+        """Test that a full-resolution scan is resized and recompressed."""
+        original = encode(photo(3000, 2000))
+        prepared = self.triage.prepare(original)
+
+        self.assertTrue(prepared.keep)
+        self.assertEqual((prepared.format, prepared.width, prepared.height), ("jpeg", 1024, 683))
+        self.assertLess(len(prepared.data), len(original) / 10)
+
+    def test_flat_graphics_stay_png_and_small_originals_are_kept(self):
+        """Test that charts are not turned into JPEG, and re-encoding never grows an image."""
+        prepared = self.triage.prepare(encode(chart(2000, 1200)))
+        self.assertEqual((prepared.format, prepared.width), ("png", 1024))
+
+        original = encode(photo(300, 200), "JPEG", quality=60)
+        prepared = self.triage.prepare(original)
+        self.assertEqual((prepared.data, prepared.format), (original, "jpeg"))
+
+
+class TestImageCaptioning(unittest.TestCase):
+
+    def test_repeats_are_captioned_once_and_decorations_removed(self):
+        """Test that placeholders of skipped images disappear and per-document stats are recorded."""
+        processor = DocumentProcessor(mock=True)
+        processor._get_image_description = MagicMock(return_value="A bar chart of leave taken per quarter.")
+        logo, bullet = encode(chart()), encode(photo(12, 12))
+        images = [
+            {"bytes": logo, "filename": "p1_logo.png"},
+            {"bytes": logo, "filename": "p2_logo.png"},
+            {"bytes": bullet, "filename": "p1_bullet.png"},
+        ]
+        blocks = [{"text": f"Text [image_placeholder:{image['filename']}]"} for image in images]
+
+        described = processor._describe_images_and_insert_placeholders(blocks, images)
+
+        processor._get_image_description.assert_called_once()
+        self.assertIn("bar chart", described[1]["text"])
+        self.assertEqual(described[2]["text"], "Text ")
+        stats = processor.image_stats
+        self.assertEqual((stats["images"], stats["captioned"], stats["duplicates"], stats["skipped"]), (3, 1, 1, {TOO_SMALL: 1}))
+        self.assertEqual(stats["bytes_embedded"], 2 * len(logo) + len(bullet))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 from unittest.mock import patch, MagicMock
 
+from pymilvus import MilvusException
+from pymilvus.client.types import LoadState
+
 from rag.src.rag.utils.milvus_manager import MilvusManager
 
 @patch('rag.src.rag.utils.milvus_manager.connections')
@@ -83,5 +86,238 @@ class TestMilvusManager(unittest.TestCase):
         
         mock_connections.disconnect.assert_called_once_with("default")
 
+    def test_compact_collection_has_one_sq8_vector_field(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that the compact settings index the only vector field with IVF_SQ8, and binary quantization is rejected."""
+        mock_utility.has_collection.return_value = False
+        mock_collection_instance = MagicMock()
+        mock_collection_class.return_value = mock_collection_instance
+
+        manager = MilvusManager(embedding_dim=256, quantization="sq8")
+
+        vector_fields = [call.kwargs["name"] for call in mock_field_schema.call_args_list if "dim" in call.kwargs]
+        self.assertEqual(vector_fields, ["embedding"])
+        indexed = {call.kwargs["field_name"]: call.kwargs["index_params"] for call in mock_collection_instance.create_index.call_args_list}
+        self.assertEqual(list(indexed), ["embedding"])
+        self.assertEqual(indexed["embedding"]["index_type"], "IVF_SQ8")
+        self.assertEqual(manager.embedding_dim, 256)
+        with self.assertRaises(ValueError):
+            MilvusManager(embedding_dim=256, quantization="binary")
+
+    def test_quantized_search_rescores_candidates(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that quantized search oversamples and re-ranks by exact distance."""
+        mock_utility.has_collection.return_value = False
+        mock_collection_instance = MagicMock()
+        mock_collection_class.return_value = mock_collection_instance
+        manager = MilvusManager(embedding_dim=256, quantization="sq8")
+
+        def hit(hit_id, distance):
+            h = MagicMock()
+            h.id, h.distance = hit_id, distance
+            h.entity.get.side_effect = lambda field: f"text {hit_id}" if field == "text" else {}
+            return h
+
+        mock_collection_instance.search.return_value = [[hit(1, 0.1), hit(2, 0.2)]]
+        mock_collection_instance.query.return_value = [
+            {"id": 1, "embedding": [1.0] * 256},
+            {"id": 2, "embedding": [0.0] * 256},
+        ]
+
+        results = manager.search([0.0] * 256, limit=1)
+
+        self.assertEqual(mock_collection_instance.search.call_args.kwargs["limit"], manager.rescore_oversample)
+        self.assertEqual([r["id"] for r in results], [2])
+        self.assertEqual(results[0]["distance"], 0.0)
+        self.assertEqual(results[0]["text"], "text 2")
+
+    def test_rejects_unsupported_dimension(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that only Titan v2 output dimensions are accepted."""
+        with self.assertRaises(ValueError):
+            MilvusManager(embedding_dim=1536)
+        mock_connections.connect.assert_not_called()
+
+    def test_filters_use_partition_key_and_scalar_fields(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that tag filters become a Milvus expression on the tag fields."""
+        mock_utility.has_collection.return_value = False
+        mock_collection_instance = MagicMock()
+        mock_collection_class.return_value = mock_collection_instance
+        mock_collection_instance.search.return_value = [[]]
+        manager = MilvusManager()
+
+        partition_key_fields = [call.kwargs["name"] for call in mock_field_schema.call_args_list if call.kwargs.get("is_partition_key")]
+        self.assertEqual(partition_key_fields, ["tenant"])
+
+        manager.search([0.0] * 1024, limit=5, filters={"tenant": "acme", "region": ["SG", "DE"], "doc_type": None})
+
+        self.assertEqual(
+            mock_collection_instance.search.call_args.kwargs["expr"],
+            'tenant == "acme" and region in ["DE", "SG"]',
+        )
+
+    def test_filters_fall_back_to_metadata_on_legacy_collections(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that collections without tag fields are filtered on the metadata JSON."""
+        mock_utility.has_collection.return_value = True
+        manager = MilvusManager()
+        manager.tag_fields = ()
+
+        self.assertEqual(manager.build_filter_expr({"department": 'HR "core"'}), 'metadata["department"] == "HR \\"core\\""')
+        self.assertIsNone(manager.build_filter_expr({}))
+        with self.assertRaises(ValueError):
+            manager.build_filter_expr({"owner": "someone"})
+
+    def test_insert_writes_tags(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that chunk tags are written to the tag fields, with a default tenant."""
+        mock_utility.has_collection.return_value = False
+        mock_collection_instance = MagicMock()
+        mock_collection_class.return_value = mock_collection_instance
+        manager = MilvusManager()
+
+        manager.insert_data([
+            {"embedding": [0.1] * 1024, "text": "a", "metadata": {"tenant": "acme", "region": "SG"}},
+            {"embedding": [0.1] * 1024, "text": "b", "metadata": {}},
+        ])
+
+        first, second = mock_collection_instance.insert.call_args[0][0]
+        self.assertEqual((first["tenant"], first["region"], first["department"]), ("acme", "SG", ""))
+        self.assertEqual(second["tenant"], "default")
+
+    def _tiered_manager(self, mock_collection_class, mock_utility):
+        hot, archive, self.questions = MagicMock(name="hot"), MagicMock(name="archive"), MagicMock(name="questions")
+        mock_utility.has_collection.return_value = True
+        collections = {"rag_collection_archive": archive, "rag_collection_questions": self.questions}
+        mock_collection_class.side_effect = lambda name, **kwargs: collections.get(name, hot)
+        manager = MilvusManager()
+        manager.tag_fields = ()
+        return manager, hot, archive
+
+    def test_archive_is_searched_only_on_request(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that archived chunks are loaded and merged only for historical queries."""
+        manager, hot, archive = self._tiered_manager(mock_collection_class, mock_utility)
+
+        def hit(hit_id, distance):
+            h = MagicMock()
+            h.id, h.distance = hit_id, distance
+            h.entity.get.return_value = None
+            return h
+
+        hot.search.return_value = [[hit(1, 0.5)]]
+        archive.search.return_value = [[hit(2, 0.1)]]
+
+        self.assertEqual([h["id"] for h in manager.search([0.0] * 1024, limit=5)], [1])
+        archive.load.assert_not_called()
+
+        results = manager.search([0.0] * 1024, limit=5, include_archived=True)
+        self.assertEqual([(h["id"], h["tier"]) for h in results], [(2, "archive"), (1, "hot")])
+        archive.load.assert_called_once()
+
+        manager.release_archive()
+        archive.release.assert_called_once()
+
+    def test_archive_released_elsewhere_is_loaded_again(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that the server's load state decides whether to load, and that a failed archive search reloads and retries once."""
+        manager, hot, archive = self._tiered_manager(mock_collection_class, mock_utility)
+        hot.search.return_value = [[]]
+        archive.search.return_value = [[]]
+
+        mock_utility.load_state.return_value = LoadState.Loaded
+        manager.search([0.0] * 1024, limit=5, include_archived=True)
+        archive.load.assert_not_called()
+
+        mock_utility.load_state.return_value = LoadState.NotLoad
+        manager.search([0.0] * 1024, limit=5, include_archived=True)
+        archive.load.assert_called_once()
+
+        mock_utility.load_state.return_value = LoadState.Loaded
+        archive.search.side_effect = [MilvusException(message="collection not loaded"), [[]]]
+        self.assertEqual(manager.search([0.0] * 1024, limit=5, include_archived=True), [])
+        self.assertEqual((archive.load.call_count, archive.search.call_count), (2, 4))
+
+    def test_move_to_archive_copies_then_deletes(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that moving chunks inserts them into the archive before deleting them from the hot tier."""
+        manager, hot, archive = self._tiered_manager(mock_collection_class, mock_utility)
+        iterator = MagicMock()
+        iterator.next.side_effect = [[{"id": 7, "text": "old", "metadata": {"source": "a.pdf"}, "embedding": [0.0]}], []]
+        hot.query_iterator.return_value = iterator
+
+        moved = manager.supersede_source("a.pdf", keep_ids=[8, 9])
+
+        self.assertEqual(moved, 1)
+        expr = hot.query_iterator.call_args.kwargs["expr"]
+        self.assertIn('metadata["source"] == "a.pdf"', expr)
+        self.assertIn("id not in [8, 9]", expr)
+        self.assertIn('metadata["tenant"] == "default"', expr)
+        archive.insert.assert_called_once_with([{"text": "old", "metadata": {"source": "a.pdf"}, "embedding": [0.0]}])
+        hot.delete.assert_called_once_with(expr="id in [7]")
+        self.questions.delete.assert_called_once_with(expr="parent_id in [7]")
+        iterator.close.assert_called_once()
+
+    def test_move_requires_a_filter(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that a move without a filter is refused."""
+        manager, hot, archive = self._tiered_manager(mock_collection_class, mock_utility)
+        with self.assertRaises(ValueError):
+            manager.move_to_tier("archive")
+        with self.assertRaises(ValueError):
+            manager.move_to_tier("cold", filters={"tenant": "acme"})
+
+    def test_bulk_insert_into_archive_does_not_flush(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that bulk inserts write tag fields to the requested tier and leave flushing to the caller."""
+        manager, hot, archive = self._tiered_manager(mock_collection_class, mock_utility)
+        manager.tag_fields = ("tenant", "region")
+        archive.insert.return_value.primary_keys = [1]
+
+        inserted = manager.bulk_insert([{"embedding": [0.0], "text": "old", "metadata": {"tenant": "acme"}}], tier="archive")
+
+        self.assertEqual(inserted, 1)
+        row = archive.insert.call_args.args[0][0]
+        self.assertEqual((row["tenant"], row["region"]), ("acme", ""))
+        archive.flush.assert_not_called()
+        hot.insert.assert_not_called()
+
+    def test_question_hits_resolve_to_hot_parents(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that question matches return their parent chunks, best question per parent, skipping archived parents."""
+        manager, hot, archive = self._tiered_manager(mock_collection_class, mock_utility)
+
+        def question(parent_id, distance, text):
+            hit = MagicMock()
+            hit.distance = distance
+            hit.entity.get.side_effect = {"parent_id": parent_id, "text": text}.get
+            return hit
+
+        self.questions.search.return_value = [[question(1, 0.2, "How many days off?"), question(1, 0.4, "Leave?"), question(2, 0.3, "Gone?")]]
+        hot.query.return_value = [{"id": 1, "text": "Leave is 20 days.", "metadata": {}}]
+
+        hits = manager.search_questions([0.0], limit=10)
+
+        self.assertEqual(hits, [{"id": 1, "text": "Leave is 20 days.", "metadata": {}, "tier": "hot", "distance": 0.2, "matched_question": "How many days off?"}])
+        self.assertEqual(hot.query.call_args.kwargs["expr"], "id in [1, 2]")
+
+    def test_insert_stores_generated_questions(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that generated questions are stored with their parent id and tags."""
+        manager, hot, archive = self._tiered_manager(mock_collection_class, mock_utility)
+        hot.insert.return_value.primary_keys = [11]
+        chunk = {"embedding": [0.0], "text": "Leave is 20 days.", "metadata": {"tenant": "acme"},
+                 "questions": [{"text": "How many days off do I get?", "embedding": [0.1]}]}
+
+        manager.insert_data([chunk])
+
+        rows = self.questions.insert.call_args.args[0]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]["parent_id"], rows[0]["tenant"], rows[0]["text"]), (11, "acme", "How many days off do I get?"))
+        self.assertNotIn("questions", hot.insert.call_args.args[0][0])
+
+    def test_replaced_chunks_keep_their_questions(self, mock_field_schema, mock_collection_schema, mock_collection_class, mock_utility, mock_connections):
+        """Test that the questions of a replaced chunk are copied to its new row, and only unreplaced chunks lose theirs."""
+        manager, hot, archive = self._tiered_manager(mock_collection_class, mock_utility)
+        hot.insert.return_value.primary_keys = [21]
+        self.questions.query.return_value = [{"id": 100, "embedding": [0.1], "text": "How many days off?", "parent_id": 1, "metadata": {}}]
+
+        manager.replace_rows([{"embedding": [0.0], "text": "Leave is 20 days.", "metadata": {}, "replaces": [1]}], [1, 2])
+
+        self.assertEqual(self.questions.insert.call_args.args[0][0]["parent_id"], 21)
+        self.assertEqual(
+            [call.kwargs["expr"] for call in self.questions.delete.call_args_list],
+            ["id in [100]", "parent_id in [2]"],
+        )
+        self.assertNotIn("replaces", hot.insert.call_args.args[0][0])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from rag.src.rag.utils import pdf_reader
+from rag.src.rag.utils.pdf_reader import page_ranges, read_pages, read_pdf
+
+PAGES = 40
+
+
+def build_pdf(path: str):
+    """Writes a handbook with headings, an image every ten pages and a sentence running from page 20 to page 21."""
+    image = io.BytesIO()
+    Image.new("RGB", (40, 30), (200, 30, 30)).save(image, format="PNG")
+    doc = fitz.open()
+    for number in range(1, PAGES + 1):
+        page = doc.new_page()
+        if number != 21:
+            page.insert_text((72, 72), f"Section {number}", fontsize=16)
+        body = f"Rule {number} applies to all employees."
+        if number == 20:
+            body = "This sentence starts on page twenty"
+        elif number == 21:
+            body = "and ends on page twenty-one."
+        page.insert_text((72, 110), body, fontsize=10)
+        if number % 10 == 5:
+            page.insert_image(fitz.Rect(72, 140, 152, 200), stream=image.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+class TestPdfReader(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.pdf = os.path.join(cls.temp_dir, "handbook.pdf")
+        build_pdf(cls.pdf)
+
+    @classmethod
+    def tearDownClass(cls):
+        pdf_reader._reset_pool()
+        shutil.rmtree(cls.temp_dir)
+
+    def test_page_ranges_cover_every_page_once(self):
+        """Test that page ranges are contiguous, in order and nearly equal."""
+        self.assertEqual(page_ranges(10, 3), [(0, 4), (4, 7), (7, 10)])
+        self.assertEqual(page_ranges(2, 5), [(0, 1), (1, 2)])
+
+    def test_small_files_are_read_in_process(self):
+        """Test that a PDF below the page threshold does not use the worker pool."""
+        with patch.object(pdf_reader, "_get_pool") as get_pool:
+            blocks, images, _ = read_pdf(self.pdf, "pdf_handbook", workers=4, min_pages=PAGES + 1)
+        get_pool.assert_not_called()
+        self.assertEqual(len(images), 4)
+        self.assertEqual(images[0]["filename"], "pdf_handbook_p5_img1.png")
+
+    def test_parallel_output_matches_single_process(self):
+        """Test that the ranges are merged in order, joining a sentence that runs over a range boundary."""
+        serial = read_pages(self.pdf, 0, PAGES, "pdf_handbook")
+        parallel = read_pdf(self.pdf, "pdf_handbook", workers=2, min_pages=1)
+
+        self.assertEqual(parallel, serial)
+        blocks = parallel[0]
+        self.assertIn("This sentence starts on page twenty\nand ends on page twenty-one.", [block["text"] for block in blocks])
+        placeholders = [block for block in blocks if block["text"].startswith("[image_placeholder:")]
+        self.assertEqual([block["page"] for block in placeholders], [5, 15, 25, 35])
+
+    def test_broken_pool_falls_back_to_a_single_process(self):
+        """Test that the document is still read when the worker pool fails."""
+        with patch.object(pdf_reader, "_get_pool", side_effect=pdf_reader.BrokenProcessPool):
+            blocks, images, _ = read_pdf(self.pdf, "pdf_handbook", workers=2, min_pages=1)
+        self.assertEqual(len(images), 4)
+        self.assertEqual(blocks[0]["text"], "Section 1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+
+from rag.src.rag.utils.metrics import metrics
+from rag.src.rag.utils.prefetch import CACHED, DISABLED, SCHEDULED, Prefetcher
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.calls = []
+
+    def work(self, key):
+        async def run():
+            self.calls.append(key)
+            await asyncio.sleep(0.02)
+            return [f"doc for {key}"]
+        return run
+
+    def test_keystrokes_are_debounced_per_client(self):
+        """Test that only the last partial query of a typing burst runs, and its result is kept."""
+        prefetcher = Prefetcher(debounce=0.05)
+
+        async def run():
+            for key in ("how many", "how many days", "how many days of leave"):
+                self.assertEqual(prefetcher.schedule("alice", key, self.work(key)), SCHEDULED)
+                await asyncio.sleep(0.01)
+            prefetcher.schedule("bob", "sick leave rules", self.work("sick leave rules"))
+            await asyncio.sleep(0.15)
+
+        asyncio.run(run())
+
+        self.assertEqual(sorted(self.calls), ["how many days of leave", "sick leave rules"])
+        self.assertEqual(metrics.get("prefetch.debounced"), 2)
+        self.assertEqual(prefetcher.get("how many days of leave"), ["doc for how many days of leave"])
+        self.assertIsNone(prefetcher.get("how many"))
+        self.assertEqual(metrics.get("prefetch.hits"), 1)
+
+    def test_speculation_is_dropped_when_busy(self):
+        """Test the in-flight limit and the backend check; neither queues work."""
+        busy = [True]
+        prefetcher = Prefetcher(debounce=0.01, max_inflight=1, should_run=lambda: not busy[0])
+
+        async def run():
+            prefetcher.schedule("alice", "annual leave", self.work("annual leave"))
+            await asyncio.sleep(0.05)
+            busy[0] = False
+            prefetcher.schedule("alice", "annual leave", self.work("annual leave"))
+            prefetcher.schedule("bob", "parental leave", self.work("parental leave"))
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+
+        self.assertEqual(self.calls, ["annual leave"])
+        self.assertEqual(metrics.get("prefetch.skipped_busy"), 2)
+
+    def test_results_expire_and_known_keys_are_not_rerun(self):
+        """Test the time-to-live, and that a cached key is not fetched again."""
+        prefetcher = Prefetcher(debounce=0.0, ttl=0.05)
+
+        async def run():
+            prefetcher.schedule("alice", "annual leave", self.work("annual leave"))
+            await asyncio.sleep(0.03)
+            self.assertEqual(prefetcher.schedule("alice", "annual leave", self.work("annual leave")), CACHED)
+            await asyncio.sleep(0.06)
+
+        asyncio.run(run())
+
+        self.assertEqual(self.calls, ["annual leave"])
+        self.assertIsNone(prefetcher.get("annual leave"))
+        self.assertEqual(Prefetcher(enabled=False).schedule("alice", "annual leave", self.work("x")), DISABLED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from rag.src.rag.utils.metrics import metrics
+from rag.src.rag.utils.prewarm import Prewarmer, QueryLog
+
+
+class TestQueryLog(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log = QueryLog(os.path.join(self.temp_dir.name, "queries.sqlite3"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_queries_are_counted_by_normalized_text_and_scope(self):
+        """Test that phrasings differing in case and punctuation add up, while scopes are counted apart."""
+        for query in ("How much annual leave?", "how much annual leave", "  How much ANNUAL leave?  "):
+            self.log.record(query, {"tenant": "acme"})
+        self.log.record("How much annual leave?", {"tenant": "globex"})
+        self.log.record("Is sick leave paid?")
+        self.log.record("Is sick leave paid?", include_archived=True)
+
+        top = self.log.top(10, min_count=1)
+
+        self.assertEqual(top[0], {"query": "How much ANNUAL leave?", "filters": {"tenant": "acme"}, "include_archived": False, "count": 3})
+        self.assertEqual(len(top), 4)
+        self.assertEqual([entry["query"] for entry in self.log.top(10)], ["How much ANNUAL leave?"])
+        self.assertEqual(self.log.stats()["queries"], 6)
+
+    def test_old_and_rare_queries_are_pruned(self):
+        """Test that queries outside the window are not returned and are pruned with the least asked."""
+        log = QueryLog(self.log.path, window=0.05, max_entries=1)
+        log.record("Old question")
+        time.sleep(0.1)
+        for query in ("Frequent question", "Frequent question", "Rare question"):
+            log.record(query)
+
+        self.assertEqual([entry["query"] for entry in log.top(10, min_count=1)], ["Frequent question", "Rare question"])
+        self.assertEqual(log.prune(), 2)
+        self.assertEqual(log.stats()["distinct_queries"], 1)
+
+
+class TestPrewarmer(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.warmed = []
+        self.generation = 1
+        self.queries = [{"query": f"question {i}"} for i in range(3)]
+
+    async def warm(self, entry):
+        await asyncio.sleep(0.01)
+        self.warmed.append(entry["query"])
+        return entry["query"] != "question 1"
+
+    def prewarmer(self, **kwargs) -> Prewarmer:
+        return Prewarmer(self.warm, lambda limit, min_count: self.queries[:limit], lambda: self.generation, **kwargs)
+
+    def test_triggers_are_debounced_and_restart_a_run(self):
+        """Test that an ingestion during a run cancels it and the top queries are warmed once after the last one."""
+        prewarmer = self.prewarmer(top_n=2, delay=0.02)
+
+        async def run():
+            prewarmer.trigger()
+            await asyncio.sleep(0.035)
+            prewarmer.trigger()
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+
+        self.assertEqual(self.warmed, ["question 0", "question 0", "question 1"])
+        self.assertEqual(metrics.get("prewarm.restarted"), 1)
+        self.assertEqual(prewarmer.stats()["last_run"], {"generation": 1, "queries": 2, "warmed": 1, "already_cached": 1, "errors": 0})
+
+    def test_queries_wait_while_the_backends_are_busy(self):
+        """Test that nothing is warmed while `should_run` is False, and that failures do not stop the run."""
+        busy = [True]
+        prewarmer = self.prewarmer(delay=0.0, busy_wait=0.02, should_run=lambda: not busy[0])
+        self.queries.insert(0, {"query": "broken"})
+
+        async def warm(entry):
+            if entry["query"] == "broken":
+                raise RuntimeError("model unavailable")
+            return await self.warm(entry)
+        prewarmer.warm = warm
+
+        async def run():
+            prewarmer.trigger()
+            await asyncio.sleep(0.05)
+            self.assertEqual(self.warmed, [])
+            busy[0] = False
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+
+        self.assertEqual(self.warmed, ["question 0", "question 1", "question 2"])
+        self.assertGreaterEqual(metrics.get("prewarm.waited_busy"), 2)
+        self.assertEqual(metrics.get("prewarm.errors"), 1)
+        self.assertEqual(metrics.get("prewarm.answers"), 2)
+
+    def test_generation_changes_are_picked_up_by_the_interval(self):
+        """Test that a change made elsewhere is warmed once, and that nothing runs without an answer cache."""
+        prewarmer = self.prewarmer(interval=0.02)
+
+        async def run():
+            prewarmer.start()
+            await asyncio.sleep(0.15)
+            self.generation = 2
+            await asyncio.sleep(0.15)
+            self.generation = None
+            prewarmer.trigger()
+            await asyncio.sleep(0.1)
+            prewarmer.cancel_all()
+
+        asyncio.run(run())
+
+        self.assertEqual(self.warmed, ["question 0", "question 1", "question 2"] * 2)
+        self.assertEqual(prewarmer.stats()["warmed_generation"], 2)
+        self.assertEqual(metrics.get("prewarm.runs"), 2)
+
+    def test_disabled_prewarmer_does_nothing(self):
+        """Test that PREWARM=off turns off triggers and the interval."""
+        prewarmer = self.prewarmer(delay=0.0, interval=0.01, enabled=False)
+
+        async def run():
+            prewarmer.start()
+            prewarmer.trigger()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+        self.assertEqual(self.warmed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
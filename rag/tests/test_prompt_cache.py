@@ -0,0 +1,109 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from rag.src.rag.utils.cost import price_of
+from rag.src.rag.utils.prompt_cache import (
+    CACHE_CONTROL,
+    ChunkPopularity,
+    _crew_config,
+    mark_cache_points,
+    prompt_cache_enabled,
+    split_prompt,
+)
+from rag.src.rag.utils.simulation import SimulatedBackend
+
+ANNUAL = "Full-time employees receive 20 days of annual leave per year, accrued monthly from the start date. " * 40
+SICK = "Sick leave of up to 10 days a year is paid on presentation of a medical certificate. " * 40
+
+
+class TestCachePoints(unittest.TestCase):
+
+    def test_messages_are_split_into_cached_blocks(self):
+        """Test that the system message and every segment before the last cache point are marked for caching."""
+        messages = [
+            {"role": "system", "content": "You are a writer."},
+            {"role": "user", "content": "Instructions.\n[cache_point]\nPinned.\n[cache_point]\nQuery: `leave`"},
+        ]
+
+        system, user = mark_cache_points(messages)
+
+        self.assertEqual(system["content"], [{"type": "text", "text": "You are a writer.", "cache_control": CACHE_CONTROL}])
+        self.assertEqual([block["text"] for block in user["content"]], ["Instructions.", "Pinned.", "Query: `leave`"])
+        self.assertEqual([block.get("cache_control") for block in user["content"]], [CACHE_CONTROL, CACHE_CONTROL, None])
+        self.assertEqual(messages[1]["content"].count("[cache_point]"), 2)
+
+    def test_markers_are_removed_without_caching(self):
+        """Test that models without prompt caching get plain text without the markers."""
+        messages = [{"role": "user", "content": "Instructions.\n[cache_point]\nQuery: `leave`"}]
+        self.assertEqual(mark_cache_points(messages, enabled=False), [{"role": "user", "content": "Instructions.\nQuery: `leave`"}])
+
+    def test_caching_is_enabled_for_supported_models(self):
+        """Test the auto mode and the overrides of PROMPT_CACHE."""
+        with patch.dict(os.environ, {"PROMPT_CACHE": "auto"}):
+            self.assertTrue(prompt_cache_enabled("apac.amazon.nova-pro-v1:0"))
+            self.assertTrue(prompt_cache_enabled("bedrock/us.anthropic.claude-3-7-sonnet-20250219-v1:0"))
+            self.assertFalse(prompt_cache_enabled("gpt-4o-mini"))
+        with patch.dict(os.environ, {"PROMPT_CACHE": "off"}):
+            self.assertFalse(prompt_cache_enabled("apac.amazon.nova-pro-v1:0"))
+
+    def test_task_prompts_end_with_the_request(self):
+        """Test that no task template has request-specific input before its first cache point."""
+        for name, task in _crew_config("tasks.yaml").items():
+            segments = split_prompt(task["description"])
+            self.assertGreater(len(segments), 1, name)
+            self.assertNotRegex(segments[0], r"\{(topic|documents|pinned_documents)\}", name)
+            self.assertIn("{topic}", segments[-1], name)
+
+
+class TestChunkPopularity(unittest.TestCase):
+
+    def test_frequently_used_chunks_are_pinned_in_id_order(self):
+        """Test that chunks are pinned after `min_uses` uses, in id order and up to `max_pinned`."""
+        popularity = ChunkPopularity(min_uses=2, max_pinned=2)
+        documents = [{"id": 9, "text": "c"}, {"id": 4, "text": "b"}, {"id": None, "text": "summary"}, {"id": 1, "text": "a"}]
+
+        self.assertEqual(popularity.split(documents), ([], documents))
+        pinned, rest = popularity.split(documents)
+
+        self.assertEqual([document["id"] for document in pinned], [1, 4])
+        self.assertEqual([document["id"] for document in rest], [9, None])
+
+    def test_counts_decay_when_too_many_chunks_are_tracked(self):
+        """Test that the counts are halved once more chunks are known than tracked."""
+        popularity = ChunkPopularity(min_uses=2, max_tracked=2)
+        popularity.split([{"id": 1}, {"id": 2}])
+        popularity.split([{"id": 3}])
+        pinned, _ = popularity.split([{"id": 1}])
+        self.assertEqual(pinned, [])
+
+
+@patch.dict(os.environ, {"SIM_LATENCY_SCALE": "0", "MODEL": "apac.amazon.nova-pro-v1:0", "PROMPT_CACHE": "auto"})
+class TestSimulatedPromptCache(unittest.TestCase):
+
+    def test_shared_prefix_is_read_from_the_cache(self):
+        """Test that a second query with the same pinned chunks reads the prefix from the cache."""
+        backend = SimulatedBackend()
+        first = backend.generate_report("How much annual leave?", ["Leave accrues monthly."], pinned_documents=[ANNUAL, SICK])
+        second = backend.generate_report("Is sick leave paid?", ["Sick notes are required."], pinned_documents=[ANNUAL, SICK])
+
+        self.assertEqual(first.token_usage.cached_prompt_tokens, 0)
+        self.assertGreater(second.token_usage.cached_prompt_tokens, (len(ANNUAL) + len(SICK)) // 4)
+        self.assertLess(second.token_usage.cached_prompt_tokens, second.token_usage.prompt_tokens)
+
+    def test_nothing_is_cached_without_cache_points(self):
+        """Test that the same queries read nothing from the cache when caching is off."""
+        with patch.dict(os.environ, {"PROMPT_CACHE": "off"}):
+            backend = SimulatedBackend()
+            backend.generate_report("How much annual leave?", ["Leave accrues monthly."], pinned_documents=[ANNUAL, SICK])
+            second = backend.generate_report("Is sick leave paid?", ["Sick notes are required."], pinned_documents=[ANNUAL, SICK])
+        self.assertEqual(second.token_usage.cached_prompt_tokens, 0)
+
+    def test_cached_tokens_are_cheaper(self):
+        """Test that cached prompt tokens are priced at the cache read rate."""
+        model = "apac.amazon.nova-pro-v1:0"
+        self.assertAlmostEqual(price_of(model, 2000, 0, cached_input_tokens=1000), 0.0008 + 0.0002)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import io
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from rag.src.rag.utils.dedup import add_references
+from rag.src.rag.utils.document_processor import DocumentProcessor
+from rag.src.rag.utils.retrieval_policy import RetrievalPolicy
+from rag.src.rag.utils.retriever import Retriever
+from rag.src.rag.utils.simulation import SimulatedMilvusManager, pseudo_embedding, reset_backend
+
+QUESTION = "How many days off do I get each year?"
+CHUNK = "Annual leave entitlement is 20 working days per calendar year, accrued monthly."
+
+
+def nova_response(text):
+    return {"body": io.BytesIO(json.dumps({"output": {"message": {"content": [{"text": text}]}}}).encode())}
+
+
+class TestQuestionGeneration(unittest.TestCase):
+
+    @patch('rag.src.rag.utils.document_processor.boto3.client')
+    def test_questions_are_parsed_and_embedded(self, mock_boto_client):
+        """Test that numbered LLM output becomes clean, embedded questions."""
+        processor = DocumentProcessor(generate_questions=True, embedding_dim=256)
+        processor._generate_embeddings = MagicMock(side_effect=lambda texts: [{"text": text, "embedding": [0.0] * 256, "metadata": {}} for text in texts])
+        processor.bedrock_client.invoke_model.return_value = nova_response(f"1. {QUESTION}\n2) Is annual leave accrued monthly?\n\nok")
+
+        questions = processor._questions_for_chunk({"text": CHUNK, "metadata": {"source": "a.pdf"}})
+
+        self.assertEqual([question["text"] for question in questions], [QUESTION, "Is annual leave accrued monthly?"])
+        body = json.loads(processor.bedrock_client.invoke_model.call_args.kwargs["body"])
+        self.assertIn(CHUNK, body["messages"][0]["content"][0]["text"])
+        self.assertIn("system", body)
+
+    @patch('rag.src.rag.utils.document_processor.boto3.client')
+    def test_generation_failure_leaves_the_chunk_without_questions(self, mock_boto_client):
+        """Test that a failed generation does not fail the ingestion."""
+        processor = DocumentProcessor(generate_questions=True)
+        processor._generate_questions = MagicMock(side_effect=RuntimeError("throttled"))
+        chunks = [{"text": CHUNK, "metadata": {"source": "a.pdf"}}, {"text": "Overtime is paid.", "metadata": {"source": "a.pdf"}}]
+
+        processor._add_questions(chunks)
+
+        self.assertEqual([chunk["questions"] for chunk in chunks], [[], []])
+
+    def test_generation_is_off_by_default(self):
+        """Test that question generation is opt-in."""
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("QUESTION_GENERATION", None)
+            self.assertFalse(DocumentProcessor(mock=True).generate_questions)
+        with patch.dict(os.environ, {"QUESTION_GENERATION": "on"}):
+            self.assertTrue(DocumentProcessor(mock=True).generate_questions)
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestQuestionSearch(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+        self.manager = SimulatedMilvusManager(collection_name="questions", embedding_dim=256)
+        chunks = [
+            {"text": CHUNK, "metadata": {"source": "leave.pdf", "tenant": "acme"},
+             "questions": [{"text": QUESTION, "embedding": pseudo_embedding(QUESTION, 256)}]},
+            {"text": "Expense claims are reimbursed within thirty days.", "metadata": {"source": "expenses.pdf", "tenant": "acme"}},
+        ]
+        for chunk in chunks:
+            chunk["embedding"] = pseudo_embedding(chunk["text"], 256)
+        self.ids = self.manager.insert_data(chunks).primary_keys
+
+    def tearDown(self):
+        reset_backend()
+
+    def test_question_match_lifts_the_parent_chunk(self):
+        """Test that a query phrased like a generated question finds its chunk at the question's distance."""
+        retriever = Retriever(self.manager, policy=RetrievalPolicy())
+        hits = retriever._search_milvus(pseudo_embedding(QUESTION, 256), top_n=2)
+
+        self.assertEqual(hits[0]["id"], self.ids[0])
+        self.assertAlmostEqual(hits[0]["distance"], 0.0, places=5)
+        self.assertEqual(hits[0]["matched_question"], QUESTION)
+        self.assertEqual(len(hits), 2)
+
+    def test_questions_follow_their_chunk_out_of_the_hot_tier(self):
+        """Test that archived chunks are no longer found through their questions, and tag filters apply."""
+        query = pseudo_embedding(QUESTION, 256)
+        self.assertEqual(self.manager.search_questions(query, limit=5, filters={"tenant": "globex"}), [])
+
+        self.manager.move_to_tier("archive", filters={"tenant": "acme"})
+        self.assertEqual(self.manager.search_questions(query, limit=5), [])
+
+    def test_questions_follow_their_chunk_when_it_is_replaced(self):
+        """Test that adding references to a chunk keeps its questions, while a plain replacement drops them."""
+        query = pseudo_embedding(QUESTION, 256)
+        add_references(self.manager, {self.ids[0]: [{"source": "handbook.pdf", "page": 3}]})
+
+        hits = self.manager.search_questions(query, limit=5)
+        self.assertEqual(len(hits), 1)
+        self.assertNotEqual(hits[0]["id"], self.ids[0])
+        self.assertEqual(hits[0]["matched_question"], QUESTION)
+
+        self.manager.replace_rows([], [hits[0]["id"]])
+        self.assertEqual(self.manager.search_questions(query, limit=5), [])
+
+    def test_question_search_can_be_switched_off(self):
+        """Test that QUESTION_INDEX_SEARCH=off searches chunks only."""
+        with patch.dict(os.environ, {"QUESTION_INDEX_SEARCH": "off"}):
+            retriever = Retriever(self.manager, policy=RetrievalPolicy())
+        hits = retriever._search_milvus(pseudo_embedding(QUESTION, 256), top_n=2)
+        self.assertNotIn("matched_question", hits[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
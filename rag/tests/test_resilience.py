@@ -0,0 +1,147 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+from rag.src.rag.utils.metrics import metrics
+from rag.src.rag.utils.resilience import CircuitBreaker, CircuitOpenError, DependencyUnavailable, ResilientCaller, is_retryable
+from rag.src.rag.utils.retriever import Retriever
+
+
+def client_error(code, status=400):
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "InvokeModel")
+
+
+def make_caller(max_attempts=3, failure_threshold=5, deadline=5.0):
+    breaker = CircuitBreaker("test", failure_threshold=failure_threshold, reset_timeout=60)
+    return ResilientCaller("test", deadline=deadline, max_attempts=max_attempts, base_delay=0.001, max_delay=0.002, breaker=breaker)
+
+
+class TestResilience(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_is_retryable(self):
+        """Test classification of throttling, timeout and caller errors."""
+        self.assertTrue(is_retryable(client_error("ThrottlingException")))
+        self.assertTrue(is_retryable(client_error("Whatever", status=503)))
+        self.assertTrue(is_retryable(ReadTimeoutError(endpoint_url="https://bedrock")))
+        self.assertFalse(is_retryable(client_error("ValidationException")))
+        self.assertFalse(is_retryable(client_error("404", status=404)))
+
+    def test_retries_throttling_then_succeeds(self):
+        """Test that throttled calls are retried until they succeed."""
+        caller = make_caller()
+        fn = MagicMock(side_effect=[client_error("ThrottlingException"), {"embedding": [1.0]}])
+
+        result = caller.call(fn, "body")
+
+        self.assertEqual(result, {"embedding": [1.0]})
+        self.assertEqual(fn.call_count, 2)
+        self.assertEqual(metrics.get("resilience.test.retries"), 1)
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_non_retryable_error_is_raised_immediately(self):
+        """Test that caller errors are neither retried nor counted against the breaker."""
+        caller = make_caller(failure_threshold=1)
+        fn = MagicMock(side_effect=client_error("ValidationException"))
+
+        with self.assertRaises(ClientError):
+            caller.call(fn)
+
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_breaker_opens_and_short_circuits_to_fallback(self):
+        """Test that repeated failures open the circuit and later calls fail fast."""
+        caller = make_caller(max_attempts=2, failure_threshold=2)
+        fn = MagicMock(side_effect=client_error("ThrottlingException"))
+
+        self.assertEqual(caller.call(fn, fallback=lambda: "fallback"), "fallback")
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(caller.call(fn, fallback=lambda: "fallback"), "fallback")
+        self.assertEqual(caller.breaker.state, CircuitBreaker.OPEN)
+
+        fn.reset_mock()
+        with self.assertRaises(CircuitOpenError):
+            caller.call(fn)
+        fn.assert_not_called()
+        self.assertEqual(metrics.get("resilience.test.short_circuits"), 1)
+        self.assertEqual(metrics.get("resilience.test.fallbacks"), 2)
+
+    def test_a_call_counts_once_against_the_breaker(self):
+        """Test that a call failing on every attempt is one failure, not one per attempt."""
+        caller = make_caller(max_attempts=4, failure_threshold=2)
+        caller.call(MagicMock(side_effect=client_error("ThrottlingException")), fallback=lambda: None)
+
+        self.assertEqual(metrics.get("resilience.test.retries"), 3)
+        self.assertEqual(caller.breaker._failures, 1)
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+
+    @patch('rag.src.rag.utils.resilience.time.monotonic')
+    def test_half_open_probe_closes_circuit(self, mock_monotonic):
+        """Test that a successful probe after the reset timeout closes the circuit."""
+        mock_monotonic.return_value = 0.0
+        caller = make_caller(max_attempts=1, failure_threshold=1)
+        caller.call(MagicMock(side_effect=client_error("ThrottlingException")), fallback=lambda: None)
+        self.assertEqual(caller.breaker.state, CircuitBreaker.OPEN)
+
+        mock_monotonic.return_value = 120.0
+        self.assertEqual(caller.call(MagicMock(return_value="ok")), "ok")
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+
+    @patch('rag.src.rag.utils.resilience.time.monotonic')
+    def test_half_open_probe_always_settles_the_circuit(self, mock_monotonic):
+        """Test that a probe rejected for its input closes the circuit, and one that is interrupted re-opens it."""
+        mock_monotonic.return_value = 0.0
+        caller = make_caller(max_attempts=1, failure_threshold=1)
+        caller.call(MagicMock(side_effect=client_error("ThrottlingException")), fallback=lambda: None)
+
+        mock_monotonic.return_value = 120.0
+        with self.assertRaises(ClientError):
+            caller.call(MagicMock(side_effect=client_error("ValidationException")), fallback=lambda: "fallback")
+        self.assertEqual(caller.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(caller.call(MagicMock(return_value="ok"), fallback=lambda: "fallback"), "ok")
+
+        caller.call(MagicMock(side_effect=client_error("ThrottlingException")), fallback=lambda: None)
+        mock_monotonic.return_value = 240.0
+        with self.assertRaises(KeyboardInterrupt):
+            caller.call(MagicMock(side_effect=KeyboardInterrupt))
+        self.assertEqual(caller.breaker.state, CircuitBreaker.OPEN)
+
+    def test_deadline_bounds_a_slow_attempt(self):
+        """Test that an attempt still running at the deadline is given up on and the fallback returned."""
+        caller = make_caller(max_attempts=3, deadline=0.05)
+        started = time.monotonic()
+
+        result = caller.call(lambda: time.sleep(0.5), fallback=lambda: "fallback")
+
+        self.assertEqual(result, "fallback")
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.assertEqual(metrics.get("resilience.test.timeouts"), 1)
+
+
+class TestQueryEmbeddingOutage(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    @patch('rag.src.rag.utils.retriever.boto3.client')
+    def test_outage_is_raised_instead_of_finding_nothing(self, mock_boto_client):
+        """Test that a throttled or short-circuited embedding call raises rather than returning no embedding."""
+        caller = make_caller(max_attempts=2, failure_threshold=1)
+        mock_boto_client.return_value.invoke_model.side_effect = client_error("ThrottlingException", status=429)
+        retriever = Retriever(MagicMock(embedding_dim=256))
+
+        with patch('rag.src.rag.utils.retriever.get_caller', return_value=caller):
+            with self.assertRaises(DependencyUnavailable):
+                retriever.retrieve("How many days of leave?")
+            with self.assertRaises(CircuitOpenError):
+                retriever.retrieve("How many days of leave?")
+        retriever.milvus_manager.search.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
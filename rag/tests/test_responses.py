@@ -0,0 +1,145 @@
+import asyncio
+import os
+import unittest
+import zlib
+from unittest.mock import patch
+
+import orjson
+
+from rag.src.rag.utils.metrics import metrics
+from rag.src.rag.utils.responses import CompressionMiddleware, as_documents, from_cached, references, snippet, sse_event
+from rag.src.rag.utils.retrieval_policy import RetrievalPolicy
+from rag.src.rag.utils.retriever import Retriever
+from rag.src.rag.utils.simulation import SimulatedMilvusManager, pseudo_embedding, reset_backend
+
+ANNUAL = "Full-time employees receive 20 days of annual leave per year, accrued monthly from the start date."
+
+
+def run_app(app, accept_encoding="gzip"):
+    """Calls an ASGI app through the middleware and returns the messages it sent."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, receive, send))
+    return sent
+
+
+def asgi_app(*bodies, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type), (b"content-length", str(sum(map(len, bodies))).encode())]})
+        for index, body in enumerate(bodies):
+            await send({"type": "http.response.body", "body": body, "more_body": index < len(bodies) - 1})
+    return app
+
+
+class TestReferences(unittest.TestCase):
+
+    def test_snippets_are_cut_at_a_word_boundary(self):
+        """Test that snippets collapse whitespace and end on a whole word."""
+        self.assertEqual(snippet("Annual\n\nleave   policy"), "Annual leave policy")
+        self.assertEqual(snippet(ANNUAL, 40), "Full-time employees receive 20 days of...")
+        self.assertLessEqual(len(snippet(ANNUAL, 40)), 43)
+
+    def test_documents_cite_chunks_by_id(self):
+        """Test that chunk hits keep their id and source, summaries have none and archived chunks are marked."""
+        hits = [
+            {"id": 7, "distance": 0.1, "text": ANNUAL, "metadata": {"source": "leave.pdf", "page": 3, "section": "Leave", "tenant": "acme"}},
+            {"id": 2, "distance": 0.2, "text": "Summary of leave.pdf:\nLeave rules.", "metadata": {"source": "leave.pdf", "level": "document"}},
+            {"id": 9, "distance": 0.3, "text": "Old policy.", "metadata": {"source": "leave.pdf"}, "tier": "archive"},
+        ]
+
+        documents = as_documents(hits)
+
+        self.assertEqual(documents[0], {"id": 7, "text": ANNUAL, "source": "leave.pdf", "page": 3, "section": "Leave"})
+        self.assertIsNone(documents[1]["id"])
+        self.assertEqual(documents[2]["tier"], "archive")
+        sources = references(documents, chars=40)
+        self.assertNotIn("text", sources[0])
+        self.assertEqual(sources[0]["snippet"], "Full-time employees receive 20 days of...")
+
+    def test_cached_texts_are_read_as_documents(self):
+        """Test that retrievals cached as plain texts still read as documents."""
+        self.assertEqual(from_cached(["a", {"id": 1, "text": "b"}]), [{"id": None, "text": "a"}, {"id": 1, "text": "b"}])
+
+    def test_events_are_serialized_with_orjson(self):
+        """Test the server-sent event framing."""
+        event = sse_event({"step": "complete", "meta": {"sources": []}})
+        self.assertTrue(event.startswith("data: ") and event.endswith("\n\n"))
+        self.assertEqual(orjson.loads(event[6:]), {"step": "complete", "meta": {"sources": []}})
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_large_responses_are_gzipped(self):
+        """Test that a large body is compressed with a matching Content-Length."""
+        body = orjson.dumps({"answer": ANNUAL * 20})
+        start, message = run_app(asgi_app(body))
+
+        headers = dict(start["headers"])
+        self.assertEqual(headers[b"content-encoding"], b"gzip")
+        self.assertEqual(int(headers[b"content-length"]), len(message["body"]))
+        self.assertEqual(zlib.decompress(message["body"], 31), body)
+        self.assertEqual(metrics.get("response.bytes_uncompressed"), len(body))
+
+    def test_small_responses_and_other_clients_are_left_alone(self):
+        """Test that small bodies and clients without gzip get the body as it is."""
+        start, message = run_app(asgi_app(b'{"status": "ok"}'))
+        self.assertNotIn(b"content-encoding", dict(start["headers"]))
+        self.assertEqual(message["body"], b'{"status": "ok"}')
+
+        body = ANNUAL.encode() * 20
+        _, message = run_app(asgi_app(body), accept_encoding="identity")
+        self.assertEqual(message["body"], body)
+
+    def test_streamed_events_are_flushed_one_at_a_time(self):
+        """Test that every event of a stream can be decompressed as soon as it arrives."""
+        events = [sse_event({"step": step, "message": ANNUAL}).encode() for step in ("retrieving", "retrieved", "complete")]
+        sent = run_app(asgi_app(*events, content_type=b"text/event-stream"))
+
+        self.assertNotIn(b"content-length", dict(sent[0]["headers"]))
+        decompressor = zlib.decompressobj(31)
+        for event, message in zip(events, sent[1:]):
+            self.assertEqual(decompressor.decompress(message["body"]), event)
+        self.assertFalse(sent[-1]["more_body"])
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0", "SUMMARY_SEARCH": "off"})
+class TestRetrievedHits(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+        self.manager = SimulatedMilvusManager(collection_name="responses", embedding_dim=256)
+        texts = [ANNUAL, "Sick leave is paid for up to 10 days a year.", "Expense claims are reimbursed within thirty days."]
+        self.manager.insert_data([
+            {"text": text, "embedding": pseudo_embedding(text, 256), "metadata": {"source": "handbook.pdf", "page": i + 1}}
+            for i, text in enumerate(texts)
+        ])
+
+    def tearDown(self):
+        reset_backend()
+
+    def test_hits_match_the_reranked_documents(self):
+        """Test that the hits left by a retrieval are those of the returned documents, in order."""
+        retriever = Retriever(self.manager, policy=RetrievalPolicy(mode="fixed"))
+
+        documents = retriever.retrieve(ANNUAL, top_n=3)
+
+        self.assertTrue(documents)
+        self.assertEqual([hit["text"] for hit in retriever.hits], documents)
+        row = self.manager.get_rows([retriever.hits[0]["id"]], include_embeddings=False)[0]
+        self.assertNotIn("embedding", row)
+        self.assertEqual(row["text"], documents[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
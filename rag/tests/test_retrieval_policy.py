@@ -0,0 +1,93 @@
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from rag.src.rag.utils.retrieval_policy import RetrievalPolicy
+from rag.src.rag.utils.retriever import Retriever
+from rag.src.rag.utils.simulation import SimulatedMilvusManager, pseudo_embedding, reset_backend
+
+
+def hits(*distances):
+    return [{"id": i, "distance": d, "text": f"doc {i}", "metadata": {}} for i, d in enumerate(distances)]
+
+
+class TestRetrievalPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetrievalPolicy(probe_depth=4, skip_rerank_distance=0.2, skip_rerank_margin=0.3, candidate_window=0.4)
+
+    def test_near_exact_match_skips_rerank(self):
+        """Test that a near-exact top hit is returned without reranking, with only close runners-up."""
+        decision = self.policy.plan(hits(0.05, 0.3, 0.5, 0.9), depth=4, max_depth=50)
+        self.assertEqual(decision.action, "skip_rerank")
+        self.assertEqual([hit["id"] for hit in decision.candidates], [0, 1])
+
+    def test_clear_margin_skips_rerank(self):
+        """Test that a top hit far ahead of the runner-up skips the reranker."""
+        decision = self.policy.plan(hits(0.5, 0.85, 0.9, 1.0), depth=4, max_depth=50)
+        self.assertEqual(decision.action, "skip_rerank")
+        self.assertEqual([hit["id"] for hit in decision.candidates], [0, 1, 2])
+
+    def test_flat_probe_expands_then_reranks_the_window(self):
+        """Test that a flat probe triggers a deeper search, and only hits inside the window are reranked."""
+        self.assertEqual(self.policy.plan(hits(0.5, 0.55, 0.6, 0.7), depth=4, max_depth=50).action, "expand")
+
+        deep = hits(0.5, 0.55, 0.6, 0.7, 0.8, 0.85, 1.2, 1.3)
+        decision = self.policy.plan(deep, depth=50, max_depth=50)
+        self.assertEqual(decision.action, "rerank")
+        self.assertEqual(len(decision.candidates), 6)
+
+    def test_ambiguous_probe_with_a_gap_reranks_without_expanding(self):
+        """Test that a probe whose tail falls outside the window is reranked at the probe depth."""
+        decision = self.policy.plan(hits(0.5, 0.55, 0.6, 1.2), depth=4, max_depth=50)
+        self.assertEqual(decision.action, "rerank")
+        self.assertEqual(len(decision.candidates), 4)
+
+    def test_fixed_mode_and_max_distance(self):
+        """Test the fixed policy and the optional relevance cut-off."""
+        fixed = RetrievalPolicy(mode="fixed")
+        self.assertEqual(fixed.initial_depth(50), 50)
+        self.assertTrue(fixed.plan(hits(0.0, 1.0), depth=50, max_depth=50).rerank)
+
+        strict = RetrievalPolicy(max_distance=1.0)
+        self.assertEqual(strict.plan(hits(1.5, 1.6), depth=10, max_depth=50).candidates, [])
+        with self.assertRaises(ValueError):
+            RetrievalPolicy(mode="greedy")
+
+    def test_from_env(self):
+        """Test that every knob can be set from the environment."""
+        with patch.dict(os.environ, {"RETRIEVAL_PROBE_DEPTH": "20", "RETRIEVAL_MAX_DISTANCE": "1.1", "RETRIEVAL_CANDIDATE_WINDOW": "0.25"}):
+            policy = RetrievalPolicy.from_env()
+        self.assertEqual((policy.probe_depth, policy.max_distance, policy.candidate_window), (20, 1.1, 0.25))
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestRetrieverWithPolicy(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+        self.manager = SimulatedMilvusManager(collection_name="policy", embedding_dim=256)
+        texts = ["Annual leave is 20 days per year.", "Sick leave needs a medical certificate.", "Overtime is paid as time off."]
+        self.manager.insert_data([{"text": text, "embedding": pseudo_embedding(text, 256), "metadata": {}} for text in texts])
+
+    def tearDown(self):
+        reset_backend()
+
+    def test_exact_match_returns_without_reranking(self):
+        """Test that the reranker is not called for an exact match."""
+        retriever = Retriever(self.manager, policy=RetrievalPolicy())
+        retriever._rerank_documents = MagicMock()
+        self.assertEqual(retriever.retrieve("Annual leave is 20 days per year.")[0], "Annual leave is 20 days per year.")
+        retriever._rerank_documents.assert_not_called()
+
+    def test_fixed_policy_always_reranks(self):
+        """Test that the fixed policy keeps the previous behaviour."""
+        retriever = Retriever(self.manager, policy=RetrievalPolicy(mode="fixed"))
+        retriever._rerank_documents = MagicMock(return_value=["Annual leave is 20 days per year."])
+        retriever.retrieve("Annual leave is 20 days per year.")
+        retriever._rerank_documents.assert_called_once()
+        self.assertEqual(len(retriever._rerank_documents.call_args.args[1]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from rag.src.rag.utils.metrics import metrics
+from rag.src.rag.utils.retrieval_policy import RetrievalPolicy
+from rag.src.rag.utils.retriever import Retriever
+from rag.src.rag.utils.sessions import SessionStore, is_follow_up, template_condense
+from rag.src.rag.utils.simulation import SimulatedMilvusManager, pseudo_embedding, reset_backend
+
+QUESTION = "How many days of annual leave do full-time employees get?"
+TEXTS = [
+    "Full-time employees receive 20 days of annual leave per year.",
+    "Part-time employees receive annual leave pro rata to their contracted hours.",
+    "Sick leave of up to 10 days a year is paid on presentation of a medical certificate.",
+    "Expense claims are reimbursed within thirty days of submission.",
+]
+
+
+class TestSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_follow_ups_are_detected_and_condensed(self):
+        """Test the follow-up heuristic and the template used without an LLM."""
+        history = [QUESTION]
+        for query in ("and for part-timers?", "What about contractors?", "for part-timers?", "contractors too"):
+            self.assertTrue(is_follow_up(query, history), query)
+        for query in ("What is maternity leave?", "Is there a dress code?", "How do I submit expenses that exceed the limit?",
+                      "Does that apply to contractors as well?", "Who approves leave?", "How are expense claims reimbursed after a business trip?"):
+            self.assertFalse(is_follow_up(query, history), query)
+        self.assertFalse(is_follow_up("and for part-timers?", []))
+        self.assertEqual(template_condense([QUESTION], "and for part-timers?"), f"{QUESTION} (for part-timers?)")
+
+    def test_sessions_keep_embedded_candidates_up_to_the_limit(self):
+        """Test that a turn keeps its question and at most `max_candidates` candidates with embeddings."""
+        store = SessionStore(max_candidates=2)
+        session = store.get("abc")
+        candidates = [{"id": i, "text": text, "embedding": [0.1] * 8} for i, text in enumerate(TEXTS)]
+        candidates.insert(0, {"id": 99, "text": "found through a generated question"})
+
+        store.update(session, QUESTION, candidates, [0.0] * 8, scope="")
+
+        self.assertIs(store.get("abc"), session)
+        self.assertEqual(list(session.history), [QUESTION])
+        self.assertEqual([hit["id"] for hit in session.prior("")], [0, 1])
+        self.assertEqual(session.prior("|archived"), [])
+        self.assertEqual(store.stats()["sessions"], 1)
+
+    def test_idle_and_oversized_sessions_are_evicted(self):
+        """Test eviction by idle time and, least recently used first, by memory."""
+        store = SessionStore(ttl=60, max_bytes=5000)
+        old = store.get("old")
+        old.last_used = time.monotonic() - 61
+        self.assertIsNot(store.get("old"), old)
+
+        sessions = [store.get(name) for name in ("first", "second", "third")]
+        for session in sessions:
+            store.update(session, QUESTION, [{"id": 1, "text": TEXTS[0], "embedding": [0.0] * 256}], [0.0] * 256, scope="")
+
+        self.assertLessEqual(store.stats()["bytes"], 5000)
+        self.assertIs(store.get("third"), sessions[2])
+        self.assertIsNot(store.get("first"), sessions[0])
+        self.assertEqual(metrics.get("session.evicted"), 3)
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0", "SUMMARY_SEARCH": "off"})
+class TestFollowUpRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+        metrics.reset()
+        self.manager = SimulatedMilvusManager(collection_name="sessions", embedding_dim=256)
+        chunks = [{"text": text, "embedding": pseudo_embedding(text, 256), "metadata": {"source": "leave.pdf"}} for text in TEXTS]
+        self.manager.insert_data(chunks)
+
+    def tearDown(self):
+        reset_backend()
+
+    @property
+    def retriever(self):
+        if not hasattr(self, "_retriever"):
+            self._retriever = Retriever(self.manager, mock=True, policy=RetrievalPolicy(probe_depth=2))
+        return self._retriever
+
+    def searches(self):
+        return metrics.get("simulation.milvus_search.calls")
+
+    def test_follow_up_extends_the_previous_candidates(self):
+        """Test that a follow-up re-scores the prior candidates and adds a shallow search to them."""
+        self.retriever.retrieve(QUESTION, top_n=3, prior=[])
+        prior, prior_embedding = self.retriever.candidates, self.retriever.query_embedding
+        self.assertTrue(all("embedding" in hit for hit in prior))
+
+        self.retriever.retrieve(TEXTS[3], top_n=4, prior=prior, prior_embedding=prior_embedding)
+
+        ids = [hit["id"] for hit in self.retriever.candidates]
+        self.assertEqual(ids[0], 4)
+        self.assertTrue({hit["id"] for hit in prior} <= set(ids))
+        self.assertEqual(metrics.get("retrieve.session_candidates"), len(prior))
+
+    def test_repeated_question_reuses_the_candidates_without_searching(self):
+        """Test that a follow-up whose embedding has not moved skips the vector search."""
+        self.retriever.retrieve(QUESTION, top_n=3, prior=[])
+        prior, prior_embedding = self.retriever.candidates, self.retriever.query_embedding
+        searches = self.searches()
+
+        self.retriever.retrieve(QUESTION, top_n=3, prior=prior, prior_embedding=prior_embedding)
+
+        self.assertEqual(self.searches(), searches)
+        self.assertEqual(metrics.get("retrieve.session_reused"), 1)
+        self.assertEqual([hit["id"] for hit in self.retriever.candidates], [hit["id"] for hit in prior])
+
+    def test_condensing_uses_the_llm(self):
+        """Test that a follow-up is rewritten through Bedrock with the earlier questions."""
+        retriever = Retriever(self.manager, policy=RetrievalPolicy())
+        standalone = retriever.condense_query([QUESTION], "and for part-timers?")
+        self.assertEqual(standalone, f"{QUESTION} (for part-timers?)")
+        self.assertEqual(metrics.get("usage.condense.calls"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from rag.src.rag.utils import shared_cache
+from rag.src.rag.utils.retriever import Retriever
+from rag.src.rag.utils.shared_cache import ANSWERS, CONFIGS, EMBEDDINGS, RETRIEVALS, SharedCache, cache_key
+
+
+class TestSharedCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cache.sqlite3")
+        self.cache = SharedCache(self.path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_values_are_shared_between_instances(self):
+        """Test that a value written by one worker's cache is read by another's, across threads."""
+        other = SharedCache(self.path)
+        self.cache.set(EMBEDDINGS, "q", [0.1, 0.2])
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(other.get(EMBEDDINGS, "q")))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(results, [[0.1, 0.2]])
+        self.assertIsNone(other.get(EMBEDDINGS, "missing"))
+
+    def test_entries_expire_and_disabled_namespaces_are_skipped(self):
+        """Test the per-namespace time-to-live, including a TTL of 0."""
+        cache = SharedCache(self.path, ttls={ANSWERS: 0})
+        cache.set(RETRIEVALS, "short", ["doc"], ttl=0.01)
+        cache.set(ANSWERS, "never", "report")
+        time.sleep(0.02)
+
+        self.assertIsNone(cache.get(RETRIEVALS, "short"))
+        self.assertIsNone(cache.get(ANSWERS, "never"))
+
+    def test_generation_bump_drops_results_but_keeps_embeddings(self):
+        """Test that a knowledge-base change invalidates derived results in every worker."""
+        other = SharedCache(self.path)
+        self.cache.set(EMBEDDINGS, "e", [1.0])
+        self.cache.set(CONFIGS, "c", {"agent": {}})
+        self.cache.set(ANSWERS, cache_key("q", self.cache.generation()), "old report")
+
+        self.assertEqual(other.bump_generation(), 1)
+
+        self.assertEqual(self.cache.generation(), 1)
+        self.assertEqual(self.cache.stats()["entries"], {EMBEDDINGS: 1, CONFIGS: 1})
+
+    def test_prune_keeps_the_newest_entries(self):
+        """Test that pruning bounds the number of entries."""
+        cache = SharedCache(self.path, max_entries=2)
+        for i in range(4):
+            cache.set(EMBEDDINGS, str(i), i, ttl=100 + i)
+
+        self.assertEqual(cache.prune(), 2)
+        self.assertEqual([cache.get(EMBEDDINGS, str(i)) for i in range(4)], [None, None, 2, 3])
+
+    def test_from_env_is_off_without_a_path(self):
+        """Test that caching is opt-in and TTLs can be overridden."""
+        with patch.dict(os.environ, {"SHARED_CACHE_PATH": ""}):
+            self.assertIsNone(SharedCache.from_env())
+        with patch.dict(os.environ, {"SHARED_CACHE_PATH": self.path, "ANSWER_CACHE_TTL": "60"}):
+            self.assertEqual(SharedCache.from_env().ttls[ANSWERS], 60.0)
+
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"SHARED_CACHE_PATH": os.path.join(self.temp_dir.name, "cache.sqlite3")})
+        self.env.start()
+        shared_cache.reset_shared_cache()
+
+    def tearDown(self):
+        shared_cache.reset_shared_cache()
+        self.env.stop()
+        self.temp_dir.cleanup()
+
+    @patch('rag.src.rag.utils.retriever.boto3.client')
+    def test_second_retriever_reuses_the_embedding(self, mock_boto_client):
+        """Test that a query embedded by one retriever is not sent to Bedrock again."""
+        mock_boto_client.return_value.invoke_model.side_effect = lambda **kwargs: {
+            "body": io.BytesIO(json.dumps({"embedding": [0.5] * 4}).encode())
+        }
+
+        first = Retriever(MagicMock(embedding_dim=4))._embed_query("How much leave do I get?")
+        second = Retriever(MagicMock(embedding_dim=4))._embed_query("How much leave do I get?")
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_boto_client.return_value.invoke_model.call_count, 1)
+
+    def test_invalidation_bumps_the_generation(self):
+        """Test that knowledge-base writes advance the generation of the configured cache."""
+        shared_cache.invalidate_knowledge_base()
+        self.assertEqual(shared_cache.get_shared_cache().generation(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,293 @@
+import itertools
+import json
+import os
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from pymilvus.client.types import LoadState
+
+from rag.src.rag.utils.metrics import Metrics
+from rag.src.rag.utils.milvus_manager import MilvusManager
+from rag.src.rag.utils.resilience import is_retryable
+from rag.src.rag.utils.retriever import Retriever
+from rag.src.rag.utils.simulation import (
+    ServiceProfile,
+    SimulatedBedrockClient,
+    SimulatedMilvusManager,
+    SimulatedService,
+    compile_expr,
+    create_milvus_manager,
+    get_backend,
+    pseudo_embedding,
+    reset_backend,
+)
+
+
+class TestPseudoEmbedding(unittest.TestCase):
+
+    def test_deterministic_and_normalized(self):
+        """Test that the same text always maps to the same unit vector of the requested size."""
+        first = pseudo_embedding("Annual leave in Singapore", 256)
+        self.assertEqual(first, pseudo_embedding("Annual leave in Singapore", 256))
+        self.assertEqual(len(first), 256)
+        self.assertAlmostEqual(float(np.linalg.norm(first)), 1.0, places=5)
+
+    def test_related_texts_are_closer(self):
+        """Test that texts sharing words are more similar than unrelated texts."""
+        query = np.asarray(pseudo_embedding("How many days of annual leave do I get?"))
+        related = np.asarray(pseudo_embedding("Employees get 20 days of annual leave per year."))
+        unrelated = np.asarray(pseudo_embedding("Laptops are replaced every three years."))
+        self.assertGreater(query @ related, query @ unrelated)
+
+
+class TestSimulatedService(unittest.TestCase):
+
+    def test_errors_are_retryable_client_errors(self):
+        """Test that simulated failures look like retryable AWS errors."""
+        service = SimulatedService("test", ServiceProfile(1, 1, error_rate=1.0), latency_scale=0)
+        with self.assertRaises(Exception) as ctx:
+            service.call()
+        self.assertTrue(is_retryable(ctx.exception))
+
+    def test_throttles_over_capacity(self):
+        """Test that calls beyond the configured capacity are throttled."""
+        service = SimulatedService("test", ServiceProfile(1, 1, capacity=1), latency_scale=0)
+        service._active = 1
+        with self.assertRaises(Exception) as ctx:
+            service.call()
+        self.assertEqual(ctx.exception.response["Error"]["Code"], "ThrottlingException")
+
+    def test_profile_from_env(self):
+        """Test that latency, error rate and capacity can be overridden per dependency."""
+        with patch.dict(os.environ, {"SIM_LLM_LATENCY_MS": "100,400", "SIM_LLM_CAPACITY": "3"}):
+            profile = ServiceProfile.from_env("llm")
+        self.assertEqual((profile.median_ms, profile.p99_ms, profile.capacity), (100.0, 400.0, 3))
+
+    def test_bedrock_embedding_response(self):
+        """Test that the simulated Bedrock client answers like Titan v2 with the requested dimension."""
+        service = SimulatedService("test", ServiceProfile(1, 1), latency_scale=0)
+        client = SimulatedBedrockClient(service, service)
+        response = client.invoke_model(body=json.dumps({"inputText": "hello world", "dimensions": 512}), modelId="titan")
+        body = json.loads(response["body"].read())
+        self.assertEqual(body["embedding"], pseudo_embedding("hello world", 512))
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestSimulatedMilvusManager(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+
+    def tearDown(self):
+        reset_backend()
+
+    def chunk(self, text, **metadata):
+        return {"text": text, "embedding": pseudo_embedding(text), "metadata": metadata}
+
+    def test_factory_and_shared_store(self):
+        """Test that managers created for the same collection share the in-memory data."""
+        writer = create_milvus_manager()
+        self.assertIsInstance(writer, SimulatedMilvusManager)
+        writer.insert_data([self.chunk("Annual leave is 20 days.", source="a.pdf")])
+        self.assertEqual(len(create_milvus_manager().search(pseudo_embedding("annual leave"), limit=5)), 1)
+
+    def test_search_filters_and_supersede(self):
+        """Test filtered search, duplicate detection and archiving of older versions."""
+        manager = create_milvus_manager()
+        manager.insert_data([
+            self.chunk("Annual leave in Singapore is 14 days.", source="sg.pdf", region="SG", content_hash="v1"),
+            self.chunk("Annual leave in Germany is 30 days.", source="de.pdf", region="DE"),
+        ])
+        hits = manager.search(pseudo_embedding("annual leave"), limit=5, filters={"region": "DE"})
+        self.assertEqual([hit["metadata"]["source"] for hit in hits], ["de.pdf"])
+        self.assertTrue(manager.has_content("v1"))
+        self.assertFalse(manager.has_content("v1", tenant="other"))
+
+        manager.insert_data([self.chunk("Annual leave in Singapore is 18 days.", source="sg.pdf", region="SG")], supersede=True)
+        hot = manager.search(pseudo_embedding("annual leave singapore"), limit=5, filters={"region": "SG"})
+        self.assertEqual([hit["text"] for hit in hot], ["Annual leave in Singapore is 18 days."])
+        everything = manager.search(pseudo_embedding("annual leave singapore"), limit=5, filters={"region": "SG"}, include_archived=True)
+        self.assertEqual(sorted(hit["tier"] for hit in everything), ["archive", "hot"])
+
+
+class TestCompileExpr(unittest.TestCase):
+
+    def test_expressions_built_by_the_manager(self):
+        """Test the comparisons, JSON functions and boolean operators MilvusManager builds."""
+        row = {"id": 3, "metadata": {"source": "a.pdf", "sources": ["a.pdf", "b.pdf"], "region": "SG"}}
+        self.assertTrue(compile_expr('(metadata["source"] == "x.pdf" or json_contains(metadata["sources"], "b.pdf")) and id not in [1, 2]')(row))
+        self.assertTrue(compile_expr('tenant == "default" and region in ["DE", "SG"]')(row))
+        self.assertFalse(compile_expr('json_contains_any(metadata["lsh_bands"], ["0:ab"])')(row))
+        self.assertFalse(compile_expr('not (id in [3])')(row))
+        with self.assertRaises(ValueError):
+            compile_expr('id > 2')
+
+
+class _FakeCollection:
+    """A pymilvus Collection over in-memory rows, filtering with the simulation's expression semantics."""
+
+    ids = itertools.count(1)
+
+    def __init__(self, schema=None):
+        self.schema = schema
+        self.rows = []
+
+    def insert(self, entities):
+        keys = []
+        for entity in entities:
+            keys.append(next(self.ids))
+            self.rows.append({**entity, "id": keys[-1]})
+        return SimpleNamespace(primary_keys=keys)
+
+    def query(self, expr, output_fields, limit=None):
+        rows = [row for row in self.rows if not expr or compile_expr(expr)(row)][:limit]
+        return [{field: row[field] for field in output_fields} for row in rows]
+
+    def query_iterator(self, batch_size, expr, output_fields):
+        batches = iter([self.query(expr, output_fields), []])
+        return SimpleNamespace(next=lambda: next(batches), close=lambda: None)
+
+    def delete(self, expr):
+        self.rows = [row for row in self.rows if not compile_expr(expr)(row)]
+
+    def search(self, data, anns_field, param, limit, expr, output_fields):
+        rows = [row for row in self.rows if not expr or compile_expr(expr)(row)]
+        distances = [float(np.sum((np.asarray(row["embedding"]) - np.asarray(data[0])) ** 2)) for row in rows]
+        return [[
+            SimpleNamespace(id=rows[i]["id"], distance=distances[i], entity={field: rows[i][field] for field in output_fields})
+            for i in np.argsort(distances)[:limit]
+        ]]
+
+    def flush(self):
+        pass
+
+    def load(self):
+        pass
+
+    def release(self):
+        pass
+
+    def create_index(self, field_name, index_params):
+        pass
+
+    @property
+    def num_entities(self):
+        return len(self.rows)
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestBackendParity(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+
+    def tearDown(self):
+        reset_backend()
+
+    def milvus_manager(self):
+        """Returns a MilvusManager whose collections are in-memory fakes."""
+        collections = {}
+        mock_utility = MagicMock()
+        mock_utility.has_collection.side_effect = lambda name: name in collections
+        mock_utility.load_state.return_value = LoadState.Loaded
+        for target, value in (
+            ('connections', MagicMock()),
+            ('FieldSchema', MagicMock()),
+            ('CollectionSchema', MagicMock()),
+            ('utility', mock_utility),
+            ('Collection', lambda name, schema=None: collections.setdefault(name, _FakeCollection(schema))),
+        ):
+            patcher = patch(f'rag.src.rag.utils.milvus_manager.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return MilvusManager(embedding_dim=256)
+
+    def run_operations(self, manager):
+        """Runs uploads, a supersede, tier moves by expression and filtered reads, and returns what each saw."""
+        def chunk(text, **metadata):
+            return {"text": text, "embedding": pseudo_embedding(text, 256), "metadata": metadata}
+
+        def tiers():
+            return {tier: sorted(row["text"] for batch in manager.iter_rows(tier) for row in batch) for tier in ("hot", "archive")}
+
+        query = pseudo_embedding("annual leave", 256)
+        seen = []
+        manager.insert_data([
+            chunk("Annual leave in Singapore is 14 days.", source="sg.pdf", region="SG", content_hash="v1"),
+            chunk("Annual leave in Germany is 30 days.", source="de.pdf", region="DE"),
+            chunk("Annual leave at Acme is 25 days.", source="acme.pdf", tenant="acme"),
+        ])
+        seen.append(sorted(hit["text"] for hit in manager.search(query, limit=5, filters={"region": ["DE", "SG"]})))
+        seen.append((manager.has_content("v1"), manager.has_content("v1", tenant="acme")))
+        manager.insert_data([chunk("Annual leave in Singapore is 18 days.", source="sg.pdf", region="SG")], supersede=True)
+        seen.append(tiers())
+        seen.append(manager.move_to_tier("archive", expr='metadata["source"] == "de.pdf"'))
+        seen.append(sorted(row["text"] for batch in manager.iter_rows("archive", expr='metadata["region"] == "DE"') for row in batch))
+        seen.append(manager.move_to_tier("hot", expr='metadata["source"] in ["de.pdf", "sg.pdf"]', filters={"region": "DE"}))
+        hits = manager.search(query, limit=5, expr='metadata["source"] != "acme.pdf"', include_archived=True)
+        seen.append(sorted((hit["text"], hit["tier"]) for hit in hits))
+        seen.append(tiers())
+        seen.append((manager.count_rows("hot"), manager.count_rows("archive")))
+        return seen
+
+    def test_simulated_manager_matches_milvus_manager(self):
+        """Test that the same operations see the same chunks on the simulated and the Milvus-backed manager."""
+        simulated = self.run_operations(SimulatedMilvusManager(embedding_dim=256))
+        self.assertEqual(simulated, self.run_operations(self.milvus_manager()))
+        self.assertEqual(simulated[3], 1)
+        self.assertEqual(simulated[-1], (3, 1))
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestDegradedRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+
+    def tearDown(self):
+        reset_backend()
+
+    def test_failed_embedding_is_degraded_and_recovers(self):
+        """Test that a retrieval after a failed embedding is flagged degraded, and the next one is complete."""
+        text = "Annual leave is 20 days."
+        create_milvus_manager().insert_data([{"text": text, "embedding": pseudo_embedding(text), "metadata": {"source": "a.pdf"}}])
+        bedrock = get_backend().bedrock
+        real_invoke = bedrock.invoke_model
+        calls = []
+
+        def fail_once(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise ValueError("Malformed response")
+            return real_invoke(**kwargs)
+
+        with patch.object(bedrock, "invoke_model", side_effect=fail_once):
+            retriever = Retriever(create_milvus_manager())
+            self.assertEqual(retriever.retrieve("How many days of annual leave?"), [])
+            self.assertTrue(retriever.degraded)
+
+            documents = retriever.retrieve("How many days of annual leave?")
+            self.assertEqual(documents, ["Annual leave is 20 days."])
+            self.assertFalse(retriever.degraded)
+
+
+class TestLatencyMetrics(unittest.TestCase):
+
+    def test_timer_records_percentiles(self):
+        """Test that timers record samples and summarize them."""
+        registry = Metrics()
+        for value in range(1, 101):
+            registry.observe("stage", value / 100)
+        with registry.timer("other"):
+            pass
+        summary = registry.latency_summary()
+        self.assertEqual(summary["stage"]["count"], 100)
+        self.assertEqual(summary["stage"]["p50"], 0.51)
+        self.assertEqual(summary["stage"]["p99"], 1.0)
+        self.assertEqual(summary["other"]["count"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
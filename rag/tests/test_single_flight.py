@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+
+from rag.src.rag.utils.metrics import metrics
+from rag.src.rag.utils.single_flight import SingleFlight
+from rag.src.rag.utils.text_utils import normalize_query
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_normalize_query(self):
+        """Test that case, whitespace and trailing punctuation are ignored."""
+        self.assertEqual(normalize_query("  How many   LEAVE days?? "), "how many leave days")
+        self.assertEqual(normalize_query("How many leave days"), "how many leave days")
+
+    def test_concurrent_identical_calls_share_one_execution(self):
+        """Test that concurrent calls with the same key run the work once."""
+        flight = SingleFlight("test")
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return ["doc"]
+
+        async def run():
+            return await asyncio.gather(*[flight.do("key", work) for _ in range(5)])
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [["doc"]] * 5)
+        self.assertEqual(metrics.get("test.executions"), 1)
+        self.assertEqual(metrics.get("test.coalesced"), 4)
+        self.assertEqual(flight.inflight(), 0)
+
+    def test_different_keys_run_independently(self):
+        """Test that different keys are not coalesced."""
+        flight = SingleFlight("test")
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        async def run():
+            return await asyncio.gather(flight.do("a", lambda: work(1)), flight.do("b", lambda: work(2)))
+
+        self.assertEqual(asyncio.run(run()), [1, 2])
+        self.assertEqual(metrics.get("test.executions"), 2)
+        self.assertEqual(metrics.get("test.coalesced"), 0)
+
+    def test_exception_is_shared_and_key_released(self):
+        """Test that a failure reaches every waiter and does not poison later calls."""
+        flight = SingleFlight("test")
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def run():
+            return await asyncio.gather(*[flight.do("key", failing) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(metrics.get("test.failures"), 1)
+
+        async def succeed():
+            return "ok"
+
+        self.assertEqual(asyncio.run(flight.do("key", succeed)), "ok")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import pyarrow.parquet as pq
+
+from rag.src.rag.utils.simulation import SimulatedMilvusManager, pseudo_embedding, reset_backend
+from rag.src.rag.utils.snapshot import MANIFEST_FILE, export_snapshot, import_snapshot
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "snapshot"
+        self.source = SimulatedMilvusManager(collection_name="source", embedding_dim=256)
+        self.source.insert_data([
+            {"text": f"Policy chunk {i}", "embedding": pseudo_embedding(f"Policy chunk {i}", 256),
+             "metadata": {"source": "policy.pdf", "tenant": "acme", "page": i}}
+            for i in range(5)
+        ])
+        self.source.move_to_tier("archive", filters={"tenant": "acme"})
+        self.source.insert_data([
+            {"text": "Leave is 20 days.", "embedding": pseudo_embedding("Leave is 20 days.", 256), "metadata": {"source": "leave.pdf"}}
+        ])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        reset_backend()
+
+    def test_round_trip_preserves_vectors_text_metadata_and_tiers(self):
+        """Test that a collection exported in small batches imports into a fresh collection unchanged."""
+        manifest = export_snapshot(self.source, str(self.path), batch_size=2)
+
+        self.assertEqual(manifest["tiers"], {"hot": {"file": "hot.parquet", "rows": 1}, "archive": {"file": "archive.parquet", "rows": 5}})
+        self.assertEqual(pq.ParquetFile(self.path / "archive.parquet").num_row_groups, 3)
+        self.assertEqual(json.loads((self.path / MANIFEST_FILE).read_text())["embedding_dim"], 256)
+
+        target = SimulatedMilvusManager(collection_name="target", embedding_dim=256)
+        self.assertEqual(import_snapshot(target, str(self.path), batch_size=2), {"hot": 1, "archive": 5})
+
+        for tier in ("hot", "archive"):
+            original = [row for batch in self.source.iter_rows(tier) for row in batch]
+            restored = [row for batch in target.iter_rows(tier) for row in batch]
+            self.assertEqual([(r["text"], r["metadata"]) for r in restored], [(r["text"], r["metadata"]) for r in original])
+            for a, b in zip(original, restored):
+                self.assertEqual(a["embedding"], b["embedding"])
+        hits = target.search(pseudo_embedding("Leave is 20 days.", 256), limit=1)
+        self.assertEqual(hits[0]["text"], "Leave is 20 days.")
+
+    def test_import_rejects_dimension_mismatch_and_non_empty_collection(self):
+        """Test that a snapshot only loads into an empty collection with the same embedding dimension."""
+        export_snapshot(self.source, str(self.path))
+        with self.assertRaises(ValueError):
+            import_snapshot(SimulatedMilvusManager(collection_name="small", embedding_dim=512), str(self.path))
+        with self.assertRaises(ValueError):
+            import_snapshot(self.source, str(self.path))
+
+    def test_incomplete_export_is_not_importable(self):
+        """Test that a directory without a manifest is refused and an existing snapshot is not overwritten."""
+        self.path.mkdir()
+        with self.assertRaises(ValueError):
+            import_snapshot(SimulatedMilvusManager(collection_name="target", embedding_dim=256), str(self.path))
+        export_snapshot(self.source, str(self.path), tiers=("hot",))
+        with self.assertRaises(ValueError):
+            export_snapshot(self.source, str(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
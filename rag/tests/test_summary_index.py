@@ -0,0 +1,130 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from rag.src.rag.utils.document_processor import DocumentProcessor
+from rag.src.rag.utils.retrieval_policy import RetrievalPolicy
+from rag.src.rag.utils.retriever import Retriever
+from rag.src.rag.utils.simulation import SimulatedMilvusManager, pseudo_embedding, reset_backend
+from rag.src.rag.utils.summary_index import group_sections, in_section
+
+ANNUAL = "Annual leave entitlement is 20 working days per calendar year, accrued monthly."
+SICK = "Sick leave of up to 10 days a year is paid on presentation of a medical certificate."
+EXPENSES = "Expense claims are reimbursed within thirty days of submission."
+
+
+def chunk(text, section, source="handbook.pdf"):
+    return {"text": text, "metadata": {"source": source, "section": section, "tenant": "acme"}}
+
+
+class TestSummaryIndexBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.chunks = [
+            chunk(ANNUAL, "Handbook > Leave > Annual leave"),
+            chunk(SICK, "Handbook > Leave > Sick leave"),
+            chunk(EXPENSES, "Handbook > Expenses"),
+        ]
+
+    def test_sections_are_grouped_below_the_document_title(self):
+        """Test that the shared title is skipped when grouping, and section membership."""
+        groups = group_sections(self.chunks)
+
+        self.assertEqual([section for section, _ in groups], ["Handbook > Leave", "Handbook > Expenses"])
+        self.assertEqual(groups[0][1], f"{ANNUAL}\n{SICK}")
+        self.assertTrue(in_section("Handbook > Leave > Sick leave", "Handbook > Leave"))
+        self.assertFalse(in_section("Handbook > Leaver", "Handbook > Leave"))
+        self.assertFalse(in_section("Handbook > Leave", ""))
+
+    def test_document_and_section_summaries_are_embedded(self):
+        """Test the summary levels, labels and metadata; short sections are used as they are."""
+        processor = DocumentProcessor(mock=True, build_summaries=True, embedding_dim=256)
+        processor.summary_words = 12
+
+        summaries = processor._summarize_document(group_sections(self.chunks), {"source": "handbook.pdf", "tenant": "acme"})
+
+        self.assertEqual([summary["metadata"]["level"] for summary in summaries], ["document", "section", "section"])
+        self.assertTrue(summaries[1]["text"].startswith("Summary of handbook.pdf > Handbook > Leave:\n"))
+        self.assertEqual(summaries[2]["text"], f"Summary of handbook.pdf > Handbook > Expenses:\n{EXPENSES}")
+        self.assertEqual(summaries[0]["metadata"], {"source": "handbook.pdf", "tenant": "acme", "level": "document", "section": ""})
+        self.assertEqual(len(summaries[0]["embedding"]), 256)
+
+    def test_summaries_are_off_by_default(self):
+        """Test that the summary stage is opt-in and leaves `summaries` empty."""
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("SUMMARY_INDEX", None)
+            processor = DocumentProcessor(mock=True)
+        self.assertFalse(processor.build_summaries)
+        self.assertEqual(processor.summaries, [])
+
+
+@patch.dict(os.environ, {"RAG_BACKEND": "simulated", "SIM_LATENCY_SCALE": "0"})
+class TestTopDownSearch(unittest.TestCase):
+
+    def setUp(self):
+        reset_backend()
+        self.manager = SimulatedMilvusManager(collection_name="summaries", embedding_dim=256)
+        chunks = [
+            chunk(ANNUAL, "Handbook > Leave > Annual leave"),
+            chunk(SICK, "Handbook > Leave > Sick leave"),
+            chunk(EXPENSES, "Handbook > Expenses"),
+            chunk("Laptops are replaced every three years.", "IT > Equipment", source="it.pdf"),
+        ]
+        for item in chunks:
+            item["embedding"] = pseudo_embedding(item["text"], 256)
+        self.manager.insert_data(chunks)
+        self.document_summary = "The employee handbook covers leave and expenses."
+        self.manager.insert_summaries([
+            self.summary(self.document_summary, "document", ""),
+            self.summary("Annual and sick leave entitlements.", "section", "Handbook > Leave"),
+            self.summary("How expenses are claimed.", "section", "Handbook > Expenses"),
+        ])
+
+    def tearDown(self):
+        reset_backend()
+
+    @staticmethod
+    def summary(text, level, section):
+        return {"text": text, "embedding": pseudo_embedding(text, 256),
+                "metadata": {"source": "handbook.pdf", "tenant": "acme", "level": level, "section": section}}
+
+    def retriever(self, mode="auto"):
+        with patch.dict(os.environ, {"SUMMARY_SEARCH": mode, "SUMMARY_SEARCH_SECTIONS": "1"}):
+            return Retriever(self.manager, policy=RetrievalPolicy())
+
+    def test_broad_query_descends_from_document_to_chunks(self):
+        """Test that a query closest to a document summary is answered top-down within its best section."""
+        query = pseudo_embedding(self.document_summary, 256)
+        chunk_hits = self.manager.search(query, limit=10)
+
+        hits = self.retriever()._search_summaries(query, chunk_hits)
+
+        self.assertEqual(hits[0]["text"], self.document_summary)
+        self.assertEqual(hits[1]["metadata"]["level"], "section")
+        section = hits[1]["metadata"]["section"]
+        self.assertTrue(hits[2:])
+        self.assertTrue(all(in_section(hit["metadata"]["section"], section) for hit in hits[2:]))
+
+    def test_specific_query_stays_on_chunks_in_auto_mode(self):
+        """Test that a query matching a chunk better than any summary is left to chunk search."""
+        query = pseudo_embedding(ANNUAL, 256)
+        chunk_hits = self.manager.search(query, limit=10)
+
+        self.assertEqual(self.retriever()._search_summaries(query, chunk_hits), [])
+        hits = self.retriever("always")._search_summaries(query, chunk_hits)
+        self.assertEqual(hits[0]["text"], self.document_summary)
+        self.assertIn(ANNUAL, [hit["text"] for hit in hits])
+
+    def test_summaries_are_replaced_and_follow_the_hot_tier(self):
+        """Test that re-ingesting replaces a document's summaries and archiving it removes them."""
+        query = pseudo_embedding(self.document_summary, 256)
+        self.manager.insert_summaries([self.summary("A new handbook.", "document", "")])
+        self.assertEqual([hit["text"] for hit in self.manager.search_summaries(query, 5, "document")], ["A new handbook."])
+        self.assertEqual(self.manager.search_summaries(query, 5, "document", filters={"tenant": "globex"}), [])
+
+        self.manager.move_to_tier("archive", filters={"tenant": "acme"})
+        self.assertEqual(self.manager.search_summaries(query, 5, "document"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
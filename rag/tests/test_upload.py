@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import tempfile
+import unittest
+from pathlib import Path
+
+from rag.src.rag.utils.upload import StreamingUploadParser, UploadRejected, check_content_length, file_sha256
+
+BOUNDARY = "testboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def multipart_body(filename: str, content: bytes, fields: dict = None) -> bytes:
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+    )
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts)
+
+
+async def chunked(body: bytes, size: int = 1000):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+class TestStreamingUploadParser(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.target = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def parse(self, body: bytes, max_bytes: int = 1_000_000):
+        parser = StreamingUploadParser(CONTENT_TYPE, self.target, max_bytes)
+        return asyncio.run(parser.parse(chunked(body)))
+
+    def test_streams_file_to_disk_and_hashes_it(self):
+        """Test that the file lands on disk with its hash and the form fields are collected."""
+        content = bytes(range(256)) * 40
+        upload = self.parse(multipart_body("../../policy.pdf", content, {"tenant": "acme", "region": "SG"}))
+
+        self.assertEqual(upload.filename, "policy.pdf")
+        self.assertEqual(upload.path, self.target / "policy.pdf")
+        self.assertEqual(upload.path.read_bytes(), content)
+        self.assertEqual(upload.size, len(content))
+        self.assertEqual(upload.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(upload.sha256, file_sha256(str(upload.path)))
+        self.assertEqual(upload.fields, {"tenant": "acme", "region": "SG"})
+
+    def test_rejects_oversized_file_mid_stream(self):
+        """Test that a file over the limit is rejected with 413 and the partial file removed."""
+        with self.assertRaises(UploadRejected) as ctx:
+            self.parse(multipart_body("big.pdf", b"x" * 5000), max_bytes=2000)
+        self.assertEqual(ctx.exception.status_code, 413)
+        self.assertEqual(list(self.target.iterdir()), [])
+
+    def test_rejects_unsupported_type_before_writing(self):
+        """Test that an unsupported file type is rejected as soon as its headers arrive."""
+        with self.assertRaises(UploadRejected) as ctx:
+            self.parse(multipart_body("notes.txt", b"hello"))
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual(list(self.target.iterdir()), [])
+
+    def test_requires_a_file_part(self):
+        """Test that a form without a file is rejected."""
+        body = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="tenant"\r\n\r\nacme\r\n--{BOUNDARY}--\r\n'.encode()
+        with self.assertRaises(UploadRejected):
+            self.parse(body)
+
+    def test_rejects_non_multipart_requests(self):
+        """Test that the content type must be multipart with a boundary."""
+        with self.assertRaises(UploadRejected):
+            StreamingUploadParser("application/json", self.target, 100)
+
+    def test_content_length_precheck(self):
+        """Test that a declared size over the limit is rejected before reading the body."""
+        check_content_length(None, 1024)
+        check_content_length("2048", 1024)
+        with self.assertRaises(UploadRejected) as ctx:
+            check_content_length(str(10 * 1024 * 1024), 1024)
+        self.assertEqual(ctx.exception.status_code, 413)
+
+
+if __name__ == '__main__':
+    unittest.main()